@@ -53,6 +53,10 @@ IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'conversation_messages')
 IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_conversation_created') AND EXISTS (SELECT * FROM sys.tables WHERE name = 'conversation_messages')
     CREATE INDEX idx_conversation_created ON dbo.conversation_messages(conversation_id, created_at);
 
+-- Rolling summarization: turns folded into a summary message are kept but marked compacted
+IF EXISTS (SELECT * FROM sys.tables WHERE name = 'conversation_messages') AND COL_LENGTH('dbo.conversation_messages', 'compacted') IS NULL
+    ALTER TABLE dbo.conversation_messages ADD compacted BIT NOT NULL CONSTRAINT DF_conversation_messages_compacted DEFAULT 0;
+
 -- User Portfolios Table (Holdings with tax lots)
 IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'user_portfolios')
     CREATE TABLE dbo.user_portfolios (
@@ -175,6 +179,22 @@ IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_session_unread') AND
 IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_delivered') AND EXISTS (SELECT * FROM sys.tables WHERE name = 'proactive_insights')
     CREATE INDEX idx_delivered ON dbo.proactive_insights(delivered_at);
 
+-- Hashtag Events Table (Hashtag analytics, written through the write-behind queue)
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'hashtag_events')
+    CREATE TABLE dbo.hashtag_events (
+        id BIGINT IDENTITY(1,1) PRIMARY KEY,
+        hashtag VARCHAR(20) NOT NULL,
+        context VARCHAR(50) NOT NULL, -- 'chat', 'search', 'portfolio', etc.
+        user_id VARCHAR(100),
+        session_id VARCHAR(100),
+        conversation_id VARCHAR(100),
+        metadata NVARCHAR(MAX), -- JSON: event metadata
+        created_at DATETIME2 DEFAULT GETDATE()
+    );
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_hashtag_events_tag_time') AND EXISTS (SELECT * FROM sys.tables WHERE name = 'hashtag_events')
+    CREATE INDEX idx_hashtag_events_tag_time ON dbo.hashtag_events(hashtag, created_at);
+
 -- ============================================================================
 -- CONTINUOUS LEARNING PIPELINE TABLES (Phase 3: Gemini-Enhanced Learning)
 -- ============================================================================
@@ -10,6 +10,10 @@ TODAY_ISO    = TODAY.isoformat()  # e.g., '2025-10-08'
 AUTO_WEB_FALLBACK = os.getenv("AUTO_WEB_FALLBACK", "true").lower() in ("1", "true", "yes")
 FAST_WEB_MAX_PAGES = int(os.getenv("FAST_WEB_MAX_PAGES", "5"))
 
+# SQL answer streaming: cursor batch size and table rows per flushed chunk
+SQL_STREAM_FETCH_SIZE = int(os.getenv("SQL_STREAM_FETCH_SIZE", "500"))
+SQL_STREAM_CHUNK_ROWS = int(os.getenv("SQL_STREAM_CHUNK_ROWS", "50"))
+
 # PDF.co API configuration for advanced PDF processing
 PDFCO_API_KEY = os.getenv("PDFCO_API_KEY")
 PDFCO_API_ENABLED = bool(PDFCO_API_KEY)
@@ -510,18 +514,24 @@ SELECT
 FROM dbo.Ingest_Prices_Stock_Data;
 """
 
-PLANNER_SYSTEM_DEFAULT = f"""
+# Planner prompt, in sections. Joined in order they form the full prompt;
+# app/core/planner_prompt.py sends only the sections a question needs.
+_PLANNER_CORE = f"""
 You are a fast planner. Do NOT ask clarifying questions. 
 Return STRICT one-line JSON: {{"action":"chat"|"sql"|"multipart"|"passive_income_plan","final_answer":<string or null>,"sql":<string or null>}}.
 
-*** MULTIPART DATA DETECTION ***
+"""
+
+_PLANNER_MULTIPART = f"""*** MULTIPART DATA DETECTION ***
 - If the user has uploaded a file or image with financial data (portfolio, watchlist, prices, dividends):
   1. Return action: "multipart"
   2. Extract and display ALL data from the file/image in a clear format
   3. Ask: "Would you like me to create a portfolio, watchlist, or passive list to track these tickers?"
   4. Return: {{"action":"multipart","final_answer":"<extracted data + question>","sql":null}}
 
-*** PORTFOLIO/WATCHLIST/PASSIVE LIST DETECTION ***
+"""
+
+_PLANNER_PORTFOLIO_LISTS = f"""*** PORTFOLIO/WATCHLIST/PASSIVE LIST DETECTION ***
 - If the user mentions "portfolio", "watchlist", "watch list", or "passive list":
   1. DO NOT execute any SQL query initially
   2. Return action: "chat" with a comprehensive response that includes:
@@ -533,7 +543,9 @@ Return STRICT one-line JSON: {{"action":"chat"|"sql"|"multipart"|"passive_income
      f) Always ask: "Would you like me to create a portfolio, watchlist, or passive list to track these tickers?"
   3. Return: {{"action":"chat","final_answer":"<type in bold + table + raw data + question>","sql":null}}
 
-*** PASSIVE INCOME PLANNING DETECTION ***
+"""
+
+_PLANNER_PASSIVE_INCOME = f"""*** PASSIVE INCOME PLANNING DETECTION ***
 - If the user asks about "passive income", "retirement income", "dividend portfolio", "replace my income", "financial independence", "live off dividends", or similar wealth-building concepts:
   1. Return action: "passive_income_plan" (NOT "chat" or "sql")
   2. Set final_answer: null
@@ -545,7 +557,9 @@ Return STRICT one-line JSON: {{"action":"chat"|"sql"|"multipart"|"passive_income
   • Generates 5-year income projections with charts
   • Offers to save as a portfolio/watchlist
 
-*** ML-POWERED INTELLIGENCE (AUTOMATIC) ***
+"""
+
+_PLANNER_ML_FEATURES = f"""*** ML-POWERED INTELLIGENCE (AUTOMATIC) ***
 - Harvey has access to powerful ML capabilities that are automatically integrated into dividend analysis
 - ML features are included in standard dividend queries - NO special action needed
 - When answering dividend queries, the system automatically enriches responses with:
@@ -566,7 +580,9 @@ Return STRICT one-line JSON: {{"action":"chat"|"sql"|"multipart"|"passive_income
 - ML features degrade gracefully - if ML API unavailable, continue with standard analytics
 - DO NOT write SQL queries for ML features - they use the ML API automatically
 
-*** SMART FINTECH QUERY HANDLING ***
+"""
+
+_PLANNER_FINTECH = f"""*** SMART FINTECH QUERY HANDLING ***
 - The system can answer ANY fintech-related query using available data:
   • Dividend yield, growth rates, payout ratios
   • Price analysis, bid/ask spreads, volume trends
@@ -578,18 +594,24 @@ Return STRICT one-line JSON: {{"action":"chat"|"sql"|"multipart"|"passive_income
 - Instead, fetch ALL relevant data and let the LLM perform calculations
 - If data is missing (EPS, P/E, earnings), suggest web search as fallback
 
-*** DATE CONTEXT (DYNAMIC) ***
+"""
+
+_PLANNER_DATE_CONTEXT = f"""*** DATE CONTEXT (DYNAMIC) ***
 - Assume today's date is {TODAY_ISO} in timezone Asia/Karachi.
 - Interpret relative phrases (e.g., "last 2 years") relative to {TODAY_ISO}.
 - In SQL, compute dates with the DB clock via CAST(GETDATE() AS DATE) and DATEADD to remain server-consistent.
 
-*** ABSOLUTE RULES ***
+"""
+
+_PLANNER_ABSOLUTE_RULES = f"""*** ABSOLUTE RULES ***
 - Dialect: **SQL Server** (T-SQL). No LIMIT/OFFSET/INTERVAL. Use DATEADD for date math.
 - Read-only. Single SELECT or WITH-CTE that ends in a SELECT. No semicolons.
 - Use **only**: dbo.vDividends, dbo.vTickers, and dbo.vPrices.
 - **U.S. MARKETS ONLY**: ALWAYS filter vTickers queries with "WHERE Country = 'United States'" to show only U.S. stocks and ETFs.
 
-*** PRICE QUERY DEFAULTS (CRITICAL) ***
+"""
+
+_PLANNER_PRICE_DEFAULTS = f"""*** PRICE QUERY DEFAULTS (CRITICAL) ***
 Smart price query defaults to prevent data overload
 - **Current/Latest Price Query** (user asks "price of X", "what's the price", "current price", "latest quote"):
   → ALWAYS use TOP 1 per ticker
@@ -611,7 +633,9 @@ Smart price query defaults to prevent data overload
   → Use TOP 1 per ticker (latest only)
   → Example: "compare AAPL and MSFT" → SELECT TOP 1 Ticker, Price, Bid, Ask, Volume, Trade_Timestamp_UTC, Snapshot_Timestamp FROM dbo.vPrices WHERE Ticker IN ('AAPL', 'MSFT') ORDER BY Ticker ASC, Trade_Timestamp_UTC DESC, Snapshot_Timestamp DESC
 
-*** DIVIDEND QUERY DEFAULTS ***
+"""
+
+_PLANNER_DIVIDEND_DEFAULTS = f"""*** DIVIDEND QUERY DEFAULTS ***
 - If the user does NOT specify columns/limits → return **FULL ROWS** (no TOP)
   **EXCEPT** when the user asks for the **latest/most recent** dividend; then return only the single most recent payout per ticker.
 - **Whenever the user asks about dividend data (history, latest, payouts), the SELECT must include ALL FOUR dates:**
@@ -632,7 +656,9 @@ Smart price query defaults to prevent data overload
 - Bold the important parts of the answer (e.g., price, dividend amount, bid/ask spread, etc.).
 - If asked for price-based metrics (yield, P/E, etc.), return available price data and note that additional metrics require external calculation.
 
-## PRICE DATA FORMAT:
+"""
+
+_PLANNER_PRICE_FORMAT = f"""## PRICE DATA FORMAT:
 When providing price data, use this EXACT format:
 
 *Ticker (SYMBOL) - Current/Historical Price Data*
@@ -643,7 +669,9 @@ When providing price data, use this EXACT format:
 | AAPL | $150.10 | $150.05 | $150.15 | 1,800,000 | 2025-10-17 14:25:00 UTC | NYSE |
 [Continue for ALL requested rows - NO GAPS, NO "..."]
 
-## DIVIDEND HISTORY FORMAT:
+"""
+
+_PLANNER_DIVIDEND_FORMAT = f"""## DIVIDEND HISTORY FORMAT:
 When providing dividend history, use this EXACT format:
 
 *Microsoft Corporation (MSFT) - Complete Dividend History*
@@ -654,7 +682,9 @@ When providing dividend history, use this EXACT format:
 | MSFT | May 19, 2010 | Jun 03, 2010 | Jun 10, 2010 | Mar 10, 2010 | $0.13 |
 [Continue for ALL years - NO GAPS, NO "..."]
 
-*** LATEST vs FULL vs DEFAULT HISTORY ***
+"""
+
+_PLANNER_HISTORY_DEFAULTS = f"""*** LATEST vs FULL vs DEFAULT HISTORY ***
 If user says "latest", "most recent", or "current" (for dividends or prices) →
 → Return only the latest dividend/price per ticker (one row per ticker).
 
@@ -667,7 +697,9 @@ If user says "history" only →
 → Default to last 30 days of data for prices:
   WHERE Trade_Timestamp_UTC >= DATEADD(DAY, -30, GETDATE()) OR Snapshot_Timestamp >= DATEADD(DAY, -30, CAST(GETDATE() AS DATE))
 
-*** DATE-RANGE / TIME-BASED QUERIES ***
+"""
+
+_PLANNER_DATE_RANGES = f"""*** DATE-RANGE / TIME-BASED QUERIES ***
 Handle human phrases like:
 - "dividends declared this week/month/year"
 - "prices from last 7 days"
@@ -685,7 +717,9 @@ Handle human phrases like:
   - "price history last 7 days" → SELECT TOP 100 Ticker, Price, Bid, Ask, Volume, Trade_Timestamp_UTC, Snapshot_Timestamp FROM dbo.vPrices WHERE Ticker = 'MSFT' AND (Trade_Timestamp_UTC >= DATEADD(DAY, -7, GETDATE()) OR Snapshot_Timestamp >= DATEADD(DAY, -7, CAST(GETDATE() AS DATE))) ORDER BY Trade_Timestamp_UTC DESC, Snapshot_Timestamp DESC
   - "bid/ask spread for MSFT" → SELECT TOP 1 Ticker, Bid, Ask, (Ask - Bid) AS Spread, Trade_Timestamp_UTC, Snapshot_Timestamp FROM dbo.vPrices WHERE Ticker = 'MSFT' ORDER BY Trade_Timestamp_UTC DESC, Snapshot_Timestamp DESC
 
-*** US MARKET FILTERING (DEFAULT) ***
+"""
+
+_PLANNER_US_MARKET = f"""*** US MARKET FILTERING (DEFAULT) ***
 **CRITICAL: By default, ALWAYS filter to US markets ONLY unless user explicitly asks for international/global data.**
 
 US Market Definition:
@@ -711,36 +745,52 @@ Exception Keywords (include international data):
 - User asks about specific country: "Japanese dividends", "UK stocks"
 → In these cases, REMOVE the "Ticker NOT LIKE '%.%'" filter but KEEP data quality filters
 
-*** MULTI-TICKER & COMPLEX QUERIES ***
+"""
+
+_PLANNER_MULTI_TICKER = f"""*** MULTI-TICKER & COMPLEX QUERIES ***
 - If multiple tickers: WHERE Ticker IN (...)
 - For rankings/comparisons: GROUP BY Ticker + aggregation logic.
 - For price comparisons: Can aggregate by Ticker and calculate average price, volume, bid/ask ranges.
 - If no tickers: return all matching rows (respect date filters and US market filter).
 
-*** NON-FINANCE / OUT-OF-SCOPE ***
+"""
+
+_PLANNER_OUT_OF_SCOPE = f"""*** NON-FINANCE / OUT-OF-SCOPE ***
 If unrelated → return {{"action":"chat","final_answer":"<helpful response>","sql":null}}
 
-*** SCHEMA (only these columns) ***
-dbo.vTickers(
+"""
+
+_PLANNER_SCHEMA = f"""*** SCHEMA (only these columns) ***
+"""
+
+_PLANNER_SCHEMA_V_TICKERS = f"""dbo.vTickers(
     Ticker_ID, Ticker, Ticker_Symbol_Name, Exchange, Exchange_Full_Name,
     Company_Name, Website, Sector, Industry, Country, Security_Type,
     Reference_Asset, Benchmark_Index, Description, Inception_Date,
     Gross_Expense_Ratio, ThirtyDay_SEC_Yield, Created_At, Updated_At, Distribution_Frequency
 )
-dbo.vDividends(
+"""
+
+_PLANNER_SCHEMA_V_DIVIDENDS = f"""dbo.vDividends(
     Dividend_ID, Ticker, Dividend_Amount, AdjDividend_Amount, Dividend_Type, Currency,
     Distribution_Frequency, Declaration_Date, Ex_Dividend_Date, Record_Date, Payment_Date,
     Created_At, Updated_At, Security_Type
 )
-dbo.vPrices(
+"""
+
+_PLANNER_SCHEMA_V_PRICES = f"""dbo.vPrices(
     Price_ID, Ticker, Price, Volume, Bid, Ask, Bid_Size, Ask_Size,
     Trade_Timestamp_UTC, Quote_Timestamp_UTC, Snapshot_Timestamp,
     Change_Percent, Source, Created_At, Updated_At, Security_Type
 )
 
-*** EXAMPLES ***
+"""
+
+_PLANNER_EXAMPLES = f"""*** EXAMPLES ***
 
-Q: "Current price of AAPL" →
+"""
+
+_PLANNER_EXAMPLES_PRICES = f"""Q: "Current price of AAPL" →
 {{"action":"sql","final_answer":null,"sql":"SELECT TOP 1 Ticker, Price, Bid, Ask, Volume, Trade_Timestamp_UTC, Snapshot_Timestamp, Source FROM dbo.vPrices WHERE Ticker = 'AAPL' ORDER BY Trade_Timestamp_UTC DESC, Snapshot_Timestamp DESC"}}
 
 Q: "Price history for MSFT last 7 days" →
@@ -752,19 +802,53 @@ Q: "Bid/Ask spread for GOOGL" →
 Q: "Compare prices of AAPL and MSFT" →
 {{"action":"sql","final_answer":null,"sql":"SELECT TOP 1 Ticker, Price, Bid, Ask, Volume, Trade_Timestamp_UTC, Snapshot_Timestamp FROM dbo.vPrices WHERE Ticker IN ('AAPL', 'MSFT') ORDER BY Ticker ASC, Trade_Timestamp_UTC DESC, Snapshot_Timestamp DESC"}}
 
-Q: "Dividends declared this week" →
+"""
+
+_PLANNER_EXAMPLES_DIVIDENDS = f"""Q: "Dividends declared this week" →
 {{"action":"sql","final_answer":null,"sql":"SELECT Ticker, Dividend_Amount, AdjDividend_Amount, Declaration_Date, Ex_Dividend_Date, Record_Date, Payment_Date FROM dbo.vDividends WHERE Ticker NOT LIKE '%.%' AND Dividend_Amount > 0 AND Dividend_Amount <= 1000 AND Declaration_Date BETWEEN DATEADD(WEEK, DATEDIFF(WEEK, 0, GETDATE()), 0) AND GETDATE() ORDER BY Declaration_Date DESC"}}
 
 Q: "What dividends will be paid next year?" →
 {{"action":"sql","final_answer":null,"sql":"SELECT Ticker, Dividend_Amount, AdjDividend_Amount, Declaration_Date, Ex_Dividend_Date, Record_Date, Payment_Date FROM dbo.vDividends WHERE Ticker NOT LIKE '%.%' AND Dividend_Amount > 0 AND Dividend_Amount <= 1000 AND Payment_Date BETWEEN DATEFROMPARTS(YEAR(GETDATE()) + 1, 1, 1) AND DATEFROMPARTS(YEAR(GETDATE()) + 1, 12, 31) ORDER BY Payment_Date DESC"}}
 
-Q: "Tell me about Microsoft dividends" OR "Show AAPL dividends" OR any dividend table/list query →
+"""
+
+_PLANNER_EXAMPLES_DIVIDENDS_ENHANCED = f"""Q: "Tell me about Microsoft dividends" OR "Show AAPL dividends" OR any dividend table/list query →
 {{"action":"sql","final_answer":null,"sql":"SELECT d.Ticker, q.Price, d.Dividend_Amount AS Distribution, ROUND((d.Dividend_Amount * ISNULL(d.Distribution_Frequency, 4) / NULLIF(q.Price, 0)) * 100, 2) AS Yield, d.Declaration_Date, d.Ex_Dividend_Date, d.Payment_Date FROM dbo.vDividendsEnhanced d LEFT JOIN dbo.vQuotesEnhanced q ON d.Ticker = q.Ticker WHERE d.Ticker = 'MSFT' AND d.Ticker NOT LIKE '%.%' AND d.Dividend_Amount > 0 AND d.Dividend_Amount <= 1000 AND d.Confidence_Score >= 0.7 ORDER BY d.Ex_Dividend_Date DESC"}}
 
 Q: "What are the top dividend paying stocks?" OR "Show me high dividend stocks" (no specific ticker) →
 {{"action":"sql","final_answer":null,"sql":"SELECT TOP 10 d.Ticker, q.Price, d.Dividend_Amount AS Distribution, ROUND((d.Dividend_Amount * ISNULL(d.Distribution_Frequency, 4) / NULLIF(q.Price, 0)) * 100, 2) AS Yield, d.Declaration_Date, d.Ex_Dividend_Date, d.Payment_Date FROM dbo.vDividendsEnhanced d LEFT JOIN dbo.vQuotesEnhanced q ON d.Ticker = q.Ticker WHERE d.Ticker NOT LIKE '%.%' AND d.Dividend_Amount > 0 AND d.Dividend_Amount <= 1000 AND d.Confidence_Score >= 0.7 AND q.Price IS NOT NULL ORDER BY Yield DESC"}}
 """
 
+PLANNER_SECTIONS = {
+    "core": _PLANNER_CORE,
+    "multipart": _PLANNER_MULTIPART,
+    "portfolio_lists": _PLANNER_PORTFOLIO_LISTS,
+    "passive_income": _PLANNER_PASSIVE_INCOME,
+    "ml_features": _PLANNER_ML_FEATURES,
+    "fintech": _PLANNER_FINTECH,
+    "date_context": _PLANNER_DATE_CONTEXT,
+    "absolute_rules": _PLANNER_ABSOLUTE_RULES,
+    "price_defaults": _PLANNER_PRICE_DEFAULTS,
+    "dividend_defaults": _PLANNER_DIVIDEND_DEFAULTS,
+    "price_format": _PLANNER_PRICE_FORMAT,
+    "dividend_format": _PLANNER_DIVIDEND_FORMAT,
+    "history_defaults": _PLANNER_HISTORY_DEFAULTS,
+    "date_ranges": _PLANNER_DATE_RANGES,
+    "us_market": _PLANNER_US_MARKET,
+    "multi_ticker": _PLANNER_MULTI_TICKER,
+    "out_of_scope": _PLANNER_OUT_OF_SCOPE,
+    "schema": _PLANNER_SCHEMA,
+    "schema_vTickers": _PLANNER_SCHEMA_V_TICKERS,
+    "schema_vDividends": _PLANNER_SCHEMA_V_DIVIDENDS,
+    "schema_vPrices": _PLANNER_SCHEMA_V_PRICES,
+    "examples": _PLANNER_EXAMPLES,
+    "examples_prices": _PLANNER_EXAMPLES_PRICES,
+    "examples_dividends": _PLANNER_EXAMPLES_DIVIDENDS,
+    "examples_dividends_enhanced": _PLANNER_EXAMPLES_DIVIDENDS_ENHANCED,
+}
+
+PLANNER_SYSTEM_DEFAULT = "".join(PLANNER_SECTIONS.values())
+
 
 ANSWER_SYSTEM_DEFAULT = f"""
 You are Harvey, a precise, professional financial advisor.
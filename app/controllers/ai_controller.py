@@ -1,13 +1,14 @@
 import os
 import json
+import time
 import uuid
+import asyncio
 import logging
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.responses import StreamingResponse, JSONResponse
-import orjson
 
 from app.config import settings
 from app.utils.helper import (
@@ -15,7 +16,10 @@ from app.utils.helper import (
     extract_text_via_node,
     _maybe_flatten_vision_json,
 )
-from app.handlers.request_handler import handle_request
+from app.handlers.request_handler import handle_request_async
+from app.core.token_events import (
+    TokenEvent, fallback_text_events, collect_text, coalesce_deltas, meta_event, SSEEncoder
+)
 
 from app.utils.extract_tickers import extract_tickers_function
 
@@ -28,6 +32,13 @@ from app.helpers.status_message_detector import detect_status_message, get_statu
 from app.services.hashtag_analytics_service import get_hashtag_analytics_service
 from app.services.video_answer_service import VideoAnswerService
 from app.core.model_router import router as model_router, ModelType
+from app.services.request_coalescer import (
+    get_request_coalescer, coalesce_key, REQUEST_COALESCING_ENABLED
+)
+from app.services.stream_resume import get_stream_resume_registry, STREAM_RESUME_ENABLED
+from app.services.semantic_cache import (
+    get_semantic_cache, answer_sources, set_answer_sources, reset_answer_sources, SEMANTIC_CACHE_ENABLED
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -76,7 +87,7 @@ AUTO_WEB_FALLBACK = os.getenv("AUTO_WEB_FALLBACK", "true").lower() in ("1", "tru
 FAST_WEB_MAX_PAGES = int(os.getenv("FAST_WEB_MAX_PAGES", "5"))
 
 
-def process_query_with_tickers(query: str, rid: str, debug: bool = False, session_id: str = None, user_id: str = None) -> tuple:
+def process_query_with_tickers(query: str, rid: str, debug: bool = False, session_id: str = None, user_id: str = None, track_hashtags: bool = True) -> tuple:
     """Extract tickers from query and return updated query with ticker information."""
     ticker_result = extract_tickers_function(query, debug=debug)
     
@@ -95,18 +106,8 @@ def process_query_with_tickers(query: str, rid: str, debug: bool = False, sessio
         if debug and ticker_result.get("debug_info"):
             logger.info(f"[{rid}] Ticker debug info: {ticker_result['debug_info']}")
         
-        # Track hashtag event
-        try:
-            hashtag_service = get_hashtag_analytics_service()
-            hashtag_service.track_hashtag_event(
-                hashtags=detected_tickers,
-                user_id=user_id,
-                context="chat",
-                session_id=session_id,
-                metadata={"request_id": rid}
-            )
-        except Exception as e:
-            logger.warning(f"[{rid}] Hashtag tracking failed: {str(e)}")
+        if track_hashtags:
+            _track_hashtags(rid, detected_tickers, session_id=session_id, user_id=user_id)
         
         return updated_query, ticker_info, detected_tickers
     else:
@@ -118,6 +119,38 @@ def process_query_with_tickers(query: str, rid: str, debug: bool = False, sessio
         return query, "", []
 
 
+def _track_hashtags(rid: str, detected_tickers: list, session_id: str = None, user_id: str = None):
+    """Record a hashtag event for the detected tickers (non-critical)."""
+    try:
+        hashtag_service = get_hashtag_analytics_service()
+        hashtag_service.track_hashtag_event(
+            hashtags=detected_tickers,
+            user_id=user_id,
+            context="chat",
+            session_id=session_id,
+            metadata={"request_id": rid}
+        )
+    except Exception as e:
+        logger.warning(f"[{rid}] Hashtag tracking failed: {str(e)}")
+
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+_background_tasks: set = set()
+
+
+def _fire_and_forget(rid: str, label: str, func, *args, **kwargs):
+    """Run a non-critical blocking call in the threadpool without holding up the response."""
+    async def runner():
+        try:
+            await asyncio.to_thread(func, *args, **kwargs)
+        except Exception as e:
+            logger.warning(f"[{rid}] {label} failed (non-critical): {e}")
+    
+    task = asyncio.create_task(runner())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 def handle_conversation_memory(
     session_id: str = None,
     conversation_id: str = None,
@@ -128,44 +161,29 @@ def handle_conversation_memory(
     """
     Handle conversation memory: create session/conversation if needed, load history, save user message.
     
+    All of it is one database round trip (conversation_service.bootstrap_turn).
+    
     Returns:
         Dict with session_id, conversation_id, and conversation_history
     """
     try:
-        if not session_id or not conversation_service.session_exists(session_id):
-            session_id = conversation_service.create_session()
-            logger.info(f"[{rid}] Created new session: {session_id}")
-        else:
-            conversation_service.update_session_activity(session_id)
-            logger.info(f"[{rid}] Using existing session: {session_id}")
-        
-        if not conversation_id or not conversation_service.conversation_exists(conversation_id):
-            conversation_id = conversation_service.create_conversation(session_id)
-            logger.info(f"[{rid}] Created new conversation: {conversation_id}")
-        else:
-            logger.info(f"[{rid}] Using existing conversation: {conversation_id}")
-        
-        conversation_history = conversation_service.get_conversation_history(
-            conversation_id,
+        turn = conversation_service.bootstrap_turn(
+            session_id=session_id,
+            conversation_id=conversation_id,
+            user_query=user_query,
+            metadata={"rid": rid},
             max_tokens=max_history_tokens
         )
-        logger.info(f"[{rid}] Loaded {len(conversation_history)} messages from history")
-        
-        try:
-            conversation_service.add_message(
-                conversation_id=conversation_id,
-                role="user",
-                content=user_query,
-                metadata={"rid": rid}
-            )
-            logger.info(f"[{rid}] Saved user message to conversation {conversation_id}")
-        except Exception as e:
-            logger.warning(f"Failed to save conversation message (non-critical): {e}")
+        logger.info(
+            f"[{rid}] {'Created new' if turn['created_session'] else 'Using existing'} session: {turn['session_id']}, "
+            f"{'created new' if turn['created_conversation'] else 'using existing'} conversation: "
+            f"{turn['conversation_id']}; loaded {len(turn['conversation_history'])} messages from history"
+        )
         
         return {
-            "session_id": session_id,
-            "conversation_id": conversation_id,
-            "conversation_history": conversation_history
+            "session_id": turn["session_id"],
+            "conversation_id": turn["conversation_id"],
+            "conversation_history": turn["conversation_history"]
         }
         
     except Exception as e:
@@ -177,6 +195,356 @@ def handle_conversation_memory(
         }
 
 
+async def _preprocess_request(
+    rid: str,
+    question: str,
+    debug: bool = False,
+    session_id: str = None,
+    conversation_id: str = None,
+    user_id: str = None
+) -> dict:
+    """
+    Run the pre-model steps of a chat turn concurrently.
+    
+    Ticker extraction (followed by routing, which reads the ticker-annotated
+    question) and conversation memory are independent, so both run in the
+    threadpool at the same time. Hashtag tracking is fired off afterwards and
+    never awaited.
+    
+    Returns:
+        Dict with updated_question, ticker_info, detected_tickers, model_type,
+        routing_reason, session_id, conversation_id and conversation_history
+    """
+    t0 = time.perf_counter()
+    timings = {}
+    
+    def tickers_and_route():
+        t = time.perf_counter()
+        updated_question, ticker_info, detected_tickers = process_query_with_tickers(
+            question, rid, debug=debug, track_hashtags=False
+        )
+        timings["tickers_ms"] = int((time.perf_counter() - t) * 1000)
+        
+        t = time.perf_counter()
+        model_type, routing_reason = model_router.route_query(updated_question, has_image=False)
+        timings["route_ms"] = int((time.perf_counter() - t) * 1000)
+        return updated_question, ticker_info, detected_tickers, model_type, routing_reason
+    
+    def memory():
+        t = time.perf_counter()
+        conv_memory = handle_conversation_memory(
+            session_id=session_id,
+            conversation_id=conversation_id,
+            user_query=question,
+            rid=rid
+        )
+        timings["memory_ms"] = int((time.perf_counter() - t) * 1000)
+        return conv_memory
+    
+    (updated_question, ticker_info, detected_tickers, model_type, routing_reason), conv_memory = await asyncio.gather(
+        asyncio.to_thread(tickers_and_route),
+        asyncio.to_thread(memory)
+    )
+    
+    if detected_tickers:
+        _fire_and_forget(
+            rid, "Hashtag tracking", _track_hashtags, rid, detected_tickers,
+            session_id=conv_memory["session_id"] or None, user_id=user_id
+        )
+    
+    timings["total_ms"] = int((time.perf_counter() - t0) * 1000)
+    logger.info(
+        f"[{rid}] Preprocess: tickers={timings['tickers_ms']}ms route={timings['route_ms']}ms "
+        f"memory={timings['memory_ms']}ms total={timings['total_ms']}ms"
+    )
+    
+    return {
+        "updated_question": updated_question,
+        "ticker_info": ticker_info,
+        "detected_tickers": detected_tickers,
+        "model_type": model_type,
+        "routing_reason": routing_reason,
+        "timings": timings,
+        **conv_memory
+    }
+
+
+def _gemini_context(conversation_history: list) -> str:
+    """Build a short context string from the last few conversation turns."""
+    context_parts = []
+    if conversation_history:
+        context_parts.append("Previous conversation:")
+        for msg in conversation_history[-3:]:  # Last 3 messages
+            role = msg.get('role', 'unknown')
+            content = msg.get('content', '')
+            if content:
+                context_parts.append(f"{role}: {content[:200]}...")
+    
+    return "\n".join(context_parts) if context_parts else None
+
+
+async def _answer_stream(
+    rid: str,
+    model_type: ModelType,
+    routing_reason: str,
+    updated_question: str,
+    user_system_all: str,
+    overrides: dict,
+    detected_tickers: list,
+    conversation_history: list,
+    debug: bool
+):
+    """
+    Pick the answer pipeline (Gemini or the default planner/SQL path).
+    
+    On the default path an Azure-hosted route (GPT-5, Grok-4, DeepSeek)
+    writes the answer through its own deployment; planning stays on CHAT_MODEL.
+    Returns an async iterator of TokenEvents.
+    """
+    logger.info(f"[{rid}] {routing_reason}")
+    
+    if model_type == ModelType.GEMINI and GEMINI_HANDLER_AVAILABLE:
+        # Get query type for specialized handling
+        query_type = model_router.classify_query(updated_question, has_image=False)
+        
+        try:
+            gemini_handler = get_gemini_handler()
+        except Exception as e:
+            logger.error(f"[{rid}] Gemini handler initialization failed: {e}, falling back to default")
+            return await handle_request_async(updated_question, user_system_all, overrides, debug=debug)
+        
+        context_str = _gemini_context(conversation_history)
+        sources = answer_sources()
+        sources["route"] = "gemini"
+        
+        async def gemini_gen():
+            text_chunks = gemini_handler.handle_query_streaming_async(
+                query=updated_question,
+                query_type=query_type,
+                context=context_str,
+                tickers=detected_tickers,
+                temperature=0.7,
+                max_tokens=2048
+            )
+            
+            async def fallback():
+                logger.error(f"[{rid}] Gemini failed before the first chunk, falling back to default handler")
+                sources["route"] = "gemini_fallback"
+                return await handle_request_async(updated_question, user_system_all, overrides, debug=debug)
+            
+            def partial_failure(error):
+                # Part of the answer is already with the client; never cache it
+                logger.error(f"[{rid}] Gemini stream failed mid-answer: {error}")
+                sources["route"] = "gemini_partial"
+            
+            async for event in fallback_text_events(text_chunks, fallback, partial_failure):
+                yield event
+            
+            logger.info(f"[{rid}] Gemini response generation complete")
+        
+        logger.info(f"[{rid}] Using Gemini for query_type={query_type.value}")
+        return gemini_gen()
+    
+    deployment = model_router.models[model_type].deployment
+    if deployment:
+        overrides = {**overrides, "answer_deployment": deployment}
+    return await handle_request_async(updated_question, user_system_all, overrides, debug=debug)
+
+
+async def _coalesced_answer(
+    answer,
+    question: str,
+    meta: dict,
+    model_type: ModelType,
+    user_system_all: str,
+    overrides: dict,
+    personalized: bool
+):
+    """
+    Share one answer stream between identical in-flight questions.
+    
+    Personalized turns (conversation history, file uploads, debug) and requests
+    with meta.coalesce=false always get their own stream.
+    """
+    if (not REQUEST_COALESCING_ENABLED or personalized
+            or not meta.get("coalesce", True) or overrides.get("bypass_plan_cache")):
+        return await answer()
+    
+    provider, system_prompt = _answer_scope(meta, model_type, user_system_all, overrides)
+    key = coalesce_key(question, provider=provider, system_prompt=system_prompt)
+    return get_request_coalescer().stream(key, answer)
+
+
+def _answer_scope(meta: dict, model_type: ModelType, user_system_all: str, overrides: dict):
+    """Everything besides the question that shapes an answer: (provider, system prompt)."""
+    provider = f"{model_type.value}:{overrides['llm_provider']}:{overrides['llama_model']}"
+    system_prompt = "\x1f".join([
+        user_system_all,
+        overrides["planner_system"],
+        overrides["answer_system"],
+        (meta.get("prepend_user") or "").strip(),
+        str(overrides["use_web"]),
+    ])
+    return provider, system_prompt
+
+
+async def _cached_answer(
+    answer,
+    question: str,
+    updated_question: str,
+    detected_tickers: list,
+    meta: dict,
+    model_type: ModelType,
+    user_system_all: str,
+    overrides: dict,
+    personalized: bool
+):
+    """
+    Serve paraphrases of recently answered questions from the semantic answer cache.
+    
+    Misses, and hits sampled for audit, are answered through _coalesced_answer
+    and stored once they complete. Eligibility matches coalescing, plus
+    meta.semantic_cache=false and the per-query-type flags.
+    """
+    def live():
+        return _coalesced_answer(answer, question, meta, model_type, user_system_all, overrides, personalized)
+    
+    cache = get_semantic_cache()
+    if (not SEMANTIC_CACHE_ENABLED or personalized or overrides.get("use_web")
+            or updated_question.strip().lower().startswith("web:")
+            or not meta.get("semantic_cache", True) or overrides.get("bypass_plan_cache")):
+        return await live()
+    
+    query_type = model_router.classify_query(updated_question, has_image=False)
+    if not cache.enabled_for(query_type.value):
+        return await live()
+    
+    scope = "\x1f".join(_answer_scope(meta, model_type, user_system_all, overrides))
+    hit = cache.lookup(updated_question, detected_tickers, scope)
+    if hit is not None and not cache.should_audit():
+        return cache.replay(hit[0])
+    
+    # The pipeline reports how it answered (SQL views, chat, web...) into `sources`
+    sources, token = set_answer_sources()
+    try:
+        gen = await live()
+    finally:
+        reset_answer_sources(token)
+    return cache.record(gen, updated_question, detected_tickers, scope, sources, audited=hit)
+
+
+async def _stream_and_log(
+    rid: str,
+    gen,
+    question: str,
+    updated_question: str,
+    overrides: dict,
+    detected_tickers: list,
+    session_id: str,
+    conversation_id: str,
+    enable_videos: bool
+):
+    """
+    Encode the answer's TokenEvents to SSE for the client while collecting the
+    answer for memory and logs. This is the only place events become SSE bytes.
+    """
+    collected_content = []
+    req_id = f"chatcmpl-{int(datetime.now().timestamp() * 1000)}"
+    encoder = SSEEncoder(req_id)
+    done_event = None
+    try:
+        # FIRST: Send context-aware status message
+        status_msg = detect_status_message(question)
+        status_chunk = get_status_sse_chunk(status_msg, req_id)
+        yield status_chunk
+        logger.info(f"[{rid}] Sent status message: {status_msg}")
+        
+        async for event in coalesce_deltas(gen):
+            # Hold back [DONE] to append videos before it
+            if event.kind == "done":
+                done_event = event
+                continue
+            
+            if event.kind == "delta":
+                collected_content.append(event.content)
+            yield encoder.encode(event)
+        
+        # After AI response, append relevant videos BEFORE [DONE]
+        if enable_videos:
+            video_service = VideoAnswerService()
+            response_text = "".join(collected_content)
+            video_result = video_service.enhance_response_with_videos(question, response_text)
+            video_suffix = video_result.get("video_suffix", "")  # Exact video section
+            video_metadata = video_result.get("video_metadata", [])
+            
+            # Emit video markdown text if present
+            if video_suffix:
+                yield encoder.encode(TokenEvent("delta", video_suffix))
+                collected_content.append(video_suffix)
+            
+            # ALWAYS emit video_metadata when available (regardless of markdown)
+            if video_metadata:
+                yield encoder.encode(meta_event(video_metadata=video_metadata))
+        
+        # Now emit the [DONE] chunk
+        if done_event:
+            yield encoder.encode(done_event)
+            
+    finally:
+        response_text = "".join(collected_content)
+        
+        # Save assistant response to conversation
+        try:
+            conversation_service.add_message(
+                conversation_id=conversation_id,
+                role="assistant",
+                content=response_text,
+                metadata={"rid": rid, "detected_tickers": detected_tickers},
+                write_behind=True
+            )
+        except Exception as e:
+            logger.warning(f"Failed to save conversation message (non-critical): {e}")
+        
+        # Log after streaming completes
+        query_logger.log_full_conversation(
+            rid=rid,
+            query=question,
+            response=response_text,
+            metadata={
+                "detected_tickers": detected_tickers,
+                "original_query": question,
+                "updated_query": updated_question,
+                "stream": True,
+                "use_web": overrides.get("use_web"),
+                "session_id": session_id,
+                "conversation_id": conversation_id
+            }
+        )
+
+
+def _sse_response(rid: str, frames) -> StreamingResponse:
+    """
+    Wrap SSE frames in a StreamingResponse.
+    
+    With resume enabled the pipeline is pumped independently of this connection
+    and every event carries an `id:` so a reconnect can pick up where it left off.
+    """
+    if not STREAM_RESUME_ENABLED:
+        return StreamingResponse(frames, media_type="text/event-stream")
+    
+    async def source():
+        return frames
+    
+    registry = get_stream_resume_registry()
+    stream_id = registry.start(source)
+    logger.info(f"[{rid}] SSE stream id={stream_id}")
+    return StreamingResponse(
+        registry.events(stream_id),
+        media_type="text/event-stream",
+        headers={"X-Stream-Id": stream_id}
+    )
+
+
 async def chat_completions(request: Request):
     """
     Handles chat completion requests with daily query/response logging.
@@ -184,6 +552,13 @@ async def chat_completions(request: Request):
     rid = getattr(request.state, "rid", str(uuid.uuid4())[:8])
     ctype = request.headers.get("content-type", "").lower()
 
+    # ---------- SSE RESUME (reconnect with Last-Event-ID) ----------
+    if STREAM_RESUME_ENABLED:
+        resumed = get_stream_resume_registry().resume(request.headers.get("last-event-id"))
+        if resumed is not None:
+            logger.info(f"[{rid}] resuming SSE stream after {request.headers.get('last-event-id')}")
+            return StreamingResponse(resumed, media_type="text/event-stream")
+
     # ---------- MULTIPART ----------
     if ctype.startswith("multipart/form-data"):
         try:
@@ -264,15 +639,23 @@ async def chat_completions(request: Request):
         enable_videos_raw = form.get("enable_videos", "true")
         enable_videos = str(enable_videos_raw).lower() in ("", "1", "true", "yes", "on")
 
-        # === TICKER EXTRACTION (with session tracking) ===
+        # === PRE-PROCESSING: tickers + routing, conversation memory (concurrent) ===
         session_id_raw = form.get("session_id", "").strip() if hasattr(form.get("session_id", ""), 'strip') else ""
+        conversation_id_raw = form.get("conversation_id", "").strip() if hasattr(form.get("conversation_id", ""), 'strip') else ""
         user_id_raw = form.get("user_id", "").strip() if hasattr(form.get("user_id", ""), 'strip') else ""
         
-        updated_question, ticker_info, detected_tickers = process_query_with_tickers(
-            question, rid, debug=debug,
+        prep = await _preprocess_request(
+            rid, question, debug=debug,
             session_id=session_id_raw if session_id_raw else None,
+            conversation_id=conversation_id_raw if conversation_id_raw else None,
             user_id=user_id_raw if user_id_raw else None
         )
+        updated_question = prep["updated_question"]
+        ticker_info = prep["ticker_info"]
+        detected_tickers = prep["detected_tickers"]
+        session_id = prep["session_id"]
+        conversation_id = prep["conversation_id"]
+        conversation_history = prep["conversation_history"]
 
         # Build overrides
         overrides = {
@@ -282,6 +665,7 @@ async def chat_completions(request: Request):
             "use_web":        bool(meta.get("use_web", False)),
             "llm_provider":   (meta.get("llm_provider")   or req_model or "").strip(),
             "llama_model":    (meta.get("llama_model")    or "").strip(),
+            "bypass_plan_cache": bool(meta.get("bypass_plan_cache", False)),
         }
 
         if ticker_info:
@@ -424,25 +808,11 @@ async def chat_completions(request: Request):
                 overrides["prepend_user"] = (extraction_prefix + overrides["prepend_user"]).strip()
                 logger.info(f"[{rid}] Text extraction successful via {extraction_method}: {len(extracted_text)} chars")
 
-        # === CONVERSATION MEMORY ===
-        session_id_raw = (form.get("session_id") or "").strip()
-        conversation_id_raw = (form.get("conversation_id") or "").strip()
-        
-        conv_memory = handle_conversation_memory(
-            session_id=session_id_raw if session_id_raw else None,
-            conversation_id=conversation_id_raw if conversation_id_raw else None,
-            user_query=question,
-            rid=rid
-        )
-        
-        session_id = conv_memory["session_id"]
-        conversation_id = conv_memory["conversation_id"]
-        conversation_history = conv_memory["conversation_history"]
-        
         overrides["conversation_history"] = conversation_history
         
-        # === LOG QUERY ===
-        query_logger.log_query(
+        # === LOG QUERY (fire-and-forget) ===
+        _fire_and_forget(
+            rid, "Query logging", query_logger.log_query,
             rid=rid,
             query=question,
             metadata={
@@ -464,170 +834,26 @@ async def chat_completions(request: Request):
         )
 
         # === GEMINI ROUTING LOGIC (Multipart path) ===
-        # Check if query should be routed to Gemini based on query type
-        model_type, routing_reason = model_router.route_query(updated_question, has_image=False)
-        
-        if model_type == ModelType.GEMINI and GEMINI_HANDLER_AVAILABLE:
-            logger.info(f"[{rid}] {routing_reason}")
-            
-            # Get query type for specialized handling
-            query_type = model_router.classify_query(updated_question, has_image=False)
-            
-            try:
-                # Get Gemini handler
-                gemini_handler = get_gemini_handler()
-                
-                # Build context from conversation history
-                context_parts = []
-                if conversation_history:
-                    context_parts.append("Previous conversation:")
-                    for msg in conversation_history[-3:]:  # Last 3 messages
-                        role = msg.get('role', 'unknown')
-                        content = msg.get('content', '')
-                        if content:
-                            context_parts.append(f"{role}: {content[:200]}...")
-                
-                context_str = "\n".join(context_parts) if context_parts else None
-                
-                # Create generator that wraps Gemini response
-                def gemini_gen():
-                    try:
-                        # Use streaming handler
-                        for chunk in gemini_handler.handle_query_streaming(
-                            query=updated_question,
-                            query_type=query_type,
-                            context=context_str,
-                            tickers=detected_tickers,
-                            temperature=0.7,
-                            max_tokens=2048
-                        ):
-                            yield chunk
-                        
-                        logger.info(f"[{rid}] Gemini response generation complete")
-                        
-                    except Exception as e:
-                        logger.error(f"[{rid}] Gemini processing error: {e}, falling back to default handler")
-                        # Fallback to default handler on error
-                        for chunk in handle_request(updated_question, user_system_all, overrides, debug=debug):
-                            yield chunk
-                
-                # Use Gemini generator
-                gen = gemini_gen()
-                logger.info(f"[{rid}] Using Gemini for query_type={query_type.value}")
-                
-            except Exception as e:
-                logger.error(f"[{rid}] Gemini handler initialization failed: {e}, falling back to default")
-                gen = handle_request(updated_question, user_system_all, overrides, debug=debug)
-        else:
-            # Use default routing for non-Gemini queries
-            logger.info(f"[{rid}] {routing_reason}")
-            gen = handle_request(updated_question, user_system_all, overrides, debug=debug)
+        # Routing was decided during pre-processing
+        gen = await _cached_answer(
+            lambda: _answer_stream(
+                rid, prep["model_type"], prep["routing_reason"], updated_question, user_system_all,
+                overrides, detected_tickers, conversation_history, debug
+            ),
+            question, updated_question, detected_tickers, meta,
+            prep["model_type"], user_system_all, overrides,
+            personalized=bool(conversation_history) or is_upload_like(upload) or debug
+        )
         
         if stream:
-            # Wrapper to collect chunks while streaming
-            async def stream_and_log():
-                collected_content = []
-                req_id = f"chatcmpl-{int(datetime.now().timestamp() * 1000)}"
-                done_chunk = None
-                try:
-                    # FIRST: Send context-aware status message
-                    status_msg = detect_status_message(question)
-                    status_chunk = get_status_sse_chunk(status_msg, req_id)
-                    yield status_chunk
-                    logger.info(f"[{rid}] Sent status message: {status_msg}")
-                    
-                    for chunk in gen:
-                        # Ensure chunk is bytes
-                        chunk_bytes = chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
-                        chunk_str = chunk_bytes.decode('utf-8')
-                        
-                        # Hold back the [DONE] chunk to append videos before it
-                        if chunk_str == 'data: [DONE]\n\n':
-                            done_chunk = chunk_bytes
-                            continue
-                            
-                        yield chunk_bytes
-                        
-                        # Extract content from SSE chunk for conversation history
-                        if chunk_str.startswith('data: '):
-                            try:
-                                data = orjson.loads(chunk_str[6:].strip())
-                                content = data.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                                if content:
-                                    collected_content.append(content)
-                            except:
-                                pass
-                    
-                    # After AI response, append relevant videos BEFORE [DONE]
-                    if enable_videos:
-                        video_service = VideoAnswerService()
-                        response_text = "".join(collected_content)
-                        video_result = video_service.enhance_response_with_videos(question, response_text)
-                        video_suffix = video_result.get("video_suffix", "")  # Exact video section
-                        video_metadata = video_result.get("video_metadata", [])
-                        
-                        # Emit video markdown text if present
-                        if video_suffix:
-                            video_sse = f'data: {orjson.dumps({"id": req_id, "object": "chat.completion.chunk", "choices": [{"delta": {"content": video_suffix}}]}).decode()}\n\n'
-                            yield video_sse.encode('utf-8')
-                            collected_content.append(video_suffix)
-                        
-                        # ALWAYS emit video_metadata when available (regardless of markdown)
-                        if video_metadata:
-                            metadata_sse = f'data: {orjson.dumps({"id": req_id, "object": "chat.completion.chunk", "video_metadata": video_metadata}).decode()}\n\n'
-                            yield metadata_sse.encode('utf-8')
-                    
-                    # Now emit the [DONE] chunk
-                    if done_chunk:
-                        yield done_chunk
-                        
-                finally:
-                    response_text = "".join(collected_content)
-                    
-                    # Save assistant response to conversation
-                    try:
-                        conversation_service.add_message(
-                            conversation_id=conversation_id,
-                            role="assistant",
-                            content=response_text,
-                            metadata={"rid": rid, "detected_tickers": detected_tickers}
-                        )
-                    except Exception as e:
-                        logger.warning(f"Failed to save conversation message (non-critical): {e}")
-                    
-                    # Log after streaming completes
-                    query_logger.log_full_conversation(
-                        rid=rid,
-                        query=question,
-                        response=response_text,
-                        metadata={
-                            "detected_tickers": detected_tickers,
-                            "original_query": question,
-                            "updated_query": updated_question,
-                            "stream": True,
-                            "use_web": overrides.get("use_web"),
-                            "session_id": session_id,
-                            "conversation_id": conversation_id
-                        }
-                    )
-            
             logger.info(f"[{rid}] streaming response → SSE")
-            return StreamingResponse(stream_and_log(), media_type="text/event-stream")
+            return _sse_response(rid, _stream_and_log(
+                rid, gen, question, updated_question, overrides, detected_tickers,
+                session_id, conversation_id, enable_videos
+            ))
 
         # Non-streaming
-        collected_content = []
-        for chunk in gen:
-            chunk_str = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
-            # Extract content from SSE chunk
-            if chunk_str.startswith('data: ') and chunk_str != 'data: [DONE]\n\n':
-                try:
-                    data = orjson.loads(chunk_str[6:].strip())
-                    content = data.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                    if content:
-                        collected_content.append(content)
-                except:
-                    pass
-        text = "".join(collected_content)
+        text = await collect_text(gen)
         
         # Enhance with videos and get structured metadata
         video_metadata = []
@@ -643,7 +869,8 @@ async def chat_completions(request: Request):
                 conversation_id=conversation_id,
                 role="assistant",
                 content=text,
-                metadata={"rid": rid, "detected_tickers": detected_tickers}
+                metadata={"rid": rid, "detected_tickers": detected_tickers},
+                write_behind=True
             )
         except Exception as e:
             logger.warning(f"Failed to save conversation message (non-critical): {e}")
@@ -712,28 +939,23 @@ async def chat_completions(request: Request):
     # === VIDEO RECOMMENDATIONS TOGGLE ===
     enable_videos = bool(body.get("enable_videos", True))
 
-    # === CONVERSATION MEMORY (before ticker extraction for session tracking) ===
+    # === PRE-PROCESSING: tickers + routing, conversation memory (concurrent) ===
     session_id_raw = (body.get("session_id") or "").strip()
     conversation_id_raw = (body.get("conversation_id") or "").strip()
     user_id_raw = (body.get("user_id") or "").strip()
     
-    conv_memory = handle_conversation_memory(
+    prep = await _preprocess_request(
+        rid, question, debug=debug,
         session_id=session_id_raw if session_id_raw else None,
         conversation_id=conversation_id_raw if conversation_id_raw else None,
-        user_query=question,
-        rid=rid
-    )
-    
-    session_id = conv_memory["session_id"]
-    conversation_id = conv_memory["conversation_id"]
-    conversation_history = conv_memory["conversation_history"]
-
-    # === TICKER EXTRACTION (with session tracking) ===
-    updated_question, ticker_info, detected_tickers = process_query_with_tickers(
-        question, rid, debug=debug, 
-        session_id=session_id,
         user_id=user_id_raw if user_id_raw else None
     )
+    updated_question = prep["updated_question"]
+    ticker_info = prep["ticker_info"]
+    detected_tickers = prep["detected_tickers"]
+    session_id = prep["session_id"]
+    conversation_id = prep["conversation_id"]
+    conversation_history = prep["conversation_history"]
 
     overrides = {
         "planner_system": (meta.get("planner_system") or "").strip(),
@@ -742,6 +964,7 @@ async def chat_completions(request: Request):
         "use_web":        bool(meta.get("use_web", False)),
         "llm_provider":   (meta.get("llm_provider")   or req_model or "").strip(),
         "llama_model":    (meta.get("llama_model")    or "").strip(),
+        "bypass_plan_cache": bool(meta.get("bypass_plan_cache", False)),
     }
 
     if ticker_info:
@@ -749,8 +972,9 @@ async def chat_completions(request: Request):
     
     overrides["conversation_history"] = conversation_history
 
-    # === LOG QUERY ===
-    query_logger.log_query(
+    # === LOG QUERY (fire-and-forget) ===
+    _fire_and_forget(
+        rid, "Query logging", query_logger.log_query,
         rid=rid,
         query=question,
         metadata={
@@ -771,159 +995,26 @@ async def chat_completions(request: Request):
     )
 
     # === GEMINI ROUTING LOGIC ===
-    # Check if query should be routed to Gemini based on query type
-    model_type, routing_reason = model_router.route_query(updated_question, has_image=False)
-    
-    if model_type == ModelType.GEMINI and GEMINI_HANDLER_AVAILABLE:
-        logger.info(f"[{rid}] {routing_reason}")
-        
-        # Get query type for specialized handling
-        query_type = model_router.classify_query(updated_question, has_image=False)
-        
-        try:
-            # Get Gemini handler
-            gemini_handler = get_gemini_handler()
-            
-            # Build context from conversation history
-            context_parts = []
-            if conversation_history:
-                context_parts.append("Previous conversation:")
-                for msg in conversation_history[-3:]:  # Last 3 messages
-                    role = msg.get('role', 'unknown')
-                    content = msg.get('content', '')
-                    if content:
-                        context_parts.append(f"{role}: {content[:200]}...")
-            
-            context_str = "\n".join(context_parts) if context_parts else None
-            
-            # Create generator that wraps Gemini response
-            def gemini_gen():
-                try:
-                    # Use streaming handler
-                    for chunk in gemini_handler.handle_query_streaming(
-                        query=updated_question,
-                        query_type=query_type,
-                        context=context_str,
-                        tickers=detected_tickers,
-                        temperature=0.7,
-                        max_tokens=2048
-                    ):
-                        yield chunk
-                    
-                    logger.info(f"[{rid}] Gemini response generation complete")
-                    
-                except Exception as e:
-                    logger.error(f"[{rid}] Gemini processing error: {e}, falling back to default handler")
-                    # Fallback to default handler on error
-                    for chunk in handle_request(updated_question, user_system_all, overrides, debug=debug):
-                        yield chunk
-            
-            # Use Gemini generator
-            gen = gemini_gen()
-            logger.info(f"[{rid}] Using Gemini for query_type={query_type.value}")
-            
-        except Exception as e:
-            logger.error(f"[{rid}] Gemini handler initialization failed: {e}, falling back to default")
-            gen = handle_request(updated_question, user_system_all, overrides, debug=debug)
-    else:
-        # Use default routing for non-Gemini queries
-        logger.info(f"[{rid}] {routing_reason}")
-        gen = handle_request(updated_question, user_system_all, overrides, debug=debug)
+    # Routing was decided during pre-processing
+    gen = await _cached_answer(
+        lambda: _answer_stream(
+            rid, prep["model_type"], prep["routing_reason"], updated_question, user_system_all,
+            overrides, detected_tickers, conversation_history, debug
+        ),
+        question, updated_question, detected_tickers, meta,
+        prep["model_type"], user_system_all, overrides,
+        personalized=bool(conversation_history) or debug
+    )
     
     if stream:
-        async def stream_and_log():
-            collected_content = []
-            req_id = f"chatcmpl-{int(datetime.now().timestamp() * 1000)}"
-            done_chunk = None
-            try:
-                # FIRST: Send context-aware status message
-                status_msg = detect_status_message(question)
-                status_chunk = get_status_sse_chunk(status_msg, req_id)
-                yield status_chunk
-                logger.info(f"[{rid}] Sent status message: {status_msg}")
-                
-                for chunk in gen:
-                    # Ensure chunk is bytes
-                    chunk_bytes = chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
-                    chunk_str = chunk_bytes.decode('utf-8')
-                    
-                    # Hold back the [DONE] chunk to append videos before it
-                    if chunk_str == 'data: [DONE]\n\n':
-                        done_chunk = chunk_bytes
-                        continue
-                        
-                    yield chunk_bytes
-                    
-                    # Extract content from SSE chunk for conversation history
-                    if chunk_str.startswith('data: '):
-                        try:
-                            data = orjson.loads(chunk_str[6:].strip())
-                            content = data.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                            if content:
-                                collected_content.append(content)
-                        except:
-                            pass
-                
-                # After AI response, append relevant videos BEFORE [DONE]
-                if enable_videos:
-                    video_service = VideoAnswerService()
-                    response_text = "".join(collected_content)
-                    video_result = video_service.enhance_response_with_videos(question, response_text)
-                    video_suffix = video_result.get("video_suffix", "")  # Exact video section
-                    video_metadata = video_result.get("video_metadata", [])
-                    
-                    # Emit video markdown text if present
-                    if video_suffix:
-                        video_sse = f'data: {orjson.dumps({"id": req_id, "object": "chat.completion.chunk", "choices": [{"delta": {"content": video_suffix}}]}).decode()}\n\n'
-                        yield video_sse.encode('utf-8')
-                        collected_content.append(video_suffix)
-                    
-                    # ALWAYS emit video_metadata when available (regardless of markdown)
-                    if video_metadata:
-                        metadata_sse = f'data: {orjson.dumps({"id": req_id, "object": "chat.completion.chunk", "video_metadata": video_metadata}).decode()}\n\n'
-                        yield metadata_sse.encode('utf-8')
-                
-                # Now emit the [DONE] chunk
-                if done_chunk:
-                    yield done_chunk
-                    
-            finally:
-                response_text = "".join(collected_content)
-                
-                # Save assistant response to conversation
-                try:
-                    conversation_service.add_message(
-                        conversation_id=conversation_id,
-                        role="assistant",
-                        content=response_text,
-                        metadata={"rid": rid, "detected_tickers": detected_tickers}
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to save conversation message (non-critical): {e}")
-                
-                query_logger.log_full_conversation(
-                    rid=rid,
-                    query=question,
-                    response=response_text,
-                    metadata={
-                        "detected_tickers": detected_tickers,
-                        "original_query": question,
-                        "updated_query": updated_question,
-                        "stream": True,
-                        "use_web": overrides.get("use_web"),
-                        "session_id": session_id,
-                        "conversation_id": conversation_id
-                    }
-                )
-        
         logger.info(f"[{rid}] (JSON) streaming response → SSE")
-        return StreamingResponse(stream_and_log(), media_type="text/event-stream")
+        return _sse_response(rid, _stream_and_log(
+            rid, gen, question, updated_question, overrides, detected_tickers,
+            session_id, conversation_id, enable_videos
+        ))
 
     # Non-streaming
-    collected = []
-    for chunk in gen:
-        collected.append(chunk)
-    text = "".join(collected)
+    text = await collect_text(gen)
     
     # === SAVE ASSISTANT RESPONSE ===
     try:
@@ -931,7 +1022,8 @@ async def chat_completions(request: Request):
             conversation_id=conversation_id,
             role="assistant",
             content=text,
-            metadata={"rid": rid, "detected_tickers": detected_tickers}
+            metadata={"rid": rid, "detected_tickers": detected_tickers},
+            write_behind=True
         )
     except Exception as e:
         logger.warning(f"Failed to save conversation message (non-critical): {e}")
@@ -0,0 +1,509 @@
+"""
+LLM Admission Control
+Per-deployment concurrency caps, token-per-minute budgets and priority queues
+in front of the OpenAI/Azure and Gemini calls.
+
+Every call is admitted by the controller of its provider/deployment
+("azure:gpt-4o", "gemini:gemini-2.0-flash") before the request is sent:
+- At most `concurrency` calls in flight (the SDK's own retries run inside the slot,
+  so OAI_MAX_RETRIES no longer multiplies load during a 429 storm)
+- A token bucket refilled at `tpm` tokens/minute; each call reserves
+  prompt chars / 4 + max_tokens and is refunded once real usage is known
+- A 429 empties the bucket and pauses admissions for the Retry-After period
+
+Waiters queue by priority class, then arrival order:
+interactive chat > digest generation > training-data generation.
+The class comes from a context variable set with `llm_priority(...)`, so
+background jobs mark themselves once at their entry point.
+
+A call whose expected queue wait already exceeds its class deadline is
+rejected immediately with AdmissionRejected (a user-facing message); one that
+waits past the deadline is rejected then. A sync acquire() made on a thread
+running an event loop never waits: parking the loop would stop the async
+streams holding slots from finishing, so it is admitted only if a slot is free
+and rejected otherwise.
+
+Expected Results:
+- Bursts queue instead of tripping Azure 429s for everyone
+- Interactive chat keeps its latency while training/digest jobs back off
+"""
+
+import os
+import json
+import time
+import heapq
+import asyncio
+import logging
+import threading
+import contextvars
+import itertools
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from app.core.llm_hedging import LatencyHistogram
+
+logger = logging.getLogger("admission_control")
+
+LLM_ADMISSION_ENABLED = os.getenv("LLM_ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))  # 0: no token budget
+# Per-deployment overrides: {"azure:gpt-4o": {"concurrency": 20, "tpm": 150000}, ...}
+LLM_ADMISSION_LIMITS: Dict[str, Dict[str, int]] = json.loads(os.getenv("LLM_ADMISSION_LIMITS", "{}") or "{}")
+
+# Priority classes, highest first
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_DIGEST = "digest"
+PRIORITY_TRAINING = "training"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_DIGEST, PRIORITY_TRAINING)
+
+# Longest acceptable queue wait per class (seconds)
+ADMISSION_DEADLINES: Dict[str, float] = {
+    PRIORITY_INTERACTIVE: float(os.getenv("LLM_ADMISSION_DEADLINE_INTERACTIVE", "15")),
+    PRIORITY_DIGEST: float(os.getenv("LLM_ADMISSION_DEADLINE_DIGEST", "120")),
+    PRIORITY_TRAINING: float(os.getenv("LLM_ADMISSION_DEADLINE_TRAINING", "600")),
+}
+
+QUEUE_WAIT_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2000, 5000, 10000, 30000, 60000, 120000, 300000]
+
+# Longest sleep between re-checks while waiting on the token bucket or a 429 pause
+_POLL_SECONDS = 0.25
+
+_PRIORITY: contextvars.ContextVar[str] = contextvars.ContextVar("LLM_PRIORITY", default=PRIORITY_INTERACTIVE)
+
+
+def current_priority() -> str:
+    """Priority class of LLM calls made from the current context."""
+    return _PRIORITY.get()
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Run the enclosed LLM calls under a priority class."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority: {priority}. Valid: {list(PRIORITIES)}")
+    token = _PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def estimate_tokens(messages: Optional[List[Dict[str, Any]]] = None, prompt: str = "", max_tokens: int = 0) -> int:
+    """Tokens to reserve for a call: ~4 chars per prompt token plus the completion budget."""
+    chars = len(prompt) + sum(len(str(m.get("content") or "")) for m in messages or [])
+    return chars // 4 + max_tokens
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when an LLM call cannot be admitted within its deadline. The message is user-facing."""
+
+    def __init__(self, key: str, priority: str, wait_seconds: float):
+        self.key = key
+        self.priority = priority
+        self.wait_seconds = wait_seconds
+        super().__init__(
+            f"Harvey is handling an unusually high number of requests right now "
+            f"(estimated wait {wait_seconds:.0f}s for {key}). Please try again in a moment."
+        )
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _resolve(future: "asyncio.Future"):
+    if not future.done():
+        future.set_result(True)
+
+
+@dataclass
+class Ticket:
+    """One admitted call. Set `used_tokens` when the response reports usage."""
+    key: str
+    priority: str
+    tokens: int
+    queued_ms: float
+    admitted_at: float
+    used_tokens: Optional[int] = None
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    seq: int
+    priority: str = field(compare=False)
+    tokens: int = field(compare=False)
+    event: Optional[threading.Event] = field(default=None, compare=False)
+    loop: Optional[asyncio.AbstractEventLoop] = field(default=None, compare=False)
+    future: Optional["asyncio.Future"] = field(default=None, compare=False)
+    granted: bool = field(default=False, compare=False)
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+class AdmissionController:
+    """
+    Admission for one provider/deployment.
+
+    Features:
+    - Concurrency cap and token-per-minute bucket
+    - Priority queue shared by threads and coroutines (slots are handed to the
+      best waiter on release, so no thread is parked for async callers)
+    - Expected-wait fast-fail and per-class deadlines
+    - 429 pause with Retry-After
+    """
+
+    def __init__(
+        self,
+        key: str,
+        concurrency: int = LLM_MAX_CONCURRENCY,
+        tpm: int = LLM_TPM_LIMIT,
+        deadlines: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            key: Provider/deployment name ("azure:gpt-4o")
+            concurrency: Calls allowed in flight
+            tpm: Token budget per minute (0 disables the bucket)
+            deadlines: Max queue wait per priority class
+        """
+        self.key = key
+        self.concurrency = max(1, concurrency)
+        self.tpm = max(0, tpm)
+        self.deadlines = dict(ADMISSION_DEADLINES, **(deadlines or {}))
+
+        self.in_flight = 0
+        self.tokens = float(self.tpm)
+        self._refilled_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.avg_hold_seconds = 5.0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+        self.queue_wait_ms = {p: LatencyHistogram(QUEUE_WAIT_BUCKETS_MS) for p in PRIORITIES}
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_fast": 0,
+            "rejected_deadline": 0,
+            "rejected_on_loop": 0,
+            "cancelled": 0,
+            "rate_limited": 0,
+            "tokens_reserved": 0,
+            "tokens_used": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # State (callers hold self._lock)
+    # ------------------------------------------------------------------
+
+    def _refill(self, now: float):
+        if self.tpm:
+            self.tokens = min(float(self.tpm), self.tokens + (now - self._refilled_at) * self.tpm / 60.0)
+        self._refilled_at = now
+
+    def _cost(self, tokens: int) -> int:
+        # A call bigger than the whole budget would never fit; it waits for a full bucket instead
+        return min(tokens, self.tpm) if self.tpm else 0
+
+    def _fits(self, tokens: int, now: float) -> bool:
+        return (self.in_flight < self.concurrency and now >= self.blocked_until
+                and self.tokens >= self._cost(tokens))
+
+    def _take(self, tokens: int):
+        self.in_flight += 1
+        self.tokens -= self._cost(tokens)
+
+    def _dispatch(self, now: float) -> List[_Waiter]:
+        """Grant queued waiters in priority order while they fit. Returns those to wake."""
+        self._refill(now)
+        woken = []
+        while self._waiters and self._fits(self._waiters[0].tokens, now):
+            waiter = heapq.heappop(self._waiters)
+            self._take(waiter.tokens)
+            waiter.granted = True
+            woken.append(waiter)
+        return woken
+
+    def _expected_wait(self, rank: int, tokens: int, now: float) -> float:
+        """Rough queue wait for a new call: slots and tokens needed by everyone ahead of it."""
+        ahead = [w for w in self._waiters if w.rank <= rank]
+        wait = max(0.0, self.blocked_until - now)
+        busy = self.in_flight + len(ahead) - self.concurrency + 1
+        if busy > 0:
+            wait = max(wait, -(-busy // self.concurrency) * self.avg_hold_seconds)
+        if self.tpm:
+            deficit = sum(self._cost(w.tokens) for w in ahead) + self._cost(tokens) - self.tokens
+            if deficit > 0:
+                wait = max(wait, deficit * 60.0 / self.tpm)
+        return wait
+
+    def _poll_timeout(self, deadline_at: float, now: float) -> float:
+        # Releases wake waiters directly; refills and 429 pauses need a timed re-check
+        timeout = deadline_at - now
+        if self.tpm or self.blocked_until > now:
+            timeout = min(timeout, _POLL_SECONDS)
+        return max(0.0, timeout)
+
+    def _enqueue(self, priority: str, tokens: int, no_wait: bool = False, **wake) -> Any:
+        """Admit immediately (returns None) or queue a waiter. Fast-fails on hopeless waits."""
+        rank = PRIORITIES.index(priority)
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            if not self._waiters and self._fits(tokens, now):
+                self._take(tokens)
+                return None
+            expected = self._expected_wait(rank, tokens, now)
+            if no_wait:
+                self.stats["rejected_on_loop"] += 1
+                logger.warning(f"Rejected {priority} call to {self.key}: sync admission on the event loop "
+                               f"thread cannot wait ({self.in_flight} in flight, {len(self._waiters)} queued)")
+                raise AdmissionRejected(self.key, priority, expected)
+            if expected > self.deadlines[priority]:
+                self.stats["rejected_fast"] += 1
+                logger.warning(f"Rejected {priority} call to {self.key}: expected wait {expected:.1f}s "
+                               f"> {self.deadlines[priority]:.0f}s ({self.in_flight} in flight, "
+                               f"{len(self._waiters)} queued)")
+                raise AdmissionRejected(self.key, priority, expected)
+            waiter = _Waiter(rank, next(self._seq), priority, tokens, **wake)
+            heapq.heappush(self._waiters, waiter)
+            self.stats["queued"] += 1
+            woken = self._dispatch(now)
+        for w in woken:
+            w.wake()
+        return waiter
+
+    def _check_waiter(self, waiter: _Waiter, deadline_at: float) -> bool:
+        """After a wake-up or poll: True if granted. Re-dispatches; raises past the deadline."""
+        now = time.monotonic()
+        with self._lock:
+            if waiter.granted:
+                return True
+            woken = self._dispatch(now)
+            granted = waiter.granted
+            if not granted and now >= deadline_at:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self.stats["rejected_deadline"] += 1
+        for w in woken:
+            w.wake()
+        if not granted and now >= deadline_at:
+            raise AdmissionRejected(self.key, waiter.priority, self.deadlines[waiter.priority])
+        return granted
+
+    def _ticket(self, priority: str, tokens: int, started: float) -> Ticket:
+        now = time.monotonic()
+        queued_ms = (now - started) * 1000
+        with self._lock:
+            self.queue_wait_ms[priority].observe(queued_ms)
+            self.stats["admitted"] += 1
+            self.stats["tokens_reserved"] += tokens
+        return Ticket(self.key, priority, tokens, round(queued_ms, 1), now)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def acquire(self, priority: Optional[str] = None, tokens: int = 0) -> Ticket:
+        """Blocking admission for sync callers (non-waiting when called on an event loop thread)."""
+        priority = priority or current_priority()
+        started = time.monotonic()
+        waiter = self._enqueue(priority, tokens, no_wait=_on_event_loop(), event=threading.Event())
+        if waiter is not None:
+            deadline_at = started + self.deadlines[priority]
+            while True:
+                waiter.event.wait(self._poll_timeout(deadline_at, time.monotonic()))
+                if self._check_waiter(waiter, deadline_at):
+                    break
+        return self._ticket(priority, tokens, started)
+
+    async def acquire_async(self, priority: Optional[str] = None, tokens: int = 0) -> Ticket:
+        """Event-loop admission; waiting costs no thread."""
+        priority = priority or current_priority()
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        waiter = self._enqueue(priority, tokens, loop=loop, future=loop.create_future())
+        if waiter is not None:
+            deadline_at = started + self.deadlines[priority]
+            try:
+                while True:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(waiter.future),
+                                               self._poll_timeout(deadline_at, time.monotonic()))
+                    except asyncio.TimeoutError:
+                        pass
+                    if self._check_waiter(waiter, deadline_at):
+                        break
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.granted
+                    if not granted:
+                        self._waiters.remove(waiter)
+                        heapq.heapify(self._waiters)
+                    self.stats["cancelled"] += 1
+                if granted:
+                    self.release(Ticket(self.key, priority, tokens, 0.0, time.monotonic(), used_tokens=0))
+                raise
+        return self._ticket(priority, tokens, started)
+
+    def release(self, ticket: Ticket):
+        """Return the slot; reconcile the token reservation with real usage when known."""
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            self.avg_hold_seconds = 0.8 * self.avg_hold_seconds + 0.2 * (now - ticket.admitted_at)
+            if ticket.used_tokens is not None:
+                self.stats["tokens_used"] += ticket.used_tokens
+                if self.tpm:
+                    self._refill(now)
+                    self.tokens = min(float(self.tpm), self.tokens + self._cost(ticket.tokens) - ticket.used_tokens)
+            woken = self._dispatch(now)
+        for w in woken:
+            w.wake()
+
+    def penalize(self, retry_after: Optional[float] = None):
+        """The provider answered 429: drain the bucket and pause admissions."""
+        pause = retry_after if retry_after is not None else 1.0
+        with self._lock:
+            self.stats["rate_limited"] += 1
+            self.tokens = min(self.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+        logger.warning(f"{self.key} rate limited; pausing admissions for {pause:.1f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get controller statistics for monitoring."""
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            queued = {p: 0 for p in PRIORITIES}
+            for w in self._waiters:
+                queued[w.priority] += 1
+            return {
+                "concurrency": self.concurrency,
+                "tpm": self.tpm,
+                "in_flight": self.in_flight,
+                "queue_depth": queued,
+                "tokens_available": round(self.tokens) if self.tpm else None,
+                "paused_seconds": round(max(0.0, self.blocked_until - now), 2),
+                "avg_hold_seconds": round(self.avg_hold_seconds, 2),
+                **self.stats,
+                "queue_wait_ms": {p: h.snapshot() for p, h in self.queue_wait_ms.items() if h.count},
+            }
+
+
+def _rate_limit_retry_after(exc: BaseException) -> Optional[float]:
+    """Retry-After seconds when `exc` is a provider 429, -1.0 for a 429 without one, else None."""
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if status != 429 and type(exc).__name__ not in ("RateLimitError", "ResourceExhausted"):
+        return None
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return -1.0
+
+
+class LLMAdmission:
+    """
+    Registry of per-deployment admission controllers.
+
+    Features:
+    - Controllers created on first use with LLM_ADMISSION_LIMITS overrides
+    - `admit` / `admit_async` context managers used around provider calls
+    - Aggregated statistics for the admin endpoint
+    """
+
+    def __init__(self, enabled: bool = LLM_ADMISSION_ENABLED,
+                 limits: Optional[Dict[str, Dict[str, int]]] = None):
+        self.enabled = enabled
+        self.limits = limits if limits is not None else LLM_ADMISSION_LIMITS
+        self._controllers: Dict[str, AdmissionController] = {}
+        self._lock = threading.Lock()
+
+    def controller(self, key: str) -> AdmissionController:
+        with self._lock:
+            ctl = self._controllers.get(key)
+            if ctl is None:
+                limits = self.limits.get(key, {})
+                ctl = self._controllers[key] = AdmissionController(
+                    key,
+                    concurrency=int(limits.get("concurrency", LLM_MAX_CONCURRENCY)),
+                    tpm=int(limits.get("tpm", LLM_TPM_LIMIT)),
+                )
+            return ctl
+
+    def _on_error(self, ctl: AdmissionController, exc: BaseException):
+        retry_after = _rate_limit_retry_after(exc)
+        if retry_after is not None:
+            ctl.penalize(retry_after if retry_after >= 0 else None)
+
+    @contextmanager
+    def admit(self, key: str, tokens: int = 0) -> Iterator[Optional[Ticket]]:
+        """Hold an admission for the enclosed (sync) provider call."""
+        if not self.enabled:
+            yield None
+            return
+        ctl = self.controller(key)
+        ticket = ctl.acquire(tokens=tokens)
+        try:
+            yield ticket
+        except Exception as e:
+            self._on_error(ctl, e)
+            raise
+        finally:
+            ctl.release(ticket)
+
+    @asynccontextmanager
+    async def admit_async(self, key: str, tokens: int = 0) -> AsyncIterator[Optional[Ticket]]:
+        """Hold an admission for the enclosed (async) provider call."""
+        if not self.enabled:
+            yield None
+            return
+        ctl = self.controller(key)
+        ticket = await ctl.acquire_async(tokens=tokens)
+        try:
+            yield ticket
+        except Exception as e:
+            self._on_error(ctl, e)
+            raise
+        finally:
+            ctl.release(ticket)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get admission statistics for all deployments."""
+        with self._lock:
+            controllers = dict(self._controllers)
+        return {
+            "enabled": self.enabled,
+            "deadlines": ADMISSION_DEADLINES,
+            "deployments": {key: ctl.get_stats() for key, ctl in controllers.items()},
+        }
+
+
+# Global admission registry
+_llm_admission: Optional[LLMAdmission] = None
+_llm_admission_lock = threading.Lock()
+
+
+def get_llm_admission() -> LLMAdmission:
+    """Get or create global LLM admission registry."""
+    global _llm_admission
+    if _llm_admission is None:
+        with _llm_admission_lock:
+            if _llm_admission is None:
+                _llm_admission = LLMAdmission()
+    return _llm_admission
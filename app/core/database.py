@@ -3,12 +3,12 @@ from urllib.parse import quote_plus
 from sqlalchemy import create_engine
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 from typing import List, Iterable, Tuple, Any
+from app.core.db_async import install_loop_guard
+from app.core.db_telemetry import install_telemetry
 from app.config.settings import (
-    SQL_ONLY, DANGEROUS, SEMICOLON, ALLOWED_TB, CREATE_VIEWS_SQL, 
+    SQL_ONLY, DANGEROUS, SEMICOLON, ALLOWED_TB,
     CREATE_ENHANCED_VIEWS_SQL, CREATE_ENHANCED_VIEWS_FALLBACK_SQL
 )
-from app.config.portfolio_schema import CREATE_PORTFOLIO_TABLES_SQL
-from app.config.features_schema import CREATE_FEATURES_TABLES_SQL
 
 # Database Configuration
 HOST = os.getenv("SQLSERVER_HOST", "")
@@ -19,6 +19,8 @@ PWD  = os.getenv("SQLSERVER_PASSWORD", "")
 DRV  = os.getenv("ODBC_DRIVER", "FreeTDS")
 LOGIN_TIMEOUT = os.getenv("SQLSERVER_LOGIN_TIMEOUT", "10")
 CONN_TIMEOUT  = os.getenv("SQLSERVER_CONN_TIMEOUT", "20")
+POOL_SIZE     = int(os.getenv("SQLSERVER_POOL_SIZE", "20"))
+MAX_OVERFLOW  = int(os.getenv("SQLSERVER_MAX_OVERFLOW", "20"))
 
 params = {
     "driver": DRV,
@@ -38,20 +40,21 @@ def open_engine():
         isolation_level="AUTOCOMMIT",
         fast_executemany=True,
         pool_pre_ping=True,
-        pool_size=20,
-        max_overflow=20,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
         pool_recycle=3600,
         pool_timeout=30,
     )
 
-# Initialize engine and create views
+# Initialize engine. Views and tables are created by versioned migrations
+# (app/core/migrations.py) run once at startup, not on import.
 engine = open_engine()
-try:
-    with engine.begin() as conn:
-        for stmt in [s.strip() for s in CREATE_VIEWS_SQL.split(";") if s.strip()]:
-            conn.exec_driver_sql(stmt)
-except Exception as e:
-    print(f"[warn] ensure_views failed: {e}")
+
+# Flag connections opened on the event loop thread (async code should await app.core.db_async)
+install_loop_guard(engine)
+
+# Per-statement timing, pool checkout/pre-ping cost and the slow-query log (/admin/db/telemetry)
+install_telemetry(engine)
 
 def ensure_enhanced_views():
     """
@@ -124,41 +127,6 @@ def ensure_enhanced_views():
             print("[warn] AI queries may fail when referencing enhanced views")
             return False
 
-# Create enhanced views with graceful degradation
-ensure_enhanced_views()
-
-# Create portfolio tables
-try:
-    with engine.begin() as conn:
-        for stmt in [s.strip() for s in CREATE_PORTFOLIO_TABLES_SQL.split(";") if s.strip()]:
-            conn.exec_driver_sql(stmt)
-except Exception as e:
-    print(f"[warn] ensure_portfolio_tables failed: {e}")
-
-# Create feature tables (Conversational Memory, Alerts, Tax, Income Ladders, Insights)
-# Execute each statement individually to avoid transaction issues with DDL in SQL Server
-feature_tables_created = 0
-feature_tables_errors = 0
-for stmt in [s.strip() for s in CREATE_FEATURES_TABLES_SQL.split(";") if s.strip()]:
-    try:
-        with engine.connect() as conn:
-            conn.exec_driver_sql(stmt)
-            conn.commit()
-        feature_tables_created += 1
-    except Exception as e:
-        feature_tables_errors += 1
-        if "already exists" not in str(e) and "There is already an object" not in str(e):
-            print(f"[debug] Statement execution note: {str(e)[:100]}")
-
-if feature_tables_errors == 0 or feature_tables_created > 5:
-    print("[info] ✓ Feature tables created successfully")
-    print("[info]   Tables: user_sessions, conversations, conversation_messages, user_portfolios,")
-    print("[info]           alert_rules, alert_events, tax_scenarios, income_ladders, proactive_insights")
-elif feature_tables_created > 0:
-    print(f"[info] ✓ Feature tables partially created ({feature_tables_created} statements succeeded)")
-else:
-    print(f"[warn] Feature tables creation had issues ({feature_tables_errors} errors)")
-
 def normalize_sql_server(sql: str) -> str:
     s = sql
     s = re.sub(r"(?i)\b(current_date|now\(\))\b", "CAST(GETDATE() AS DATE)", s)
@@ -200,4 +168,33 @@ def exec_sql_stream(engine, sql: str, fetch_size: int = 10000):
                 yield tuple(row)
         finally:
             result.close(); conn.close()
-    return columns, row_iter()
\ No newline at end of file
+    return columns, row_iter()
+
+def exec_sql_stream_cached(engine, sql: str, fetch_size: int = 10000):
+    """
+    exec_sql_stream with a read-through result cache.
+    
+    Hits replay the cached rows; misses stream from the database as usual and
+    populate the cache only once the result set has been read to the end.
+    """
+    from app.services.query_cache import (
+        get_cached_sql_result, cache_sql_result, SQL_RESULT_CACHE_MAX_ROWS
+    )
+
+    cached = get_cached_sql_result(sql)
+    if cached is not None:
+        columns, rows = cached
+        return list(columns), iter(rows)
+
+    columns, rows_iter = exec_sql_stream(engine, sql, fetch_size=fetch_size)
+    def caching_iter():
+        buffered: List[tuple] | None = []
+        for row in rows_iter:
+            if buffered is not None:
+                buffered.append(row)
+                if len(buffered) > SQL_RESULT_CACHE_MAX_ROWS:
+                    buffered = None
+            yield row
+        if buffered is not None:
+            cache_sql_result(sql, columns, buffered)
+    return columns, caching_iter()
@@ -0,0 +1,258 @@
+"""
+Async Database Access
+Keeps blocking SQLAlchemy/pyodbc calls off the event loop thread.
+
+Async endpoints await these helpers instead of opening connections inline:
+- run_db(fn, *args) runs any sync database function (a FinancialDataExtractor
+  method, a service call) on a dedicated thread pool and awaits the result
+- fetch_all / fetch_one / fetch_scalar / execute cover single statements;
+  with_connection / with_transaction run a function that takes the connection
+  for multi-statement work
+- The pool has DB_EXECUTOR_WORKERS threads, by default pool_size +
+  max_overflow of the shared engine, so a worker never waits on a connection
+  another worker is not using and DB work cannot starve FastAPI's own
+  threadpool (file I/O, sync endpoints)
+- Context variables (request id, endpoint) follow the call into the worker
+
+pyodbc has no asyncio driver, so the thread pool is the async path here; the
+helpers keep the same signatures if an async driver is adopted later.
+
+A pool checkout listener (install_loop_guard) catches code that still opens a
+connection on the event loop thread: DB_LOOP_GUARD=warn logs and counts it,
+raise fails the call (used by tests), off disables the check.
+
+Expected Results:
+- One slow query no longer stalls every other request on the worker
+- Concurrent requests keep their throughput while a slow query is in flight
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import traceback
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.llm_hedging import LatencyHistogram
+
+logger = logging.getLogger("db_async")
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "0"))  # 0 = engine pool_size + max_overflow
+DB_LOOP_GUARD = os.getenv("DB_LOOP_GUARD", "warn").lower()  # off | warn | raise
+
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+RUN_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+class BlockingDatabaseCallError(RuntimeError):
+    """A database connection was checked out on the event loop thread."""
+
+
+class DatabaseExecutor:
+    """Bounded thread pool for blocking database calls made from async code."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.wait_ms = LatencyHistogram(WAIT_BUCKETS_MS)
+        self.run_ms = LatencyHistogram(RUN_BUCKETS_MS)
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "errors": 0,
+            "cancelled": 0,
+            "max_queued": 0,
+            "max_running": 0,
+        }
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on a database worker thread and await its result."""
+        ctx = contextvars.copy_context()
+        submitted = time.perf_counter()
+        with self._lock:
+            self.stats["submitted"] += 1
+            self._queued += 1
+            self.stats["max_queued"] = max(self.stats["max_queued"], self._queued)
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self.stats["max_running"] = max(self.stats["max_running"], self._running)
+                self.wait_ms.observe((started - submitted) * 1000)
+            try:
+                return ctx.run(fn, *args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.stats["errors"] += 1
+                raise
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    self._running -= 1
+                    self.stats["completed"] += 1
+                    self.run_ms.observe(elapsed)
+
+        future = self._executor.submit(call)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        # A future cancelled before a worker picked it up never ran call()
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+                self.stats["cancelled"] += 1
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting work; queued calls that have not started are cancelled."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker count, queue depth, in-flight calls and wait/run latency."""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                **self.stats,
+                "wait_ms": self.wait_ms.snapshot(),
+                "run_ms": self.run_ms.snapshot(),
+            }
+
+
+_executor: Optional[DatabaseExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _default_workers() -> int:
+    if DB_EXECUTOR_WORKERS > 0:
+        return DB_EXECUTOR_WORKERS
+    try:
+        from app.core.database import POOL_SIZE, MAX_OVERFLOW
+        return POOL_SIZE + MAX_OVERFLOW
+    except Exception:
+        return 40
+
+
+def get_db_executor() -> DatabaseExecutor:
+    """Get the process-wide database executor, sized to the shared engine's pool."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = DatabaseExecutor(_default_workers())
+    return _executor
+
+
+def _default_engine():
+    from app.core.database import engine
+    return engine
+
+
+def _statement(sql):
+    if isinstance(sql, str):
+        from sqlalchemy import text
+        return text(sql)
+    return sql
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Await a blocking database function without holding up the event loop."""
+    return await get_db_executor().run(fn, *args, **kwargs)
+
+
+async def with_connection(fn: Callable[..., Any], *args, engine=None) -> Any:
+    """Await fn(conn, *args) run inside engine.connect() on a database worker."""
+    def call():
+        with (engine or _default_engine()).connect() as conn:
+            return fn(conn, *args)
+    return await run_db(call)
+
+
+async def with_transaction(fn: Callable[..., Any], *args, engine=None) -> Any:
+    """Await fn(conn, *args) run inside engine.begin() (committed on success) on a database worker."""
+    def call():
+        with (engine or _default_engine()).begin() as conn:
+            return fn(conn, *args)
+    return await run_db(call)
+
+
+async def fetch_all(sql, params: Optional[Dict[str, Any]] = None, engine=None) -> List[Any]:
+    """Await all rows of a query (SQL string or text() clause with :named params)."""
+    return await with_connection(lambda conn: conn.execute(_statement(sql), params or {}).fetchall(), engine=engine)
+
+
+async def fetch_one(sql, params: Optional[Dict[str, Any]] = None, engine=None) -> Any:
+    """Await the first row of a query, or None."""
+    return await with_connection(lambda conn: conn.execute(_statement(sql), params or {}).fetchone(), engine=engine)
+
+
+async def fetch_scalar(sql, params: Optional[Dict[str, Any]] = None, engine=None) -> Any:
+    """Await the first column of the first row of a query, or None."""
+    return await with_connection(lambda conn: conn.execute(_statement(sql), params or {}).scalar(), engine=engine)
+
+
+async def execute(sql, params: Optional[Dict[str, Any]] = None, engine=None) -> int:
+    """Await a write statement in its own transaction; returns the affected row count."""
+    return await with_transaction(lambda conn: conn.execute(_statement(sql), params or {}).rowcount, engine=engine)
+
+
+# ----------------------------------------------------------------------------
+# Event loop guard
+# ----------------------------------------------------------------------------
+
+_guard_lock = threading.Lock()
+_guard_stats = {"mode": DB_LOOP_GUARD, "violations": 0, "last_violation": None}
+
+
+def check_not_on_event_loop(mode: Optional[str] = None):
+    """
+    Flag a blocking database call made on a thread that is running an event loop.
+
+    Raises BlockingDatabaseCallError in raise mode; logs (first and every 100th) in warn mode.
+    """
+    mode = mode or _guard_stats["mode"]
+    if mode == "off":
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    caller = "".join(traceback.format_stack(limit=12)[:-1])
+    with _guard_lock:
+        _guard_stats["violations"] += 1
+        _guard_stats["last_violation"] = caller.strip().splitlines()[-2:] if caller else None
+        violations = _guard_stats["violations"]
+    message = "Blocking database call on the event loop thread; await run_db()/fetch_all() instead"
+    if mode == "raise":
+        raise BlockingDatabaseCallError(message)
+    if violations % 100 == 1:
+        logger.warning(f"{message} ({violations} so far)\n{caller}")
+
+
+def install_loop_guard(engine, mode: Optional[str] = None):
+    """Check every pool checkout on engine with check_not_on_event_loop()."""
+    if mode:
+        _guard_stats["mode"] = mode
+    if _guard_stats["mode"] == "off":
+        return
+    from sqlalchemy import event
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        check_not_on_event_loop()
+
+    event.listen(engine, "checkout", on_checkout)
+
+
+def get_loop_guard_stats() -> Dict[str, Any]:
+    """Get the guard mode and how many event-loop checkouts it has seen."""
+    with _guard_lock:
+        return dict(_guard_stats)
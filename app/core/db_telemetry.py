@@ -0,0 +1,403 @@
+"""
+Database Telemetry
+Shows where database time goes: SQL execution, waiting for a pooled
+connection, opening new connections, or pool_pre_ping.
+
+Hooks installed on the shared engine (install_telemetry):
+- before/after_cursor_execute time every statement into a latency histogram
+  keyed by its fingerprint (SQL with literals, parameter lists and whitespace
+  normalized), with call, error and row counts and the endpoints issuing it.
+  Rows returned are counted as the result is fetched; rows affected come from
+  the cursor rowcount
+- The pool's connection getter is timed: checkout wait when a pooled
+  connection was handed out, connect time when a new one had to be opened,
+  overflow connections in use and timeouts
+- The dialect's ping is timed, so pool_pre_ping cost is visible on its own
+- Statements slower than DB_SLOW_QUERY_MS go to a bounded slow-query log with
+  the normalized SQL and the originating endpoint (set per request by the
+  timing middleware; background threads report their thread name)
+
+Each statement costs two listener calls, a dict lookup for its cached
+fingerprint and a histogram update; normalization only runs the first time a
+statement text is seen. scripts/benchmark_db_telemetry.py measures it.
+
+Expected Results:
+- Chat latency can be attributed to SQL, checkout wait or pre-ping
+- The slowest statements and the endpoints issuing them are one admin call away
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.llm_hedging import LatencyHistogram
+
+logger = logging.getLogger("db_telemetry")
+
+DB_TELEMETRY_ENABLED = os.getenv("DB_TELEMETRY_ENABLED", "true").lower() in ("1", "true", "yes")
+DB_TELEMETRY_COUNT_ROWS = os.getenv("DB_TELEMETRY_COUNT_ROWS", "true").lower() in ("1", "true", "yes")
+DB_TELEMETRY_MAX_FINGERPRINTS = int(os.getenv("DB_TELEMETRY_MAX_FINGERPRINTS", "500"))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", "200"))
+
+STATEMENT_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+POOL_BUCKETS_MS = [0.1, 0.5, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 30000]
+
+MAX_STATEMENT_TEXTS = 5000  # raw SQL -> fingerprint cache entries before it is cleared
+MAX_ENDPOINTS_PER_STATEMENT = 20
+MAX_SQL_CHARS = 1000
+OTHER = "other"
+
+# "METHOD /path" of the request being served; copied into db executor threads
+DB_ENDPOINT: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("DB_ENDPOINT", default=None)
+
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.@#$])[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Strip comments and literals so statements differing only in values share a fingerprint."""
+    sql = _COMMENT.sub(" ", sql)
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _VALUE_LIST.sub("(?)", sql)
+    return _WHITESPACE.sub(" ", sql).strip().rstrip(";").strip()[:MAX_SQL_CHARS]
+
+
+class StatementStats:
+    """Counters for one statement fingerprint."""
+
+    __slots__ = ("fingerprint", "sql", "count", "errors", "total_ms", "rows", "rows_affected",
+                 "latency", "endpoints")
+
+    def __init__(self, fingerprint: str, sql: str):
+        self.fingerprint = fingerprint
+        self.sql = sql
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.rows = 0
+        self.rows_affected = 0
+        self.latency = LatencyHistogram(STATEMENT_BUCKETS_MS)
+        self.endpoints: Dict[str, int] = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "sql": self.sql,
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 1),
+            "rows": self.rows,
+            "rows_per_call": round(self.rows / self.count, 1) if self.count else None,
+            "rows_affected": self.rows_affected,
+            "latency_ms": self.latency.snapshot(),
+            "endpoints": dict(sorted(self.endpoints.items(), key=lambda kv: -kv[1])),
+        }
+
+
+class DatabaseTelemetry:
+    """Statement, pool and pre-ping metrics fed by SQLAlchemy engine hooks."""
+
+    def __init__(self, slow_query_ms: float = DB_SLOW_QUERY_MS, slow_log_size: int = DB_SLOW_QUERY_LOG_SIZE,
+                 max_fingerprints: int = DB_TELEMETRY_MAX_FINGERPRINTS, count_rows: bool = DB_TELEMETRY_COUNT_ROWS):
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self.count_rows = count_rows
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._by_text: Dict[str, StatementStats] = {}
+        self._by_fingerprint: Dict[str, StatementStats] = {}
+        self._slow: Deque[Dict[str, Any]] = deque(maxlen=slow_log_size)
+        self._pool = None
+        self._counting_fetch = None
+        self._default_fetch = None
+        self.checkout_wait_ms = LatencyHistogram(POOL_BUCKETS_MS)
+        self.connect_ms = LatencyHistogram(POOL_BUCKETS_MS)
+        self.pre_ping_ms = LatencyHistogram(POOL_BUCKETS_MS)
+        self.pool_stats = {
+            "checkouts": 0,
+            "connects": 0,
+            "overflow_checkouts": 0,
+            "peak_overflow": 0,
+            "peak_checked_out": 0,
+            "checkout_errors": 0,
+            "timeouts": 0,
+            "pre_pings": 0,
+            "pre_ping_failures": 0,
+        }
+        self.stats = {"executed": 0, "errors": 0, "slow": 0}
+
+    # ------------------------------------------------------------------
+    # Statements
+    # ------------------------------------------------------------------
+
+    def _record_for(self, statement: str) -> StatementStats:
+        record = self._by_text.get(statement)
+        if record is not None:
+            return record
+        sql = normalize_sql(statement)
+        fingerprint = hashlib.sha1(sql.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            record = self._by_fingerprint.get(fingerprint)
+            if record is None:
+                if len(self._by_fingerprint) >= self.max_fingerprints:
+                    record = self._by_fingerprint.get(OTHER)
+                    if record is None:
+                        record = self._by_fingerprint[OTHER] = StatementStats(OTHER, "(fingerprint limit reached)")
+                else:
+                    record = self._by_fingerprint[fingerprint] = StatementStats(fingerprint, sql)
+            if len(self._by_text) >= MAX_STATEMENT_TEXTS:
+                self._by_text.clear()
+            self._by_text[statement] = record
+        return record
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._telemetry_start = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_telemetry_start", None)
+        if start is None:
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        record = self._record_for(statement)
+        endpoint = DB_ENDPOINT.get() or threading.current_thread().name
+        returns_rows = cursor.description is not None
+        with self._lock:
+            self.stats["executed"] += 1
+            record.count += 1
+            record.total_ms += elapsed
+            record.latency.observe(elapsed)
+            endpoints = record.endpoints
+            if endpoint not in endpoints and len(endpoints) >= MAX_ENDPOINTS_PER_STATEMENT:
+                endpoint = OTHER
+            endpoints[endpoint] = endpoints.get(endpoint, 0) + 1
+            if not returns_rows and cursor.rowcount > 0:
+                record.rows_affected += cursor.rowcount
+        if elapsed >= self.slow_query_ms:
+            self._log_slow(record, elapsed, endpoint, executemany)
+        if returns_rows and self._counting_fetch is not None \
+                and context.cursor_fetch_strategy is self._default_fetch:
+            context.cursor_fetch_strategy = self._counting_fetch(record)
+
+    def handle_error(self, exception_context):
+        statement = exception_context.statement
+        with self._lock:
+            self.stats["errors"] += 1
+        if statement:
+            record = self._record_for(statement)
+            with self._lock:
+                record.errors += 1
+
+    def add_rows(self, record: StatementStats, rows: int):
+        with self._lock:
+            record.rows += rows
+
+    def _log_slow(self, record: StatementStats, elapsed: float, endpoint: str, executemany: bool):
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(elapsed, 1),
+            "fingerprint": record.fingerprint,
+            "sql": record.sql,
+            "endpoint": endpoint,
+            "executemany": bool(executemany),
+        }
+        with self._lock:
+            self.stats["slow"] += 1
+            self._slow.append(entry)
+        logger.warning(f"Slow query {elapsed:.0f} ms [{endpoint}] {record.fingerprint}: {record.sql[:300]}")
+
+    # ------------------------------------------------------------------
+    # Pool
+    # ------------------------------------------------------------------
+
+    def on_connect(self, dbapi_connection=None, connection_record=None):
+        self._local.connected = True
+
+    def instrument_pool(self, pool):
+        """Time the pool's connection getter: queue wait vs. opening a new connection."""
+        do_get = pool._do_get
+        overflow_of = getattr(pool, "overflow", lambda: 0)
+        checked_out_of = getattr(pool, "checkedout", lambda: 0)
+
+        def timed_do_get():
+            self._local.connected = False
+            start = time.perf_counter()
+            try:
+                record = do_get()
+            except Exception as e:
+                with self._lock:
+                    self.pool_stats["checkout_errors"] += 1
+                    if type(e).__name__ == "TimeoutError":
+                        self.pool_stats["timeouts"] += 1
+                raise
+            elapsed = (time.perf_counter() - start) * 1000
+            overflow = overflow_of()
+            checked_out = checked_out_of()
+            with self._lock:
+                stats = self.pool_stats
+                stats["checkouts"] += 1
+                if self._local.connected:
+                    stats["connects"] += 1
+                    self.connect_ms.observe(elapsed)
+                else:
+                    self.checkout_wait_ms.observe(elapsed)
+                if overflow > 0:
+                    stats["overflow_checkouts"] += 1
+                    stats["peak_overflow"] = max(stats["peak_overflow"], overflow)
+                stats["peak_checked_out"] = max(stats["peak_checked_out"], checked_out)
+            return record
+
+        pool._do_get = timed_do_get
+        self._pool = pool
+
+    def instrument_dialect(self, dialect):
+        """Time pool_pre_ping round trips."""
+        do_ping = dialect.do_ping
+
+        def timed_ping(dbapi_connection):
+            start = time.perf_counter()
+            alive = None
+            try:
+                alive = do_ping(dbapi_connection)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                with self._lock:
+                    self.pool_stats["pre_pings"] += 1
+                    self.pre_ping_ms.observe(elapsed)
+                    if not alive:
+                        self.pool_stats["pre_ping_failures"] += 1
+            return alive
+
+        dialect.do_ping = timed_ping
+
+    def enable_row_counting(self, default_fetch, counting_fetch):
+        """Swap the default cursor fetch strategy for one that counts rows into the statement's record."""
+        self._default_fetch = default_fetch
+        self._counting_fetch = counting_fetch
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._by_text.clear()
+            self._by_fingerprint.clear()
+            self._slow.clear()
+            self.checkout_wait_ms = LatencyHistogram(POOL_BUCKETS_MS)
+            self.connect_ms = LatencyHistogram(POOL_BUCKETS_MS)
+            self.pre_ping_ms = LatencyHistogram(POOL_BUCKETS_MS)
+            for counters in (self.pool_stats, self.stats):
+                for key in counters:
+                    counters[key] = 0
+
+    def get_stats(self, top: int = 20) -> Dict[str, Any]:
+        """Get the top statements by total time, pool checkout/pre-ping metrics and the slow-query log."""
+        with self._lock:
+            records = sorted(self._by_fingerprint.values(), key=lambda r: r.total_ms, reverse=True)[:top]
+            statements = [r.snapshot() for r in records]
+            pool = {
+                **self.pool_stats,
+                "checkout_wait_ms": self.checkout_wait_ms.snapshot(),
+                "connect_ms": self.connect_ms.snapshot(),
+                "pre_ping_ms": self.pre_ping_ms.snapshot(),
+            }
+            summary = {**self.stats, "fingerprints": len(self._by_fingerprint)}
+            slow = list(reversed(self._slow))
+        if self._pool is not None and hasattr(self._pool, "overflow"):
+            pool.update({
+                "size": self._pool.size(),
+                "checked_out": self._pool.checkedout(),
+                "overflow": max(self._pool.overflow(), 0),
+                "max_overflow": getattr(self._pool, "_max_overflow", None),
+            })
+        return {
+            **summary,
+            "slow_query_ms": self.slow_query_ms,
+            "pool": pool,
+            "statements": statements,
+            "slow_queries": slow,
+        }
+
+
+def _counting_fetch_class(telemetry: DatabaseTelemetry):
+    from sqlalchemy.engine.cursor import CursorFetchStrategy
+
+    class CountingFetchStrategy(CursorFetchStrategy):
+        __slots__ = ("record",)
+
+        def __init__(self, record):
+            self.record = record
+
+        def fetchone(self, result, dbapi_cursor, hard_close=False):
+            row = super().fetchone(result, dbapi_cursor, hard_close)
+            if row is not None:
+                telemetry.add_rows(self.record, 1)
+            return row
+
+        def fetchmany(self, result, dbapi_cursor, size=None):
+            rows = super().fetchmany(result, dbapi_cursor, size)
+            if rows:
+                telemetry.add_rows(self.record, len(rows))
+            return rows
+
+        def fetchall(self, result, dbapi_cursor):
+            rows = super().fetchall(result, dbapi_cursor)
+            if rows:
+                telemetry.add_rows(self.record, len(rows))
+            return rows
+
+    return CountingFetchStrategy
+
+
+def install_telemetry(engine, telemetry: Optional[DatabaseTelemetry] = None) -> Optional[DatabaseTelemetry]:
+    """Attach statement, pool and pre-ping hooks to engine (no-op when DB_TELEMETRY_ENABLED=false)."""
+    if telemetry is None:
+        if not DB_TELEMETRY_ENABLED:
+            return None
+        telemetry = get_db_telemetry()
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", telemetry.before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", telemetry.after_cursor_execute)
+    event.listen(engine, "handle_error", telemetry.handle_error)
+    event.listen(engine, "connect", telemetry.on_connect)
+    telemetry.instrument_pool(engine.pool)
+    telemetry.instrument_dialect(engine.dialect)
+    if telemetry.count_rows:
+        try:
+            from sqlalchemy.engine.cursor import _DEFAULT_FETCH
+            telemetry.enable_row_counting(_DEFAULT_FETCH, _counting_fetch_class(telemetry))
+        except ImportError as e:
+            logger.warning(f"Row counting unavailable with this SQLAlchemy version: {e}")
+    return telemetry
+
+
+_telemetry: Optional[DatabaseTelemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_db_telemetry() -> DatabaseTelemetry:
+    """Get the process-wide database telemetry (fed by the shared engine's hooks)."""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = DatabaseTelemetry()
+    return _telemetry
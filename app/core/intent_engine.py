@@ -0,0 +1,172 @@
+"""
+Intent Engine
+Single-pass classification of a chat turn against every intent keyword and
+pattern set in the request path.
+
+Modules register their sets once at import:
+- Keyword groups (substring semantics, like `kw in text.lower()`) are compiled
+  together into one trie-shaped regex. One scan of the lowercased query finds
+  the longest keyword starting at each position; every keyword that is a
+  prefix of it matched there too, so all overlapping hits are recovered.
+- Pattern groups (regex lists) are compiled into one alternation per group and
+  evaluated lazily, at most once per query.
+
+Scans are memoized per query text, so the router, the request handler, the
+status detector and the audit/ETF checks of one turn share one scan.
+
+Expected Results:
+- One lowercase + one C-level scan per turn instead of dozens of re.search /
+  `in` loops
+- Identical classifications to the per-function checks it replaces
+"""
+
+import os
+import re
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Pattern
+
+logger = logging.getLogger("intent_engine")
+
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "2048"))
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Regex matching the longest of `words` at the current position."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # Word may end here; greedy `?` still prefers the longer word
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class IntentSignals:
+    """Result of scanning one query."""
+
+    __slots__ = ("text", "lower", "keywords", "_engine", "_patterns")
+
+    def __init__(self, engine: "IntentEngine", text: str, lower: str, keywords: FrozenSet[str]):
+        self._engine = engine
+        self.text = text
+        self.lower = lower
+        self.keywords = keywords
+        self._patterns: Dict[str, bool] = {}
+
+    def has(self, group: str) -> bool:
+        """Any keyword of `group` occurs in the query."""
+        return not self._engine.keyword_groups[group].isdisjoint(self.keywords)
+
+    def hits(self, group: str) -> FrozenSet[str]:
+        """Keywords of `group` that occur in the query."""
+        return self._engine.keyword_groups[group] & self.keywords
+
+    def matches(self, group: str) -> bool:
+        """Any regex of pattern `group` matches the lowercased query."""
+        hit = self._patterns.get(group)
+        if hit is None:
+            hit = self._patterns[group] = self._engine.pattern_groups[group].search(self.lower) is not None
+        return hit
+
+
+class IntentEngine:
+    """
+    Registry and scanner for intent keyword and pattern groups.
+
+    Features:
+    - Combined keyword automaton across all registered groups
+    - One compiled alternation per pattern group
+    - Memoized scans, invalidated when a group is (re)registered
+    """
+
+    def __init__(self, cache_size: int = INTENT_CACHE_SIZE):
+        """
+        Initialize intent engine.
+
+        Args:
+            cache_size: Number of distinct query texts whose scans are memoized
+        """
+        self.keyword_groups: Dict[str, FrozenSet[str]] = {}
+        self.pattern_groups: Dict[str, Pattern] = {}
+        self._lock = threading.Lock()
+        self._scanner: Optional[Pattern] = None
+        self._prefixes: Dict[str, FrozenSet[str]] = {}
+        self.scan = lru_cache(maxsize=cache_size)(self._scan)
+
+    def register_keywords(self, group: str, keywords: Iterable[str]):
+        """Register (or replace) a keyword group with `kw in text.lower()` semantics."""
+        with self._lock:
+            self.keyword_groups[group] = frozenset(k for k in keywords if k)
+            self._scanner = None
+            self.scan.cache_clear()
+
+    def register_patterns(self, group: str, patterns: Iterable[str], flags: int = re.IGNORECASE):
+        """Register (or replace) a regex group; it matches if any pattern is found."""
+        combined = "|".join(f"(?:{p})" for p in patterns)
+        with self._lock:
+            self.pattern_groups[group] = re.compile(combined or r"(?!)", flags)
+            self.scan.cache_clear()
+
+    def _compile(self) -> Pattern:
+        with self._lock:
+            if self._scanner is None:
+                words = set().union(*self.keyword_groups.values()) if self.keyword_groups else set()
+                self._prefixes = {w: frozenset(p for p in words if w.startswith(p)) for w in words}
+                self._scanner = re.compile("(?=(" + (_trie_regex(words) or r"(?!)") + "))", re.DOTALL)
+                logger.info(f"Intent automaton compiled: {len(words)} keywords, {len(self.keyword_groups)} groups")
+            return self._scanner
+
+    def _scan(self, text: str) -> IntentSignals:
+        scanner = self._scanner or self._compile()
+        lower = text.lower()
+        prefixes = self._prefixes
+        found = set()
+        for m in scanner.finditer(lower):
+            longest = m.group(1)
+            if longest and longest not in found:
+                found |= prefixes[longest]
+        return IntentSignals(self, text, lower, frozenset(found))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get engine statistics for monitoring."""
+        info = self.scan.cache_info()
+        total = info.hits + info.misses
+        return {
+            "keyword_groups": len(self.keyword_groups),
+            "keywords": len(self._prefixes),
+            "pattern_groups": len(self.pattern_groups),
+            "scans": info.misses,
+            "memo_hits": info.hits,
+            "memo_hit_rate": info.hits / total if total > 0 else 0.0,
+            "memo_size": info.currsize,
+        }
+
+
+# Global intent engine instance
+_intent_engine: Optional[IntentEngine] = None
+
+
+def get_intent_engine() -> IntentEngine:
+    """Get or create global intent engine instance."""
+    global _intent_engine
+    if _intent_engine is None:
+        _intent_engine = IntentEngine()
+    return _intent_engine
+
+
+def scan(text: str) -> IntentSignals:
+    """Scan `text` with the global engine (memoized)."""
+    return get_intent_engine().scan(text or "")
@@ -0,0 +1,430 @@
+"""
+LLM Request Hedging
+Tail-latency protection for streamed completions across the model fleet.
+
+Every streamed completion is timed per model (deployment name):
+- Time to first token (TTFT) and tokens/sec histograms
+- Error counts and requests in flight
+
+With LLM_HEDGING_ENABLED, a stream whose first token has not arrived within
+the routed model's adaptive threshold (tracked p95 TTFT, clamped to
+[LLM_HEDGE_MIN_MS, LLM_HEDGE_MAX_MS]) fires the same prompt at the fallback
+model. Whichever model produces a token first is streamed to the client and
+the other request is cancelled, closing its HTTP stream.
+
+A primary that fails before its first token hands over to the fallback
+immediately. Nothing is hedged once the first token has been sent.
+
+Sync streams (threadpool callers such as oai_stream_with_model) are timed
+through timed(), which reports the same events but never hedges.
+
+Expected Results:
+- p99 time-to-first-token bounded by roughly p95 + fallback TTFT
+- Extra spend limited to the ~5% slowest starts
+"""
+
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger("llm_hedging")
+
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_FALLBACK_DEPLOYMENT = os.getenv("LLM_HEDGE_FALLBACK_DEPLOYMENT", "")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_DEFAULT_MS = int(os.getenv("LLM_HEDGE_DEFAULT_MS", "2500"))
+LLM_HEDGE_MIN_MS = int(os.getenv("LLM_HEDGE_MIN_MS", "500"))
+LLM_HEDGE_MAX_MS = int(os.getenv("LLM_HEDGE_MAX_MS", "8000"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Histogram bucket upper bounds
+TTFT_BUCKETS_MS = [50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 20000, 30000]
+THROUGHPUT_BUCKETS_TPS = [1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500]
+
+
+class LatencyHistogram:
+    """Cumulative fixed-bucket histogram with percentile estimates."""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket = overflow
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile (None if empty)."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+        return self.bounds[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 1) if self.count else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": {
+                (f"le_{b}" if i < len(self.bounds) else "inf"): n
+                for i, (b, n) in enumerate(zip(self.bounds + [None], self.counts))
+            },
+        }
+
+
+class ModelLatencyStats:
+    """Streaming latency record for one model."""
+
+    def __init__(self):
+        self.ttft_ms = LatencyHistogram(TTFT_BUCKETS_MS)
+        self.tokens_per_sec = LatencyHistogram(THROUGHPUT_BUCKETS_TPS)
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.in_flight = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight,
+            "ttft_ms": self.ttft_ms.snapshot(),
+            "tokens_per_sec": self.tokens_per_sec.snapshot(),
+        }
+
+
+class _Attempt:
+    """One model's stream, advanced by a task until its first token."""
+
+    def __init__(self, hedger: "LLMHedger", model: str, factory: Callable[[], AsyncIterator[str]]):
+        self.hedger = hedger
+        self.model = model
+        self.stats = hedger.stats_for(model)
+        self.stream = factory()
+        self.started = time.perf_counter()
+        self.first_at: Optional[float] = None
+        self.chunks = 0
+        self.finished = False
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        hedger.notify(model, "start")
+        self.first = asyncio.ensure_future(self._first_token())
+
+    async def _first_token(self) -> Optional[str]:
+        async for piece in self.stream:
+            if piece:
+                self.first_at = time.perf_counter()
+                self.chunks = 1
+                ttft_ms = (self.first_at - self.started) * 1000
+                self.stats.ttft_ms.observe(ttft_ms)
+                self.hedger.notify(self.model, "ttft", ttft_ms)
+                return piece
+        return None
+
+    async def rest(self) -> AsyncIterator[str]:
+        """Remaining chunks after the first token."""
+        try:
+            async for piece in self.stream:
+                if piece:
+                    self.chunks += 1
+                    yield piece
+        except Exception:
+            self.close(error=True)
+            raise
+        self.close()
+
+    def close(self, error: bool = False, cancelled: bool = False):
+        if self.finished:
+            return
+        self.finished = True
+        self.stats.in_flight -= 1
+        if error:
+            self.stats.errors += 1
+            self.hedger.notify(self.model, "error")
+        if cancelled:
+            self.stats.cancelled += 1
+        if not error and not cancelled and self.first_at is not None and self.chunks > 1:
+            elapsed = time.perf_counter() - self.first_at
+            if elapsed > 0:
+                tps = (self.chunks - 1) / elapsed
+                self.stats.tokens_per_sec.observe(tps)
+                self.hedger.notify(self.model, "tps", tps)
+        self.hedger.notify(self.model, "end")
+
+    async def cancel(self):
+        """Stop this request and close its upstream stream."""
+        self.first.cancel()
+        try:
+            await self.first
+        except BaseException:
+            pass
+        try:
+            await self.stream.aclose()  # type: ignore[attr-defined]
+        except Exception:
+            pass
+        self.close(cancelled=True)
+
+
+class LLMHedger:
+    """
+    Per-model latency tracker and hedged stream runner.
+
+    Features:
+    - TTFT / tokens-per-sec histograms per model
+    - Adaptive hedge threshold from tracked TTFT percentile
+    - First-token race between routed and fallback model, loser cancelled
+    - Hedge/win statistics
+    """
+
+    def __init__(
+        self,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        default_ms: int = LLM_HEDGE_DEFAULT_MS,
+        min_ms: int = LLM_HEDGE_MIN_MS,
+        max_ms: int = LLM_HEDGE_MAX_MS,
+        min_samples: int = LLM_HEDGE_MIN_SAMPLES
+    ):
+        """
+        Initialize hedger.
+
+        Args:
+            percentile: TTFT quantile used as the hedge threshold
+            default_ms: Threshold while a model has fewer than min_samples
+            min_ms: Lower clamp for the threshold
+            max_ms: Upper clamp for the threshold
+            min_samples: TTFT samples needed before the percentile is trusted
+        """
+        self.percentile = percentile
+        self.default_ms = default_ms
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.min_samples = min_samples
+        self._models: Dict[str, ModelLatencyStats] = {}
+        self._listeners: List[Callable[[str, str, Optional[float]], None]] = []
+        self.hedged = 0
+        self.fallback_wins = 0
+        self.primary_wins = 0
+        self.failovers = 0
+
+        logger.info(
+            f"LLM hedger initialized (enabled={LLM_HEDGING_ENABLED}, "
+            f"fallback={LLM_HEDGE_FALLBACK_DEPLOYMENT or 'none'}, p{int(percentile * 100)})"
+        )
+
+    def stats_for(self, model: str) -> ModelLatencyStats:
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = ModelLatencyStats()
+        return stats
+
+    def record(self, model: str, ttft_ms: Optional[float], chunks: int = 0, stream_seconds: float = 0.0, error: bool = False):
+        """Record a stream that was timed outside stream() (e.g. the Gemini SDK path)."""
+        stats = self.stats_for(model)
+        stats.requests += 1
+        if error:
+            stats.errors += 1
+            self.notify(model, "error")
+        if ttft_ms is not None:
+            stats.ttft_ms.observe(ttft_ms)
+            self.notify(model, "ttft", ttft_ms)
+        if not error and chunks > 1 and stream_seconds > 0:
+            tps = (chunks - 1) / stream_seconds
+            stats.tokens_per_sec.observe(tps)
+            self.notify(model, "tps", tps)
+
+    def timed(self, model: str, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Time a synchronous stream the way stream() times an async one.
+
+        Emits start / ttft / tps / error / end to the listeners. No hedging:
+        the caller is a worker thread that cannot race two requests.
+        """
+        stats = self.stats_for(model)
+        stats.requests += 1
+        stats.in_flight += 1
+        self.notify(model, "start")
+        started = time.perf_counter()
+        first_at: Optional[float] = None
+        count = 0
+        finished = False
+        try:
+            for piece in chunks:
+                if not piece:
+                    continue
+                count += 1
+                if first_at is None:
+                    first_at = time.perf_counter()
+                    ttft_ms = (first_at - started) * 1000
+                    stats.ttft_ms.observe(ttft_ms)
+                    self.notify(model, "ttft", ttft_ms)
+                yield piece
+            finished = True
+        except GeneratorExit:
+            stats.cancelled += 1
+            raise
+        except Exception:
+            stats.errors += 1
+            self.notify(model, "error")
+            raise
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()  # releases the upstream stream and its admission slot
+            stats.in_flight -= 1
+            if finished and first_at is not None and count > 1:
+                elapsed = time.perf_counter() - first_at
+                if elapsed > 0:
+                    tps = (count - 1) / elapsed
+                    stats.tokens_per_sec.observe(tps)
+                    self.notify(model, "tps", tps)
+            self.notify(model, "end")
+
+    def add_listener(self, callback: Callable[[str, str, Optional[float]], None]):
+        """
+        Subscribe to stream timing events.
+
+        callback(model, event, value) is called with event "start" / "end"
+        (request entered / left flight), "ttft" (ms), "tps" (tokens/sec) or "error".
+        """
+        self._listeners.append(callback)
+
+    def notify(self, model: str, event: str, value: Optional[float] = None):
+        for callback in self._listeners:
+            try:
+                callback(model, event, value)
+            except Exception as e:
+                logger.warning(f"Latency listener failed: {e}")
+
+    def threshold_ms(self, model: str) -> float:
+        """Hedge delay for `model`: its TTFT percentile, clamped."""
+        hist = self.stats_for(model).ttft_ms
+        if hist.count < self.min_samples:
+            return self.default_ms
+        return min(self.max_ms, max(self.min_ms, hist.percentile(self.percentile) or self.default_ms))
+
+    async def stream(
+        self,
+        model: str,
+        factory: Callable[[], AsyncIterator[str]],
+        fallback_model: Optional[str] = None,
+        fallback_factory: Optional[Callable[[], AsyncIterator[str]]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream text chunks from `model`, hedging against the fallback if given.
+
+        Without a fallback the stream is only timed.
+
+        Args:
+            model: Routed model / deployment name
+            factory: Starts the routed model's stream
+            fallback_model: Model to hedge with
+            fallback_factory: Starts the fallback model's stream
+        """
+        hedge = fallback_factory is not None and fallback_model not in (None, model)
+        primary = _Attempt(self, model, factory)
+        attempts = [primary]
+        winner: Optional[_Attempt] = None
+        first: Optional[str] = None
+        error: Optional[BaseException] = None
+
+        try:
+            deadline = self.threshold_ms(model) / 1000 if hedge else None
+            while winner is None:
+                pending = [a.first for a in attempts if not a.first.done()]
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+                deadline = None
+
+                if not done:
+                    # Routed model is late: fire the fallback
+                    self.hedged += 1
+                    logger.info(f"Hedging {model} → {fallback_model} after {self.threshold_ms(model):.0f}ms without a token")
+                    attempts.append(_Attempt(self, fallback_model, fallback_factory))  # type: ignore[arg-type]
+                    continue
+
+                for attempt in attempts:
+                    if attempt.first not in done:
+                        continue
+                    exc = attempt.first.exception()
+                    if exc is not None:
+                        attempt.close(error=True)
+                        error = error or exc
+                        if hedge and attempt is primary and len(attempts) == 1:
+                            # Failed before its first token: hand over now
+                            self.failovers += 1
+                            logger.warning(f"{model} failed before first token ({exc}), failing over to {fallback_model}")
+                            attempts.append(_Attempt(self, fallback_model, fallback_factory))  # type: ignore[arg-type]
+                        continue
+                    if winner is None:
+                        winner, first = attempt, attempt.first.result()
+                        if winner.first_at is None:
+                            winner.close()  # empty completion
+
+            if winner is None:
+                if error is not None:
+                    raise error
+                return
+
+            if len(attempts) > 1:
+                if winner is primary:
+                    self.primary_wins += 1
+                else:
+                    self.fallback_wins += 1
+                    logger.info(f"Hedge won by {winner.model}")
+        finally:
+            for attempt in attempts:
+                if attempt is not winner and not attempt.finished:
+                    await attempt.cancel()
+
+        if first is None:
+            return
+        yield first
+        try:
+            async for piece in winner.rest():
+                yield piece
+        finally:
+            if not winner.finished:
+                await winner.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hedging and per-model latency statistics for monitoring."""
+        return {
+            "enabled": LLM_HEDGING_ENABLED,
+            "fallback_deployment": LLM_HEDGE_FALLBACK_DEPLOYMENT or None,
+            "percentile": self.percentile,
+            "hedged": self.hedged,
+            "primary_wins": self.primary_wins,
+            "fallback_wins": self.fallback_wins,
+            "failovers": self.failovers,
+            "models": {
+                model: {**stats.snapshot(), "hedge_threshold_ms": self.threshold_ms(model)}
+                for model, stats in self._models.items()
+            },
+        }
+
+
+# Global hedger instance
+_llm_hedger: Optional[LLMHedger] = None
+
+
+def get_llm_hedger() -> LLMHedger:
+    """Get or create global LLM hedger instance."""
+    global _llm_hedger
+    if _llm_hedger is None:
+        _llm_hedger = LLMHedger()
+    return _llm_hedger
@@ -1,9 +1,12 @@
 import os, json, time
 import contextvars
-import requests as _req
 import httpx
-from typing import Dict, List, Iterable, Optional
-from openai import OpenAI, AzureOpenAI
+from typing import Dict, List, Iterable, AsyncIterator, Optional
+from openai import OpenAI, AzureOpenAI, AsyncOpenAI, AsyncAzureOpenAI
+
+from app.core.llm_hedging import get_llm_hedger, LLM_HEDGING_ENABLED, LLM_HEDGE_FALLBACK_DEPLOYMENT
+from app.core.admission_control import get_llm_admission, estimate_tokens
+from app.core.ollama_client import get_ollama_client, OLLAMA_MODEL
 
 # Gemini import (optional, for Azure VM deployment)
 try:
@@ -15,13 +18,7 @@ except ImportError:
 
 # LLM Context Management
 ACTIVE_LLM = contextvars.ContextVar("ACTIVE_LLM", default="chatgpt")
-LLAMA_MODEL = contextvars.ContextVar("LLAMA_MODEL", default=os.getenv("OLLAMA_MODEL", "llama3.1:8b"))
-
-# Ollama Configuration
-OLLAMA_BASE = (os.getenv("OLLAMA_BASE") or "http://localhost:11434").rstrip("/")
-OLLAMA_CHAT = f"{OLLAMA_BASE}/api/chat"
-OLLAMA_TAGS = f"{OLLAMA_BASE}/api/tags"
-OLLAMA_VERSION = f"{OLLAMA_BASE}/api/version"
+LLAMA_MODEL = contextvars.ContextVar("LLAMA_MODEL", default=OLLAMA_MODEL)
 
 # OpenAI/Azure Clients with timeout and retry configuration
 OAI_TIMEOUT = int(os.getenv("OPENAI_TIMEOUT", "60"))
@@ -32,6 +29,13 @@ http_client = httpx.Client(
     limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
 )
 
+# Shared async transport for the event-loop native streaming path. One pool per
+# worker: streams are multiplexed on the loop instead of pinning a thread each.
+async_http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(OAI_TIMEOUT, connect=10.0),
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+)
+
 USE_AZURE = os.getenv("AZURE_OPENAI", "false").lower() in ("1","true","yes")
 if USE_AZURE:
     OAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME") or os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
@@ -49,6 +53,13 @@ if USE_AZURE:
         http_client=http_client,
         max_retries=OAI_MAX_RETRIES
     )
+    oai_async_client = AsyncAzureOpenAI(
+        api_key=OAI_API_KEY,
+        azure_endpoint=OAI_ENDPOINT,
+        api_version=OAI_API_VER,
+        http_client=async_http_client,
+        max_retries=OAI_MAX_RETRIES
+    )
     CHAT_MODEL = OAI_DEPLOYMENT
     print(f"[INFO] 🔵 Azure OpenAI initialized: endpoint={OAI_ENDPOINT}, deployment={OAI_DEPLOYMENT}, api_version={OAI_API_VER}")
 else:
@@ -58,15 +69,21 @@ else:
         http_client=http_client,
         max_retries=OAI_MAX_RETRIES
     )
+    oai_async_client = AsyncOpenAI(
+        api_key=OAI_API_KEY,
+        http_client=async_http_client,
+        max_retries=OAI_MAX_RETRIES
+    )
     CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o")
 
 # Gemini Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = "gemini-2.5-pro"
 gemini_client = None
 if GEMINI_AVAILABLE and GEMINI_API_KEY:
     try:
         genai.configure(api_key=GEMINI_API_KEY)  # type: ignore[attr-defined]
-        gemini_client = genai.GenerativeModel('gemini-2.5-pro')  # type: ignore[attr-defined]
+        gemini_client = genai.GenerativeModel(GEMINI_MODEL)  # type: ignore[attr-defined]
         print(f"[INFO] 🟢 Gemini 2.5 Pro initialized for chart/FX analysis")
     except Exception as e:
         print(f"[WARN] ⚠️  Gemini initialization failed: {e}")
@@ -75,6 +92,17 @@ elif not GEMINI_AVAILABLE:
 else:
     print("[WARN] ⚠️  GEMINI_API_KEY not set - Gemini features disabled")
 
+
+def _oai_key(model: str) -> str:
+    """Admission-control key of an OpenAI/Azure deployment."""
+    return f"{'azure' if USE_AZURE else 'openai'}:{model}"
+
+
+def _usage_tokens(resp) -> Optional[int]:
+    usage = getattr(resp, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
 def set_active_llm(provider: str, model: str | None = None):
     prov = (provider or "").strip().lower()
     if prov == "llama":
@@ -99,17 +127,11 @@ def _ollama_messages_from_openai(messages: list[dict]) -> list[dict]:
     return out
 
 def _ollama_list_tags() -> list[str]:
-    try:
-        r = _req.get(OLLAMA_TAGS, timeout=10)
-        r.raise_for_status()
-        data = r.json() or {}
-        models = data.get("models") or []
-        return [m.get("name") for m in models if isinstance(m, dict) and m.get("name")]  # type: ignore[misc]
-    except Exception:
-        return []
+    return get_ollama_client().list_tags()
 
-def _explain_ollama_404(model: str) -> str:
-    tags = _ollama_list_tags()
+def _explain_ollama_404(model: str, tags: list[str] | None = None) -> str:
+    if tags is None:
+        tags = _ollama_list_tags()
     if tags:
         return (f"Ollama returned 404 for model '{model}'. Installed models are:\n"
                 + "\n".join([f" - {t}" for t in tags])
@@ -121,12 +143,11 @@ def _explain_ollama_404(model: str) -> str:
 
 def _ollama_chat_stream_sync(messages: list[dict], model: str) -> Iterable[str]:
     """Streaming chat with Ollama (/api/chat). Synchronous."""
-    payload = {
-        "model": model,
-        "messages": _ollama_messages_from_openai(messages),
-        "stream": True,
-    }
-    with _req.post(OLLAMA_CHAT, json=payload, stream=True, timeout=300) as r:
+    client = get_ollama_client()
+    payload = client.chat_payload(model, _ollama_messages_from_openai(messages), stream=True)
+    with client.slot(model), client.session.post(
+        client.url("/api/chat"), json=payload, stream=True, timeout=client.sync_timeout
+    ) as r:
         if r.status_code == 404:
             try:
                 body = r.json()
@@ -149,21 +170,19 @@ def _ollama_chat_stream_sync(messages: list[dict], model: str) -> Iterable[str]:
 
 def _ollama_chat_once_sync(messages: list[dict], model: str) -> str:
     """Single chat response with Ollama (/api/chat, stream=False)."""
-    payload = {
-        "model": model,
-        "messages": _ollama_messages_from_openai(messages),
-        "stream": False,
-    }
-    r = _req.post(OLLAMA_CHAT, json=payload, timeout=300)
-    if r.status_code == 404:
-        try:
-            body = r.json()
-            detail = body.get("error") or body
-        except Exception:
-            detail = r.text
-        raise RuntimeError(_explain_ollama_404(model) + f"\nDetails: {detail}")
-    r.raise_for_status()
-    data = r.json() or {}
+    client = get_ollama_client()
+    payload = client.chat_payload(model, _ollama_messages_from_openai(messages), stream=False)
+    with client.slot(model):
+        r = client.session.post(client.url("/api/chat"), json=payload, timeout=client.sync_timeout)
+        if r.status_code == 404:
+            try:
+                body = r.json()
+                detail = body.get("error") or body
+            except Exception:
+                detail = r.text
+            raise RuntimeError(_explain_ollama_404(model) + f"\nDetails: {detail}")
+        r.raise_for_status()
+        data = r.json() or {}
     msg = (data or {}).get("message") or {}
     return msg.get("content") or ""
 
@@ -176,17 +195,33 @@ def oai_stream(messages: list[dict], temperature=0.2, max_tokens=2000) -> Iterab
         return
 
     # OpenAI/Azure path
-    stream = oai_client.chat.completions.create(  # type: ignore[arg-type]
-        model=CHAT_MODEL,
-        messages=messages,  # type: ignore[arg-type]
-        temperature=temperature,
-        stream=True,
-        max_tokens=max_tokens
-    )
-    for chunk in stream:
-        delta = chunk.choices[0].delta
-        if delta and delta.content is not None:
-            yield delta.content
+    yield from _oai_chat_stream_sync(messages, CHAT_MODEL, temperature, max_tokens)
+
+
+def _oai_chat_stream_sync(messages: list[dict], model: str, temperature=0.2, max_tokens=2000) -> Iterable[str]:
+    """Stream one OpenAI/Azure completion inside an admission slot, timed per deployment."""
+    return get_llm_hedger().timed(model, _oai_admitted_stream_sync(messages, model, temperature, max_tokens))
+
+
+def _oai_admitted_stream_sync(messages: list[dict], model: str, temperature=0.2, max_tokens=2000) -> Iterable[str]:
+    """Stream one OpenAI/Azure completion inside an admission slot for the deployment."""
+    prompt_tokens = estimate_tokens(messages)
+    with get_llm_admission().admit(_oai_key(model), prompt_tokens + max_tokens) as ticket:
+        stream = oai_client.chat.completions.create(  # type: ignore[arg-type]
+            model=model,
+            messages=messages,  # type: ignore[arg-type]
+            temperature=temperature,
+            stream=True,
+            max_tokens=max_tokens
+        )
+        chunks = 0
+        for chunk in stream:
+            delta = chunk.choices[0].delta
+            if delta and delta.content is not None:
+                chunks += 1
+                yield delta.content
+        if ticket:
+            ticket.used_tokens = prompt_tokens + chunks
 
 def oai_plan(question: str, planner_system: str) -> Dict:
     """Planner step that returns JSON. Uses active provider."""
@@ -208,14 +243,32 @@ def oai_plan(question: str, planner_system: str) -> Dict:
             return {"action": "chat", "final_answer": result_text}
 
     # OpenAI/Azure path
-    resp = oai_client.chat.completions.create(
-        model=CHAT_MODEL,
+    resp = oai_chat_completion(
         messages=[{"role":"system","content": planner_system},
                   {"role":"user","content": question}],
         temperature=0.1,
         max_tokens=2000,
     )
     txt = (resp.choices[0].message.content or "").strip()
+    return _parse_plan_text(txt, question)
+
+
+def oai_chat_completion(messages: list[dict], model: str | None = None, **kwargs):
+    """
+    Non-streaming chat completion on the shared sync client.
+    Admitted per deployment and priority class (see app.core.admission_control).
+    """
+    model = model or CHAT_MODEL
+    tokens = estimate_tokens(messages, max_tokens=kwargs.get("max_tokens") or 1000)
+    with get_llm_admission().admit(_oai_key(model), tokens) as ticket:
+        resp = oai_client.chat.completions.create(model=model, messages=messages, **kwargs)  # type: ignore[arg-type]
+        if ticket:
+            ticket.used_tokens = _usage_tokens(resp)
+    return resp
+
+
+def _parse_plan_text(txt: str, question: str) -> Dict:
+    """Decode the planner's JSON reply, falling back to a canned chat action."""
     try:
         return json.loads(txt)
     except Exception:
@@ -237,64 +290,254 @@ def oai_stream_with_model(
     if not USE_AZURE:
         raise ValueError("oai_stream_with_model requires Azure OpenAI to be enabled")
     
-    stream = oai_client.chat.completions.create(  # type: ignore[arg-type]
-        model=model_deployment,
-        messages=messages,  # type: ignore[arg-type]
-        temperature=temperature,
-        stream=True,
-        max_tokens=max_tokens
-    )
-    for chunk in stream:
-        delta = chunk.choices[0].delta
-        if delta and delta.content is not None:
-            yield delta.content
+    yield from _oai_chat_stream_sync(messages, model_deployment, temperature, max_tokens)
 
 
-def gemini_stream(messages: list[dict], temperature=0.2, max_tokens=2000) -> Iterable[str]:
-    """
-    Streams from Gemini 2.5 Pro.
-    Used for chart analysis, FX trading, and multimodal queries.
-    """
-    if not gemini_client:
-        raise ValueError("Gemini client not initialized - check GEMINI_API_KEY")
-    
-    # Convert OpenAI-style messages to Gemini format
+def _gemini_chat_from_openai(messages: list[dict]):
+    """Convert OpenAI-style messages to a Gemini chat session and its pending user turn."""
     gemini_history = []
-    system_instruction = None
     
     for msg in messages:
         role = msg.get("role", "")
         content = msg.get("content", "")
         
-        if role == "system":
-            system_instruction = content
-        elif role == "user":
+        if role == "user":
             gemini_history.append({"role": "user", "parts": [content]})
         elif role == "assistant":
             gemini_history.append({"role": "model", "parts": [content]})
     
     # Create chat session
-    chat = gemini_client.start_chat(history=gemini_history[:-1] if len(gemini_history) > 1 else [])
+    chat = gemini_client.start_chat(history=gemini_history[:-1] if len(gemini_history) > 1 else [])  # type: ignore[union-attr]
     
     # Get last user message
     last_message = gemini_history[-1]["parts"][0] if gemini_history else ""
+    return chat, last_message
+
+
+def gemini_stream(messages: list[dict], temperature=0.2, max_tokens=2000) -> Iterable[str]:
+    """
+    Streams from Gemini 2.5 Pro.
+    Used for chart analysis, FX trading, and multimodal queries.
+    """
+    if not gemini_client:
+        raise ValueError("Gemini client not initialized - check GEMINI_API_KEY")
     
-    # Stream response
-    response = chat.send_message(
-        last_message,
-        generation_config=genai.types.GenerationConfig(  # type: ignore[attr-defined]
-            temperature=temperature,
-            max_output_tokens=max_tokens,
-        ),
-        stream=True
-    )
+    chat, last_message = _gemini_chat_from_openai(messages)
     
-    for chunk in response:
-        if chunk.text:
-            yield chunk.text
+    prompt_tokens = estimate_tokens(messages)
+    with get_llm_admission().admit(f"gemini:{GEMINI_MODEL}", prompt_tokens + max_tokens) as ticket:
+        # Stream response
+        response = chat.send_message(
+            last_message,
+            generation_config=genai.types.GenerationConfig(  # type: ignore[attr-defined]
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+            ),
+            stream=True
+        )
+        
+        chunks = 0
+        for chunk in response:
+            if chunk.text:
+                chunks += 1
+                yield chunk.text
+        if ticket:
+            ticket.used_tokens = prompt_tokens + chunks
 
 
 def gemini_chat_once(messages: list[dict], temperature=0.2, max_tokens=2000) -> str:
     """Non-streaming Gemini response"""
     chunks = list(gemini_stream(messages, temperature, max_tokens))
-    return "".join(chunks)
\ No newline at end of file
+    return "".join(chunks)
+
+
+# ---------------------------------------------------------------------------
+# Async-native providers
+#
+# Mirrors of the sync helpers above for the SSE path. Tokens are pulled with
+# `async for` on the shared AsyncClient so a single worker can multiplex many
+# concurrent streams without parking a threadpool thread per request.
+# ---------------------------------------------------------------------------
+
+async def _ollama_raise_for_404(r: httpx.Response, model: str) -> None:
+    if r.status_code != 404:
+        return
+    raw = await r.aread()
+    try:
+        body = json.loads(raw)
+        detail = body.get("error") or body
+    except Exception:
+        detail = raw.decode("utf-8", "replace")
+    tags = await get_ollama_client().list_tags_async()
+    explanation = _explain_ollama_404(model, tags)
+    raise RuntimeError(explanation + f"\nDetails: {detail}")
+
+
+async def _ollama_chat_stream_async(messages: list[dict], model: str) -> AsyncIterator[str]:
+    """Streaming chat with Ollama (/api/chat) over the pooled Ollama client."""
+    client = get_ollama_client()
+    payload = client.chat_payload(model, _ollama_messages_from_openai(messages), stream=True)
+    async with client.slot_async(model), \
+            client.async_client.stream("POST", "/api/chat", json=payload) as r:
+        await _ollama_raise_for_404(r, model)
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except Exception:
+                continue
+            msg = (obj or {}).get("message") or {}
+            chunk = msg.get("content") or ""
+            if chunk:
+                yield chunk
+
+
+async def _ollama_chat_once_async(messages: list[dict], model: str) -> str:
+    """Single chat response with Ollama (/api/chat, stream=False)."""
+    client = get_ollama_client()
+    payload = client.chat_payload(model, _ollama_messages_from_openai(messages), stream=False)
+    async with client.slot_async(model):
+        r = await client.async_client.post("/api/chat", json=payload)
+        await _ollama_raise_for_404(r, model)
+        r.raise_for_status()
+    data = r.json() or {}
+    msg = (data or {}).get("message") or {}
+    return msg.get("content") or ""
+
+
+async def oai_stream_async(messages: list[dict], temperature=0.2, max_tokens=2000) -> AsyncIterator[str]:
+    """Async counterpart of oai_stream: streams from the active provider."""
+    provider, llama_model = get_active_llm()
+    if provider == "llama":
+        async for chunk in _ollama_chat_stream_async(messages, llama_model):
+            yield chunk
+        return
+
+    # OpenAI/Azure path
+    async for chunk in _oai_hedged_stream_async(messages, CHAT_MODEL, temperature, max_tokens):
+        yield chunk
+
+
+async def _oai_chat_stream_async(
+    messages: list[dict],
+    model: str,
+    temperature=0.2,
+    max_tokens=2000
+) -> AsyncIterator[str]:
+    """Stream one OpenAI/Azure completion; the HTTP stream is closed if we stop early."""
+    prompt_tokens = estimate_tokens(messages)
+    async with get_llm_admission().admit_async(_oai_key(model), prompt_tokens + max_tokens) as ticket:
+        stream = await oai_async_client.chat.completions.create(  # type: ignore[arg-type]
+            model=model,
+            messages=messages,  # type: ignore[arg-type]
+            temperature=temperature,
+            stream=True,
+            max_tokens=max_tokens
+        )
+        chunks = 0
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta and delta.content is not None:
+                    chunks += 1
+                    yield delta.content
+        finally:
+            await stream.close()
+            if ticket:
+                ticket.used_tokens = prompt_tokens + chunks
+
+
+def _oai_hedged_stream_async(
+    messages: list[dict],
+    model: str,
+    temperature=0.2,
+    max_tokens=2000
+) -> AsyncIterator[str]:
+    """Time the stream per model and, when hedging is enabled, race a late start against the fallback deployment."""
+    fallback = LLM_HEDGE_FALLBACK_DEPLOYMENT if LLM_HEDGING_ENABLED else None
+    return get_llm_hedger().stream(
+        model,
+        lambda: _oai_chat_stream_async(messages, model, temperature, max_tokens),
+        fallback,
+        (lambda: _oai_chat_stream_async(messages, fallback, temperature, max_tokens)) if fallback else None,
+    )
+
+
+async def oai_plan_async(question: str, planner_system: str) -> Dict:
+    """Async counterpart of oai_plan."""
+    provider, llama_model = get_active_llm()
+    if provider == "llama":
+        msgs = [
+            {"role": "system", "content": planner_system},
+            {"role": "user",   "content": question},
+        ]
+        try:
+            result_text = await _ollama_chat_once_async(msgs, llama_model)
+        except Exception as e:
+            from app.utils.helpers import logger
+            logger.error(f"[planner] Llama failed: {e}")
+            return {"action": "chat", "final_answer": f"I couldn't plan with llama ({e})."}
+        try:
+            return json.loads(result_text)
+        except Exception:
+            return {"action": "chat", "final_answer": result_text}
+
+    # OpenAI/Azure path
+    msgs = [{"role":"system","content": planner_system},
+            {"role":"user","content": question}]
+    async with get_llm_admission().admit_async(_oai_key(CHAT_MODEL), estimate_tokens(msgs, max_tokens=2000)) as ticket:
+        resp = await oai_async_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=msgs,  # type: ignore[arg-type]
+            temperature=0.1,
+            max_tokens=2000,
+        )
+        if ticket:
+            ticket.used_tokens = _usage_tokens(resp)
+    txt = (resp.choices[0].message.content or "").strip()
+    return _parse_plan_text(txt, question)
+
+
+async def oai_stream_with_model_async(
+    messages: list[dict],
+    model_deployment: str,
+    temperature=0.2,
+    max_tokens=2000
+) -> AsyncIterator[str]:
+    """Async counterpart of oai_stream_with_model (Azure deployments only)."""
+    if not USE_AZURE:
+        raise ValueError("oai_stream_with_model_async requires Azure OpenAI to be enabled")
+    
+    async for chunk in _oai_hedged_stream_async(messages, model_deployment, temperature, max_tokens):
+        yield chunk
+
+
+async def gemini_stream_async(messages: list[dict], temperature=0.2, max_tokens=2000) -> AsyncIterator[str]:
+    """Async counterpart of gemini_stream using the SDK's native async streaming."""
+    if not gemini_client:
+        raise ValueError("Gemini client not initialized - check GEMINI_API_KEY")
+    
+    chat, last_message = _gemini_chat_from_openai(messages)
+    
+    prompt_tokens = estimate_tokens(messages)
+    async with get_llm_admission().admit_async(f"gemini:{GEMINI_MODEL}", prompt_tokens + max_tokens) as ticket:
+        response = await chat.send_message_async(
+            last_message,
+            generation_config=genai.types.GenerationConfig(  # type: ignore[attr-defined]
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+            ),
+            stream=True
+        )
+        
+        chunks = 0
+        async for chunk in response:
+            if chunk.text:
+                chunks += 1
+                yield chunk.text
+        if ticket:
+            ticket.used_tokens = prompt_tokens + chunks
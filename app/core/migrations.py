@@ -0,0 +1,353 @@
+"""
+Schema Migrations
+Versioned, run-once schema setup instead of DDL on every import.
+
+Importing app.core.database used to create views and tables in every worker,
+taking schema locks on the shared SQL Server and racing the other workers.
+Schema changes are now numbered migrations:
+- dbo.schema_migrations records each applied version with the SHA-256 of its
+  SQL; the schema hash over all (version, checksum) pairs identifies the
+  schema the code expects
+- Startup runs one SELECT against that table. When the stored hash matches,
+  no DDL is executed at all
+- Pending migrations (never applied, or whose SQL changed since) are applied
+  in version order by a single process holding a SQL Server application lock
+  (sp_getapplock); other workers wait for it, re-check and skip. Every
+  migration is idempotent (CREATE OR ALTER / IF NOT EXISTS), so re-applying
+  an edited one is safe
+- A failed migration is not recorded and stops the run; it is retried on
+  the next start, and the app keeps serving as it did when import-time DDL
+  failed
+
+Startup logs the check time and, when migrations ran, the time spent applying
+them; the same numbers are on /admin/db/migrations.
+
+Usage:
+    python -m app.core.migrations            # status
+    python -m app.core.migrations apply      # apply pending migrations
+
+Expected Results:
+- Worker cold start no longer executes DDL when the schema is current
+- Only one process applies a schema change
+"""
+
+import os
+import sys
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("migrations")
+
+MIGRATIONS_ENABLED = os.getenv("MIGRATIONS_ENABLED", "true").lower() in ("1", "true", "yes")
+MIGRATIONS_LOCK_TIMEOUT = float(os.getenv("MIGRATIONS_LOCK_TIMEOUT", "120"))
+
+MIGRATIONS_LOCK_RESOURCE = "harvey_schema_migrations"
+
+CREATE_MIGRATIONS_TABLE_SQL = """
+IF OBJECT_ID('dbo.schema_migrations', 'U') IS NULL
+    CREATE TABLE dbo.schema_migrations (
+        version INT NOT NULL PRIMARY KEY,
+        name NVARCHAR(200) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        duration_ms INT NOT NULL
+    )
+"""
+SELECT_APPLIED_SQL = "SELECT version, checksum FROM dbo.schema_migrations"
+RECORD_MIGRATION_SQL = """
+MERGE dbo.schema_migrations AS target
+USING (SELECT ? AS version) AS source ON target.version = source.version
+WHEN MATCHED THEN
+    UPDATE SET name = ?, checksum = ?, applied_at = SYSUTCDATETIME(), duration_ms = ?
+WHEN NOT MATCHED THEN
+    INSERT (version, name, checksum, duration_ms) VALUES (?, ?, ?, ?);
+"""
+ACQUIRE_LOCK_SQL = (
+    "SET NOCOUNT ON; DECLARE @result INT; "
+    "EXEC @result = sp_getapplock @Resource = '{resource}', @LockMode = 'Exclusive', "
+    "@LockOwner = 'Session', @LockTimeout = {timeout_ms}; SELECT @result"
+)
+RELEASE_LOCK_SQL = "EXEC sp_releaseapplock @Resource = '{resource}', @LockOwner = 'Session'"
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a script on semicolons into non-empty statements."""
+    return [s.strip() for s in sql.split(";") if s.strip()]
+
+
+def is_already_exists(error: BaseException) -> bool:
+    """True for the SQL Server errors of DDL whose object is already in place."""
+    message = str(error)
+    return "already exists" in message or "There is already an object" in message
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    One schema change. `sql` is the script text the checksum is taken from;
+    `apply` runs it against the engine and must be idempotent.
+    """
+    version: int
+    name: str
+    sql: str
+    apply: Callable[[Any], None]
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+
+def schema_hash(checksums: Dict[int, str]) -> str:
+    """Hash over (version, checksum) pairs in version order."""
+    digest = hashlib.sha256()
+    for version in sorted(checksums):
+        digest.update(f"{version}:{checksums[version]};".encode("ascii"))
+    return digest.hexdigest()
+
+
+class MigrationRunner:
+    """Applies pending migrations once per schema change, across all processes."""
+
+    def __init__(self, engine, migrations: List[Migration],
+                 lock_timeout: float = MIGRATIONS_LOCK_TIMEOUT):
+        versions = [m.version for m in migrations]
+        if len(set(versions)) != len(versions):
+            raise ValueError("Duplicate migration versions")
+        self.engine = engine
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        self.lock_timeout = lock_timeout
+        self.expected_hash = schema_hash({m.version: m.checksum for m in self.migrations})
+        self._lock = threading.Lock()
+        self._current = False
+        self.stats: Dict[str, Any] = {
+            "runs": 0,
+            "check_ms": None,
+            "lock_wait_ms": None,
+            "apply_ms": None,
+            "applied": [],
+            "failed": None,
+            "last_error": None,
+        }
+
+    def _applied(self, conn) -> Dict[int, str]:
+        try:
+            rows = conn.exec_driver_sql(SELECT_APPLIED_SQL).fetchall()
+        except Exception:
+            # No migrations table yet: nothing applied
+            return {}
+        return {int(version): (checksum or "").strip() for version, checksum in rows}
+
+    def pending(self, applied: Dict[int, str]) -> List[Migration]:
+        """Migrations never applied, or applied with different SQL."""
+        return [m for m in self.migrations if applied.get(m.version) != m.checksum]
+
+    def is_current(self, applied: Dict[int, str]) -> bool:
+        return schema_hash({m.version: applied.get(m.version, "") for m in self.migrations}) == self.expected_hash
+
+    def run(self) -> bool:
+        """Bring the schema up to date. Returns True when it is current afterwards."""
+        with self._lock:
+            if self._current:
+                return True
+            self.stats["runs"] += 1
+            start = time.perf_counter()
+            with self.engine.connect() as conn:
+                applied = self._applied(conn)
+                self.stats["check_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                if self.is_current(applied):
+                    self._current = True
+                    logger.info(f"Schema current ({self.expected_hash[:12]}), "
+                                f"check took {self.stats['check_ms']} ms")
+                    return True
+
+                wait_start = time.perf_counter()
+                if not self._acquire(conn):
+                    logger.warning(f"Schema migration lock not acquired within {self.lock_timeout}s; "
+                                   "continuing without applying migrations")
+                    return False
+                try:
+                    self.stats["lock_wait_ms"] = round((time.perf_counter() - wait_start) * 1000, 1)
+                    # Another process may have applied them while this one waited
+                    applied = self._applied(conn)
+                    self._current = self._apply(conn, self.pending(applied))
+                finally:
+                    self._release(conn)
+            return self._current
+
+    def _apply(self, conn, pending: List[Migration]) -> bool:
+        if not pending:
+            logger.info("Schema migrations were applied by another process")
+            return True
+        conn.exec_driver_sql(CREATE_MIGRATIONS_TABLE_SQL)
+        apply_start = time.perf_counter()
+        for migration in pending:
+            start = time.perf_counter()
+            try:
+                migration.apply(self.engine)
+            except Exception as e:
+                self.stats["failed"] = f"{migration.version:04d}_{migration.name}"
+                self.stats["last_error"] = str(e)
+                logger.error(f"Migration {migration.version:04d}_{migration.name} failed: {e}")
+                return False
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            conn.exec_driver_sql(RECORD_MIGRATION_SQL, (
+                migration.version, migration.name, migration.checksum, duration_ms,
+                migration.version, migration.name, migration.checksum, duration_ms,
+            ))
+            self.stats["applied"].append(f"{migration.version:04d}_{migration.name}")
+            logger.info(f"Applied migration {migration.version:04d}_{migration.name} in {duration_ms} ms")
+        self.stats["apply_ms"] = round((time.perf_counter() - apply_start) * 1000, 1)
+        logger.info(f"Applied {len(pending)} schema migration(s) in {self.stats['apply_ms']} ms")
+        return True
+
+    def _acquire(self, conn) -> bool:
+        sql = ACQUIRE_LOCK_SQL.format(resource=MIGRATIONS_LOCK_RESOURCE,
+                                      timeout_ms=int(self.lock_timeout * 1000))
+        return (conn.exec_driver_sql(sql).scalar() or 0) >= 0
+
+    def _release(self, conn):
+        try:
+            conn.exec_driver_sql(RELEASE_LOCK_SQL.format(resource=MIGRATIONS_LOCK_RESOURCE))
+        except Exception as e:
+            logger.warning(f"Releasing the schema migration lock failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        """Applied / pending migrations as recorded in the database."""
+        with self.engine.connect() as conn:
+            applied = self._applied(conn)
+        return {
+            "expected_hash": self.expected_hash,
+            "current": self.is_current(applied),
+            "migrations": [
+                {"version": m.version, "name": m.name,
+                 "state": "applied" if applied.get(m.version) == m.checksum
+                 else "changed" if m.version in applied else "pending"}
+                for m in self.migrations
+            ],
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the schema hash and the timings of this process's last migration check."""
+        return {
+            "enabled": MIGRATIONS_ENABLED,
+            "expected_hash": self.expected_hash,
+            "current": self._current,
+            "migrations": len(self.migrations),
+            **self.stats,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Migrations
+# ---------------------------------------------------------------------------
+
+def _run_script(sql: str) -> Callable[[Any], None]:
+    def apply(engine):
+        with engine.begin() as conn:
+            for stmt in split_statements(sql):
+                conn.exec_driver_sql(stmt)
+    return apply
+
+
+def _apply_enhanced_views(engine):
+    from app.core.database import ensure_enhanced_views
+    if not ensure_enhanced_views():
+        raise RuntimeError("enhanced views and their fallback could not be created")
+
+
+def _refreshes_views(apply: Callable[[Any], None]) -> Callable[[Any], None]:
+    # A redefined view can return different rows: retire every worker's cached results
+    def run(engine):
+        apply(engine)
+        from app.services.query_cache import VIEW_TTLS, invalidate_views
+        invalidate_views(VIEW_TTLS)
+    return run
+
+
+def _feature_tables(sql: str) -> Callable[[Any], None]:
+    # Each statement on its own: SQL Server DDL does not mix well in one transaction.
+    # Objects that already exist are skipped; any other failure fails the migration
+    # (after trying the rest), so it is not recorded and runs again on the next start.
+    def apply(engine):
+        errors = []
+        for stmt in split_statements(sql):
+            try:
+                with engine.connect() as conn:
+                    conn.exec_driver_sql(stmt)
+                    conn.commit()
+            except Exception as e:
+                if not is_already_exists(e):
+                    errors.append(str(e)[:200])
+                    logger.warning(f"Feature table statement failed: {str(e)[:100]}")
+        if errors:
+            raise RuntimeError(f"{len(errors)} feature table statement(s) failed; first: {errors[0]}")
+    return apply
+
+
+def _apply_performance_indexes(engine):
+    from app.database.init_db import apply_performance_indexes
+    if not apply_performance_indexes():
+        raise RuntimeError("performance indexes could not be applied; see the database_init log")
+
+
+def default_migrations() -> List[Migration]:
+    """The app's schema, oldest first. Append new migrations; never renumber."""
+    from app.config.settings import (
+        CREATE_VIEWS_SQL, CREATE_ENHANCED_VIEWS_SQL, CREATE_ENHANCED_VIEWS_FALLBACK_SQL,
+    )
+    from app.config.portfolio_schema import CREATE_PORTFOLIO_TABLES_SQL
+    from app.config.features_schema import CREATE_FEATURES_TABLES_SQL
+    from app.services.query_cache import CREATE_VIEW_GENERATIONS_SQL
+
+    indexes_sql = (Path(__file__).resolve().parent.parent / "database" / "performance_indexes.sql").read_text()
+    return [
+        Migration(1, "core_views", CREATE_VIEWS_SQL, _refreshes_views(_run_script(CREATE_VIEWS_SQL))),
+        Migration(2, "enhanced_views", CREATE_ENHANCED_VIEWS_SQL + CREATE_ENHANCED_VIEWS_FALLBACK_SQL,
+                  _refreshes_views(_apply_enhanced_views)),
+        Migration(3, "portfolio_tables", CREATE_PORTFOLIO_TABLES_SQL, _run_script(CREATE_PORTFOLIO_TABLES_SQL)),
+        Migration(4, "feature_tables", CREATE_FEATURES_TABLES_SQL, _feature_tables(CREATE_FEATURES_TABLES_SQL)),
+        Migration(5, "performance_indexes", indexes_sql, _apply_performance_indexes),
+        Migration(6, "view_generations", CREATE_VIEW_GENERATIONS_SQL, _run_script(CREATE_VIEW_GENERATIONS_SQL)),
+    ]
+
+
+_migration_runner: Optional[MigrationRunner] = None
+_migration_runner_lock = threading.Lock()
+
+
+def get_migration_runner() -> MigrationRunner:
+    """Get the process-wide migration runner for the shared engine."""
+    global _migration_runner
+    if _migration_runner is None:
+        with _migration_runner_lock:
+            if _migration_runner is None:
+                from app.core.database import engine
+                _migration_runner = MigrationRunner(engine, default_migrations())
+    return _migration_runner
+
+
+def ensure_schema() -> bool:
+    """Apply pending migrations (once per process). Returns True when the schema is current."""
+    if not MIGRATIONS_ENABLED:
+        return True
+    try:
+        return get_migration_runner().run()
+    except Exception as e:
+        logger.error(f"Schema migration check failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    runner = get_migration_runner()
+    if len(sys.argv) > 1 and sys.argv[1] == "apply":
+        sys.exit(0 if runner.run() else 1)
+    state = runner.status()
+    print(f"Expected schema hash: {state['expected_hash']} ({'current' if state['current'] else 'out of date'})")
+    for m in state["migrations"]:
+        print(f"  {m['version']:04d}_{m['name']:24s} {m['state']}")
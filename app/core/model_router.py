@@ -13,10 +13,31 @@ Cost Optimization: Targets 70% cost savings vs. all-GPT-5 approach
 """
 
 import os
-import re
+import time
+import logging
+import threading
+from collections import deque
 from enum import Enum
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, asdict
+
+from app.core.llm_hedging import get_llm_hedger
+from app.core.intent_engine import get_intent_engine, scan
+
+logger = logging.getLogger("model_router")
+
+# Adaptive routing: off = always the static route (decisions are still logged)
+ADAPTIVE_ROUTING_ENABLED = os.getenv("ADAPTIVE_ROUTING_ENABLED", "false").lower() in ("1", "true", "yes")
+ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.2"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "10"))
+ROUTER_SWITCH_MARGIN = float(os.getenv("ROUTER_SWITCH_MARGIN", "0.2"))
+ROUTER_MODEL_CONCURRENCY = int(os.getenv("ROUTER_MODEL_CONCURRENCY", "20"))
+ROUTER_EXPECTED_INPUT_TOKENS = int(os.getenv("ROUTER_EXPECTED_INPUT_TOKENS", "3000"))
+ROUTER_EXPECTED_OUTPUT_TOKENS = int(os.getenv("ROUTER_EXPECTED_OUTPUT_TOKENS", "600"))
+ROUTER_DEFAULT_TOKENS_PER_SEC = float(os.getenv("ROUTER_DEFAULT_TOKENS_PER_SEC", "40"))
+ROUTER_COST_BUDGET_MULTIPLIER = float(os.getenv("ROUTER_COST_BUDGET_MULTIPLIER", "1.5"))
+ROUTER_COST_BUDGET_PER_REQUEST = float(os.getenv("ROUTER_COST_BUDGET_PER_REQUEST", "0"))  # $; 0 = multiplier of static route
+ROUTER_DECISION_LOG_SIZE = int(os.getenv("ROUTER_DECISION_LOG_SIZE", "1000"))
 
 class ModelType(Enum):
     """Available AI models in Harvey's fleet"""
@@ -104,99 +125,190 @@ MODEL_CONFIGS = {
     )
 }
 
+# Regex patterns for query classification
+QUERY_PATTERNS = {
+    QueryType.CHART_ANALYSIS: [
+        r'\b(chart|graph|candlestick|pattern|technical\s+analysis|moving\s+average|rsi|macd|bollinger)\b',
+        r'\b(support|resistance|trend\s+line|breakout|fibonacci)\b',
+        r'\b(analyze\s+this\s+(chart|image|screenshot|graph))\b'
+    ],
+    QueryType.FX_TRADING: [
+        r'\b(forex|fx|currency|eur/usd|gbp/usd|exchange\s+rate)\b',
+        r'\b(pip|spread|currency\s+pair|cross\s+rate)\b'
+    ],
+    QueryType.DIVIDEND_SCORING: [
+        r'\b(dividend\s+(quality|score|rating|grade|sustainability))\b',
+        r'\b(payout\s+ratio|dividend\s+growth|yield\s+prediction)\b',
+        r'\b(cut\s+risk|dividend\s+safety|income\s+reliability)\b',
+        r'\b(rate\s+this\s+dividend|score\s+[A-Z]{1,5}\s+dividend)\b'
+    ],
+    QueryType.DIVIDEND_STRATEGY: [
+        r'\b(margin\s+(buying|trading|leverage)|leverag(e|ing)\s+dividend)\b',
+        r'\b(drip|dividend\s+reinvest|reinvestment\s+plan)\b',
+        r'\b(dividend\s+capture|capture\s+strateg|ex(-|\s)date\s+play)\b',
+        r'\b(ex(-|\s)dividend\s+(dip|drop|buying|strategy))\b',
+        r'\b(declaration\s+(play|strateg|buying))\b',
+        r'\b(covered\s+call|sell\s+call|option\s+income)\b',
+        r'\b(cash(-|\s)secured\s+put|put\s+writing|sell\s+put)\b',
+        r'\b(when\s+(to|should)\s+(buy|sell).*(dividend|ex(-|\s)date))\b',
+        r'\b(buy\s+before\s+ex|sell\s+after\s+(ex|record))\b'
+    ],
+    QueryType.QUANTITATIVE_ANALYSIS: [
+        r'\b(portfolio\s+optimization|optimize\s+my\s+portfolio)\b',
+        r'\b(sharpe\s+ratio|sortino|alpha|beta|volatility)\b',
+        r'\b(correlation|covariance|regression|backtest)\b',
+        r'\b(calculate|compute|model|quantitative|quant)\b',
+        r'\b(risk.*return|efficient\s+frontier|monte\s+carlo)\b',
+        r'\b(tax\s+optimization|tax.*loss.*harvest)\b',
+        r'\b(rebalance|asset\s+allocation|diversification\s+ratio)\b'
+    ],
+    QueryType.FAST_QUERY: [
+        r'^\b(what|when|where|who|how\s+much|how\s+many)\b.*\?$',
+        r'\b(price\s+of|current\s+price|latest\s+price|stock\s+price)\b',
+        r'\b(quick|fast|simple|brief)\b',
+        r'^.{0,50}$'  # Short queries (under 50 chars)
+    ],
+    QueryType.MULTIMODAL: [
+        r'\b(analyze\s+this\s+(image|photo|screenshot|picture))\b',
+        r'\b(what.*in\s+this\s+(image|chart|graph))\b'
+    ],
+    QueryType.DIVIDEND_SUSTAINABILITY: [
+        r'\b(dividend\s+sustainability|sustainable\s+dividend|sustainability\s+(of|analysis))\b',
+        r'\b(payout\s+sustainability|can.*maintain.*dividend|dividend.*fundamentals)\b',
+        r'\b(coverage\s+ratio|earnings\s+coverage|fcf\s+coverage|free\s+cash\s+flow.*dividend)\b',
+        r'\b(analyze.*sustainability|sustain.*payout|long(-|\s)term.*dividend)\b'
+    ],
+    QueryType.RISK_ASSESSMENT: [
+        r'\b(risk\s+(assessment|analysis|profile|evaluation)|portfolio\s+risk)\b',
+        r'\b(downside\s+(risk|protection)|volatility\s+analysis|var|value\s+at\s+risk)\b',
+        r'\b(risk.*portfolio|assess.*risk|concentration\s+risk|sector\s+risk)\b',
+        r'\b(drawdown|maximum\s+drawdown|tail\s+risk|black\s+swan)\b'
+    ],
+    QueryType.PORTFOLIO_OPTIMIZATION: [
+        r'\b(optimize.*portfolio|portfolio\s+optimization|allocation\s+strategy)\b',
+        r'\b(diversification\s+(strategy|analysis)|diversify.*portfolio)\b',
+        r'\b(rebalance|rebalancing\s+strategy|optimal\s+allocation)\b',
+        r'\b(how.*allocate|best.*allocation|allocation.*income)\b'
+    ],
+    QueryType.TAX_STRATEGY: [
+        r'\b(tax(-|\s)(efficient|strategy|optimization|advantaged))\b',
+        r'\b(qualified\s+dividend|ordinary\s+dividend|dividend\s+tax)\b',
+        r'\b(tax.*loss.*harvest|capital\s+gain.*tax|ltcg|stcg)\b',
+        r'\b(roth|traditional.*ira|401k.*dividend|tax(-|\s)deferred)\b',
+        r'\b(minimize.*tax|reduce.*tax.*dividend|after(-|\s)tax.*return)\b'
+    ],
+    QueryType.GLOBAL_MARKETS: [
+        r'\b(international\s+dividend|global\s+(dividend|market)|foreign\s+dividend)\b',
+        r'\b(european\s+dividend|asian\s+dividend|emerging\s+market.*dividend)\b',
+        r'\b(adr|american\s+depositary|withholding\s+tax|foreign\s+tax)\b',
+        r'\b(currency\s+(risk|hedging)|fx.*dividend|exchange\s+rate.*dividend)\b',
+        r'\b(compare.*(us|america).*(europe|asia|international))\b'
+    ],
+    QueryType.MULTIMODAL_DOCUMENT: [
+        r'\b(analyze.*\b(pdf|document|file|statement|report))\b',
+        r'\b(read.*\b(document|pdf|statement)|extract.*from.*\b(pdf|document))\b',
+        r'\b(portfolio.*\b(pdf|document|file|statement)|brokerage.*statement)\b'
+    ]
+}
+
+# Classification priority: first matching type wins
+CLASSIFY_ORDER = [
+    QueryType.MULTIMODAL_DOCUMENT,
+    QueryType.DIVIDEND_SUSTAINABILITY,  # before general dividend scoring
+    QueryType.RISK_ASSESSMENT,
+    QueryType.PORTFOLIO_OPTIMIZATION,
+    QueryType.TAX_STRATEGY,
+    QueryType.GLOBAL_MARKETS,
+    QueryType.QUANTITATIVE_ANALYSIS,  # high priority
+    QueryType.DIVIDEND_SCORING,
+    QueryType.CHART_ANALYSIS,
+    QueryType.FX_TRADING,
+    QueryType.FAST_QUERY,
+]
+
+# Complex analysis indicator words
+COMPLEX_KEYWORDS = [
+    'analyze', 'compare', 'evaluate', 'portfolio', 'strategy',
+    'comprehensive', 'detailed', 'explain', 'breakdown'
+]
+
+_intent_engine = get_intent_engine()
+for _query_type, _patterns in QUERY_PATTERNS.items():
+    _intent_engine.register_patterns(f"query_type:{_query_type.value}", _patterns)
+_intent_engine.register_keywords("complex", COMPLEX_KEYWORDS)
+
+# Static route per query type
+ROUTING_MAP = {
+    QueryType.CHART_ANALYSIS: (ModelType.GEMINI, "Chart/technical analysis → Gemini 2.5 Pro (multimodal expert)"),
+    QueryType.FX_TRADING: (ModelType.GEMINI, "FX trading analysis → Gemini 2.5 Pro (financial data expert)"),
+    QueryType.DIVIDEND_SCORING: (ModelType.FINGPT, "Dividend scoring → FinGPT (specialized dividend expert)"),
+    QueryType.QUANTITATIVE_ANALYSIS: (ModelType.DEEPSEEK, "Quantitative analysis → DeepSeek-R1 (mathematical reasoning expert)"),
+    QueryType.FAST_QUERY: (ModelType.GROK4, "Fast query → Grok-4 (optimized for speed)"),
+    QueryType.COMPLEX_ANALYSIS: (ModelType.GPT5, "Complex analysis → GPT-5 (advanced reasoning)"),
+    QueryType.GENERAL_CHAT: (ModelType.GROK4, "General chat → Grok-4 (cost-optimized)"),
+    QueryType.MULTIMODAL: (ModelType.GEMINI, "Multimodal query → Gemini 2.5 Pro (image analysis)"),
+    QueryType.DIVIDEND_SUSTAINABILITY: (ModelType.GEMINI, "Dividend sustainability analysis → Gemini 2.5 Pro (deep reasoning expert)"),
+    QueryType.RISK_ASSESSMENT: (ModelType.GEMINI, "Portfolio risk assessment → Gemini 2.5 Pro (analytical reasoning)"),
+    QueryType.PORTFOLIO_OPTIMIZATION: (ModelType.GEMINI, "Portfolio optimization → Gemini 2.5 Pro (strategic allocation expert)"),
+    QueryType.TAX_STRATEGY: (ModelType.GEMINI, "Tax strategy → Gemini 2.5 Pro (tax optimization expert)"),
+    QueryType.GLOBAL_MARKETS: (ModelType.GEMINI, "Global markets analysis → Gemini 2.5 Pro (international finance expert)"),
+    QueryType.MULTIMODAL_DOCUMENT: (ModelType.GEMINI, "Document analysis → Gemini 2.5 Pro (multimodal document expert)")
+}
+
+# Models allowed to serve each query type under adaptive routing (static route first).
+# Image/document and dividend-scoring types stay pinned to the only capable model.
+CANDIDATE_MODELS = {
+    QueryType.QUANTITATIVE_ANALYSIS: [ModelType.DEEPSEEK, ModelType.GPT5],
+    QueryType.FAST_QUERY: [ModelType.GROK4, ModelType.GPT5],
+    QueryType.COMPLEX_ANALYSIS: [ModelType.GPT5, ModelType.DEEPSEEK, ModelType.GEMINI],
+    QueryType.GENERAL_CHAT: [ModelType.GROK4, ModelType.GPT5],
+    QueryType.DIVIDEND_STRATEGY: [ModelType.GPT5, ModelType.GROK4],
+    QueryType.DIVIDEND_SUSTAINABILITY: [ModelType.GEMINI, ModelType.GPT5],
+    QueryType.RISK_ASSESSMENT: [ModelType.GEMINI, ModelType.GPT5],
+    QueryType.PORTFOLIO_OPTIMIZATION: [ModelType.GEMINI, ModelType.GPT5, ModelType.DEEPSEEK],
+    QueryType.TAX_STRATEGY: [ModelType.GEMINI, ModelType.GPT5],
+    QueryType.GLOBAL_MARKETS: [ModelType.GEMINI, ModelType.GPT5],
+}
+
+
+@dataclass
+class ModelRuntimeStats:
+    """Online (EWMA) statistics for one model"""
+    ttft_ms: Optional[float] = None
+    tokens_per_sec: Optional[float] = None
+    error_rate: float = 0.0
+    in_flight: int = 0
+    samples: int = 0
+    errors: int = 0
+
+
+def _ewma(current: Optional[float], value: float) -> float:
+    return value if current is None else current + ROUTER_EWMA_ALPHA * (value - current)
+
+
+def model_for_tracked_name(name: str) -> Optional[ModelType]:
+    """Map a deployment / model name from stream timings to the fleet ModelType."""
+    for model, cfg in MODEL_CONFIGS.items():
+        if cfg.deployment and cfg.deployment == name:
+            return model
+    if name.startswith("gemini"):
+        return ModelType.GEMINI
+    return None
+
 class QueryRouter:
     """Intelligent query router for multi-model AI system"""
     
     def __init__(self):
         self.models = MODEL_CONFIGS
         self._init_patterns()
+        self.runtime_stats: Dict[ModelType, ModelRuntimeStats] = {m: ModelRuntimeStats() for m in ModelType}
+        self._stats_lock = threading.Lock()
+        self.decisions: Deque[Dict] = deque(maxlen=ROUTER_DECISION_LOG_SIZE)
+        self.adaptive_decisions = 0
     
     def _init_patterns(self):
         """Initialize regex patterns for query classification"""
-        self.patterns = {
-            QueryType.CHART_ANALYSIS: [
-                r'\b(chart|graph|candlestick|pattern|technical\s+analysis|moving\s+average|rsi|macd|bollinger)\b',
-                r'\b(support|resistance|trend\s+line|breakout|fibonacci)\b',
-                r'\b(analyze\s+this\s+(chart|image|screenshot|graph))\b'
-            ],
-            QueryType.FX_TRADING: [
-                r'\b(forex|fx|currency|eur/usd|gbp/usd|exchange\s+rate)\b',
-                r'\b(pip|spread|currency\s+pair|cross\s+rate)\b'
-            ],
-            QueryType.DIVIDEND_SCORING: [
-                r'\b(dividend\s+(quality|score|rating|grade|sustainability))\b',
-                r'\b(payout\s+ratio|dividend\s+growth|yield\s+prediction)\b',
-                r'\b(cut\s+risk|dividend\s+safety|income\s+reliability)\b',
-                r'\b(rate\s+this\s+dividend|score\s+[A-Z]{1,5}\s+dividend)\b'
-            ],
-            QueryType.DIVIDEND_STRATEGY: [
-                r'\b(margin\s+(buying|trading|leverage)|leverag(e|ing)\s+dividend)\b',
-                r'\b(drip|dividend\s+reinvest|reinvestment\s+plan)\b',
-                r'\b(dividend\s+capture|capture\s+strateg|ex(-|\s)date\s+play)\b',
-                r'\b(ex(-|\s)dividend\s+(dip|drop|buying|strategy))\b',
-                r'\b(declaration\s+(play|strateg|buying))\b',
-                r'\b(covered\s+call|sell\s+call|option\s+income)\b',
-                r'\b(cash(-|\s)secured\s+put|put\s+writing|sell\s+put)\b',
-                r'\b(when\s+(to|should)\s+(buy|sell).*(dividend|ex(-|\s)date))\b',
-                r'\b(buy\s+before\s+ex|sell\s+after\s+(ex|record))\b'
-            ],
-            QueryType.QUANTITATIVE_ANALYSIS: [
-                r'\b(portfolio\s+optimization|optimize\s+my\s+portfolio)\b',
-                r'\b(sharpe\s+ratio|sortino|alpha|beta|volatility)\b',
-                r'\b(correlation|covariance|regression|backtest)\b',
-                r'\b(calculate|compute|model|quantitative|quant)\b',
-                r'\b(risk.*return|efficient\s+frontier|monte\s+carlo)\b',
-                r'\b(tax\s+optimization|tax.*loss.*harvest)\b',
-                r'\b(rebalance|asset\s+allocation|diversification\s+ratio)\b'
-            ],
-            QueryType.FAST_QUERY: [
-                r'^\b(what|when|where|who|how\s+much|how\s+many)\b.*\?$',
-                r'\b(price\s+of|current\s+price|latest\s+price|stock\s+price)\b',
-                r'\b(quick|fast|simple|brief)\b',
-                r'^.{0,50}$'  # Short queries (under 50 chars)
-            ],
-            QueryType.MULTIMODAL: [
-                r'\b(analyze\s+this\s+(image|photo|screenshot|picture))\b',
-                r'\b(what.*in\s+this\s+(image|chart|graph))\b'
-            ],
-            QueryType.DIVIDEND_SUSTAINABILITY: [
-                r'\b(dividend\s+sustainability|sustainable\s+dividend|sustainability\s+(of|analysis))\b',
-                r'\b(payout\s+sustainability|can.*maintain.*dividend|dividend.*fundamentals)\b',
-                r'\b(coverage\s+ratio|earnings\s+coverage|fcf\s+coverage|free\s+cash\s+flow.*dividend)\b',
-                r'\b(analyze.*sustainability|sustain.*payout|long(-|\s)term.*dividend)\b'
-            ],
-            QueryType.RISK_ASSESSMENT: [
-                r'\b(risk\s+(assessment|analysis|profile|evaluation)|portfolio\s+risk)\b',
-                r'\b(downside\s+(risk|protection)|volatility\s+analysis|var|value\s+at\s+risk)\b',
-                r'\b(risk.*portfolio|assess.*risk|concentration\s+risk|sector\s+risk)\b',
-                r'\b(drawdown|maximum\s+drawdown|tail\s+risk|black\s+swan)\b'
-            ],
-            QueryType.PORTFOLIO_OPTIMIZATION: [
-                r'\b(optimize.*portfolio|portfolio\s+optimization|allocation\s+strategy)\b',
-                r'\b(diversification\s+(strategy|analysis)|diversify.*portfolio)\b',
-                r'\b(rebalance|rebalancing\s+strategy|optimal\s+allocation)\b',
-                r'\b(how.*allocate|best.*allocation|allocation.*income)\b'
-            ],
-            QueryType.TAX_STRATEGY: [
-                r'\b(tax(-|\s)(efficient|strategy|optimization|advantaged))\b',
-                r'\b(qualified\s+dividend|ordinary\s+dividend|dividend\s+tax)\b',
-                r'\b(tax.*loss.*harvest|capital\s+gain.*tax|ltcg|stcg)\b',
-                r'\b(roth|traditional.*ira|401k.*dividend|tax(-|\s)deferred)\b',
-                r'\b(minimize.*tax|reduce.*tax.*dividend|after(-|\s)tax.*return)\b'
-            ],
-            QueryType.GLOBAL_MARKETS: [
-                r'\b(international\s+dividend|global\s+(dividend|market)|foreign\s+dividend)\b',
-                r'\b(european\s+dividend|asian\s+dividend|emerging\s+market.*dividend)\b',
-                r'\b(adr|american\s+depositary|withholding\s+tax|foreign\s+tax)\b',
-                r'\b(currency\s+(risk|hedging)|fx.*dividend|exchange\s+rate.*dividend)\b',
-                r'\b(compare.*(us|america).*(europe|asia|international))\b'
-            ],
-            QueryType.MULTIMODAL_DOCUMENT: [
-                r'\b(analyze.*\b(pdf|document|file|statement|report))\b',
-                r'\b(read.*\b(document|pdf|statement)|extract.*from.*\b(pdf|document))\b',
-                r'\b(portfolio.*\b(pdf|document|file|statement)|brokerage.*statement)\b'
-            ]
-        }
+        self.patterns = QUERY_PATTERNS
     
     def classify_query(self, query: str, has_image: bool = False) -> QueryType:
         """
@@ -209,75 +321,20 @@ class QueryRouter:
         Returns:
             QueryType enum
         """
-        query_lower = query.lower()
-        
         # Multimodal takes priority if image is present
         if has_image:
             return QueryType.MULTIMODAL
         
-        # Check multimodal document patterns (PDFs, statements)
-        for pattern in self.patterns[QueryType.MULTIMODAL_DOCUMENT]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.MULTIMODAL_DOCUMENT
-        
-        # Check dividend sustainability patterns (before general dividend scoring)
-        for pattern in self.patterns[QueryType.DIVIDEND_SUSTAINABILITY]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.DIVIDEND_SUSTAINABILITY
-        
-        # Check risk assessment patterns
-        for pattern in self.patterns[QueryType.RISK_ASSESSMENT]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.RISK_ASSESSMENT
-        
-        # Check portfolio optimization patterns
-        for pattern in self.patterns[QueryType.PORTFOLIO_OPTIMIZATION]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.PORTFOLIO_OPTIMIZATION
-        
-        # Check tax strategy patterns
-        for pattern in self.patterns[QueryType.TAX_STRATEGY]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.TAX_STRATEGY
-        
-        # Check global markets patterns
-        for pattern in self.patterns[QueryType.GLOBAL_MARKETS]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.GLOBAL_MARKETS
-        
-        # Check quantitative analysis patterns (high priority)
-        for pattern in self.patterns[QueryType.QUANTITATIVE_ANALYSIS]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.QUANTITATIVE_ANALYSIS
-        
-        # Check dividend scoring patterns
-        for pattern in self.patterns[QueryType.DIVIDEND_SCORING]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.DIVIDEND_SCORING
-        
-        # Check chart analysis patterns
-        for pattern in self.patterns[QueryType.CHART_ANALYSIS]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.CHART_ANALYSIS
-        
-        # Check FX trading patterns
-        for pattern in self.patterns[QueryType.FX_TRADING]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.FX_TRADING
-        
-        # Check fast query patterns
-        for pattern in self.patterns[QueryType.FAST_QUERY]:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.FAST_QUERY
+        signals = scan(query)
+        for query_type in CLASSIFY_ORDER:
+            if signals.matches(f"query_type:{query_type.value}"):
+                return query_type
         
         # Complex analysis indicators
         complex_indicators = [
             len(query) > 200,  # Long query
             query.count('?') > 2,  # Multiple questions
-            any(word in query_lower for word in [
-                'analyze', 'compare', 'evaluate', 'portfolio', 'strategy',
-                'comprehensive', 'detailed', 'explain', 'breakdown'
-            ])
+            signals.has("complex")
         ]
         
         if sum(complex_indicators) >= 2:
@@ -295,6 +352,9 @@ class QueryRouter:
         """
         Route query to optimal model based on classification.
         
+        The static route for the query type is used unless adaptive routing is
+        enabled and a candidate model is measurably faster within budget.
+        
         Args:
             query: User query text
             has_image: Whether query includes image/chart
@@ -304,29 +364,167 @@ class QueryRouter:
             Tuple of (ModelType, routing_reason)
         """
         query_type = self.classify_query(query, has_image)
+        model, reason = ROUTING_MAP.get(query_type, (ModelType.GPT5, "Default → GPT-5"))
         
-        # Routing logic
-        routing_map = {
-            QueryType.CHART_ANALYSIS: (ModelType.GEMINI, "Chart/technical analysis → Gemini 2.5 Pro (multimodal expert)"),
-            QueryType.FX_TRADING: (ModelType.GEMINI, "FX trading analysis → Gemini 2.5 Pro (financial data expert)"),
-            QueryType.DIVIDEND_SCORING: (ModelType.FINGPT, "Dividend scoring → FinGPT (specialized dividend expert)"),
-            QueryType.QUANTITATIVE_ANALYSIS: (ModelType.DEEPSEEK, "Quantitative analysis → DeepSeek-R1 (mathematical reasoning expert)"),
-            QueryType.FAST_QUERY: (ModelType.GROK4, "Fast query → Grok-4 (optimized for speed)"),
-            QueryType.COMPLEX_ANALYSIS: (ModelType.GPT5, "Complex analysis → GPT-5 (advanced reasoning)"),
-            QueryType.GENERAL_CHAT: (ModelType.GROK4, "General chat → Grok-4 (cost-optimized)"),
-            QueryType.MULTIMODAL: (ModelType.GEMINI, "Multimodal query → Gemini 2.5 Pro (image analysis)"),
-            QueryType.DIVIDEND_SUSTAINABILITY: (ModelType.GEMINI, "Dividend sustainability analysis → Gemini 2.5 Pro (deep reasoning expert)"),
-            QueryType.RISK_ASSESSMENT: (ModelType.GEMINI, "Portfolio risk assessment → Gemini 2.5 Pro (analytical reasoning)"),
-            QueryType.PORTFOLIO_OPTIMIZATION: (ModelType.GEMINI, "Portfolio optimization → Gemini 2.5 Pro (strategic allocation expert)"),
-            QueryType.TAX_STRATEGY: (ModelType.GEMINI, "Tax strategy → Gemini 2.5 Pro (tax optimization expert)"),
-            QueryType.GLOBAL_MARKETS: (ModelType.GEMINI, "Global markets analysis → Gemini 2.5 Pro (international finance expert)"),
-            QueryType.MULTIMODAL_DOCUMENT: (ModelType.GEMINI, "Document analysis → Gemini 2.5 Pro (multimodal document expert)")
-        }
+        decision = self.decide(query_type, self.snapshot_stats())
+        self._log_decision(decision)
         
-        model, reason = routing_map.get(query_type, (ModelType.GPT5, "Default → GPT-5"))
+        if ADAPTIVE_ROUTING_ENABLED and decision["chosen"] != model.value:
+            chosen = ModelType(decision["chosen"])
+            return chosen, f"{query_type.value} → {MODEL_CONFIGS[chosen].name} (adaptive: {decision['reason']})"
         
         return model, reason
     
+    # ------------------------------------------------------------------
+    # Adaptive routing
+    # ------------------------------------------------------------------
+    
+    def observe_stream_event(self, tracked_name: str, event: str, value: Optional[float] = None):
+        """
+        Feed one stream timing event (see LLMHedger.add_listener) into the
+        per-model online statistics.
+        """
+        model = model_for_tracked_name(tracked_name)
+        if model is None:
+            return
+        with self._stats_lock:
+            stats = self.runtime_stats[model]
+            if event == "start":
+                stats.in_flight += 1
+            elif event == "end":
+                stats.in_flight = max(0, stats.in_flight - 1)
+            elif event == "ttft" and value is not None:
+                stats.ttft_ms = _ewma(stats.ttft_ms, value)
+                stats.error_rate = _ewma(stats.error_rate, 0.0)
+                stats.samples += 1
+            elif event == "tps" and value is not None:
+                stats.tokens_per_sec = _ewma(stats.tokens_per_sec, value)
+            elif event == "error":
+                stats.error_rate = _ewma(stats.error_rate, 1.0)
+                stats.errors += 1
+    
+    def snapshot_stats(self) -> Dict[str, Dict]:
+        """Current per-model statistics as plain dicts (the input to decide())."""
+        with self._stats_lock:
+            return {m.value: asdict(stats) for m, stats in self.runtime_stats.items()}
+    
+    @staticmethod
+    def expected_latency_ms(stats: Dict) -> Optional[float]:
+        """
+        Expected time to a complete answer from a model's live statistics.
+        
+        TTFT plus generation time for ROUTER_EXPECTED_OUTPUT_TOKENS, stretched
+        by queue depth and by the retries implied by the error rate.
+        """
+        if stats.get("samples", 0) < ROUTER_MIN_SAMPLES or stats.get("ttft_ms") is None:
+            return None
+        tps = stats.get("tokens_per_sec") or ROUTER_DEFAULT_TOKENS_PER_SEC
+        latency = stats["ttft_ms"] + ROUTER_EXPECTED_OUTPUT_TOKENS / tps * 1000
+        latency *= 1 + stats.get("in_flight", 0) / ROUTER_MODEL_CONCURRENCY
+        return latency / max(0.05, 1 - (stats.get("error_rate") or 0.0))
+    
+    def decide(self, query_type: QueryType, stats: Dict[str, Dict]) -> Dict:
+        """
+        Pick a model for `query_type` from its candidate set.
+        
+        Pure function of (query_type, stats), so recorded decisions can be
+        replayed deterministically. Candidates must fit the cost budget; the
+        static route wins unless another candidate is faster by
+        ROUTER_SWITCH_MARGIN, and always wins when it has no data yet.
+        
+        Returns:
+            Decision dict: query_type, static, chosen, reason, scores, stats
+        """
+        static, _ = ROUTING_MAP.get(query_type, (ModelType.GPT5, "Default → GPT-5"))
+        candidates = CANDIDATE_MODELS.get(query_type, [static])
+        budget = (
+            ROUTER_COST_BUDGET_PER_REQUEST if ROUTER_COST_BUDGET_PER_REQUEST > 0
+            else self._request_cost(static) * ROUTER_COST_BUDGET_MULTIPLIER
+        )
+        
+        scores: Dict[str, Optional[float]] = {}
+        for model in candidates:
+            if model != static and self._request_cost(model) > budget:
+                continue
+            scores[model.value] = self.expected_latency_ms(stats.get(model.value, {}))
+        
+        chosen, reason = static, "static route"
+        static_latency = scores.get(static.value)
+        if static_latency is None:
+            reason = "static route (no latency data)"
+        else:
+            measured = {m: v for m, v in scores.items() if v is not None}
+            best = min(measured, key=lambda m: measured[m])
+            if best != static.value and measured[best] < static_latency * (1 - ROUTER_SWITCH_MARGIN):
+                chosen = ModelType(best)
+                reason = f"{best} ≈{measured[best]:.0f}ms vs {static.value} ≈{static_latency:.0f}ms"
+        
+        return {
+            "query_type": query_type.value,
+            "static": static.value,
+            "chosen": chosen.value,
+            "reason": reason,
+            "scores": {m: (round(v, 1) if v is not None else None) for m, v in scores.items()},
+            "stats": {m.value: stats.get(m.value, {}) for m in candidates},
+        }
+    
+    def replay(self, decisions: Iterable[Dict]) -> Dict:
+        """
+        Re-run recorded routing decisions against their recorded statistics.
+        
+        Records need "query_type" (or "query" to re-classify) and "stats".
+        Nothing live is read, so the same input always gives the same output;
+        use it to compare routing changes against captured traffic.
+        
+        Returns:
+            Summary with per-record results and changed/adaptive counts
+        """
+        results = []
+        for record in decisions:
+            if record.get("query_type"):
+                query_type = QueryType(record["query_type"])
+            else:
+                query_type = self.classify_query(record.get("query", ""), record.get("has_image", False))
+            decision = self.decide(query_type, record.get("stats") or {})
+            decision["recorded"] = record.get("chosen")
+            results.append(decision)
+        
+        def _total(key: str) -> float:
+            return round(sum(r["scores"].get(r[key]) or 0.0 for r in results), 1)
+        
+        return {
+            "decisions": len(results),
+            "adaptive": sum(1 for r in results if r["chosen"] != r["static"]),
+            "changed_vs_recorded": sum(1 for r in results if r["recorded"] is not None and r["chosen"] != r["recorded"]),
+            "expected_latency_ms": {"static": _total("static"), "adaptive": _total("chosen")},
+            "results": results,
+        }
+    
+    def _request_cost(self, model: ModelType) -> float:
+        return self.estimate_cost(model, ROUTER_EXPECTED_INPUT_TOKENS, ROUTER_EXPECTED_OUTPUT_TOKENS)
+    
+    def _log_decision(self, decision: Dict):
+        self.decisions.append({"ts": time.time(), **decision})
+        if decision["chosen"] != decision["static"]:
+            self.adaptive_decisions += 1
+            logger.info(
+                f"Adaptive route {decision['query_type']}: {decision['static']} → {decision['chosen']} "
+                f"({decision['reason']}, applied={ADAPTIVE_ROUTING_ENABLED})"
+            )
+    
+    def get_adaptive_stats(self, limit: int = 50) -> Dict:
+        """Live per-model statistics and the most recent routing decisions."""
+        return {
+            "enabled": ADAPTIVE_ROUTING_ENABLED,
+            "decisions_logged": len(self.decisions),
+            "adaptive_decisions": self.adaptive_decisions,
+            "models": {
+                m: {**s, "expected_latency_ms": self.expected_latency_ms(s), "request_cost": self._request_cost(ModelType(m))}
+                for m, s in self.snapshot_stats().items()
+            },
+            "recent_decisions": list(self.decisions)[-limit:] if limit > 0 else [],
+        }
+    
     def get_model_config(self, model_type: ModelType) -> ModelConfig:
         """Get configuration for a specific model"""
         return self.models[model_type]
@@ -364,12 +562,14 @@ class QueryRouter:
                 }
                 for m, cfg in self.models.items()
             },
-            "query_types": [qt.value for qt in QueryType]
+            "query_types": [qt.value for qt in QueryType],
+            "adaptive_routing": self.get_adaptive_stats(limit=0)
         }
 
 
-# Global router instance
+# Global router instance (fed by the stream timings of every LLM call)
 router = QueryRouter()
+get_llm_hedger().add_listener(router.observe_stream_event)
 
 
 def route_query(query: str, has_image: bool = False, context: Optional[Dict] = None):
@@ -0,0 +1,429 @@
+"""
+Ollama Client
+Pooled, warm transport for the llama provider (on-box Ollama).
+
+Features:
+- One keep-alive connection pool per worker (httpx for the async paths,
+  a requests.Session for the sync paths)
+- `keep_alive` sent with every chat so Ollama keeps the model resident
+- Background keep-warm thread that loads OLLAMA_MODEL at startup and
+  re-pings it before Ollama's keep_alive expires
+- Cached /api/tags list (404 explanations no longer cost an extra round trip)
+- Per-model concurrency gate shared by sync and async callers: bursts queue
+  FIFO instead of forcing Ollama to thrash model loads
+
+Expected Results:
+- No 5-20s cold model load on the first llama request after idle
+- No TCP/HTTP setup per llama request
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, Iterator, AsyncIterator, List, Optional
+
+import httpx
+import requests
+
+logger = logging.getLogger("ollama_client")
+
+OLLAMA_BASE = (os.getenv("OLLAMA_BASE") or "http://localhost:11434").rstrip("/")
+OLLAMA_CHAT = f"{OLLAMA_BASE}/api/chat"
+OLLAMA_GENERATE = f"{OLLAMA_BASE}/api/generate"
+OLLAMA_TAGS = f"{OLLAMA_BASE}/api/tags"
+OLLAMA_VERSION = f"{OLLAMA_BASE}/api/version"
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+
+# Ollama duration string ("30m", "1h") or seconds; "-1" keeps the model loaded indefinitely
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Keep-warm is on by default only when an Ollama host is explicitly configured
+OLLAMA_KEEPWARM_ENABLED = os.getenv(
+    "OLLAMA_KEEPWARM_ENABLED", "true" if os.getenv("OLLAMA_BASE") else "false"
+).lower() in ("1", "true", "yes")
+OLLAMA_KEEPWARM_INTERVAL = int(os.getenv("OLLAMA_KEEPWARM_INTERVAL", "240"))
+OLLAMA_MODEL_CONCURRENCY = int(os.getenv("OLLAMA_MODEL_CONCURRENCY", "2"))
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "120"))
+OLLAMA_TAGS_TTL = int(os.getenv("OLLAMA_TAGS_TTL", "300"))
+OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "300"))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+
+
+class OllamaBusyError(RuntimeError):
+    """Raised when a request waited longer than the queue timeout for a model slot."""
+
+
+class ModelGate:
+    """
+    Counting gate with FIFO hand-off to both threads and coroutines.
+
+    A released slot goes straight to the oldest waiter, so a burst is served
+    in arrival order whichever side (sync or async) each caller is on.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._lock = threading.Lock()
+        # Waiters: threading.Event (sync) or (loop, future) (async)
+        self._waiters: Deque[Any] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Blocking acquire for sync callers."""
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return True
+            event = threading.Event()
+            self._waiters.append(event)
+        if event.wait(timeout):
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(event)
+                return False
+            except ValueError:
+                # Handed a slot between the timeout and taking the lock
+                return True
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """Event-loop acquire; waiting costs no thread."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return True
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[1]), timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    handed = False
+                except ValueError:
+                    handed = True
+            if handed:
+                # The slot was already ours: keep it on timeout, give it back on cancel
+                if isinstance(e, asyncio.CancelledError):
+                    self.release()
+                    raise
+                return True
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.in_use -= 1
+                return
+            waiter = self._waiters.popleft()
+        # Slot passes to the waiter; in_use is unchanged
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future: "asyncio.Future"):
+    if not future.done():
+        future.set_result(True)
+
+
+class OllamaClient:
+    """
+    Shared Ollama transport with connection pooling, keep-warm and per-model queuing.
+
+    Features:
+    - Pooled sync and async HTTP clients with keep-alive
+    - keep_alive on every chat request plus a background keep-warm ping
+    - TTL-cached installed model list
+    - Per-model concurrency limit shared by sync and async callers
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        model_concurrency: int = OLLAMA_MODEL_CONCURRENCY,
+        queue_timeout: float = OLLAMA_QUEUE_TIMEOUT,
+        tags_ttl: int = OLLAMA_TAGS_TTL,
+        keepwarm_interval: int = OLLAMA_KEEPWARM_INTERVAL,
+        keepwarm_models: Optional[List[str]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        session: Optional[requests.Session] = None,
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: Ollama server URL
+            keep_alive: keep_alive sent with chat and keep-warm requests
+            model_concurrency: Concurrent requests allowed per model
+            queue_timeout: Seconds a request may wait for a model slot
+            tags_ttl: Seconds the /api/tags list is cached
+            keepwarm_interval: Seconds between keep-warm pings
+            keepwarm_models: Models kept resident (default: OLLAMA_MODEL)
+            transport: Optional httpx transport (tests)
+            session: Optional requests session (tests)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.model_concurrency = model_concurrency
+        self.queue_timeout = queue_timeout
+        self.tags_ttl = tags_ttl
+        self.keepwarm_interval = keepwarm_interval
+        self.keepwarm_models = keepwarm_models or [OLLAMA_MODEL]
+        self.timeout = httpx.Timeout(OLLAMA_TIMEOUT, connect=10.0)
+        self.sync_timeout = (10.0, OLLAMA_TIMEOUT)
+
+        self.async_client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_keepalive_connections=OLLAMA_POOL_SIZE,
+                                max_connections=OLLAMA_POOL_SIZE * 2, keepalive_expiry=120),
+            transport=transport,
+        )
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+        self._gates: Dict[str, ModelGate] = {}
+        self._tags: Optional[List[str]] = None
+        self._tags_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "queued": 0,
+            "queue_timeouts": 0,
+            "max_queue_wait_ms": 0.0,
+            "tags_cache_hits": 0,
+            "tags_fetches": 0,
+            "keepwarm_pings": 0,
+            "keepwarm_failures": 0,
+            "last_keepwarm": None,
+            "last_keepwarm_ms": None,
+        }
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def chat_payload(self, model: str, messages: List[Dict[str, str]], stream: bool) -> Dict[str, Any]:
+        """/api/chat body; keep_alive keeps the model resident after the answer."""
+        return {"model": model, "messages": messages, "stream": stream, "keep_alive": self.keep_alive}
+
+    # ------------------------------------------------------------------
+    # Per-model concurrency
+    # ------------------------------------------------------------------
+
+    def _gate(self, model: str) -> ModelGate:
+        with self._lock:
+            gate = self._gates.get(model)
+            if gate is None:
+                gate = self._gates[model] = ModelGate(self.model_concurrency)
+            return gate
+
+    def _record_wait(self, started: float, waited: bool, acquired: bool, model: str):
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.stats["requests"] += 1
+            if waited:
+                self.stats["queued"] += 1
+                self.stats["max_queue_wait_ms"] = max(self.stats["max_queue_wait_ms"], round(wait_ms, 1))
+            if not acquired:
+                self.stats["queue_timeouts"] += 1
+        if not acquired:
+            raise OllamaBusyError(
+                f"Ollama model '{model}' is busy: waited {wait_ms / 1000:.0f}s for one of "
+                f"{self.model_concurrency} slots"
+            )
+        if waited:
+            logger.info(f"Queued {wait_ms:.0f}ms for Ollama model '{model}'")
+
+    @contextmanager
+    def slot(self, model: str) -> Iterator[None]:
+        """Hold one of the model's concurrency slots (sync callers)."""
+        gate = self._gate(model)
+        started = time.perf_counter()
+        waited = gate.in_use >= gate.limit
+        acquired = gate.acquire(self.queue_timeout)
+        self._record_wait(started, waited, acquired, model)
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            gate.release()
+
+    @asynccontextmanager
+    async def slot_async(self, model: str) -> AsyncIterator[None]:
+        """Hold one of the model's concurrency slots (event-loop callers)."""
+        gate = self._gate(model)
+        started = time.perf_counter()
+        waited = gate.in_use >= gate.limit
+        acquired = await gate.acquire_async(self.queue_timeout)
+        self._record_wait(started, waited, acquired, model)
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            gate.release()
+
+    # ------------------------------------------------------------------
+    # Installed models
+    # ------------------------------------------------------------------
+
+    def _cached_tags(self) -> Optional[List[str]]:
+        with self._lock:
+            if self._tags is not None and time.time() - self._tags_at < self.tags_ttl:
+                self.stats["tags_cache_hits"] += 1
+                return list(self._tags)
+        return None
+
+    def _store_tags(self, data: Any) -> List[str]:
+        models = (data or {}).get("models") or []
+        tags = [m.get("name") for m in models if isinstance(m, dict) and m.get("name")]
+        with self._lock:
+            self._tags, self._tags_at = tags, time.time()
+            self.stats["tags_fetches"] += 1
+        return list(tags)
+
+    def list_tags(self) -> List[str]:
+        """Installed model tags (cached for tags_ttl seconds; [] when unreachable)."""
+        cached = self._cached_tags()
+        if cached is not None:
+            return cached
+        try:
+            r = self.session.get(self.url("/api/tags"), timeout=10)
+            r.raise_for_status()
+            return self._store_tags(r.json())
+        except Exception:
+            return []
+
+    async def list_tags_async(self) -> List[str]:
+        """Async counterpart of list_tags over the pooled client."""
+        cached = self._cached_tags()
+        if cached is not None:
+            return cached
+        try:
+            r = await self.async_client.get("/api/tags", timeout=10)
+            r.raise_for_status()
+            return self._store_tags(r.json())
+        except Exception:
+            return []
+
+    def invalidate_tags(self):
+        with self._lock:
+            self._tags = None
+
+    # ------------------------------------------------------------------
+    # Keep-warm
+    # ------------------------------------------------------------------
+
+    def warm(self, model: str) -> bool:
+        """Load `model` (or extend its residency) with an empty /api/generate."""
+        started = time.perf_counter()
+        try:
+            r = self.session.post(
+                self.url("/api/generate"),
+                json={"model": model, "keep_alive": self.keep_alive},
+                timeout=self.sync_timeout,
+            )
+            r.raise_for_status()
+            ok = True
+        except Exception as e:
+            logger.warning(f"Ollama keep-warm for '{model}' failed: {e}")
+            ok = False
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        with self._lock:
+            self.stats["keepwarm_pings" if ok else "keepwarm_failures"] += 1
+            if ok:
+                self.stats["last_keepwarm"] = time.time()
+                self.stats["last_keepwarm_ms"] = elapsed_ms
+        return ok
+
+    def _keepwarm_loop(self):
+        while not self._stop.is_set():
+            for model in self.keepwarm_models:
+                if self._stop.is_set():
+                    break
+                self.warm(model)
+            self._stop.wait(self.keepwarm_interval)
+
+    def start(self):
+        """Start the background keep-warm thread (first ping loads the model)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._keepwarm_loop, name="ollama-keepwarm", daemon=True)
+        self._thread.start()
+        logger.info(f"Ollama keep-warm started: models={self.keepwarm_models}, "
+                    f"interval={self.keepwarm_interval}s, keep_alive={self.keep_alive}")
+
+    def stop(self):
+        """Stop the keep-warm thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    async def aclose(self):
+        self.stop()
+        await self.async_client.aclose()
+        self.session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get client statistics for monitoring."""
+        with self._lock:
+            stats = dict(self.stats)
+            gates = {
+                model: {"in_flight": gate.in_use, "queued": gate.queued, "limit": gate.limit}
+                for model, gate in self._gates.items()
+            }
+            tags_age = time.time() - self._tags_at if self._tags is not None else None
+        return {
+            "base_url": self.base_url,
+            "keep_alive": self.keep_alive,
+            "keepwarm_running": bool(self._thread and self._thread.is_alive()),
+            "keepwarm_models": self.keepwarm_models,
+            **stats,
+            "tags_age_seconds": round(tags_age, 1) if tags_age is not None else None,
+            "models": gates,
+        }
+
+
+# Global client instance
+_ollama_client: Optional[OllamaClient] = None
+_ollama_client_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    """Get or create global Ollama client instance."""
+    global _ollama_client
+    if _ollama_client is None:
+        with _ollama_client_lock:
+            if _ollama_client is None:
+                _ollama_client = OllamaClient()
+    return _ollama_client
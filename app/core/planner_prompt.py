@@ -0,0 +1,252 @@
+"""
+Planner Prompt Builder
+Assembles the planner system prompt from the sections in
+settings.PLANNER_SECTIONS, keeping only the rules, view schemas and examples
+the question needs.
+
+Intents are read from the shared intent engine scan (prices, dividends,
+security profile, lists, passive income, ML, file uploads, greetings).
+Questions with no recognised intent get the full prompt, as does any request
+carrying its own planner_system override. When a pruned prompt produces SQL that fails
+sanitize_sql, the request handler re-plans once with the full prompt.
+
+Every assembled prompt comes with a token report (tiktoken when installed,
+~4 chars/token otherwise).
+
+Expected Results:
+- 40-70% fewer planner prompt tokens on price / dividend lookups
+- Same plans on the common paths; full prompt on anything ambiguous
+"""
+
+import os
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.config.settings import PLANNER_SECTIONS, PLANNER_SYSTEM_DEFAULT
+from app.core.intent_engine import get_intent_engine, scan
+from app.utils.helpers import is_greeting_only
+
+logger = logging.getLogger("planner_prompt")
+
+PLANNER_PROMPT_PRUNING_ENABLED = os.getenv("PLANNER_PROMPT_PRUNING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+DATA_INTENTS = frozenset({"prices", "dividends", "profile"})
+
+# Intents specific enough to prune on; anything else gets the full prompt
+PRUNABLE_INTENTS = DATA_INTENTS | {"lists", "passive_income", "upload", "greeting"}
+
+# Intent -> trigger keywords (substring semantics, lowercased question)
+PLANNER_INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "prices": [
+        "price", "quote", "bid", "ask", "spread", "volume", "trading", "trade", "intraday",
+        "change percent", "% change", "chart", "trend", "worth", "cost", "yield",
+    ],
+    "dividends": [
+        "dividend", "distribution", "payout", "ex-div", "ex div", "ex-date", "ex date", "record date",
+        "payment", "paid", "pays", "payer", "declar", "yield", "income", "aristocrat", "drip",
+        "frequency", "monthly", "quarterly",
+    ],
+    "profile": [
+        "sector", "industry", "company", "exchange", "expense ratio", "sec yield", "country",
+        "inception", "benchmark", "description", "website", "etf", "fund", "reit", "security type",
+        "about",
+    ],
+    "lists": ["portfolio", "watchlist", "watch list", "passive list"],
+    "passive_income": [
+        "passive income", "retirement income", "dividend portfolio", "replace my income",
+        "financial independence", "live off dividends",
+    ],
+    "ml": [
+        "stocks like", "similar to", "optimiz", "ml score", "rate ", "sustainab", "cut risk",
+        "dividend safety", "forecast", "predict",
+    ],
+}
+
+# Section -> intents that need it (None: always sent). Order follows PLANNER_SECTIONS.
+SECTION_INTENTS: Dict[str, Optional[FrozenSet[str]]] = {
+    "core": None,
+    "multipart": frozenset({"upload"}),
+    "portfolio_lists": frozenset({"lists"}),
+    "passive_income": frozenset({"passive_income"}),
+    "ml_features": frozenset({"ml"}),
+    "fintech": None,
+    "date_context": None,
+    "absolute_rules": None,
+    "price_defaults": frozenset({"prices"}),
+    "dividend_defaults": frozenset({"prices", "dividends"}),
+    "price_format": frozenset({"prices"}),
+    "dividend_format": frozenset({"dividends"}),
+    "history_defaults": frozenset({"prices", "dividends"}),
+    "date_ranges": frozenset({"prices", "dividends"}),
+    "us_market": frozenset({"dividends", "profile"}),
+    "multi_ticker": None,
+    "out_of_scope": None,
+    "schema": DATA_INTENTS,
+    "schema_vTickers": frozenset({"profile"}),
+    "schema_vDividends": frozenset({"dividends"}),
+    "schema_vPrices": frozenset({"prices"}),
+    "examples": frozenset({"prices", "dividends"}),
+    "examples_prices": frozenset({"prices"}),
+    "examples_dividends": frozenset({"dividends"}),
+    "examples_dividends_enhanced": frozenset({"dividends"}),
+}
+
+_intent_engine = get_intent_engine()
+for _intent, _keywords in PLANNER_INTENT_KEYWORDS.items():
+    _intent_engine.register_keywords(f"planner:{_intent}", _keywords)
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating planner tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text` (tiktoken cl100k_base, or ~4 chars per token)."""
+    enc = _encoder()
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=None)
+def _section_tokens(name: str) -> int:
+    return count_tokens(PLANNER_SECTIONS[name])
+
+
+class PlannerPromptBuilder:
+    """
+    Intent-scoped planner prompt assembly.
+
+    Features:
+    - Per-view schema and per-intent rule/example sections
+    - Full prompt for ambiguous questions and explicit overrides
+    - Token report per prompt and running savings statistics
+    """
+
+    def __init__(self, enabled: bool = PLANNER_PROMPT_PRUNING_ENABLED):
+        """
+        Initialize the builder.
+
+        Args:
+            enabled: When False every question gets the full prompt
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.stats = {
+            "prompts": 0,
+            "pruned": 0,
+            "full": 0,
+            "full_prompt_fallbacks": 0,
+            "tokens_sent": 0,
+            "tokens_saved": 0,
+        }
+
+    def detect_intents(self, question: str, tickers: List[str], has_upload: bool = False) -> FrozenSet[str]:
+        """Planner intents of a question."""
+        signals = scan(question)
+        intents = {intent for intent in PLANNER_INTENT_KEYWORDS if signals.has(f"planner:{intent}")}
+        if has_upload:
+            intents.add("upload")
+        if not intents and not tickers and is_greeting_only(question):
+            intents.add("greeting")
+        if tickers and not intents & DATA_INTENTS and intents & {"lists", "ml"}:
+            # "rate KO" / "KO in my portfolio": keep the data schemas in reach
+            intents |= DATA_INTENTS
+        return frozenset(intents)
+
+    def select_sections(self, intents: FrozenSet[str]) -> List[str]:
+        """Section names for a set of intents, in prompt order."""
+        return [
+            name for name in PLANNER_SECTIONS
+            if SECTION_INTENTS.get(name) is None or SECTION_INTENTS[name] & intents
+        ]
+
+    def build(self, question: str, tickers: List[str], has_upload: bool = False,
+              user_system: str = "") -> Tuple[str, Dict[str, Any]]:
+        """
+        Assemble the planner prompt for a question.
+
+        Args:
+            question: User question (as sent to the planner)
+            tickers: Tickers extracted from the question
+            has_upload: The question carries uploaded file/image text
+            user_system: Caller system prompt appended to the planner prompt
+
+        Returns:
+            (prompt, report) where report lists intents, sections and token counts
+        """
+        intents = self.detect_intents(question, tickers, has_upload)
+        if self.enabled and intents & PRUNABLE_INTENTS:
+            sections = self.select_sections(intents)
+        else:
+            # Nothing recognisable (or pruning off): the full prompt is the safe choice
+            sections = list(PLANNER_SECTIONS)
+        pruned = len(sections) < len(PLANNER_SECTIONS)
+
+        prompt = "".join(PLANNER_SECTIONS[name] for name in sections) if pruned else PLANNER_SYSTEM_DEFAULT
+        full_tokens = sum(_section_tokens(name) for name in PLANNER_SECTIONS)
+        tokens = sum(_section_tokens(name) for name in sections)
+        if user_system:
+            prompt = prompt + "\n\n" + user_system
+            extra = count_tokens("\n\n" + user_system)
+            tokens += extra
+            full_tokens += extra
+
+        report = {
+            "pruned": pruned,
+            "intents": sorted(intents),
+            "sections": sections,
+            "tokens": tokens,
+            "full_tokens": full_tokens,
+            "saved_tokens": full_tokens - tokens,
+        }
+        with self._lock:
+            self.stats["prompts"] += 1
+            self.stats["pruned" if pruned else "full"] += 1
+            self.stats["tokens_sent"] += tokens
+            self.stats["tokens_saved"] += full_tokens - tokens
+        logger.info(f"Planner prompt: {tokens}/{full_tokens} tokens, intents={report['intents']}, "
+                    f"{len(sections)}/{len(PLANNER_SECTIONS)} sections")
+        return prompt, report
+
+    def full_prompt(self, user_system: str = "") -> str:
+        """Full planner prompt, used to re-plan after a pruned plan failed sanitize_sql."""
+        with self._lock:
+            self.stats["full_prompt_fallbacks"] += 1
+        if user_system:
+            return PLANNER_SYSTEM_DEFAULT + "\n\n" + user_system
+        return PLANNER_SYSTEM_DEFAULT
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get builder statistics for monitoring."""
+        with self._lock:
+            stats = dict(self.stats)
+        sent, saved = stats["tokens_sent"], stats["tokens_saved"]
+        return {
+            "enabled": self.enabled,
+            **stats,
+            "avg_prompt_tokens": sent / stats["prompts"] if stats["prompts"] else 0.0,
+            "token_savings_rate": saved / (sent + saved) if sent + saved else 0.0,
+            "full_prompt_tokens": sum(_section_tokens(name) for name in PLANNER_SECTIONS),
+            "section_tokens": {name: _section_tokens(name) for name in PLANNER_SECTIONS},
+        }
+
+
+# Global builder instance
+_planner_prompt_builder: Optional[PlannerPromptBuilder] = None
+
+
+def get_planner_prompt_builder() -> PlannerPromptBuilder:
+    """Get or create global planner prompt builder instance."""
+    global _planner_prompt_builder
+    if _planner_prompt_builder is None:
+        _planner_prompt_builder = PlannerPromptBuilder()
+    return _planner_prompt_builder
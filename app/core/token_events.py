@@ -0,0 +1,200 @@
+"""
+Token Events
+Internal representation of a streamed answer, from provider to controller.
+
+Answer pipelines yield TokenEvents instead of SSE text. The controller collects
+content straight from the events and serializes to OpenAI-style SSE exactly
+once, at the edge, after small deltas have been coalesced into larger frames.
+
+Coalescing:
+- The first delta of a stream is sent immediately (time-to-first-token is untouched)
+- Later deltas are batched for SSE_COALESCE_MIN_MS, widening to SSE_COALESCE_MAX_MS
+  while the stream is busy, or until SSE_COALESCE_MAX_CHARS are buffered
+- Non-delta events flush the batch and pass through in order
+"""
+
+import os
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+
+SSE_COALESCE_MIN_MS = int(os.getenv("SSE_COALESCE_MIN_MS", "20"))
+SSE_COALESCE_MAX_MS = int(os.getenv("SSE_COALESCE_MAX_MS", "40"))
+SSE_COALESCE_MAX_CHARS = int(os.getenv("SSE_COALESCE_MAX_CHARS", "512"))
+
+# A batch with at least this many deltas counts as "busy" and widens the window
+_BUSY_BATCH_DELTAS = 4
+
+
+@dataclass(frozen=True)
+class TokenEvent:
+    """One step of a streamed answer."""
+    kind: str  # "role" | "delta" | "meta" | "done"
+    content: str = ""
+    data: Optional[Dict[str, Any]] = None
+
+
+ROLE_EVENT = TokenEvent("role")
+DONE_EVENT = TokenEvent("done")
+
+
+def meta_event(**data: Any) -> TokenEvent:
+    """Out-of-band payload sent as top-level chunk fields (e.g. video_metadata)."""
+    return TokenEvent("meta", data=data)
+
+
+async def text_events(text_chunks: AsyncIterable[str]) -> AsyncIterator[TokenEvent]:
+    """Turn plain text chunks into a role / delta... / done event stream."""
+    yield ROLE_EVENT
+    async for piece in text_chunks:
+        if piece:
+            yield TokenEvent("delta", piece)
+    yield DONE_EVENT
+
+
+async def fallback_text_events(
+    text_chunks: AsyncIterable[str],
+    fallback: Callable[[], Awaitable[AsyncIterable[TokenEvent]]],
+    on_partial_failure: Callable[[BaseException], None]
+) -> AsyncIterator[TokenEvent]:
+    """
+    text_events for a provider that can fail mid-stream.
+
+    A failure before the first text chunk hands the request to fallback().
+    After part of the answer has been sent it cannot be retried, so
+    on_partial_failure(error) is called (callers mark the answer uncacheable)
+    and the stream ends with an error note.
+    """
+    yield ROLE_EVENT
+    sent_text = False
+    try:
+        async for piece in text_chunks:
+            if piece:
+                sent_text = True
+                yield TokenEvent("delta", piece)
+    except Exception as e:
+        if sent_text:
+            on_partial_failure(e)
+            yield TokenEvent("delta", f"\n\n**Error**: The response was interrupted: {e}\n")
+            yield DONE_EVENT
+            return
+        async for event in await fallback():
+            if event.kind != "role":
+                yield event
+        return
+    yield DONE_EVENT
+
+
+async def collect_text(events: AsyncIterable[TokenEvent]) -> str:
+    """Drain an event stream and return the answer text."""
+    return "".join([ev.content async for ev in events if ev.kind == "delta"])
+
+
+class SSEEncoder:
+    """Serializes TokenEvents to OpenAI chat.completion.chunk SSE frames for one response."""
+
+    def __init__(self, req_id: str):
+        self.req_id = req_id
+        self._delta_prefix = (
+            b'data: {"id":' + orjson.dumps(req_id)
+            + b',"object":"chat.completion.chunk","choices":[{"delta":{"content":'
+        )
+
+    def encode(self, event: TokenEvent) -> bytes:
+        if event.kind == "delta":
+            return self._delta_prefix + orjson.dumps(event.content) + b"}}]}\n\n"
+        if event.kind == "done":
+            return b"data: [DONE]\n\n"
+        if event.kind == "role":
+            chunk = {"id": self.req_id, "object": "chat.completion.chunk", "choices": [{"delta": {"role": "assistant"}}]}
+        else:
+            chunk = {"id": self.req_id, "object": "chat.completion.chunk", **(event.data or {})}
+        return b"data: " + orjson.dumps(chunk) + b"\n\n"
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_END = object()
+
+
+async def coalesce_deltas(
+    events: AsyncIterable[TokenEvent],
+    min_ms: int = SSE_COALESCE_MIN_MS,
+    max_ms: int = SSE_COALESCE_MAX_MS,
+    max_chars: int = SSE_COALESCE_MAX_CHARS
+) -> AsyncIterator[TokenEvent]:
+    """
+    Merge runs of small delta events into fewer, larger deltas.
+
+    Upstream is read by a helper task so a batch is flushed on time even while
+    the provider is silent.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for ev in events:
+                queue.put_nowait(ev)
+            queue.put_nowait(_END)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            queue.put_nowait(_Failure(e))
+
+    task = loop.create_task(pump())
+    window = min_ms / 1000
+    pending: List[str] = []
+    pending_chars = 0
+    deadline = 0.0
+    sent_first = False
+
+    def take() -> TokenEvent:
+        nonlocal pending, pending_chars, window
+        window = (max_ms if len(pending) >= _BUSY_BATCH_DELTAS else min_ms) / 1000
+        merged = TokenEvent("delta", "".join(pending))
+        pending, pending_chars = [], 0
+        return merged
+
+    try:
+        while True:
+            if pending:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    yield take()
+                    continue
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield take()
+                    continue
+            else:
+                item = await queue.get()
+
+            if isinstance(item, TokenEvent) and item.kind == "delta":
+                if not sent_first:
+                    sent_first = True
+                    yield item
+                    continue
+                if not pending:
+                    deadline = loop.time() + window
+                pending.append(item.content)
+                pending_chars += len(item.content)
+                if pending_chars >= max_chars:
+                    yield take()
+                continue
+
+            if pending:
+                yield take()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        task.cancel()
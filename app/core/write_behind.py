@@ -0,0 +1,478 @@
+"""
+Write-Behind Queue
+Takes non-critical request-path database writes off the request path.
+
+Callers submit (SQL, params) records instead of opening a connection:
+- Records go into a bounded in-memory queue; when it is full the new record
+  is dropped and counted rather than blocking the request
+- A background thread flushes up to WRITE_BEHIND_BATCH_SIZE records every
+  WRITE_BEHIND_FLUSH_INTERVAL seconds, in one transaction, sending all records
+  with the same SQL as one executemany (fast_executemany on pyodbc). Records of
+  one statement keep their order; different statements are not ordered
+  relative to each other, so each submitted write must stand on its own
+- Connectivity failures are retried with exponential backoff; when retries
+  run out the batch is appended to a local JSONL spill file and later batches
+  go straight to the file until a periodic probe write succeeds, at which
+  point the file is replayed (also replayed on startup). Every worker process
+  shares the file: appends and the replay hand-off hold an flock on
+  "<spill>.lock", and a replaying process first moves the records into its
+  own "<spill>.replay.<pid>.<queue>" file, so each spilled record is replayed once
+- An unexpected error in the flusher is logged and the loop keeps running
+- A record the database rejects (constraint, bad data) is isolated by
+  writing the batch row by row and is dropped alone
+- stop() drains the queue on shutdown, spilling whatever cannot be written
+- submit(on_written=...) runs a callback once the record is in the database
+  (not for records that are dropped, rejected or spilled)
+
+Only writes whose loss or short delay is acceptable belong here: assistant
+replies, analytics events, feedback side tables and audit logs. With
+WRITE_BEHIND_ENABLED=false submit() writes synchronously instead.
+
+Expected Results:
+- Chat turns no longer pay a connection checkout + commit per side write
+- Side writes arrive in a handful of batched round trips per second
+"""
+
+import os
+import glob
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.llm_hedging import LatencyHistogram
+
+try:
+    import fcntl
+    _HAS_FCNTL = True
+except ImportError:  # Windows: spill files are not coordinated between processes
+    _HAS_FCNTL = False
+
+logger = logging.getLogger("write_behind")
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "4"))
+WRITE_BEHIND_BACKOFF_BASE = float(os.getenv("WRITE_BEHIND_BACKOFF_BASE", "0.5"))
+WRITE_BEHIND_BACKOFF_MAX = float(os.getenv("WRITE_BEHIND_BACKOFF_MAX", "30"))
+WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT", "10"))
+WRITE_BEHIND_SPILL_PATH = os.getenv("WRITE_BEHIND_SPILL_PATH", "logs/write_behind_spill.jsonl")
+
+FLUSH_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+# (statement name, SQL, params)
+Record = Tuple[str, str, Dict[str, Any]]
+
+
+def _encode_param(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_param(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "$datetime" in value:
+            return datetime.fromisoformat(value["$datetime"])
+        if "$date" in value:
+            return date.fromisoformat(value["$date"])
+    return value
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _is_connectivity_error(exc: Exception) -> bool:
+    """True when the failure says nothing about the rows (database unreachable, pool timeout)."""
+    try:
+        from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+    except ImportError:
+        return True
+    if isinstance(exc, DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+    return True
+
+
+def engine_writer(engine) -> Callable[[List[Record]], None]:
+    """Batch writer for a SQLAlchemy engine: one transaction, one executemany per statement."""
+    from sqlalchemy import text
+
+    def write(batch: List[Record]):
+        by_sql: Dict[str, List[Dict[str, Any]]] = {}
+        for _, sql, params in batch:
+            by_sql.setdefault(sql, []).append(params)
+        with engine.connect() as conn:
+            # The shared engine autocommits; a batch must commit or roll back as a whole
+            conn = conn.execution_options(isolation_level="READ COMMITTED")
+            with conn.begin():
+                for sql, params in by_sql.items():
+                    conn.execute(text(sql), params if len(params) > 1 else params[0])
+    return write
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue of deferred writes with a single background flusher.
+
+    Features:
+    - Non-blocking submit; overflow drops the newest record and counts it
+    - Batched, transactional flushes with retry and exponential backoff
+    - Local spill file while the database is down, replayed on recovery
+    - Queue depth, flush latency, drop and spill counters for monitoring
+    """
+
+    def __init__(self, writer: Optional[Callable[[List[Record]], None]] = None,
+                 max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+                 max_retries: int = WRITE_BEHIND_MAX_RETRIES,
+                 backoff_base: float = WRITE_BEHIND_BACKOFF_BASE,
+                 backoff_max: float = WRITE_BEHIND_BACKOFF_MAX,
+                 spill_path: Optional[str] = WRITE_BEHIND_SPILL_PATH,
+                 enabled: bool = WRITE_BEHIND_ENABLED,
+                 is_transient: Callable[[Exception], bool] = _is_connectivity_error):
+        self._writer = writer
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max(1, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.spill_path = spill_path
+        self.enabled = enabled
+        self.is_transient = is_transient
+        self._queue: Deque[Record] = deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._wake = threading.Event()
+        self._degraded = False
+        self._retry_at = 0.0
+        self.flush_ms = LatencyHistogram(FLUSH_BUCKETS_MS)
+        self.stats = {
+            "submitted": 0,
+            "written": 0,
+            "batches": 0,
+            "dropped": 0,
+            "rejected_rows": 0,
+            "retries": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "errors": 0,
+        }
+        self._by_statement: Dict[str, Dict[str, int]] = {}
+        # id(params) -> callback for queued records that asked to hear about their write
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+
+    @property
+    def writer(self) -> Callable[[List[Record]], None]:
+        if self._writer is None:
+            from app.core.database import engine
+            self._writer = engine_writer(engine)
+        return self._writer
+
+    def submit(self, name: str, sql: str, params: Dict[str, Any],
+               on_written: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Queue a write. Returns False when the record was dropped because the queue is full.
+
+        on_written is called from the flusher thread after the record is committed.
+        When write-behind is disabled the record is written immediately and errors propagate.
+        """
+        if not self.enabled:
+            self.writer([(name, sql, params)])
+            if on_written is not None:
+                self._notify([on_written])
+            return True
+        with self._cond:
+            if self._stopping:
+                self._spill([(name, sql, params)])
+                return True
+            counters = self._by_statement.setdefault(name, {"submitted": 0, "dropped": 0})
+            if len(self._queue) >= self.max_queue:
+                self.stats["dropped"] += 1
+                counters["dropped"] += 1
+                if self.stats["dropped"] % 1000 == 1:
+                    logger.warning(f"Write-behind queue full ({self.max_queue}); dropped {name} write "
+                                   f"({self.stats['dropped']} dropped so far)")
+                return False
+            self._queue.append((name, sql, params))
+            if on_written is not None:
+                self._callbacks[id(params)] = on_written
+            self.stats["submitted"] += 1
+            counters["submitted"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _take_batch(self) -> List[Record]:
+        """Wait for a full batch, the flush interval or shutdown; return up to batch_size records."""
+        with self._cond:
+            if len(self._queue) < self.batch_size and not self._stopping:
+                self._cond.wait(self.flush_interval)
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _run(self):
+        try:
+            self._replay_spill()
+        except Exception as e:
+            logger.error(f"Write-behind startup replay failed: {e}", exc_info=True)
+        while True:
+            try:
+                batch = self._take_batch()
+                if batch:
+                    self._flush(batch)
+                elif self._stopping:
+                    return
+                elif self._degraded and time.monotonic() >= self._retry_at:
+                    self._probe()
+            except Exception as e:
+                # Never lose the flusher: later submits would silently stop being written
+                with self._cond:
+                    self.stats["errors"] += 1
+                logger.error(f"Write-behind flusher error: {e}", exc_info=True)
+                self._wake.wait(self.flush_interval)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.backoff_max, self.backoff_base * (2 ** attempt))
+
+    def _write(self, batch: List[Record]):
+        start = time.perf_counter()
+        self.writer(batch)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self.flush_ms.observe(elapsed_ms)
+            self.stats["batches"] += 1
+            self.stats["written"] += len(batch)
+            callbacks = self._pop_callbacks(batch)
+        self._notify(callbacks)
+
+    def _pop_callbacks(self, batch: List[Record]) -> List[Callable[[], None]]:
+        if not self._callbacks:
+            return []
+        callbacks = (self._callbacks.pop(id(params), None) for _, _, params in batch)
+        return [callback for callback in callbacks if callback is not None]
+
+    def _forget(self, batch: List[Record]):
+        """Records that will not be written by this queue never report back."""
+        with self._cond:
+            self._pop_callbacks(batch)
+
+    def _notify(self, callbacks: List[Callable[[], None]]):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Write-behind on_written callback failed: {e}")
+
+    def _flush(self, batch: List[Record]) -> bool:
+        """Write a batch, retrying connectivity failures; spill it when the database stays down."""
+        if self._degraded and (self._stopping or time.monotonic() < self._retry_at):
+            self._spill(batch)
+            return False
+        attempts = 1 if (self._degraded or self._stopping) else self.max_retries
+        for attempt in range(attempts):
+            try:
+                self._write(batch)
+            except Exception as e:
+                with self._cond:
+                    self.stats["errors"] += 1
+                if not self.is_transient(e):
+                    self._write_rows(batch, e)
+                    return True
+                if attempt + 1 < attempts:
+                    with self._cond:
+                        self.stats["retries"] += 1
+                    logger.info(f"Write-behind flush of {len(batch)} records failed ({e}); retrying")
+                    self._wake.wait(self._backoff(attempt))
+                    continue
+                logger.warning(f"Write-behind flush failed, spilling {len(batch)} records: {e}")
+                self._spill(batch)
+                self._degraded = True
+                self._retry_at = time.monotonic() + self.backoff_max
+                return False
+            if self._degraded:
+                self._degraded = False
+                logger.info("Write-behind database writes recovered")
+                self._replay_spill()
+            return True
+        return False
+
+    def _write_rows(self, batch: List[Record], error: Exception):
+        """Isolate rejected records by writing the batch one record at a time."""
+        if len(batch) == 1:
+            with self._cond:
+                self.stats["rejected_rows"] += 1
+                self._pop_callbacks(batch)
+            logger.warning(f"Write-behind dropped rejected {batch[0][0]} write: {error}")
+            return
+        for record in batch:
+            try:
+                self._write([record])
+            except Exception as e:
+                if self.is_transient(e):
+                    self._spill([record])
+                else:
+                    with self._cond:
+                        self.stats["rejected_rows"] += 1
+                        self._pop_callbacks([record])
+                    logger.warning(f"Write-behind dropped rejected {record[0]} write: {e}")
+
+    def _probe(self):
+        """While degraded and idle, check whether spilled records can be written again."""
+        self._retry_at = time.monotonic() + self.backoff_max
+        if self.spill_path and os.path.exists(self.spill_path):
+            self._replay_spill()
+
+    @contextmanager
+    def _spill_locked(self):
+        """Hold the spill file for this thread and, on POSIX, against other worker processes."""
+        with self._spill_lock:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if not _HAS_FCNTL:
+                yield
+                return
+            with open(f"{self.spill_path}.lock", "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                yield  # closing the file releases the lock
+
+    def _spill(self, batch: List[Record]):
+        self._forget(batch)
+        if not self.spill_path:
+            with self._cond:
+                self.stats["dropped"] += len(batch)
+            return
+        try:
+            with self._spill_locked():
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for name, sql, params in batch:
+                        f.write(json.dumps({
+                            "name": name,
+                            "sql": sql,
+                            "params": {k: _encode_param(v) for k, v in params.items()},
+                        }) + "\n")
+            with self._cond:
+                self.stats["spilled"] += len(batch)
+        except Exception as e:
+            with self._cond:
+                self.stats["dropped"] += len(batch)
+            logger.error(f"Write-behind spill of {len(batch)} records failed: {e}")
+
+    def _replay_spill(self):
+        """Write spilled records back to the database; whatever fails stays spilled."""
+        if not self.spill_path:
+            return
+        replaying = f"{self.spill_path}.replay.{os.getpid()}.{id(self):x}"
+        with self._spill_locked():
+            # Replays interrupted in processes that are gone come first, then the spill file;
+            # another live worker's replay file is that worker's to finish
+            sources = []
+            for path in sorted(glob.glob(f"{glob.escape(self.spill_path)}.replay*")):
+                owner = path[len(self.spill_path) + len(".replay."):].split(".")[0]
+                if path != replaying and (not owner.isdigit() or not _pid_alive(int(owner))):
+                    sources.append(path)
+            if os.path.exists(self.spill_path):
+                sources.append(self.spill_path)
+            if not sources and not os.path.exists(replaying):
+                return
+            if sources:
+                with open(replaying, "a", encoding="utf-8") as dst:
+                    for path in sources:
+                        with open(path, "r", encoding="utf-8") as src:
+                            dst.write(src.read())
+                        os.remove(path)
+        records: List[Record] = []
+        with open(replaying, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    records.append((entry["name"], entry["sql"],
+                                    {k: _decode_param(v) for k, v in entry["params"].items()}))
+                except (ValueError, KeyError):
+                    continue
+        os.remove(replaying)
+        logger.info(f"Write-behind replaying {len(records)} spilled records")
+        was_degraded, self._degraded = self._degraded, False
+        for i in range(0, len(records), self.batch_size):
+            batch = records[i:i + self.batch_size]
+            try:
+                self._write(batch)
+            except Exception as e:
+                with self._cond:
+                    self.stats["errors"] += 1
+                if self.is_transient(e):
+                    self._spill(records[i:])
+                    self._degraded = True
+                    self._retry_at = time.monotonic() + self.backoff_max
+                    if not was_degraded:
+                        logger.warning(f"Write-behind replay failed, database unavailable: {e}")
+                    return
+                self._write_rows(batch, e)
+                continue
+            with self._cond:
+                self.stats["replayed"] += len(batch)
+
+    def stop(self, timeout: float = WRITE_BEHIND_DRAIN_TIMEOUT):
+        """Flush what is queued (one attempt per batch), spilling anything left after the timeout."""
+        with self._cond:
+            self._stopping = True
+            thread = self._thread
+            self._cond.notify_all()
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            leftover = list(self._queue)
+            self._queue.clear()
+        if leftover:
+            logger.warning(f"Write-behind drain timed out; spilling {len(leftover)} records")
+            self._spill(leftover)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, throughput, drop/spill counters and flush latency."""
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "queue_depth": len(self._queue),
+                "max_queue": self.max_queue,
+                "batch_size": self.batch_size,
+                "degraded": self._degraded,
+                **self.stats,
+                "flush_ms": self.flush_ms.snapshot(),
+                "statements": {name: dict(c) for name, c in self._by_statement.items()},
+            }
+
+
+_write_behind: Optional[WriteBehindQueue] = None
+_write_behind_lock = threading.Lock()
+
+
+def get_write_behind() -> WriteBehindQueue:
+    """Get the process-wide write-behind queue (writes through the shared engine)."""
+    global _write_behind
+    if _write_behind is None:
+        with _write_behind_lock:
+            if _write_behind is None:
+                _write_behind = WriteBehindQueue()
+    return _write_behind
@@ -1,13 +1,14 @@
 """
 Database Initialization and Performance Optimization
 
-Applies performance indexes on startup to optimize query performance.
+Applies schema migrations, including the performance indexes, on startup.
 """
 
 import logging
 from pathlib import Path
 from sqlalchemy import text
 from app.core.database import engine
+from app.core.migrations import is_already_exists
 
 logger = logging.getLogger("database_init")
 
@@ -16,7 +17,9 @@ def apply_performance_indexes():
     """
     Apply performance indexes to database.
     
-    Idempotent - safe to run multiple times.
+    Idempotent - safe to run multiple times. Each GO batch runs in its own
+    transaction; batches whose index already exists are skipped, and any other
+    failure makes the result False so the migration is retried.
     """
     try:
         logger.info("Applying performance indexes...")
@@ -32,17 +35,23 @@ def apply_performance_indexes():
         
         # Execute SQL script
         # Note: SQL Server requires GO statements to be handled separately
-        batches = sql_script.split('GO')
+        batches = [batch.strip() for batch in sql_script.split('GO') if batch.strip()]
         
-        with engine.begin() as conn:
-            for batch in batches:
-                batch = batch.strip()
-                if batch:
-                    try:
-                        conn.execute(text(batch))
-                    except Exception as e:
-                        # Log but continue (indexes might already exist)
-                        logger.debug(f"Index creation note: {e}")
+        failed = 0
+        for batch in batches:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(batch))
+            except Exception as e:
+                if is_already_exists(e):
+                    logger.debug(f"Index creation note: {e}")
+                    continue
+                failed += 1
+                logger.error(f"Performance index batch failed: {str(e)[:200]}")
+        
+        if failed:
+            logger.error(f"{failed} of {len(batches)} performance index batch(es) failed")
+            return False
         
         logger.info("✓ Performance indexes applied successfully")
         return True
@@ -54,15 +63,19 @@ def apply_performance_indexes():
 
 def initialize_database():
     """
-    Initialize database with performance optimizations.
+    Initialize database: apply pending schema migrations (views, tables and
+    the performance indexes above; see app/core/migrations.py).
     
-    Call this on application startup.
+    Call this on application startup. When the schema is current this is a
+    single SELECT against dbo.schema_migrations.
     """
     try:
+        from app.core.migrations import ensure_schema
         logger.info("Initializing database...")
         
-        # Apply performance indexes
-        apply_performance_indexes()
+        if not ensure_schema():
+            logger.warning("Database schema is not current; see /admin/db/migrations")
+            return False
         
         logger.info("✓ Database initialization complete")
         return True
@@ -8,6 +8,8 @@ to display during streaming responses.
 import re
 import logging
 
+from app.core.intent_engine import get_intent_engine, scan
+
 logger = logging.getLogger(__name__)
 
 # Status message mappings based on query keywords
@@ -206,6 +208,23 @@ STATUS_MAPPINGS = {
 }
 
 
+# Keywords by match priority: longest first, so "dividend aristocrat" beats "dividend"
+_STATUS_PRIORITY = {
+    keyword: rank for rank, (keyword, _) in enumerate(sorted(
+        [(k, v) for k, v in STATUS_MAPPINGS.items() if k != "default"],
+        key=lambda x: len(x[0]),
+        reverse=True
+    ))
+}
+
+_intent_engine = get_intent_engine()
+_intent_engine.register_keywords("status", _STATUS_PRIORITY)
+_intent_engine.register_keywords("status:distribution", ["distribution"])
+_intent_engine.register_keywords("status:fundamental", ["fundamental"])
+_intent_engine.register_keywords("status:ex_dividend", ["ex-dividend", "ex dividend"])
+_intent_engine.register_keywords("status:safety", ["safety", "cut", "suspend"])
+
+
 def detect_status_message(query: str) -> str:
     """
     Detect appropriate status message based on query content.
@@ -219,7 +238,7 @@ def detect_status_message(query: str) -> str:
     if not query:
         return STATUS_MAPPINGS["default"]
     
-    query_lower = query.lower()
+    signals = scan(query)
     
     # First check for ticker patterns ($TICKER or #TICKER)
     ticker_pattern = r'[\$#]([A-Z]{1,5})'
@@ -229,30 +248,25 @@ def detect_status_message(query: str) -> str:
         logger.info(f"Status detector: Found ticker {ticker}")
         
         # Context-specific ticker messages
-        if "distribution" in query_lower or "distributions" in query_lower:
+        if signals.has("status:distribution"):
             return f"Checking {ticker} distributions..."
-        elif "fundamental" in query_lower or "fundamentals" in query_lower:
+        elif signals.has("status:fundamental"):
             return f"Pulling {ticker} fundamentals..."
-        elif "ex-dividend" in query_lower or "ex dividend" in query_lower:
+        elif signals.has("status:ex_dividend"):
             return "Finding ex-dividend dates..."
-        elif "safety" in query_lower or "cut" in query_lower or "suspend" in query_lower:
+        elif signals.has("status:safety"):
             return "Evaluating dividend safety..."
         else:
             # Default ticker message
             return f"Pulling {ticker} fundamentals..."
     
-    # Sort keywords by length (longest first) to match most specific phrases
-    # This ensures "dividend aristocrat" matches before "dividend"
-    sorted_keywords = sorted(
-        [(k, v) for k, v in STATUS_MAPPINGS.items() if k != "default"],
-        key=lambda x: len(x[0]),
-        reverse=True
-    )
-    
-    for keyword, status_msg in sorted_keywords:
-        if keyword in query_lower:
-            logger.info(f"Status detector: Matched keyword '{keyword}' → '{status_msg}'")
-            return status_msg
+    # Most specific (longest) matched phrase wins
+    hits = signals.hits("status")
+    if hits:
+        keyword = min(hits, key=_STATUS_PRIORITY.__getitem__)
+        status_msg = STATUS_MAPPINGS[keyword]
+        logger.info(f"Status detector: Matched keyword '{keyword}' → '{status_msg}'")
+        return status_msg
     
     # Default fallback
     logger.info("Status detector: Using default status message")
@@ -11,7 +11,7 @@ from decimal import Decimal
 from typing import Dict, List, Any
 import logging
 
-from app.core.database import engine
+from app.core.db_async import with_connection
 
 router = APIRouter(prefix="/data-quality", tags=["data-quality"])
 logger = logging.getLogger(__name__)
@@ -32,9 +32,8 @@ async def get_data_quality_report():
             'low_confidence': [],
             'duplicates': []
         }
-        stats = {}
         
-        with engine.connect() as conn:
+        def collect(conn):
             # Analyze dividend amounts
             query = text("""
                 SELECT 
@@ -169,7 +168,7 @@ async def get_data_quality_report():
             result = conn.execute(query)
             row = result.fetchone()
             
-            stats = {
+            return {
                 'total_records': row.total_records,
                 'unique_tickers': row.unique_tickers,
                 'avg_dividend': float(row.avg_dividend) if row.avg_dividend else 0,
@@ -178,6 +177,8 @@ async def get_data_quality_report():
                 'avg_confidence': float(row.avg_confidence) if row.avg_confidence else 0
             }
         
+        stats = await with_connection(collect)
+        
         # Format report
         report = []
         report.append("=" * 80)
@@ -278,7 +279,7 @@ async def get_data_quality_issues_json():
             'duplicates': []
         }
         
-        with engine.connect() as conn:
+        def collect(conn):
             # Unrealistic amounts
             query = text("""
                 SELECT TOP 100
@@ -304,6 +305,8 @@ async def get_data_quality_issues_json():
                     'confidence': float(row.Confidence_Score) if row.Confidence_Score else 0
                 })
         
+        await with_connection(collect)
+        
         return JSONResponse(content={
             'timestamp': datetime.now().isoformat(),
             'issues': issues,
@@ -381,6 +381,102 @@ async def get_model_usage_stats():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/models/latency")
+async def get_model_latency_stats():
+    """
+    Get per-model streaming latency (TTFT, tokens/sec) and request hedging statistics.
+    """
+    try:
+        from app.core.llm_hedging import get_llm_hedger
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **get_llm_hedger().get_stats()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting model latency stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/models/ollama")
+async def get_ollama_stats():
+    """
+    Get local Ollama client statistics: keep-warm pings, per-model queueing and tag cache.
+    """
+    try:
+        from app.core.ollama_client import get_ollama_client
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **get_ollama_client().get_stats()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting Ollama stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/models/admission")
+async def get_model_admission_stats():
+    """
+    Get per-deployment LLM admission control statistics: in-flight calls, queue depth
+    per priority class, token budget and queue-wait percentiles.
+    """
+    try:
+        from app.core.admission_control import get_llm_admission
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **get_llm_admission().get_stats()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting LLM admission stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/models/routing")
+async def get_model_routing_stats(
+    limit: int = Query(50, description="Number of recent routing decisions to return")
+):
+    """
+    Get live per-model routing statistics and recent adaptive routing decisions.
+    
+    Decisions include the statistics they were made with, so they can be fed
+    to scripts/replay_routing.py.
+    """
+    try:
+        from app.core.model_router import router as model_router
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **model_router.get_adaptive_stats(limit=limit)
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting model routing stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/models/planner-prompt")
+async def get_planner_prompt_stats():
+    """
+    Get planner prompt pruning statistics (prompt sizes, tokens saved, full-prompt retries).
+    """
+    try:
+        from app.core.planner_prompt import get_planner_prompt_builder
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **get_planner_prompt_builder().get_stats()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting planner prompt stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ======================== SYSTEM STATUS ENDPOINTS ========================
 
 @router.get("/status")
@@ -396,11 +492,9 @@ async def get_admin_status():
         
         # Check database connection
         try:
-            from app.database.connection import get_db_connection
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT 1")
-                db_status = "connected"
+            from app.core.db_async import fetch_scalar
+            await fetch_scalar("SELECT 1")
+            db_status = "connected"
         except:
             db_status = "disconnected"
         
@@ -433,9 +527,151 @@ async def get_admin_status():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/db/write-behind")
+async def get_write_behind_stats():
+    """
+    Get write-behind queue statistics: queue depth, flush latency, drops, retries and spills.
+    """
+    try:
+        from app.core.write_behind import get_write_behind
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **get_write_behind().get_stats()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting write-behind stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/db/executor")
+async def get_db_executor_stats():
+    """
+    Get async database executor statistics: workers, queue depth, wait/run latency and event-loop guard hits.
+    """
+    try:
+        from app.core.db_async import get_db_executor, get_loop_guard_stats
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **get_db_executor().get_stats(),
+            "loop_guard": get_loop_guard_stats()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting database executor stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/db/telemetry")
+async def get_db_telemetry_stats(top: int = 20):
+    """
+    Get database telemetry: slowest statement fingerprints, pool checkout/pre-ping cost and the slow-query log.
+    """
+    try:
+        from app.core.db_telemetry import get_db_telemetry
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **get_db_telemetry().get_stats(top=top)
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting database telemetry: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/db/telemetry/reset")
+async def reset_db_telemetry():
+    """
+    Reset database telemetry counters, histograms and the slow-query log.
+    """
+    try:
+        from app.core.db_telemetry import get_db_telemetry
+        
+        get_db_telemetry().reset()
+        
+        return {
+            "status": "success",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error resetting database telemetry: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/db/migrations")
+async def get_migration_status():
+    """
+    Get schema migration state: expected schema hash, applied/pending migrations and startup timings.
+    """
+    try:
+        from app.core.migrations import get_migration_runner
+        
+        runner = get_migration_runner()
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **runner.get_stats(),
+            "database": runner.status()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting migration status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/tickers/snapshot")
+async def get_ticker_snapshot_stats():
+    """
+    Get ticker universe snapshot statistics: symbol count, age, load timings and reloads.
+    """
+    try:
+        from app.utils.ticker_snapshot import get_ticker_universe
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            **get_ticker_universe().get_stats()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting ticker snapshot stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Get hit/miss statistics for the request-path caches.
+    """
+    try:
+        from app.services.plan_cache import get_plan_cache
+        from app.services.query_cache import get_query_cache
+        from app.services.request_coalescer import get_request_coalescer
+        from app.services.stream_resume import get_stream_resume_registry
+        from app.services.semantic_cache import get_semantic_cache
+        from app.services.conversation_service import get_conversation_tail_cache, get_conversation_compactor
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            "plan_cache": get_plan_cache().get_stats(),
+            "query_cache": get_query_cache().get_stats(),
+            "request_coalescer": get_request_coalescer().get_stats(),
+            "stream_resume": get_stream_resume_registry().get_stats(),
+            "semantic_cache": get_semantic_cache().get_stats(),
+            "conversation_history": get_conversation_tail_cache().get_stats(),
+            "conversation_compaction": get_conversation_compactor().get_stats(),
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/cache/clear")
 async def clear_cache(
-    cache_type: str = Query(..., description="Cache type: all, ml, query, dividend")
+    cache_type: str = Query(..., description="Cache type: all, ml, query, dividend, plan, semantic, history")
 ):
     """
     Clear specific cache types.
@@ -449,8 +685,8 @@ async def clear_cache(
             cleared.append("ml_cache")
         
         if cache_type in ["all", "query"]:
-            from app.services.query_cache import query_cache
-            query_cache.clear()
+            from app.services.query_cache import clear_query_cache
+            clear_query_cache()
             cleared.append("query_cache")
         
         if cache_type in ["all", "dividend"]:
@@ -459,6 +695,21 @@ async def clear_cache(
             service.cache.clear()
             cleared.append("dividend_cache")
         
+        if cache_type in ["all", "plan"]:
+            from app.services.plan_cache import get_plan_cache
+            get_plan_cache().clear()
+            cleared.append("plan_cache")
+        
+        if cache_type in ["all", "semantic"]:
+            from app.services.semantic_cache import get_semantic_cache
+            get_semantic_cache().clear()
+            cleared.append("semantic_cache")
+        
+        if cache_type in ["all", "history"]:
+            from app.services.conversation_service import get_conversation_tail_cache
+            get_conversation_tail_cache().clear()
+            cleared.append("conversation_history")
+        
         log_api_event("cache_cleared", {"cache_type": cache_type, "cleared": cleared})
         
         return {
@@ -472,6 +723,36 @@ async def clear_cache(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/cache/invalidate-views")
+async def invalidate_view_cache(
+    views: List[str] = Query(..., description="Views refreshed by ingestion, e.g. vDividends")
+):
+    """
+    Drop cached SQL results that read the given views (semantic-cache answers
+    built on them are retired too), in every worker: the new generations are
+    stored in dbo.view_generations, which the other workers poll.
+    
+    Intended to be called by ingestion jobs right after they refresh a view.
+    """
+    try:
+        from app.services.query_cache import invalidate_views
+        from app.core.db_async import run_db
+        
+        removed = await run_db(invalidate_views, views)
+        log_api_event("cache_views_invalidated", {"views": views, "removed": removed})
+        
+        return {
+            "status": "success",
+            "views": views,
+            "removed": removed,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error invalidating view cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ======================== HELPER FUNCTIONS ========================
 
 async def analyze_performance_logs(cutoff_time: datetime) -> Dict[str, Any]:
@@ -6,10 +6,12 @@ Endpoints for creating, managing, and monitoring natural language alerts.
 
 import logging
 from fastapi import APIRouter, HTTPException, Depends, Query
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, List
 
 from app.core.auth import verify_api_key
+from app.core.db_async import run_db
 from app.services import alert_service
 
 logging.basicConfig(level=logging.INFO)
@@ -62,7 +64,8 @@ async def create_alert(
             f"'{request.natural_language}'"
         )
         
-        result = alert_service.create_alert_from_natural_language(
+        result = await run_in_threadpool(
+            alert_service.create_alert_from_natural_language,
             session_id=request.session_id,
             natural_language=request.natural_language
         )
@@ -121,7 +124,8 @@ async def list_alerts(
     try:
         logger.info(f"Listing alerts for session {session_id} (active_only={active_only})")
         
-        alerts = alert_service.get_user_alerts(
+        alerts = await run_db(
+            alert_service.get_user_alerts,
             session_id=session_id,
             active_only=active_only
         )
@@ -167,7 +171,8 @@ async def list_alert_events(
             f"(unread_only={unread_only}, limit={limit})"
         )
         
-        events = alert_service.get_alert_events(
+        events = await run_db(
+            alert_service.get_alert_events,
             session_id=session_id,
             unread_only=unread_only,
             limit=limit
@@ -209,7 +214,7 @@ async def delete_alert(
     try:
         logger.info(f"Deleting alert {alert_id}")
         
-        success = alert_service.delete_alert(alert_id)
+        success = await run_db(alert_service.delete_alert, alert_id)
         
         if not success:
             raise HTTPException(
@@ -251,7 +256,7 @@ async def mark_alert_event_read(
     try:
         logger.info(f"Marking alert event {event_id} as read")
         
-        success = alert_service.mark_alert_event_read(event_id)
+        success = await run_db(alert_service.mark_alert_event_read, event_id)
         
         if not success:
             raise HTTPException(
@@ -298,7 +303,7 @@ async def check_alerts(
         else:
             logger.info("Manually checking all active alerts")
         
-        triggered = alert_service.check_alert_conditions(alert_id)
+        triggered = await run_db(alert_service.check_alert_conditions, alert_id)
         
         logger.info(f"Alert check complete: {len(triggered)} alerts triggered")
         
@@ -10,6 +10,7 @@ from typing import Optional, List
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 from app.services.feedback_service import feedback_service
+from app.core.db_async import run_db, fetch_all
 
 logger = logging.getLogger("feedback_routes")
 
@@ -56,7 +57,8 @@ async def submit_feedback(feedback: FeedbackRequest, request: Request):
         user_agent = request.headers.get("user-agent")
         
         # Record feedback
-        result = feedback_service.record_feedback(
+        result = await run_db(
+            feedback_service.record_feedback,
             response_id=feedback.response_id,
             sentiment=feedback.sentiment,
             request_id=feedback.request_id,
@@ -103,7 +105,8 @@ async def submit_simple_feedback(response_id: str, sentiment: str, request: Requ
         user_ip = request.client.host if request.client else None
         user_agent = request.headers.get("user-agent")
         
-        result = feedback_service.record_feedback(
+        result = await run_db(
+            feedback_service.record_feedback,
             response_id=response_id,
             sentiment=sentiment,
             user_ip=user_ip,
@@ -138,7 +141,7 @@ async def get_feedback_summary(days: int = 7):
     - success_rate: Percentage of positive feedback
     """
     try:
-        summary = feedback_service.get_feedback_summary(days=days)
+        summary = await run_db(feedback_service.get_feedback_summary, days=days)
         return summary
     except Exception as e:
         logger.error(f"Error getting feedback summary: {e}")
@@ -165,7 +168,8 @@ async def export_training_data(limit: int = 1000, min_quality: float = 0.8):
     ```
     """
     try:
-        training_data = feedback_service.export_training_data(
+        training_data = await run_db(
+            feedback_service.export_training_data,
             limit=limit,
             min_quality=min_quality
         )
@@ -194,48 +198,46 @@ async def get_response_patterns(min_responses: int = 10):
     - Array of response patterns with success rates
     """
     try:
-        from app.core.database import engine
         from sqlalchemy import text
         
-        with engine.begin() as conn:
-            results = conn.execute(
-                text("""
-                    SELECT 
-                        pattern_id,
-                        query_type,
-                        action_type,
-                        avg_rating,
-                        positive_feedback_count,
-                        negative_feedback_count,
-                        total_responses,
-                        success_rate,
-                        last_updated
-                    FROM successful_response_patterns
-                    WHERE total_responses >= :min_responses
-                    ORDER BY success_rate DESC, avg_rating DESC
-                """),
-                {"min_responses": min_responses}
-            ).fetchall()
-            
-            patterns = []
-            for row in results:
-                patterns.append({
-                    "pattern_id": row[0],
-                    "query_type": row[1],
-                    "action_type": row[2],
-                    "avg_rating": float(row[3]) if row[3] else None,
-                    "positive_feedback_count": row[4],
-                    "negative_feedback_count": row[5],
-                    "total_responses": row[6],
-                    "success_rate": float(row[7]) if row[7] else 0,
-                    "last_updated": str(row[8]) if row[8] else None
-                })
-            
-            return {
-                "success": True,
-                "patterns": patterns,
-                "count": len(patterns)
-            }
+        results = await fetch_all(
+            text("""
+                SELECT 
+                    pattern_id,
+                    query_type,
+                    action_type,
+                    avg_rating,
+                    positive_feedback_count,
+                    negative_feedback_count,
+                    total_responses,
+                    success_rate,
+                    last_updated
+                FROM successful_response_patterns
+                WHERE total_responses >= :min_responses
+                ORDER BY success_rate DESC, avg_rating DESC
+            """),
+            {"min_responses": min_responses}
+        )
+        
+        patterns = []
+        for row in results:
+            patterns.append({
+                "pattern_id": row[0],
+                "query_type": row[1],
+                "action_type": row[2],
+                "avg_rating": float(row[3]) if row[3] else None,
+                "positive_feedback_count": row[4],
+                "negative_feedback_count": row[5],
+                "total_responses": row[6],
+                "success_rate": float(row[7]) if row[7] else 0,
+                "last_updated": str(row[8]) if row[8] else None
+            })
+        
+        return {
+            "success": True,
+            "patterns": patterns,
+            "count": len(patterns)
+        }
     
     except Exception as e:
         logger.error(f"Error getting response patterns: {e}")
@@ -259,8 +261,8 @@ async def get_analytics_dashboard(days: int = 7):
     from app.services.feedback_analytics import feedback_analytics
     
     try:
-        metrics = feedback_analytics.get_dashboard_metrics(days=days)
-        suggestions = feedback_analytics.get_improvement_suggestions()
+        metrics = await run_db(feedback_analytics.get_dashboard_metrics, days=days)
+        suggestions = await run_db(feedback_analytics.get_improvement_suggestions)
         
         return {
             **metrics,
@@ -286,7 +288,7 @@ async def get_feedback_trends(days: int = 30):
     from app.services.feedback_analytics import feedback_analytics
     
     try:
-        trends = feedback_analytics.get_feedback_trends(days=days)
+        trends = await run_db(feedback_analytics.get_feedback_trends, days=days)
         return trends
     except Exception as e:
         logger.error(f"Error getting feedback trends: {e}")
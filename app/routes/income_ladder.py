@@ -10,6 +10,7 @@ from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 
 from app.core.auth import verify_api_key
+from app.core.db_async import run_db
 from app.services import income_ladder_service
 
 logging.basicConfig(level=logging.INFO)
@@ -63,7 +64,8 @@ async def build_income_ladder_endpoint(
             f"target=${request.target_monthly_income}/month, risk={request.risk_tolerance}"
         )
         
-        ladder = income_ladder_service.build_income_ladder(
+        ladder = await run_db(
+            income_ladder_service.build_income_ladder,
             session_id=request.session_id,
             target_monthly_income=request.target_monthly_income,
             risk_tolerance=request.risk_tolerance,
@@ -113,7 +115,7 @@ async def get_income_ladder(
     try:
         logger.info(f"Retrieving income ladder: {ladder_id}")
         
-        ladder = income_ladder_service.get_income_ladder(ladder_id)
+        ladder = await run_db(income_ladder_service.get_income_ladder, ladder_id)
         
         if not ladder:
             raise HTTPException(
@@ -172,7 +174,8 @@ async def list_user_ladders(
     try:
         logger.info(f"Listing income ladders for session: {session_id}")
         
-        ladders = income_ladder_service.get_user_income_ladders(
+        ladders = await run_db(
+            income_ladder_service.get_user_income_ladders,
             session_id=session_id,
             limit=limit
         )
@@ -6,10 +6,12 @@ Endpoints for retrieving and managing daily digests and portfolio insights.
 
 import logging
 from fastapi import APIRouter, HTTPException, Depends, Query
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, List
 
 from app.core.auth import verify_api_key
+from app.core.db_async import run_db
 from app.services import insights_service
 
 logging.basicConfig(level=logging.INFO)
@@ -53,12 +55,14 @@ async def get_insights(
         )
         
         if unread_only:
-            insights = insights_service.get_unread_insights(
+            insights = await run_db(
+                insights_service.get_unread_insights,
                 session_id=session_id,
                 limit=limit
             )
         else:
-            insights = insights_service.get_all_insights(
+            insights = await run_db(
+                insights_service.get_all_insights,
                 session_id=session_id,
                 limit=limit
             )
@@ -100,7 +104,7 @@ async def generate_digest(
     try:
         logger.info(f"Generating digest for session {request.session_id}")
         
-        result = insights_service.generate_daily_digest(request.session_id)
+        result = await run_in_threadpool(insights_service.generate_daily_digest, request.session_id)
         
         if not result.get("success", False):
             error_msg = result.get("message") or result.get("error", "Unknown error")
@@ -157,7 +161,7 @@ async def mark_insight_read(
     try:
         logger.info(f"Marking insight {insight_id} as read")
         
-        success = insights_service.mark_insight_read(insight_id)
+        success = await run_db(insights_service.mark_insight_read, insight_id)
         
         if not success:
             raise HTTPException(
@@ -222,7 +226,8 @@ async def create_portfolio_alert(
             "price_change": 5.5
         }
         
-        result = insights_service.generate_portfolio_alert(
+        result = await run_in_threadpool(
+            insights_service.generate_portfolio_alert,
             session_id=session_id,
             alert_type=alert_type,
             ticker=ticker,
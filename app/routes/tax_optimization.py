@@ -7,10 +7,12 @@ Endpoints for tax-efficient dividend investing strategies.
 import logging
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends, Query
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 
 from app.core.auth import verify_api_key
+from app.core.db_async import run_db, fetch_all
 from app.services import tax_optimization_service
 
 logging.basicConfig(level=logging.INFO)
@@ -61,7 +63,8 @@ async def analyze_portfolio_taxes(
             f"tax_bracket={request.user_tax_bracket}"
         )
         
-        result = tax_optimization_service.analyze_qualified_dividends(
+        result = await run_db(
+            tax_optimization_service.analyze_qualified_dividends,
             session_id=request.session_id,
             portfolio_tickers=request.portfolio_tickers,
             user_tax_bracket=request.user_tax_bracket
@@ -121,7 +124,8 @@ async def find_harvest_opportunities(
             f"min_loss=${request.min_loss_threshold}"
         )
         
-        result = tax_optimization_service.find_tax_loss_harvest_opportunities(
+        result = await run_db(
+            tax_optimization_service.find_tax_loss_harvest_opportunities,
             session_id=request.session_id,
             min_loss_threshold=request.min_loss_threshold,
             user_tax_bracket=request.user_tax_bracket
@@ -189,7 +193,8 @@ async def calculate_scenario(
             f"type={request.scenario_type}"
         )
         
-        result = tax_optimization_service.calculate_tax_scenario(
+        result = await run_db(
+            tax_optimization_service.calculate_tax_scenario,
             session_id=request.session_id,
             scenario_type=request.scenario_type,
             user_tax_bracket=request.user_tax_bracket,
@@ -202,14 +207,16 @@ async def calculate_scenario(
                 detail=result.get('error', 'Failed to calculate scenario')
             )
         
-        qualified_analysis = tax_optimization_service.analyze_qualified_dividends(
+        qualified_analysis = await run_db(
+            tax_optimization_service.analyze_qualified_dividends,
             session_id=request.session_id,
             user_tax_bracket=request.user_tax_bracket
         )
         
         harvest_analysis = None
         if request.scenario_type == 'harvest' or request.harvest_losses:
-            harvest_analysis = tax_optimization_service.find_tax_loss_harvest_opportunities(
+            harvest_analysis = await run_db(
+                tax_optimization_service.find_tax_loss_harvest_opportunities,
                 session_id=request.session_id,
                 min_loss_threshold=500,
                 user_tax_bracket=request.user_tax_bracket
@@ -263,7 +270,8 @@ async def get_recommendations(
     try:
         logger.info(f"Generating AI tax recommendations for session: {session_id}")
         
-        result = tax_optimization_service.get_tax_efficient_recommendations(
+        result = await run_in_threadpool(
+            tax_optimization_service.get_tax_efficient_recommendations,
             session_id=session_id,
             user_tax_bracket=user_tax_bracket
         )
@@ -306,7 +314,6 @@ async def list_tax_scenarios(
     """
     try:
         from sqlalchemy import text
-        from app.core.database import engine
         
         logger.info(f"Listing tax scenarios for session: {session_id}")
         
@@ -322,12 +329,10 @@ async def list_tax_scenarios(
             ORDER BY created_at DESC;
         """)
         
-        with engine.connect() as conn:
-            result = conn.execute(query, {
-                'session_id': session_id,
-                'limit': limit
-            })
-            rows = result.fetchall()
+        rows = await fetch_all(query, {
+            'session_id': session_id,
+            'limit': limit
+        })
         
         scenarios = []
         for row in rows:
@@ -10,6 +10,7 @@ from pydantic import BaseModel, Field
 import asyncio
 
 from app.core.auth import verify_api_key
+from app.core.db_async import run_db
 from app.services.training_ingestion_service import training_ingestion
 from app.services.bulk_profile_ingestion import bulk_ingestion
 from app.services.training_evaluation_service import training_evaluator, ExpertiseLevel
@@ -67,7 +68,8 @@ async def ingest_training_questions(
     This loads the 1,000+ predefined dividend questions plus investor profiling scenarios.
     """
     try:
-        result = training_ingestion.ingest_training_questions(
+        result = await run_db(
+            training_ingestion.ingest_training_questions,
             batch_size=request.batch_size,
             include_profiles=True  # Include investor profile questions
         )
@@ -144,7 +146,7 @@ async def get_training_status(api_key: str = Depends(verify_api_key)):
     Shows statistics on questions, responses, and training data quality.
     """
     try:
-        stats = training_ingestion.get_training_statistics()
+        stats = await run_db(training_ingestion.get_training_statistics)
         
         return JSONResponse({
             "success": True,
@@ -168,7 +170,7 @@ async def export_training_data(
     Returns data in OpenAI fine-tuning format.
     """
     try:
-        training_data = training_ingestion.export_training_data(min_quality=min_quality)
+        training_data = await run_db(training_ingestion.export_training_data, min_quality=min_quality)
         
         if not training_data:
             return JSONResponse({
@@ -284,7 +286,8 @@ async def _ingest_profile_questions(questions: List[Dict[str, Any]]):
         # Actually persist questions to the training database
         stored_count = 0
         for question_data in questions:
-            result = training_ingestion.store_training_question(
+            result = await run_db(
+                training_ingestion.store_training_question,
                 category=question_data.get("category", "investor_profile"),
                 question_text=question_data.get("question", ""),
                 complexity_level=question_data.get("complexity", 2)
@@ -569,7 +572,8 @@ async def export_quality_examples(
     """
     try:
         # Export evaluated responses that meet quality threshold
-        quality_examples = training_ingestion.export_evaluated_training_data(
+        quality_examples = await run_db(
+            training_ingestion.export_evaluated_training_data,
             min_quality=min_score,
             limit=limit
         )
@@ -694,7 +698,8 @@ async def _process_passive_income_questions(questions: List):
         stored_count = 0
         for q in questions:
             # Convert TrainingQuestion objects to database format
-            result = training_ingestion.store_training_question(
+            result = await run_db(
+                training_ingestion.store_training_question,
                 category=q.category if hasattr(q, 'category') else 'passive_income',
                 question_text=q.query if hasattr(q, 'query') else str(q),
                 complexity_level=q.complexity if hasattr(q, 'complexity') else 3
@@ -721,7 +726,8 @@ async def _process_passive_income_questions(questions: List):
                     
                     # Store evaluation results
                     if evaluation.overall_score >= 0.85:
-                        training_ingestion.store_evaluation_result(
+                        await run_db(
+                            training_ingestion.store_evaluation_result,
                             question_id=response_data.get("question_id"),
                             model_name=response_data.get("model"),
                             evaluation_scores={
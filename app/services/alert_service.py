@@ -14,7 +14,7 @@ from typing import List, Dict, Optional, Any
 from sqlalchemy import text
 
 from app.core.database import engine
-from app.core.llm_providers import oai_client, CHAT_MODEL
+from app.core.llm_providers import oai_chat_completion
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("alert_service")
@@ -104,8 +104,7 @@ Examples:
 
 Extract ticker symbols when mentioned. For portfolio-wide alerts, set ticker to null."""
 
-        response = oai_client.chat.completions.create(
-            model=CHAT_MODEL,
+        response = oai_chat_completion(
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": natural_language}
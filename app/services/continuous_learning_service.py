@@ -26,6 +26,7 @@ from app.core.database import engine
 from app.services.feedback_etl_service import feedback_etl_service
 from app.services.gemini_feedback_analyzer import gemini_feedback_analyzer
 from app.services.rlhf_dataset_builder import rlhf_dataset_builder
+from app.core.admission_control import llm_priority, PRIORITY_TRAINING
 
 logger = logging.getLogger("continuous_learning")
 
@@ -55,6 +56,7 @@ class ContinuousLearningService:
         self.logger = logger
         self.max_gemini_calls = max_gemini_calls_per_run
     
+    @llm_priority(PRIORITY_TRAINING)
     def run_learning_cycle(
         self,
         days: int = 7,
@@ -3,18 +3,38 @@ Conversational Memory Service for Harvey AI Financial Advisor
 
 Manages conversation sessions, threads, and message history with token budgeting.
 Stores every user-assistant interaction in the database for context-aware responses.
+
+Token counts are computed once, when a message is added, and persisted with it.
+History is selected by a windowed query that returns only the newest messages
+fitting the token budget. An in-process tail cache of recent messages per
+conversation serves consecutive turns without touching the database.
+
+Long conversations are compacted off the request path: once a conversation's
+live (uncompacted) messages pass a token threshold, a background worker
+summarizes the older turns into a stored summary message and marks them
+compacted, so history becomes summary + recent tail.
+
+bootstrap_turn does a chat turn's session/conversation upserts, user message
+insert and history read in one database round trip. Assistant replies are
+written through the write-behind queue.
 """
 
 import os
 import json
+import time
 import uuid
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional, Any
-from sqlalchemy import text
+from functools import lru_cache
+from typing import List, Dict, Optional, Any, Tuple
+from sqlalchemy import text, bindparam
 import tiktoken
 
 from app.core.database import engine
+from app.core.write_behind import get_write_behind
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("conversation_service")
@@ -23,6 +43,41 @@ DEFAULT_MODEL = "gpt-4"
 DEFAULT_MAX_TOKENS = 4000
 TOKEN_BUFFER = 500
 
+HISTORY_TAIL_CACHE_ENABLED = os.getenv("HISTORY_TAIL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_TAIL_CACHE_SIZE = int(os.getenv("HISTORY_TAIL_CACHE_SIZE", "2000"))
+# Entries expire so a turn served by another worker is picked up eventually
+HISTORY_TAIL_CACHE_TTL = int(os.getenv("HISTORY_TAIL_CACHE_TTL", "900"))
+HISTORY_TAIL_MAX_TOKENS = int(os.getenv("HISTORY_TAIL_MAX_TOKENS", str(DEFAULT_MAX_TOKENS * 2)))
+
+CONVERSATION_COMPACTION_ENABLED = os.getenv("CONVERSATION_COMPACTION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Compact once live messages exceed this many tokens...
+CONVERSATION_COMPACTION_THRESHOLD = int(os.getenv("CONVERSATION_COMPACTION_THRESHOLD", "6000"))
+# ...keeping the newest messages up to this many tokens verbatim
+CONVERSATION_COMPACTION_KEEP_TOKENS = int(os.getenv("CONVERSATION_COMPACTION_KEEP_TOKENS", "2000"))
+CONVERSATION_COMPACTION_WORKERS = int(os.getenv("CONVERSATION_COMPACTION_WORKERS", "2"))
+CONVERSATION_COMPACTION_COOLDOWN = int(os.getenv("CONVERSATION_COMPACTION_COOLDOWN", "60"))
+CONVERSATION_SUMMARY_MAX_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_MAX_TOKENS", "600"))
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and Harvey, a dividend "
+    "investing assistant. Merge the previous summary (if any) with the new turns into one concise "
+    "summary. Keep tickers, numbers, holdings, goals, preferences, decisions and open questions; "
+    "drop pleasantries and data tables. Write plain prose or short bullets, no preamble."
+)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """tiktoken encoding for a model, loaded once (None when tiktoken cannot load it)."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable for {model}, using estimate: {e}")
+        return None
+
 
 def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
     """
@@ -35,14 +90,223 @@ def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
     Returns:
         Number of tokens
     """
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4
     try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
+        return len(encoding.encode(text, disallowed_special=()))
     except Exception as e:
         logger.warning(f"Token counting failed, using estimate: {e}")
         return len(text) // 4
 
 
+# Live messages of one conversation, newest first, with the running token total.
+# Portable SQL (COALESCE, standard window functions) so the SQLite fallback can share it.
+_HISTORY_WINDOW_SQL = """
+    SELECT role, content, COALESCE(tokens, 0) AS tokens, created_at,
+           SUM(COALESCE(tokens, 0)) OVER (
+               ORDER BY created_at DESC ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+           ) AS running_tokens,
+           COUNT(*) OVER () AS total_messages
+    FROM dbo.conversation_messages
+    WHERE conversation_id = {conversation_id}
+      AND COALESCE(compacted, 0) = 0
+      {extra}
+"""
+
+
+def _select_within_budget(newest_first: List[Tuple[str, str, int]], budget: int) -> Tuple[List[Dict[str, str]], bool]:
+    """
+    Newest messages whose running token total fits `budget`, in chronological order.
+    
+    Returns:
+        (messages, bounded) where bounded is True when the budget was reached
+        inside `newest_first`, i.e. older messages could not change the result
+    """
+    messages = []
+    total_tokens = 0
+    bounded = False
+    for role, content, tokens in newest_first:
+        if total_tokens + tokens > budget:
+            bounded = True
+            break
+        messages.append({"role": role, "content": content})
+        total_tokens += tokens
+    messages.reverse()
+    return messages, bounded
+
+
+# Empty message_count range: no cached tail, always read the history
+NO_TAIL = (0, -1)
+
+
+class ConversationTailCache:
+    """
+    In-process cache of the newest messages of recently active conversations.
+    
+    Features:
+    - Filled from the history query, appended to by add_message
+    - Tails trimmed to HISTORY_TAIL_MAX_TOKENS; `complete` marks tails that
+      still hold the whole conversation
+    - Each tail records the conversation's message_count it reflects. Other
+      workers write to the same conversations, so readers fetch message_count
+      in their round trip anyway and only use the tail when it matches
+      (`window`); otherwise they take the history read in that same query
+    - LRU over conversations with a TTL per entry
+    """
+    
+    def __init__(self, max_conversations: int = HISTORY_TAIL_CACHE_SIZE,
+                 ttl: int = HISTORY_TAIL_CACHE_TTL, max_tokens: int = HISTORY_TAIL_MAX_TOKENS):
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "appends": 0, "fills": 0, "evictions": 0}
+    
+    def _trim(self, entry: Dict[str, Any]):
+        # Keep at least the newest message so a budget boundary stays visible
+        messages = entry["messages"]
+        while len(messages) > 1 and entry["tokens"] > self.max_tokens:
+            entry["tokens"] -= messages.pop(0)[2]
+            entry["complete"] = False
+    
+    def _put(self, conversation_id: str, messages: List[Tuple[str, str, int]], complete: bool, count: int):
+        entry = {
+            "messages": messages,
+            "tokens": sum(m[2] for m in messages),
+            "complete": complete,
+            # message_count once our writes land; `unconfirmed` of them are still write-behind
+            "count": count,
+            "unconfirmed": 0,
+            "at": time.time(),
+        }
+        self._trim(entry)
+        self._entries[conversation_id] = entry
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def _fresh(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(conversation_id)
+        if entry is not None and time.time() - entry["at"] > self.ttl:
+            del self._entries[conversation_id]
+            return None
+        return entry
+    
+    def has(self, conversation_id: str) -> bool:
+        """True if the conversation is cached (so it exists)."""
+        with self._lock:
+            return self._fresh(conversation_id) is not None
+    
+    def select(self, conversation_id: str, budget: int) -> Optional[List[Dict[str, str]]]:
+        """History within `budget` from the cached tail, or None when the tail cannot decide it."""
+        with self._lock:
+            entry = self._fresh(conversation_id)
+            if entry is not None:
+                messages, bounded = _select_within_budget(list(reversed(entry["messages"])), budget)
+                if bounded or entry["complete"]:
+                    self._entries.move_to_end(conversation_id)
+                    self.stats["hits"] += 1
+                    return messages
+            self.stats["misses"] += 1
+            return None
+    
+    def window(self, conversation_id: str) -> Tuple[int, int]:
+        """
+        Range of database message_count values the cached tail is current for.
+        
+        Wider than one value while our own write-behind replies are unflushed;
+        empty (NO_TAIL) when nothing is cached.
+        """
+        with self._lock:
+            entry = self._fresh(conversation_id)
+            if entry is None:
+                return NO_TAIL
+            return entry["count"] - entry["unconfirmed"], entry["count"]
+    
+    def stale(self, conversation_id: str):
+        """The database moved past the cached tail (another worker wrote): drop it."""
+        with self._lock:
+            if self._entries.pop(conversation_id, None) is not None:
+                self.stats["stale"] += 1
+                self.stats["hits"] -= 1
+                self.stats["misses"] += 1
+    
+    def fill(self, conversation_id: str, messages: List[Tuple[str, str, int]], complete: bool, count: int):
+        """Cache a tail read from the database (oldest first) with the message_count it was read at."""
+        with self._lock:
+            self._put(conversation_id, list(messages), complete, count)
+            self.stats["fills"] += 1
+    
+    def start(self, conversation_id: str):
+        """A conversation created here: its (empty) history is known."""
+        with self._lock:
+            self._put(conversation_id, [], True, 0)
+    
+    def append(self, conversation_id: str, role: str, content: str, tokens: int, written: bool = True):
+        """
+        Add a newly stored message to a cached tail (no-op when not cached).
+        
+        written=False for write-behind messages; confirm() once they are flushed.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            entry["messages"].append((role, content, tokens))
+            entry["tokens"] += tokens
+            entry["count"] += 1
+            if not written:
+                entry["unconfirmed"] += 1
+            self._trim(entry)
+            self.stats["appends"] += 1
+    
+    def confirm(self, conversation_id: str):
+        """A write-behind message of this conversation reached the database."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None and entry["unconfirmed"] > 0:
+                entry["unconfirmed"] -= 1
+    
+    def live_tokens(self, conversation_id: str) -> Optional[int]:
+        """Tokens of the whole live history when the cached tail is complete, else None."""
+        with self._lock:
+            entry = self._fresh(conversation_id)
+            if entry is None or not entry["complete"]:
+                return None
+            return entry["tokens"]
+    
+    def evict(self, conversation_id: str):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get tail cache statistics for monitoring."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": HISTORY_TAIL_CACHE_ENABLED,
+                "conversations": len(self._entries),
+                "max_conversations": self.max_conversations,
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+_tail_cache = ConversationTailCache()
+
+
+def get_conversation_tail_cache() -> ConversationTailCache:
+    """Get the process-wide conversation tail cache."""
+    return _tail_cache
+
+
 def create_session(user_data: Optional[Dict[str, Any]] = None) -> str:
     """
     Create a new user session.
@@ -59,13 +323,14 @@ def create_session(user_data: Optional[Dict[str, Any]] = None) -> str:
     try:
         query = text("""
             INSERT INTO dbo.user_sessions (session_id, user_data, created_at, last_active)
-            VALUES (:session_id, :user_data, GETDATE(), GETDATE());
+            VALUES (:session_id, :user_data, :now, :now);
         """)
         
         with engine.begin() as conn:
             conn.execute(query, {
                 "session_id": session_id,
-                "user_data": user_data_json
+                "user_data": user_data_json,
+                "now": datetime.utcnow()
             })
         
         logger.info(f"Created new session: {session_id}")
@@ -86,12 +351,12 @@ def update_session_activity(session_id: str) -> None:
     try:
         query = text("""
             UPDATE dbo.user_sessions
-            SET last_active = GETDATE()
+            SET last_active = :now
             WHERE session_id = :session_id;
         """)
         
         with engine.begin() as conn:
-            conn.execute(query, {"session_id": session_id})
+            conn.execute(query, {"session_id": session_id, "now": datetime.utcnow()})
             
     except Exception as e:
         logger.warning(f"Failed to update session activity: {e}")
@@ -117,16 +382,19 @@ def create_conversation(session_id: str, title: Optional[str] = None) -> str:
         query = text("""
             INSERT INTO dbo.conversations 
             (conversation_id, session_id, title, created_at, updated_at, total_tokens, message_count)
-            VALUES (:conversation_id, :session_id, :title, GETDATE(), GETDATE(), 0, 0);
+            VALUES (:conversation_id, :session_id, :title, :now, :now, 0, 0);
         """)
         
         with engine.begin() as conn:
             conn.execute(query, {
                 "conversation_id": conversation_id,
                 "session_id": session_id,
-                "title": title
+                "title": title,
+                "now": datetime.utcnow()
             })
         
+        if HISTORY_TAIL_CACHE_ENABLED:
+            _tail_cache.start(conversation_id)
         logger.info(f"Created conversation {conversation_id} for session {session_id}")
         return conversation_id
         
@@ -135,12 +403,31 @@ def create_conversation(session_id: str, title: Optional[str] = None) -> str:
         raise
 
 
+# Messages (and session / conversation stamps) use the application's UTC clock on
+# every path (direct, write-behind and bootstrap_turn), so history order never
+# mixes the database server's clock with the workers'.
+_ADD_MESSAGE_SQL = """
+    INSERT INTO dbo.conversation_messages 
+    (message_id, conversation_id, role, content, tokens, created_at, metadata)
+    VALUES (:message_id, :conversation_id, :role, :content, :tokens, :created_at, :metadata);
+"""
+
+_UPDATE_CONVERSATION_TOTALS_SQL = """
+    UPDATE dbo.conversations
+    SET total_tokens = total_tokens + :tokens,
+        message_count = message_count + 1,
+        updated_at = :created_at
+    WHERE conversation_id = :conversation_id;
+"""
+
+
 def add_message(
     conversation_id: str,
     role: str,
     content: str,
     tokens: Optional[int] = None,
-    metadata: Optional[Dict[str, Any]] = None
+    metadata: Optional[Dict[str, Any]] = None,
+    write_behind: bool = False
 ) -> str:
     """
     Add a message to a conversation.
@@ -151,6 +438,8 @@ def add_message(
         content: Message content
         tokens: Token count (auto-calculated if not provided)
         metadata: Optional metadata (query_type, tickers, ml_predictions, etc)
+        write_behind: Queue the insert on the write-behind queue instead of writing
+            now (assistant replies; the tail cache is updated either way)
     
     Returns:
         message_id (UUID string)
@@ -161,41 +450,63 @@ def add_message(
         tokens = count_tokens(content)
     
     metadata_json = json.dumps(metadata) if metadata else None
+    # Stamped now so a late flush cannot order the reply after the next question
+    created_at = datetime.utcnow()
+    compact = CONVERSATION_COMPACTION_ENABLED and role == "assistant"
+    
+    def written():
+        _tail_cache.confirm(conversation_id)
+        # The compactor reads the stored rows, so it only looks once they are there
+        if compact:
+            _compactor.maybe_schedule(conversation_id)
     
     try:
-        insert_query = text("""
-            INSERT INTO dbo.conversation_messages 
-            (message_id, conversation_id, role, content, tokens, created_at, metadata)
-            VALUES (:message_id, :conversation_id, :role, :content, :tokens, GETDATE(), :metadata);
-        """)
-        
-        update_query = text("""
-            UPDATE dbo.conversations
-            SET total_tokens = total_tokens + :tokens,
-                message_count = message_count + 1,
-                updated_at = GETDATE()
-            WHERE conversation_id = :conversation_id;
-        """)
-        
-        with engine.begin() as conn:
-            conn.execute(insert_query, {
+        if write_behind:
+            # Cached before submitting: the flush confirms it and may run right away
+            if HISTORY_TAIL_CACHE_ENABLED:
+                _tail_cache.append(conversation_id, role, content, tokens, written=False)
+            writes = get_write_behind()
+            writes.submit("conversation_message", _ADD_MESSAGE_SQL, {
                 "message_id": message_id,
                 "conversation_id": conversation_id,
                 "role": role,
                 "content": content,
                 "tokens": tokens,
+                "created_at": created_at,
                 "metadata": metadata_json
             })
-            
-            conn.execute(update_query, {
+            writes.submit("conversation_totals", _UPDATE_CONVERSATION_TOTALS_SQL, {
                 "conversation_id": conversation_id,
-                "tokens": tokens
-            })
+                "tokens": tokens,
+                "created_at": created_at
+            }, on_written=written)
+        else:
+            with engine.begin() as conn:
+                conn.execute(text(_ADD_MESSAGE_SQL), {
+                    "message_id": message_id,
+                    "conversation_id": conversation_id,
+                    "role": role,
+                    "content": content,
+                    "tokens": tokens,
+                    "created_at": created_at,
+                    "metadata": metadata_json
+                })
+                
+                conn.execute(text(_UPDATE_CONVERSATION_TOTALS_SQL), {
+                    "conversation_id": conversation_id,
+                    "tokens": tokens,
+                    "created_at": created_at
+                })
+            if HISTORY_TAIL_CACHE_ENABLED:
+                _tail_cache.append(conversation_id, role, content, tokens)
+            if compact:
+                _compactor.maybe_schedule(conversation_id)
         
         logger.info(f"Added {role} message to conversation {conversation_id} ({tokens} tokens)")
         return message_id
         
     except Exception as e:
+        _tail_cache.evict(conversation_id)
         logger.error(f"Failed to add message: {e}")
         raise
 
@@ -209,10 +520,16 @@ def get_conversation_history(
     Retrieve conversation history formatted for OpenAI API.
     
     Implements token budgeting to stay within limits:
-    1. Loads messages from newest to oldest
+    1. Takes messages from newest to oldest
     2. Stops when token limit is reached
     3. Returns messages in chronological order
     
+    Compacted turns are represented by their stored summary (a system message).
+    One query reads the conversation's message_count and, unless the cached
+    tail is current for it and holds enough of the conversation, a window of
+    only the messages within the budget (plus the first one past it, so the
+    cached tail knows where it ends).
+    
     Args:
         conversation_id: The conversation ID
         max_tokens: Maximum tokens to include in history
@@ -221,54 +538,77 @@ def get_conversation_history(
     Returns:
         List of message dicts with 'role' and 'content' keys
     """
+    budget = max_tokens - TOKEN_BUFFER
+    cached, (tail_min, tail_max) = None, NO_TAIL
+    if HISTORY_TAIL_CACHE_ENABLED:
+        cached = _tail_cache.select(conversation_id, budget)
+        if cached is not None:
+            tail_min, tail_max = _tail_cache.window(conversation_id)
+    
     try:
-        query = text("""
-            SELECT role, content, tokens, created_at
-            FROM dbo.conversation_messages
-            WHERE conversation_id = :conversation_id
-            ORDER BY created_at DESC;
+        query = text(f"""
+            SELECT c.message_count, recent.role, recent.content, recent.tokens, recent.total_messages
+            FROM dbo.conversations AS c
+            LEFT JOIN ({_HISTORY_WINDOW_SQL.format(conversation_id=":conversation_id", extra="")}) AS recent
+                ON COALESCE(c.message_count, -1) NOT BETWEEN :tail_min AND :tail_max
+               AND recent.running_tokens - recent.tokens <= :budget
+            WHERE c.conversation_id = :conversation_id
+            ORDER BY recent.created_at ASC;
         """)
         
         with engine.connect() as conn:
-            result = conn.execute(query, {"conversation_id": conversation_id})
+            result = conn.execute(query, {"conversation_id": conversation_id, "budget": budget,
+                                          "tail_min": tail_min, "tail_max": tail_max})
             rows = result.fetchall()
         
         if not rows:
             return []
-        
-        messages = []
-        total_tokens = 0
-        
-        for row in rows:
-            role, content, tokens, created_at = row
-            
-            if total_tokens + tokens > max_tokens - TOKEN_BUFFER:
-                logger.info(
-                    f"Token limit reached for conversation {conversation_id}. "
-                    f"Loaded {len(messages)} messages ({total_tokens} tokens)"
-                )
-                break
-            
-            messages.append({
-                "role": role,
-                "content": content
-            })
-            total_tokens += tokens
-        
-        messages.reverse()
-        
-        logger.info(
-            f"Retrieved {len(messages)} messages for conversation {conversation_id} "
-            f"({total_tokens} tokens)"
-        )
-        
-        return messages
+        message_count = rows[0][0]
+        if cached is not None:
+            if message_count is not None and tail_min <= message_count <= tail_max:
+                logger.info(f"Retrieved {len(cached)} messages for conversation {conversation_id} (tail cache)")
+                return cached
+            _tail_cache.stale(conversation_id)
+        return _history_from_rows(conversation_id, [row[1:] for row in rows if row[1] is not None],
+                                  budget, message_count)
         
     except Exception as e:
         logger.error(f"Failed to get conversation history: {e}")
         return []
 
 
+def _history_from_rows(conversation_id: str, rows: List[Any], budget: int,
+                       message_count: Optional[int]) -> List[Dict[str, str]]:
+    """
+    Budgeted history from windowed rows (role, content, tokens, total_messages),
+    oldest first, read at `message_count`. Refills the tail cache.
+    """
+    cacheable = HISTORY_TAIL_CACHE_ENABLED and message_count is not None
+    if not rows:
+        if cacheable:
+            _tail_cache.fill(conversation_id, [], complete=True, count=message_count)
+        return []
+    
+    tail = [(row[0], row[1], row[2]) for row in rows]
+    if cacheable:
+        _tail_cache.fill(conversation_id, tail, complete=len(rows) == rows[0][3], count=message_count)
+    
+    messages, bounded = _select_within_budget(list(reversed(tail)), budget)
+    if bounded:
+        logger.info(
+            f"Token limit reached for conversation {conversation_id}. "
+            f"Loaded {len(messages)} messages"
+        )
+    
+    history_tokens = sum(t[2] for t in tail[len(tail) - len(messages):])
+    logger.info(
+        f"Retrieved {len(messages)} messages for conversation {conversation_id} "
+        f"({history_tokens} tokens)"
+    )
+    
+    return messages
+
+
 def get_recent_conversations(session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
     """
     Get recent conversations for a session.
@@ -368,21 +708,246 @@ def get_conversation_stats(conversation_id: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def summarize_old_conversations(conversation_id: str) -> None:
+def _summary_transcript(rows: List[Any]) -> str:
+    """Previous summary plus the turns to fold into it, as summarizer input."""
+    parts = []
+    for row in rows:
+        role, content = row[1], row[2] or ""
+        if role == "system" and content.startswith(SUMMARY_PREFIX):
+            parts.append("PREVIOUS SUMMARY:\n" + content[len(SUMMARY_PREFIX):])
+        else:
+            # Long answers are mostly tables; their opening carries the substance
+            parts.append(f"{role.upper()}: {content[:4000]}")
+    return "\n\n".join(parts)
+
+
+def summarize_old_conversations(conversation_id: str) -> Optional[Dict[str, Any]]:
     """
     Summarize old messages in a conversation to reduce token usage.
     
-    This is a placeholder for future implementation that would:
-    1. Identify old messages beyond a threshold
-    2. Generate summaries using LLM
-    3. Replace old messages with summaries
-    4. Keep recent messages intact
+    When the live (uncompacted) messages exceed CONVERSATION_COMPACTION_THRESHOLD
+    tokens:
+    1. Keeps the newest messages up to CONVERSATION_COMPACTION_KEEP_TOKENS
+    2. Summarizes everything older (including any previous summary) with the LLM
+    3. Marks those turns compacted and stores the summary as a system message
+       placed where they ended, in one transaction; when another worker has
+       compacted any of them first, nothing is written
+    
+    Runs on the compaction workers (see ConversationCompactor), never on a live turn.
     
     Args:
         conversation_id: The conversation ID to summarize
+    
+    Returns:
+        Dict with compaction details, or None when nothing was compacted
+    """
+    query = text("""
+        SELECT message_id, role, content, ISNULL(tokens, 0) AS tokens, created_at
+        FROM dbo.conversation_messages
+        WHERE conversation_id = :conversation_id
+          AND ISNULL(compacted, 0) = 0
+        ORDER BY created_at ASC;
+    """)
+    with engine.connect() as conn:
+        rows = conn.execute(query, {"conversation_id": conversation_id}).fetchall()
+    
+    live_tokens = sum(row[3] for row in rows)
+    if live_tokens <= CONVERSATION_COMPACTION_THRESHOLD:
+        return None
+    
+    kept_tokens = 0
+    split = len(rows)
+    while split > 0 and kept_tokens + rows[split - 1][3] <= CONVERSATION_COMPACTION_KEEP_TOKENS:
+        split -= 1
+        kept_tokens += rows[split][3]
+    # Always keep the latest exchange verbatim
+    split = min(split, len(rows) - 2)
+    old_rows = rows[:split]
+    if len(old_rows) < 2:
+        return None
+    
+    from app.core.llm_providers import oai_chat_completion
+    from app.core.admission_control import llm_priority, PRIORITY_DIGEST
+    
+    with llm_priority(PRIORITY_DIGEST):
+        response = oai_chat_completion(
+            messages=[
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": _summary_transcript(old_rows)}
+            ],
+            temperature=0.2,
+            max_tokens=CONVERSATION_SUMMARY_MAX_TOKENS
+        )
+    summary_text = (response.choices[0].message.content or "").strip()
+    if not summary_text:
+        return None
+    
+    summary = SUMMARY_PREFIX + summary_text
+    summary_tokens = count_tokens(summary)
+    compacted_tokens = sum(row[3] for row in old_rows)
+    message_ids = [row[0] for row in old_rows]
+    
+    insert_query = text("""
+        INSERT INTO dbo.conversation_messages
+        (message_id, conversation_id, role, content, tokens, created_at, metadata, compacted)
+        VALUES (:message_id, :conversation_id, 'system', :content, :tokens, :created_at, :metadata, 0);
+    """)
+    compact_query = text("""
+        UPDATE dbo.conversation_messages
+        SET compacted = 1
+        WHERE conversation_id = :conversation_id
+          AND message_id IN :message_ids
+          AND ISNULL(compacted, 0) = 0;
+    """).bindparams(bindparam("message_ids", expanding=True))
+    
+    with engine.connect() as conn, conn.begin() as trans:
+        # Claim the turns before writing the summary: a compaction of the same
+        # turns by another worker holds the rows until it commits, after which
+        # fewer than all of them are left to claim
+        claimed = conn.execute(compact_query, {"conversation_id": conversation_id, "message_ids": message_ids})
+        if claimed.rowcount != len(message_ids):
+            trans.rollback()
+            logger.info(
+                f"Compaction of conversation {conversation_id} skipped: "
+                f"{len(message_ids) - claimed.rowcount} of its {len(message_ids)} turns already compacted"
+            )
+            return None
+        conn.execute(insert_query, {
+            "message_id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "content": summary,
+            "tokens": summary_tokens,
+            "created_at": old_rows[-1][4],
+            "metadata": json.dumps({
+                "summary": True,
+                "compacted_messages": len(old_rows),
+                "compacted_tokens": compacted_tokens
+            })
+        })
+        # The summary is a message too; the new count retires other workers' cached tails
+        conn.execute(text("""
+            UPDATE dbo.conversations
+            SET message_count = message_count + 1, updated_at = :now
+            WHERE conversation_id = :conversation_id;
+        """), {"conversation_id": conversation_id, "now": datetime.utcnow()})
+    
+    # The cached tail still holds the compacted turns
+    _tail_cache.evict(conversation_id)
+    
+    result = {
+        "conversation_id": conversation_id,
+        "compacted_messages": len(old_rows),
+        "compacted_tokens": compacted_tokens,
+        "summary_tokens": summary_tokens,
+        "live_tokens": live_tokens - compacted_tokens + summary_tokens,
+    }
+    logger.info(
+        f"Compacted {len(old_rows)} messages ({compacted_tokens} tokens) of conversation "
+        f"{conversation_id} into a {summary_tokens}-token summary"
+    )
+    return result
+
+
+class ConversationCompactor:
     """
-    logger.info(f"Summarization not yet implemented for conversation {conversation_id}")
-    pass
+    Background scheduler for conversation summarization.
+    
+    Features:
+    - Bounded worker pool; at most one job per conversation at a time
+    - Cheap trigger check from the tail cache, with a per-conversation cooldown
+      when the live token count is unknown
+    - Submissions never block: when the backlog is full the check is skipped
+      and retried on a later turn
+    """
+    
+    def __init__(self, workers: int = CONVERSATION_COMPACTION_WORKERS,
+                 cooldown: int = CONVERSATION_COMPACTION_COOLDOWN):
+        self.workers = max(1, workers)
+        self.cooldown = cooldown
+        self.max_pending = self.workers * 4
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: set = set()
+        self._last_check: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "scheduled": 0,
+            "skipped_backlog": 0,
+            "runs": 0,
+            "compactions": 0,
+            "compacted_messages": 0,
+            "tokens_saved": 0,
+            "errors": 0,
+        }
+    
+    def maybe_schedule(self, conversation_id: str) -> bool:
+        """Queue a compaction check for the conversation if it may be over the threshold."""
+        live = _tail_cache.live_tokens(conversation_id)
+        if live is not None and live <= CONVERSATION_COMPACTION_THRESHOLD:
+            return False
+        now = time.time()
+        with self._lock:
+            if conversation_id in self._pending:
+                return False
+            if live is None and now - self._last_check.get(conversation_id, 0.0) < self.cooldown:
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.stats["skipped_backlog"] += 1
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix="conversation-compactor")
+            self._pending.add(conversation_id)
+            self._last_check[conversation_id] = now
+            if len(self._last_check) > HISTORY_TAIL_CACHE_SIZE:
+                self._last_check.pop(next(iter(self._last_check)))
+            self.stats["scheduled"] += 1
+            executor = self._executor
+        executor.submit(self._run, conversation_id)
+        return True
+    
+    def _run(self, conversation_id: str):
+        try:
+            result = summarize_old_conversations(conversation_id)
+            with self._lock:
+                self.stats["runs"] += 1
+                if result:
+                    self.stats["compactions"] += 1
+                    self.stats["compacted_messages"] += result["compacted_messages"]
+                    self.stats["tokens_saved"] += result["compacted_tokens"] - result["summary_tokens"]
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            logger.warning(f"Conversation compaction failed for {conversation_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(conversation_id)
+    
+    def stop(self):
+        """Drop queued jobs and stop the workers (running summaries finish in the background)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get compaction statistics for monitoring."""
+        with self._lock:
+            return {
+                "enabled": CONVERSATION_COMPACTION_ENABLED,
+                "threshold_tokens": CONVERSATION_COMPACTION_THRESHOLD,
+                "keep_tokens": CONVERSATION_COMPACTION_KEEP_TOKENS,
+                "workers": self.workers,
+                "pending": len(self._pending),
+                **self.stats,
+            }
+
+
+_compactor = ConversationCompactor()
+
+
+def get_conversation_compactor() -> ConversationCompactor:
+    """Get the process-wide conversation compactor."""
+    return _compactor
 
 
 def delete_conversation(conversation_id: str) -> bool:
@@ -404,6 +969,7 @@ def delete_conversation(conversation_id: str) -> bool:
         with engine.begin() as conn:
             result = conn.execute(query, {"conversation_id": conversation_id})
         
+        _tail_cache.evict(conversation_id)
         logger.info(f"Deleted conversation {conversation_id}")
         return True
         
@@ -447,6 +1013,9 @@ def conversation_exists(conversation_id: str) -> bool:
     Returns:
         True if conversation exists, False otherwise
     """
+    if HISTORY_TAIL_CACHE_ENABLED and _tail_cache.has(conversation_id):
+        return True
+    
     try:
         query = text("""
             SELECT 1 FROM dbo.conversations
@@ -460,3 +1029,253 @@ def conversation_exists(conversation_id: str) -> bool:
     except Exception as e:
         logger.error(f"Failed to check conversation existence: {e}")
         return False
+
+
+# One T-SQL batch: upsert session, upsert conversation, append the user message,
+# then return the history tail (before that message) joined to the resolved ids
+# and the conversation's prior message_count. The history is skipped when that
+# count is one the caller's cached tail is current for.
+# Every stamp in the batch is the caller's UTC time (see _ADD_MESSAGE_SQL).
+# NOCOUNT keeps the row counts of the writes out of the result stream; it is
+# switched back off because the setting outlives the batch on a pooled connection.
+_BOOTSTRAP_TURN_SQL = f"""
+SET NOCOUNT ON;
+DECLARE @session_id VARCHAR(100) = :session_id;
+DECLARE @conversation_id VARCHAR(100) = :conversation_id;
+DECLARE @new_session BIT = 0;
+DECLARE @new_conversation BIT = 0;
+DECLARE @message_count INT = NULL;
+DECLARE @now DATETIME2 = :created_at;
+
+IF @session_id IS NOT NULL
+BEGIN
+    UPDATE dbo.user_sessions SET last_active = @now WHERE session_id = @session_id;
+    IF @@ROWCOUNT = 0 SET @session_id = NULL;
+END
+IF @session_id IS NULL
+BEGIN
+    SET @session_id = :new_session_id;
+    INSERT INTO dbo.user_sessions (session_id, user_data, created_at, last_active)
+    VALUES (@session_id, NULL, @now, @now);
+    SET @new_session = 1;
+END
+
+IF @conversation_id IS NOT NULL
+BEGIN
+    SELECT @message_count = ISNULL(message_count, -1) FROM dbo.conversations
+    WHERE conversation_id = @conversation_id;
+    IF @@ROWCOUNT = 0 SET @conversation_id = NULL;
+END
+IF @conversation_id IS NULL
+BEGIN
+    SET @conversation_id = :new_conversation_id;
+    INSERT INTO dbo.conversations
+    (conversation_id, session_id, title, created_at, updated_at, total_tokens, message_count)
+    VALUES (@conversation_id, @session_id, :title, @now, @now, 0, 0);
+    SET @new_conversation = 1;
+END
+
+INSERT INTO dbo.conversation_messages
+(message_id, conversation_id, role, content, tokens, created_at, metadata)
+VALUES (:message_id, @conversation_id, 'user', :content, :tokens, @now, :metadata);
+
+UPDATE dbo.conversations
+SET total_tokens = total_tokens + :tokens,
+    message_count = message_count + 1,
+    updated_at = @now
+WHERE conversation_id = @conversation_id;
+
+SET NOCOUNT OFF;
+
+SELECT @session_id AS session_id, @conversation_id AS conversation_id,
+       @new_session AS new_session, @new_conversation AS new_conversation,
+       @message_count AS message_count,
+       recent.role, recent.content, recent.tokens, recent.total_messages
+FROM (SELECT 1 AS one) AS ids
+LEFT JOIN ({_HISTORY_WINDOW_SQL.format(
+    conversation_id="@conversation_id",
+    extra="AND message_id <> :message_id AND @new_conversation = 0 "
+          "AND @message_count NOT BETWEEN :tail_min AND :tail_max"
+)}) AS recent
+    ON recent.running_tokens - recent.tokens <= :budget
+ORDER BY recent.created_at ASC;
+"""
+
+
+def _bootstrap_turn_portable(conn, params: Dict[str, Any]) -> List[Tuple]:
+    """
+    Statement-by-statement equivalent of _BOOTSTRAP_TURN_SQL for databases
+    without T-SQL batches (SQLite in local testing). Same transaction, same rows.
+    """
+    now = params["created_at"]
+    session_id = params["session_id"]
+    new_session = False
+    if session_id is not None:
+        updated = conn.execute(
+            text("UPDATE dbo.user_sessions SET last_active = :now WHERE session_id = :session_id"),
+            {"now": now, "session_id": session_id}
+        )
+        if updated.rowcount == 0:
+            session_id = None
+    if session_id is None:
+        session_id = params["new_session_id"]
+        conn.execute(
+            text("""
+                INSERT INTO dbo.user_sessions (session_id, user_data, created_at, last_active)
+                VALUES (:session_id, NULL, :now, :now)
+            """),
+            {"session_id": session_id, "now": now}
+        )
+        new_session = True
+    
+    conversation_id = params["conversation_id"]
+    new_conversation = False
+    message_count = None
+    if conversation_id is not None:
+        row = conn.execute(
+            text("SELECT COALESCE(message_count, -1) FROM dbo.conversations WHERE conversation_id = :conversation_id"),
+            {"conversation_id": conversation_id}
+        ).fetchone()
+        if row is None:
+            conversation_id = None
+        else:
+            message_count = row[0]
+    if conversation_id is None:
+        conversation_id = params["new_conversation_id"]
+        conn.execute(
+            text("""
+                INSERT INTO dbo.conversations
+                (conversation_id, session_id, title, created_at, updated_at, total_tokens, message_count)
+                VALUES (:conversation_id, :session_id, :title, :now, :now, 0, 0)
+            """),
+            {"conversation_id": conversation_id, "session_id": session_id, "title": params["title"], "now": now}
+        )
+        new_conversation = True
+    
+    history = []
+    if not new_conversation and not params["tail_min"] <= message_count <= params["tail_max"]:
+        history = conn.execute(
+            text(f"""
+                SELECT role, content, tokens, total_messages
+                FROM ({_HISTORY_WINDOW_SQL.format(conversation_id=":conversation_id", extra="")}) AS recent
+                WHERE running_tokens - tokens <= :budget
+                ORDER BY created_at ASC
+            """),
+            {"conversation_id": conversation_id, "budget": params["budget"]}
+        ).fetchall()
+    
+    conn.execute(
+        text("""
+            INSERT INTO dbo.conversation_messages
+            (message_id, conversation_id, role, content, tokens, created_at, metadata)
+            VALUES (:message_id, :conversation_id, 'user', :content, :tokens, :now, :metadata)
+        """),
+        {**params, "conversation_id": conversation_id, "now": now}
+    )
+    conn.execute(
+        text("""
+            UPDATE dbo.conversations
+            SET total_tokens = total_tokens + :tokens,
+                message_count = message_count + 1,
+                updated_at = :now
+            WHERE conversation_id = :conversation_id
+        """),
+        {"tokens": params["tokens"], "conversation_id": conversation_id, "now": now}
+    )
+    
+    ids = (session_id, conversation_id, new_session, new_conversation, message_count)
+    return [ids + tuple(row) for row in history] or [ids + (None, None, None, None)]
+
+
+def bootstrap_turn(
+    session_id: Optional[str],
+    conversation_id: Optional[str],
+    user_query: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    max_tokens: int = DEFAULT_MAX_TOKENS
+) -> Dict[str, Any]:
+    """
+    Start a chat turn in one database round trip.
+    
+    In a single transaction:
+    1. Touches the session, or creates one when missing/unknown
+    2. Reuses the conversation, or creates one when missing/unknown
+    3. Appends the user message
+    4. Returns the history within `max_tokens` as it was before that message
+    
+    On SQL Server this is one batched statement; other dialects (SQLite in
+    local testing) run the equivalent statements on one connection. When the
+    tail cache covers the conversation and is current for the stored
+    message_count, the history read is skipped.
+    
+    Args:
+        session_id: Session ID from the client, if any
+        conversation_id: Conversation ID from the client, if any
+        user_query: The user's message
+        metadata: Optional metadata stored with the message
+        max_tokens: Maximum tokens of history to return
+    
+    Returns:
+        Dict with session_id, conversation_id, conversation_history, message_id,
+        created_session and created_conversation
+    """
+    budget = max_tokens - TOKEN_BUFFER
+    cached, (tail_min, tail_max) = None, NO_TAIL
+    if HISTORY_TAIL_CACHE_ENABLED and conversation_id:
+        cached = _tail_cache.select(conversation_id, budget)
+        if cached is not None:
+            tail_min, tail_max = _tail_cache.window(conversation_id)
+    
+    tokens = count_tokens(user_query)
+    params = {
+        "session_id": session_id or None,
+        "conversation_id": conversation_id or None,
+        "new_session_id": str(uuid.uuid4()),
+        "new_conversation_id": str(uuid.uuid4()),
+        "title": f"Conversation {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+        "message_id": str(uuid.uuid4()),
+        "content": user_query,
+        "tokens": tokens,
+        "metadata": json.dumps(metadata) if metadata else None,
+        "created_at": datetime.utcnow(),
+        "budget": budget,
+        "tail_min": tail_min,
+        "tail_max": tail_max,
+    }
+    
+    with engine.begin() as conn:
+        if engine.dialect.name == "mssql":
+            rows = conn.execute(text(_BOOTSTRAP_TURN_SQL), params).fetchall()
+        else:
+            rows = _bootstrap_turn_portable(conn, params)
+    
+    session_id, conversation_id, new_session, new_conversation, message_count = rows[0][:5]
+    if new_conversation:
+        history = []
+        if HISTORY_TAIL_CACHE_ENABLED:
+            _tail_cache.start(conversation_id)
+    elif cached is not None and tail_min <= message_count <= tail_max:
+        history = cached
+    else:
+        if cached is not None:
+            _tail_cache.stale(conversation_id)
+        history = _history_from_rows(conversation_id, [row[5:] for row in rows if row[5] is not None],
+                                     budget, message_count)
+    
+    if HISTORY_TAIL_CACHE_ENABLED:
+        _tail_cache.append(conversation_id, "user", user_query, tokens)
+    if new_session:
+        logger.info(f"Created new session: {session_id}")
+    if new_conversation:
+        logger.info(f"Created conversation {conversation_id} for session {session_id}")
+    logger.info(f"Bootstrapped turn for conversation {conversation_id} ({len(history)} history messages, "
+                f"user message {tokens} tokens)")
+    
+    return {
+        "session_id": session_id,
+        "conversation_id": conversation_id,
+        "conversation_history": history,
+        "message_id": params["message_id"],
+        "created_session": bool(new_session),
+        "created_conversation": bool(new_conversation),
+    }
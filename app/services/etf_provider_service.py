@@ -9,6 +9,8 @@ import logging
 from typing import List, Dict, Optional, Any
 from datetime import datetime, timedelta
 
+from app.core.intent_engine import get_intent_engine, scan
+
 logger = logging.getLogger("etf_provider_service")
 
 
@@ -196,14 +198,13 @@ class ETFProviderService:
         Returns:
             Provider key if found, None otherwise
         """
-        query_lower = query.lower()
+        signals = scan(query)
         
         # Check each provider's aliases
-        for provider_key, aliases in self.PROVIDER_ALIASES.items():
-            for alias in aliases:
-                if alias in query_lower:
-                    logger.info(f"Identified provider: {provider_key} from query")
-                    return provider_key
+        for provider_key in self.PROVIDER_ALIASES:
+            if signals.has(f"etf_provider:{provider_key}"):
+                logger.info(f"Identified provider: {provider_key} from query")
+                return provider_key
         
         # Check if query contains a ticker that maps to a provider
         words = query.upper().split()
@@ -243,25 +244,12 @@ class ETFProviderService:
         Returns:
             True if query is about multiple ETFs from a provider
         """
-        query_lower = query.lower()
-        
-        # Keywords that indicate multiple ETFs
-        plural_indicators = ["etfs", "funds", "all", "distribution amounts", "distributions"]
-        
-        # Check if query mentions a provider and has plural indicators
-        provider = self.identify_provider(query)
-        if provider:
-            for indicator in plural_indicators:
-                if indicator in query_lower:
-                    return True
-        
-        # Check for explicit provider ETF queries
-        for provider_name in self.PROVIDER_ALIASES.keys():
-            for alias in self.PROVIDER_ALIASES[provider_name]:
-                if alias in query_lower and any(ind in query_lower for ind in plural_indicators):
-                    return True
+        # Only queries with an indicator of multiple ETFs qualify
+        if not scan(query).has("etf_plural"):
+            return False
         
-        return False
+        # ...and that mention a provider (by alias or one of its tickers)
+        return self.identify_provider(query) is not None
     
     def format_provider_response(self, provider_key: str, distributions: List[Dict]) -> str:
         """
@@ -358,4 +346,13 @@ class ETFProviderService:
                 "ticker": ticker_upper
             }
         
-        return None
\ No newline at end of file
+        return None
+
+
+# Keywords that indicate multiple ETFs
+PLURAL_INDICATORS = ["etfs", "funds", "all", "distribution amounts", "distributions"]
+
+_intent_engine = get_intent_engine()
+_intent_engine.register_keywords("etf_plural", PLURAL_INDICATORS)
+for _provider_key, _aliases in ETFProviderService.PROVIDER_ALIASES.items():
+    _intent_engine.register_keywords(f"etf_provider:{_provider_key}", _aliases)
@@ -12,9 +12,50 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 from sqlalchemy import text
 from app.core.database import engine
+from app.core.write_behind import get_write_behind
 
 logger = logging.getLogger("feedback_service")
 
+# Side-table writes go through the write-behind queue; each record stands on its own
+TRAINING_DATA_INSERT_SQL = """
+    INSERT INTO gpt_training_data (
+        training_id, feedback_id, user_message, assistant_message,
+        quality_score, is_high_quality, query_type, created_at
+    ) VALUES (
+        :training_id, :feedback_id, :user_message, :assistant_message,
+        :quality_score, :is_high_quality, :query_type, :created_at
+    )
+"""
+
+# Upsert counters and recompute success rate / average rating in one statement
+RESPONSE_PATTERN_MERGE_SQL = """
+    MERGE successful_response_patterns WITH (HOLDLOCK) AS target
+    USING (
+        SELECT :pattern_id AS pattern_id,
+               (SELECT AVG(rating)
+                FROM conversation_feedback
+                WHERE query_type = :query_type AND action_taken = :action_taken AND rating IS NOT NULL) AS avg_rating
+    ) AS source
+    ON target.pattern_id = source.pattern_id
+    WHEN MATCHED THEN UPDATE SET
+        positive_feedback_count = target.positive_feedback_count + :pos_inc,
+        negative_feedback_count = target.negative_feedback_count + :neg_inc,
+        total_responses = target.total_responses + 1,
+        success_rate = ROUND(100.0 * (target.positive_feedback_count + :pos_inc) / (target.total_responses + 1), 2),
+        avg_rating = source.avg_rating,
+        last_updated = :now,
+        last_positive_feedback = CASE WHEN :pos_inc = 1 THEN :now ELSE target.last_positive_feedback END
+    WHEN NOT MATCHED THEN INSERT (
+        pattern_id, query_type, action_type,
+        positive_feedback_count, negative_feedback_count, total_responses,
+        success_rate, avg_rating, first_seen, last_updated
+    ) VALUES (
+        source.pattern_id, :query_type, :action_taken,
+        :pos_inc, :neg_inc, 1,
+        100.0 * :pos_inc, source.avg_rating, :now, :now
+    );
+"""
+
 
 class FeedbackService:
     """
@@ -197,35 +238,23 @@ class FeedbackService:
         rating: int,
         query_type: Optional[str] = None
     ):
-        """Create a training data entry for high-quality responses"""
+        """Queue a training data entry for a high-quality response (write-behind)"""
         try:
             training_id = f"train_{uuid.uuid4().hex[:12]}"
             quality_score = rating / 5.0  # Normalize to 0.0-1.0
             
-            with engine.begin() as conn:
-                conn.execute(
-                    text("""
-                        INSERT INTO gpt_training_data (
-                            training_id, feedback_id, user_message, assistant_message,
-                            quality_score, is_high_quality, query_type, created_at
-                        ) VALUES (
-                            :training_id, :feedback_id, :user_message, :assistant_message,
-                            :quality_score, :is_high_quality, :query_type, :created_at
-                        )
-                    """),
-                    {
-                        "training_id": training_id,
-                        "feedback_id": feedback_id,
-                        "user_message": user_query,
-                        "assistant_message": harvey_response,
-                        "quality_score": quality_score,
-                        "is_high_quality": 1,  # BIT type: 1 for True
-                        "query_type": query_type,
-                        "created_at": datetime.now()
-                    }
-                )
+            get_write_behind().submit("gpt_training_data", TRAINING_DATA_INSERT_SQL, {
+                "training_id": training_id,
+                "feedback_id": feedback_id,
+                "user_message": user_query,
+                "assistant_message": harvey_response,
+                "quality_score": quality_score,
+                "is_high_quality": 1,  # BIT type: 1 for True
+                "query_type": query_type,
+                "created_at": datetime.now()
+            })
             
-            logger.info(f"Created training data entry: {training_id} (quality: {quality_score})")
+            logger.info(f"Queued training data entry: {training_id} (quality: {quality_score})")
         
         except Exception as e:
             logger.warning(f"Failed to create training data entry: {e}")
@@ -237,79 +266,18 @@ class FeedbackService:
         sentiment: str,
         rating: Optional[int] = None
     ):
-        """Update successful response patterns analytics"""
+        """Queue an update of the successful response patterns analytics (write-behind)"""
         try:
             pattern_id = f"{query_type}_{action_taken}".replace(" ", "_").lower()
             
-            with engine.begin() as conn:
-                # Check if pattern exists
-                result = conn.execute(
-                    text("SELECT pattern_id FROM successful_response_patterns WHERE pattern_id = :pattern_id"),
-                    {"pattern_id": pattern_id}
-                ).first()
-                
-                if result:
-                    # Update existing pattern
-                    conn.execute(
-                        text("""
-                            UPDATE successful_response_patterns
-                            SET positive_feedback_count = positive_feedback_count + :pos_inc,
-                                negative_feedback_count = negative_feedback_count + :neg_inc,
-                                total_responses = total_responses + 1,
-                                last_updated = :now,
-                                last_positive_feedback = CASE WHEN :is_positive THEN :now ELSE last_positive_feedback END
-                            WHERE pattern_id = :pattern_id
-                        """),
-                        {
-                            "pattern_id": pattern_id,
-                            "pos_inc": 1 if sentiment == 'positive' else 0,
-                            "neg_inc": 1 if sentiment == 'negative' else 0,
-                            "is_positive": sentiment == 'positive',
-                            "now": datetime.now()
-                        }
-                    )
-                else:
-                    # Create new pattern
-                    conn.execute(
-                        text("""
-                            INSERT INTO successful_response_patterns (
-                                pattern_id, query_type, action_type,
-                                positive_feedback_count, negative_feedback_count, total_responses,
-                                first_seen, last_updated
-                            ) VALUES (
-                                :pattern_id, :query_type, :action_type,
-                                :pos_count, :neg_count, 1,
-                                :now, :now
-                            )
-                        """),
-                        {
-                            "pattern_id": pattern_id,
-                            "query_type": query_type,
-                            "action_type": action_taken,
-                            "pos_count": 1 if sentiment == 'positive' else 0,
-                            "neg_count": 1 if sentiment == 'negative' else 0,
-                            "now": datetime.now()
-                        }
-                    )
-                
-                # Update success rate
-                conn.execute(
-                    text("""
-                        UPDATE successful_response_patterns
-                        SET success_rate = ROUND(100.0 * positive_feedback_count / NULLIF(total_responses, 0), 2),
-                            avg_rating = (
-                                SELECT AVG(rating)
-                                FROM conversation_feedback
-                                WHERE query_type = :query_type AND action_taken = :action_taken AND rating IS NOT NULL
-                            )
-                        WHERE pattern_id = :pattern_id
-                    """),
-                    {
-                        "pattern_id": pattern_id,
-                        "query_type": query_type,
-                        "action_taken": action_taken
-                    }
-                )
+            get_write_behind().submit("response_pattern", RESPONSE_PATTERN_MERGE_SQL, {
+                "pattern_id": pattern_id,
+                "query_type": query_type,
+                "action_taken": action_taken,
+                "pos_inc": 1 if sentiment == 'positive' else 0,
+                "neg_inc": 1 if sentiment == 'negative' else 0,
+                "now": datetime.now()
+            })
         
         except Exception as e:
             logger.warning(f"Failed to update response patterns: {e}")
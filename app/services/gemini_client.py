@@ -6,13 +6,17 @@ caching, error handling, and comprehensive logging.
 
 import os
 import time
+import asyncio
 import hashlib
 import logging
 import json
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, AsyncIterator
 from datetime import datetime, timedelta
 from collections import deque
 
+from app.core.llm_hedging import get_llm_hedger
+from app.core.admission_control import get_llm_admission, estimate_tokens, AdmissionRejected
+
 logger = logging.getLogger("gemini_client")
 
 try:
@@ -165,6 +169,7 @@ class GeminiClient:
         genai.configure(api_key=self.api_key)
         self.model_name = model_name
         self.model = genai.GenerativeModel(model_name)
+        self.admission_key = f"gemini:{model_name}"
         
         # Rate limiting and caching
         self.rate_limiter = RateLimiter(max_requests_per_minute, 60)
@@ -182,6 +187,34 @@ class GeminiClient:
         
         logger.info(f"Gemini client initialized (model: {model_name}, rate limit: {max_requests_per_minute}/min)")
     
+    @staticmethod
+    def _generation_config(temperature: float, max_tokens: int, top_p: float, top_k: int):
+        """Build the Gemini GenerationConfig for a request."""
+        return GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            top_p=top_p,
+            top_k=top_k
+        )
+    
+    @staticmethod
+    def _safety_settings() -> Dict[Any, Any]:
+        """Safety settings - allow most content for financial analysis."""
+        return {
+            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        }
+    
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Text of one streamed chunk ('' for chunks without text parts, e.g. the final one)."""
+        try:
+            return chunk.text or ""
+        except ValueError:
+            return ""
+    
     def generate_text(
         self,
         prompt: str,
@@ -254,28 +287,15 @@ class GeminiClient:
                 
                 start_time = time.time()
                 
-                # Configure generation
-                generation_config = GenerationConfig(
-                    temperature=temperature,
-                    max_output_tokens=max_tokens,
-                    top_p=top_p,
-                    top_k=top_k
-                )
-                
-                # Safety settings - allow most content for financial analysis
-                safety_settings = {
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                }
-                
-                # Generate response
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config=generation_config,
-                    safety_settings=safety_settings
-                )
+                # Generate response (admission control queues us behind higher-priority calls)
+                with get_llm_admission().admit(self.admission_key, estimate_tokens(prompt=prompt, max_tokens=max_tokens)) as ticket:
+                    response = self.model.generate_content(
+                        prompt,
+                        generation_config=self._generation_config(temperature, max_tokens, top_p, top_k),
+                        safety_settings=self._safety_settings()
+                    )
+                    if ticket and getattr(response, 'usage_metadata', None):
+                        ticket.used_tokens = response.usage_metadata.total_token_count
                 
                 latency_ms = int((time.time() - start_time) * 1000)
                 
@@ -310,6 +330,9 @@ class GeminiClient:
                     'latency_ms': latency_ms
                 }
                 
+            except AdmissionRejected:
+                # Queue deadline passed: retrying would only queue again
+                raise
             except Exception as e:
                 last_error = e
                 self.stats['errors'] += 1
@@ -325,6 +348,204 @@ class GeminiClient:
         # All retries failed
         raise Exception(f"Failed to generate text after {retry_attempts} attempts: {last_error}")
     
+    def generate_text_stream(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        top_p: float = 0.95,
+        top_k: int = 40,
+        use_cache: bool = True,
+        retry_attempts: int = 3,
+        retry_delay: float = 1.0
+    ) -> Iterator[str]:
+        """
+        Stream generated text chunk by chunk using Gemini's streaming API.
+        
+        Same arguments as generate_text. Retries only happen before the first
+        chunk has been yielded. The response cache is written only when the
+        stream completes; abandoned or failed streams are never cached.
+        
+        Yields:
+            Text chunks as Gemini produces them
+        """
+        config = {
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'top_p': top_p,
+            'top_k': top_k
+        }
+        
+        if use_cache and self.cache:
+            cached_response = self.cache.get(prompt, config)
+            if cached_response:
+                self.stats['cache_hits'] += 1
+                yield cached_response
+                return
+            self.stats['cache_misses'] += 1
+        
+        wait_time = self.rate_limiter.wait_time()
+        if wait_time > 0:
+            logger.warning(f"Rate limit reached, waiting {wait_time:.2f}s")
+            self.stats['rate_limit_waits'] += 1
+            time.sleep(wait_time)
+        
+        last_error = None
+        for attempt in range(retry_attempts):
+            parts: List[str] = []
+            try:
+                self.rate_limiter.add_request()
+                self.stats['total_requests'] += 1
+                start_time = time.time()
+                first_chunk_ms = None
+                
+                with get_llm_admission().admit(self.admission_key, estimate_tokens(prompt=prompt, max_tokens=max_tokens)) as ticket:
+                    response = self.model.generate_content(
+                        prompt,
+                        generation_config=self._generation_config(temperature, max_tokens, top_p, top_k),
+                        safety_settings=self._safety_settings(),
+                        stream=True
+                    )
+                    for chunk in response:
+                        text = self._chunk_text(chunk)
+                        if not text:
+                            continue
+                        if first_chunk_ms is None:
+                            first_chunk_ms = int((time.time() - start_time) * 1000)
+                        parts.append(text)
+                        yield text
+                    if ticket:
+                        ticket.used_tokens = estimate_tokens(prompt=prompt) + len(parts)
+                
+                text = "".join(parts)
+                if use_cache and self.cache and text:
+                    self.cache.set(prompt, config, text)
+                
+                latency_ms = int((time.time() - start_time) * 1000)
+                logger.info(f"Streamed {len(text)} chars in {latency_ms}ms (first chunk: {first_chunk_ms}ms)")
+                return
+                
+            except AdmissionRejected:
+                # Queue deadline passed: retrying would only queue again
+                raise
+            except Exception as e:
+                last_error = e
+                self.stats['errors'] += 1
+                
+                if parts:
+                    # Client already has part of the answer - cannot retry transparently
+                    logger.error(f"Gemini stream failed after {len(parts)} chunk(s): {e}")
+                    raise
+                if attempt < retry_attempts - 1:
+                    self.stats['retries'] += 1
+                    delay = retry_delay * (2 ** attempt)
+                    logger.warning(f"Stream attempt {attempt + 1} failed: {e}. Retrying in {delay:.1f}s...")
+                    time.sleep(delay)
+                else:
+                    logger.error(f"All {retry_attempts} stream attempts failed: {e}")
+        
+        raise Exception(f"Failed to stream text after {retry_attempts} attempts: {last_error}")
+    
+    async def generate_text_stream_async(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        top_p: float = 0.95,
+        top_k: int = 40,
+        use_cache: bool = True,
+        retry_attempts: int = 3,
+        retry_delay: float = 1.0
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of generate_text_stream (no threadpool needed).
+        
+        Same caching and retry rules: cache only completed streams, retry only
+        before the first chunk.
+        """
+        config = {
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'top_p': top_p,
+            'top_k': top_k
+        }
+        
+        if use_cache and self.cache:
+            cached_response = self.cache.get(prompt, config)
+            if cached_response:
+                self.stats['cache_hits'] += 1
+                yield cached_response
+                return
+            self.stats['cache_misses'] += 1
+        
+        wait_time = self.rate_limiter.wait_time()
+        if wait_time > 0:
+            logger.warning(f"Rate limit reached, waiting {wait_time:.2f}s")
+            self.stats['rate_limit_waits'] += 1
+            await asyncio.sleep(wait_time)
+        
+        last_error = None
+        for attempt in range(retry_attempts):
+            parts: List[str] = []
+            try:
+                self.rate_limiter.add_request()
+                self.stats['total_requests'] += 1
+                start_time = time.time()
+                first_chunk_ms = None
+                
+                async with get_llm_admission().admit_async(
+                    self.admission_key, estimate_tokens(prompt=prompt, max_tokens=max_tokens)
+                ) as ticket:
+                    response = await self.model.generate_content_async(
+                        prompt,
+                        generation_config=self._generation_config(temperature, max_tokens, top_p, top_k),
+                        safety_settings=self._safety_settings(),
+                        stream=True
+                    )
+                    async for chunk in response:
+                        text = self._chunk_text(chunk)
+                        if not text:
+                            continue
+                        if first_chunk_ms is None:
+                            first_chunk_ms = int((time.time() - start_time) * 1000)
+                        parts.append(text)
+                        yield text
+                    if ticket:
+                        ticket.used_tokens = estimate_tokens(prompt=prompt) + len(parts)
+                
+                text = "".join(parts)
+                if use_cache and self.cache and text:
+                    self.cache.set(prompt, config, text)
+                
+                latency_ms = int((time.time() - start_time) * 1000)
+                logger.info(f"Streamed {len(text)} chars in {latency_ms}ms (first chunk: {first_chunk_ms}ms)")
+                if first_chunk_ms is not None:
+                    get_llm_hedger().record(
+                        self.model_name, first_chunk_ms, len(parts), (latency_ms - first_chunk_ms) / 1000
+                    )
+                return
+                
+            except AdmissionRejected:
+                # Queue deadline passed: retrying would only queue again
+                raise
+            except Exception as e:
+                last_error = e
+                self.stats['errors'] += 1
+                get_llm_hedger().record(self.model_name, None, error=True)
+                
+                if parts:
+                    logger.error(f"Gemini stream failed after {len(parts)} chunk(s): {e}")
+                    raise
+                if attempt < retry_attempts - 1:
+                    self.stats['retries'] += 1
+                    delay = retry_delay * (2 ** attempt)
+                    logger.warning(f"Stream attempt {attempt + 1} failed: {e}. Retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+                else:
+                    logger.error(f"All {retry_attempts} stream attempts failed: {e}")
+        
+        raise Exception(f"Failed to stream text after {retry_attempts} attempts: {last_error}")
+    
     def generate_batch(
         self,
         prompts: List[str],
@@ -13,7 +13,7 @@ Handles:
 
 import logging
 import base64
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Union, Iterator, AsyncIterator
 from pathlib import Path
 
 from app.services.gemini_client import get_gemini_client
@@ -338,6 +338,44 @@ When analyzing documents:
 Focus on turning static documents into actionable intelligence for dividend investors."""
         }
     
+    def _build_prompt(
+        self,
+        query: str,
+        query_type: QueryType,
+        context: Optional[str] = None,
+        tickers: Optional[List[str]] = None,
+        document_data: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Assemble the specialized prompt sent to Gemini for a query."""
+        # Get specialized system prompt
+        system_prompt = self.prompts.get(query_type, "")
+        
+        # Build enhanced prompt
+        prompt_parts = []
+        
+        # Add system prompt
+        if system_prompt:
+            prompt_parts.append(system_prompt)
+        
+        # Add ticker context if available
+        if tickers and len(tickers) > 0:
+            ticker_context = f"\n\n**TICKERS TO ANALYZE**: {', '.join(tickers)}"
+            prompt_parts.append(ticker_context)
+        
+        # Add conversation context if available
+        if context:
+            prompt_parts.append(f"\n\n**CONTEXT**: {context}")
+        
+        # Add the actual user query
+        prompt_parts.append(f"\n\n**USER QUERY**: {query}")
+        
+        # Special handling for multimodal document queries
+        if query_type == QueryType.MULTIMODAL_DOCUMENT and document_data:
+            doc_context = self._format_document_context(document_data)
+            prompt_parts.append(doc_context)
+        
+        return "\n".join(prompt_parts)
+    
     def handle_query(
         self,
         query: str,
@@ -369,34 +407,7 @@ Focus on turning static documents into actionable intelligence for dividend inve
                 - cached: Whether response was cached
         """
         try:
-            # Get specialized system prompt
-            system_prompt = self.prompts.get(query_type, "")
-            
-            # Build enhanced prompt
-            prompt_parts = []
-            
-            # Add system prompt
-            if system_prompt:
-                prompt_parts.append(system_prompt)
-            
-            # Add ticker context if available
-            if tickers and len(tickers) > 0:
-                ticker_context = f"\n\n**TICKERS TO ANALYZE**: {', '.join(tickers)}"
-                prompt_parts.append(ticker_context)
-            
-            # Add conversation context if available
-            if context:
-                prompt_parts.append(f"\n\n**CONTEXT**: {context}")
-            
-            # Add the actual user query
-            prompt_parts.append(f"\n\n**USER QUERY**: {query}")
-            
-            # Special handling for multimodal document queries
-            if query_type == QueryType.MULTIMODAL_DOCUMENT and document_data:
-                doc_context = self._format_document_context(document_data)
-                prompt_parts.append(doc_context)
-            
-            full_prompt = "\n".join(prompt_parts)
+            full_prompt = self._build_prompt(query, query_type, context, tickers, document_data)
             
             # Log query routing
             logger.info(f"Routing to Gemini: query_type={query_type.value}, tickers={tickers}")
@@ -430,40 +441,57 @@ Focus on turning static documents into actionable intelligence for dividend inve
         document_data: Optional[Dict[str, Any]] = None,
         temperature: float = 0.7,
         max_tokens: int = 2048
-    ):
+    ) -> Iterator[str]:
         """
-        Handle query with streaming response (yields text chunks).
+        Handle query with streaming response (yields text chunks as Gemini produces them).
         
-        Note: Current implementation returns complete response.
-        For true streaming, would need to use Gemini's streaming API.
+        Only completed streams populate the response cache. Errors propagate so
+        the caller can fall back or mark a partial answer as failed.
         
         Yields:
             Text chunks for streaming response
         """
         try:
-            # For now, generate complete response and yield it
-            # Future: Implement true streaming with Gemini API
-            result = self.handle_query(
-                query=query,
-                query_type=query_type,
-                context=context,
-                tickers=tickers,
-                document_data=document_data,
+            full_prompt = self._build_prompt(query, query_type, context, tickers, document_data)
+            logger.info(f"Streaming from Gemini: query_type={query_type.value}, tickers={tickers}")
+            
+            yield from self.client.generate_text_stream(
+                prompt=full_prompt,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                use_cache=True
             )
+                
+        except Exception as e:
+            logger.error(f"Streaming handler error: {e}")
+            raise
+    
+    async def handle_query_streaming_async(
+        self,
+        query: str,
+        query_type: QueryType,
+        context: Optional[str] = None,
+        tickers: Optional[List[str]] = None,
+        document_data: Optional[Dict[str, Any]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2048
+    ) -> AsyncIterator[str]:
+        """Async variant of handle_query_streaming for the event loop."""
+        try:
+            full_prompt = self._build_prompt(query, query_type, context, tickers, document_data)
+            logger.info(f"Streaming from Gemini: query_type={query_type.value}, tickers={tickers}")
             
-            text = result.get('text', '')
-            
-            # Yield in chunks for progressive display
-            chunk_size = 100
-            for i in range(0, len(text), chunk_size):
-                chunk = text[i:i + chunk_size]
+            async for chunk in self.client.generate_text_stream_async(
+                prompt=full_prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                use_cache=True
+            ):
                 yield chunk
                 
         except Exception as e:
             logger.error(f"Streaming handler error: {e}")
-            yield f"\n\n**Error**: Failed to generate Gemini response: {str(e)}\n"
+            raise
     
     def _format_document_context(self, document_data: Dict[str, Any]) -> str:
         """
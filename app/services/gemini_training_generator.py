@@ -12,6 +12,7 @@ from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from difflib import SequenceMatcher
 from app.services.gemini_client import get_gemini_client
+from app.core.admission_control import llm_priority, PRIORITY_TRAINING
 
 logger = logging.getLogger("gemini_training_generator")
 
@@ -343,6 +344,7 @@ Output format: Return ONLY a JSON array of question strings, no additional text.
         
         logger.info("Gemini Training Generator initialized")
     
+    @llm_priority(PRIORITY_TRAINING)
     def generate_questions(
         self,
         category: str,
@@ -560,6 +562,7 @@ Output format: Return ONLY a JSON array of question strings, no additional text.
         
         return False
     
+    @llm_priority(PRIORITY_TRAINING)
     def _generate_answer(self, question: str, category: str) -> str:
         """
         Generate a comprehensive answer for a question.
@@ -14,6 +14,8 @@ Features:
 - Optional database persistence for durability
 """
 
+import os
+import json
 import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
@@ -29,6 +31,14 @@ try:
 except ImportError:
     HAS_PYODBC = False
 
+HASHTAG_EVENTS_PERSIST = os.getenv("HASHTAG_EVENTS_PERSIST", "false").lower() in ("1", "true", "yes")
+
+HASHTAG_EVENT_INSERT_SQL = """
+    INSERT INTO dbo.hashtag_events
+    (hashtag, context, user_id, session_id, conversation_id, metadata, created_at)
+    VALUES (:hashtag, :context, :user_id, :session_id, :conversation_id, :metadata, :created_at)
+"""
+
 
 class HashtagAnalyticsService:
     """
@@ -41,7 +51,8 @@ class HashtagAnalyticsService:
         db_connection_string: Optional[str] = None,
         retention_days: int = 30,
         max_events_in_memory: int = 10000,
-        enable_auto_cleanup: bool = True
+        enable_auto_cleanup: bool = True,
+        persist_events: Optional[bool] = None
     ):
         """
         Initialize hashtag analytics service
@@ -51,8 +62,13 @@ class HashtagAnalyticsService:
             retention_days: Days to retain events before auto-deletion (default: 30)
             max_events_in_memory: Maximum events to keep in memory (default: 10000)
             enable_auto_cleanup: Enable automatic cleanup of old events (default: True)
+            persist_events: Persist events to dbo.hashtag_events (default: on when a
+                connection string is given or HASHTAG_EVENTS_PERSIST is set)
         """
         self.db_connection_string = db_connection_string
+        if persist_events is None:
+            persist_events = bool(db_connection_string) or HASHTAG_EVENTS_PERSIST
+        self.persist_events = persist_events
         self.retention_days = retention_days
         self.max_events_in_memory = max_events_in_memory
         self.enable_auto_cleanup = enable_auto_cleanup
@@ -175,8 +191,8 @@ class HashtagAnalyticsService:
                 self._cleanup_old_events()
             
             # Persist to database if available
-            if self.db_connection_string and HAS_PYODBC:
-                self._persist_to_database(hashtags, user_id, context, session_id, conversation_id, metadata)
+            if self.persist_events and HAS_PYODBC:
+                self._persist_to_database(hashtags, user_id, context, session_id, conversation_id, metadata, timestamp)
             
             logger.info(
                 f"[HashtagAnalytics] Tracked {len(hashtags)} hashtag(s): "
@@ -487,28 +503,31 @@ class HashtagAnalyticsService:
         context: str,
         session_id: Optional[str],
         conversation_id: Optional[str],
-        metadata: Optional[Dict]
+        metadata: Optional[Dict],
+        timestamp: Optional[datetime] = None
     ):
         """
-        Persist hashtag event to database (if connection available)
+        Persist hashtag event to database (one hashtag_events row per hashtag)
         
-        This is a placeholder for database persistence.
-        In production, you would implement:
-        1. INSERT into hashtag_events table
-        2. UPDATE hashtag_stats aggregates
-        3. Track user preferences
+        Rows are queued on the shared write-behind queue and inserted in
+        batches off the request path; aggregates are computed from the table.
         """
         try:
-            if not self.db_connection_string:
-                return
-            
-            # Placeholder for database persistence
-            # In production, implement:
-            # 1. INSERT into hashtag_events table
-            # 2. UPDATE hashtag_stats aggregates
-            # 3. Track user preferences
+            from app.core.write_behind import get_write_behind
             
-            logger.debug(f"[HashtagAnalytics] Would persist {len(hashtags)} hashtags to database")
+            writes = get_write_behind()
+            metadata_json = json.dumps(metadata) if metadata else None
+            created_at = timestamp or datetime.utcnow()
+            for hashtag in hashtags:
+                writes.submit("hashtag_event", HASHTAG_EVENT_INSERT_SQL, {
+                    "hashtag": hashtag.upper(),
+                    "context": context,
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "conversation_id": conversation_id,
+                    "metadata": metadata_json,
+                    "created_at": created_at
+                })
             
         except Exception as e:
             logger.warning(f"[HashtagAnalytics] Database persistence failed: {str(e)}")
@@ -13,7 +13,8 @@ from typing import List, Dict, Optional, Any
 from sqlalchemy import text
 
 from app.core.database import engine
-from app.core.llm_providers import oai_client, CHAT_MODEL
+from app.core.llm_providers import oai_chat_completion
+from app.core.admission_control import llm_priority, PRIORITY_DIGEST
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("insights_service")
@@ -336,15 +337,16 @@ Upcoming Ex-Dividend Dates (Next 7 days):
 {json.dumps(upcoming_dividends, indent=2)}
 """
 
-        response = oai_client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Generate a daily portfolio digest based on this data:\n\n{data_summary}"}
-            ],
-            temperature=0.3,
-            max_tokens=1000
-        )
+        # Digests are batch work: queue behind interactive chat
+        with llm_priority(PRIORITY_DIGEST):
+            response = oai_chat_completion(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": f"Generate a daily portfolio digest based on this data:\n\n{data_summary}"}
+                ],
+                temperature=0.3,
+                max_tokens=1000
+            )
         
         digest_content = response.choices[0].message.content.strip()
         
@@ -13,8 +13,37 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.pool import NullPool
 import logging
 
+from app.core.intent_engine import get_intent_engine, scan
+from app.core.write_behind import get_write_behind
+
 logger = logging.getLogger(__name__)
 
+DIVIDEND_QUERY_KEYWORDS = [
+    'dividend', 'yield', 'payout', 'income', 'passive',
+    'distribution', 'ex-date', 'payment date', 'aristocrat',
+    'monthly income', 'quarterly dividend', 'drip', 'reinvest',
+    'tax efficient', 'qualified dividend', 'ordinary dividend',
+    'dividend growth', 'dividend safety', 'payout ratio',
+    'dividend cut', 'dividend king', 'dividend champion',
+    'income ladder', 'cash flow', 'dividend coverage',
+    'reit dividend', 'mlp distribution', 'bdc dividend'
+]
+
+get_intent_engine().register_keywords("dividend_audit", DIVIDEND_QUERY_KEYWORDS)
+
+AUDIT_LOG_INSERT_SQL = """
+    INSERT INTO dividend_model_audit_log (
+        query, selected_model, routing_reason,
+        model_responses_json, dividend_metrics_json,
+        user_id, session_id, created_at
+    )
+    VALUES (
+        :query, :selected_model, :routing_reason,
+        :model_responses_json, :dividend_metrics_json,
+        :user_id, :session_id, :created_at
+    )
+"""
+
 
 class DividendModelAuditor:
     """
@@ -53,19 +82,7 @@ class DividendModelAuditor:
         Determine if a query is dividend-related.
         Harvey's specialty: passive income and dividend investing.
         """
-        dividend_keywords = [
-            'dividend', 'yield', 'payout', 'income', 'passive',
-            'distribution', 'ex-date', 'payment date', 'aristocrat',
-            'monthly income', 'quarterly dividend', 'drip', 'reinvest',
-            'tax efficient', 'qualified dividend', 'ordinary dividend',
-            'dividend growth', 'dividend safety', 'payout ratio',
-            'dividend cut', 'dividend king', 'dividend champion',
-            'income ladder', 'cash flow', 'dividend coverage',
-            'reit dividend', 'mlp distribution', 'bdc dividend'
-        ]
-        
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in dividend_keywords)
+        return scan(query).has("dividend_audit")
     
     def extract_dividend_metrics(self, response: str, model_name: str) -> Dict[str, Any]:
         """
@@ -199,7 +216,8 @@ class DividendModelAuditor:
             session_id: Optional session identifier
         
         Returns:
-            Audit log ID if successful, None otherwise
+            None; the row is written through the write-behind queue, so no
+            audit log ID is available to the caller
         """
         # Only log dividend-focused queries
         if not self.is_dividend_query(query):
@@ -227,29 +245,11 @@ class DividendModelAuditor:
                 'created_at': datetime.utcnow()
             }
             
-            # Insert into database
-            insert_sql = text("""
-                INSERT INTO dividend_model_audit_log (
-                    query, selected_model, routing_reason, 
-                    model_responses_json, dividend_metrics_json,
-                    user_id, session_id, created_at
-                )
-                OUTPUT INSERTED.id
-                VALUES (
-                    :query, :selected_model, :routing_reason,
-                    :model_responses_json, :dividend_metrics_json,
-                    :user_id, :session_id, :created_at
-                )
-            """)
+            # Queue the insert; the audit log is training data, not on the answer path
+            get_write_behind().submit("dividend_model_audit", AUDIT_LOG_INSERT_SQL, audit_data)
+            logger.info(f"Queued multi-model dividend analysis for query: {query[:50]}...")
+            return None
             
-            with self.engine.connect() as conn:
-                result = conn.execute(insert_sql, audit_data)
-                conn.commit()
-                audit_id = result.scalar()
-                
-                logger.info(f"Logged multi-model dividend analysis (ID: {audit_id}) for query: {query[:50]}...")
-                return audit_id
-                
         except Exception as e:
             logger.error(f"Failed to log model audit: {e}")
             return None
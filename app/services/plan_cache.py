@@ -0,0 +1,243 @@
+"""
+Planner Plan Cache
+
+Skips the planner LLM round trip for question shapes we have already planned:
+- Questions canonicalized into templates (tickers -> placeholders, case/whitespace folded)
+- Keyed together with a hash of the effective planner system prompt
+- Stores the sanitized SQL template and re-binds the new tickers on a hit
+- TTL + LRU eviction (backed by QueryCache)
+- Hit/miss counters exposed through /admin/cache/stats
+
+Only SQL plans are cached, and only when every ticker-looking literal in the
+SQL comes from the question itself, so a template can never leak a ticker the
+planner picked on its own into somebody else's answer. Plans that mention the
+question's tickers in any other form (LIKE 'KO%', '%Coca-Cola%'), or that have
+no ticker placeholder at all for a question with tickers, are not cached either.
+
+Expected Results:
+- 1-3s saved on every repeated SQL-path question ("latest dividend for X")
+- Fewer planner tokens per chat turn
+"""
+
+import os
+import re
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+
+from app.services.query_cache import QueryCache
+
+logger = logging.getLogger("plan_cache")
+
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", "3600"))
+PLAN_CACHE_MAX_SIZE = int(os.getenv("PLAN_CACHE_MAX_SIZE", "1000"))
+# Long questions are almost always file/OCR uploads - never worth a template
+PLAN_CACHE_MAX_QUESTION_CHARS = int(os.getenv("PLAN_CACHE_MAX_QUESTION_CHARS", "1000"))
+
+_WS = re.compile(r"\s+")
+_EXTRACTION_TIMING = re.compile(r"\(processed in \d+ms\)")
+_SQL_STRING = re.compile(r"'((?:[^']|'')*)'")
+_TICKER_SHAPE = re.compile(r"^[A-Z]{1,5}(?:[.\-][A-Z]{1,2})?$")
+_PLACEHOLDER = re.compile(r"__T(\d+)__")
+
+# Uppercase literals the planner legitimately emits that are not tickers
+_NON_TICKER_LITERALS = {
+    "NYSE", "NASDAQ", "AMEX", "ARCA", "BATS", "OTC", "PINK",
+    "US", "USA", "USD", "ETF", "REIT", "CEF",
+}
+
+
+def _placeholder(index: int) -> str:
+    return f"__T{index}__"
+
+
+def canonicalize_question(question: str, tickers: List[str]) -> str:
+    """
+    Reduce a question to its shape: tickers become positional placeholders,
+    case and whitespace are folded.
+
+    Args:
+        question: Question as sent to the planner (including TICKERS_HINT)
+        tickers: Tickers from extract_ticker_list, in order of appearance
+    """
+    text = _EXTRACTION_TIMING.sub("", question)
+    for i, ticker in enumerate(tickers):
+        text = re.sub(
+            rf"(?<![A-Za-z0-9.\-]){re.escape(ticker)}(?![A-Za-z0-9])",
+            _placeholder(i),
+            text
+        )
+    return _WS.sub(" ", text).strip().lower()
+
+
+def _mentions(literal: str, tickers: Iterable[str], names: Iterable[str]) -> bool:
+    """Whether a SQL string literal refers to one of the tickers or company names."""
+    for ticker in tickers:
+        if re.search(rf"(?<![A-Za-z0-9]){re.escape(ticker)}(?![A-Za-z0-9])", literal, re.IGNORECASE):
+            return True
+    text = literal.lower()
+    core = text.strip("%_[] ")
+    return any(name in text or (len(core) >= 3 and core in name) for name in names)
+
+
+def to_sql_template(sql: str, tickers: List[str],
+                    aliases: Optional[Dict[str, List[str]]] = None) -> Optional[str]:
+    """
+    Replace the question's ticker literals in `sql` with placeholders.
+
+    Args:
+        sql: Sanitized planner SQL
+        tickers: Tickers from the question, in placeholder order
+        aliases: Lowercased company names per ticker (extract_tickers.ticker_aliases)
+
+    Returns None when the SQL is not safe to reuse for other tickers: it
+    references a ticker-looking literal the question did not contain, it
+    still names a question ticker or company inside another literal, or the
+    question has tickers but none of them became a placeholder.
+    """
+    index = {t.upper(): i for i, t in enumerate(tickers)}
+    names = [name for t in index for name in (aliases or {}).get(t, ()) if name]
+    uncacheable = False
+    placeholders = 0
+
+    def repl(m: re.Match) -> str:
+        nonlocal uncacheable, placeholders
+        literal = m.group(1)
+        up = literal.upper()
+        if up in index:
+            placeholders += 1
+            return f"'{_placeholder(index[up])}'"
+        if _TICKER_SHAPE.match(literal) and literal not in _NON_TICKER_LITERALS:
+            uncacheable = True
+        elif _mentions(literal, index, names):
+            uncacheable = True
+        return m.group(0)
+
+    template = _SQL_STRING.sub(repl, sql)
+    if uncacheable or _PLACEHOLDER.search(sql) or (index and not placeholders):
+        return None
+    return template
+
+
+def bind_sql_template(template: str, tickers: List[str]) -> Optional[str]:
+    """Re-bind placeholders to the current question's tickers."""
+    missing = False
+
+    def repl(m: re.Match) -> str:
+        nonlocal missing
+        i = int(m.group(1))
+        if i >= len(tickers):
+            missing = True
+            return m.group(0)
+        return tickers[i].replace("'", "''")
+
+    sql = _PLACEHOLDER.sub(repl, template)
+    return None if missing else sql
+
+
+class PlanCache:
+    """
+    Cache of planner SQL templates keyed by canonical question shape.
+
+    Features:
+    - Ticker-normalized keys (one entry serves every ticker)
+    - Planner prompt hash in the key (prompt edits invalidate naturally)
+    - TTL + LRU eviction
+    - Hit/miss/store statistics
+    """
+
+    def __init__(self, ttl: int = PLAN_CACHE_TTL, max_size: int = PLAN_CACHE_MAX_SIZE):
+        """
+        Initialize plan cache.
+
+        Args:
+            ttl: Seconds a cached plan stays valid
+            max_size: Maximum number of cached templates
+        """
+        self.ttl = ttl
+        self._store = QueryCache(max_size=max_size)
+        self._lock = threading.Lock()
+        self.stores = 0
+        self.uncacheable = 0
+        self.bypassed = 0
+
+        logger.info(f"Plan cache initialized: ttl={ttl}s, max_size={max_size}")
+
+    def make_key(self, question: str, tickers: List[str], planner_system: str) -> Optional[str]:
+        """Build the cache key, or None if this question should never be cached."""
+        if len(question) > PLAN_CACHE_MAX_QUESTION_CHARS:
+            return None
+        shape = canonicalize_question(question, tickers)
+        prompt_hash = hashlib.sha1(planner_system.encode("utf-8")).hexdigest()[:16]
+        shape_hash = hashlib.sha1(shape.encode("utf-8")).hexdigest()
+        return f"plan:{prompt_hash}:{len(tickers)}:{shape_hash}"
+
+    def lookup(self, key: str, tickers: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Return a ready-to-run plan for this question, or None on a miss.
+        """
+        with self._lock:
+            template = self._store.get(key)
+        if template is None:
+            return None
+
+        sql = bind_sql_template(template, tickers)
+        if sql is None:
+            return None
+
+        logger.info(f"Plan cache HIT: {key[:40]}... (hit rate: {self.get_hit_rate():.1%})")
+        return {"action": "sql", "final_answer": None, "sql": sql, "cached": True}
+
+    def store_plan(self, key: str, sql: str, tickers: List[str],
+                   aliases: Optional[Dict[str, List[str]]] = None) -> bool:
+        """Store the sanitized SQL for a freshly planned question (aliases: company names per ticker)."""
+        template = to_sql_template(sql, tickers, aliases)
+        if template is None:
+            self.uncacheable += 1
+            logger.debug(f"Plan cache SKIP (ticker not bound to a placeholder): {key[:40]}...")
+            return False
+
+        with self._lock:
+            self._store.set(key, template, ttl=self.ttl, query_type="planner_plan")
+        self.stores += 1
+        return True
+
+    def note_bypass(self):
+        """Count a request that skipped the cache on purpose."""
+        self.bypassed += 1
+
+    def clear(self):
+        """Drop every cached plan."""
+        with self._lock:
+            self._store.clear()
+
+    def get_hit_rate(self) -> float:
+        """Get current cache hit rate."""
+        return self._store.get_hit_rate()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get plan cache statistics for monitoring."""
+        with self._lock:
+            stats = self._store.get_stats()
+        stats.update({
+            "enabled": PLAN_CACHE_ENABLED,
+            "ttl_seconds": self.ttl,
+            "stores": self.stores,
+            "uncacheable": self.uncacheable,
+            "bypassed": self.bypassed,
+        })
+        return stats
+
+
+# Global plan cache instance
+_plan_cache: Optional[PlanCache] = None
+
+
+def get_plan_cache() -> PlanCache:
+    """Get or create global plan cache instance."""
+    global _plan_cache
+    if _plan_cache is None:
+        _plan_cache = PlanCache()
+    return _plan_cache
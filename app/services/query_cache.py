@@ -5,6 +5,8 @@ Caches static reference data and frequently-accessed queries:
 - Ticker metadata (24 hour TTL)
 - ML cluster dashboard (12 hour TTL)
 - Common dividend queries (1 hour TTL)
+- Planner-generated SQL results, with per-view TTLs and view-level invalidation
+  that reaches every worker (refresh generations shared through the database)
 
 Expected Results:
 - Faster repeated queries
@@ -12,9 +14,12 @@ Expected Results:
 - Better user experience
 """
 
+import os
+import re
 import time
 import logging
-from typing import Dict, Any, Optional, Callable
+import threading
+from typing import Dict, Any, Optional, Callable, Iterable, List, Tuple
 from collections import OrderedDict
 from functools import wraps
 
@@ -29,6 +34,7 @@ class QueryCache:
     - Configurable TTL per query type
     - LRU eviction
     - Automatic expiration
+    - Tag-based invalidation (e.g. by source view)
     - Cache statistics
     """
     
@@ -44,6 +50,8 @@ class QueryCache:
         self.hits = 0
         self.misses = 0
         self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.RLock()
         
         # Default TTLs for different query types
         self.default_ttls = {
@@ -51,6 +59,7 @@ class QueryCache:
             "ml_cluster_dashboard": 43200, # 12 hours
             "dividend_query": 3600,        # 1 hour
             "price_query": 300,            # 5 minutes
+            "sql_result": 1800,            # 30 minutes (per-view TTLs usually apply)
             "default": 1800                # 30 minutes
         }
         
@@ -66,26 +75,34 @@ class QueryCache:
         Returns:
             Cached result or None
         """
-        if key in self.cache:
-            entry = self.cache[key]
+        with self._lock:
+            if key in self.cache:
+                entry = self.cache[key]
             
-            # Check if expired
-            if time.time() < entry["expires_at"]:
-                # Move to end (LRU)
-                self.cache.move_to_end(key)
-                self.hits += 1
-                logger.debug(f"Query cache HIT: {key[:50]}... (hit rate: {self.get_hit_rate():.1%})")
-                return entry["data"]
-            else:
-                # Expired - remove it
-                del self.cache[key]
-                logger.debug(f"Query cache EXPIRED: {key[:50]}...")
+                # Check if expired
+                if time.time() < entry["expires_at"]:
+                    # Move to end (LRU)
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+                    logger.debug(f"Query cache HIT: {key[:50]}... (hit rate: {self.get_hit_rate():.1%})")
+                    return entry["data"]
+                else:
+                    # Expired - remove it
+                    del self.cache[key]
+                    logger.debug(f"Query cache EXPIRED: {key[:50]}...")
         
-        self.misses += 1
-        logger.debug(f"Query cache MISS: {key[:50]}... (hit rate: {self.get_hit_rate():.1%})")
-        return None
+            self.misses += 1
+            logger.debug(f"Query cache MISS: {key[:50]}... (hit rate: {self.get_hit_rate():.1%})")
+            return None
     
-    def set(self, key: str, data: Any, ttl: Optional[int] = None, query_type: str = "default"):
+    def set(
+        self,
+        key: str,
+        data: Any,
+        ttl: Optional[int] = None,
+        query_type: str = "default",
+        tags: Optional[Iterable[str]] = None
+    ):
         """
         Cache query result.
         
@@ -94,36 +111,59 @@ class QueryCache:
             data: Query result to cache
             ttl: Time-to-live in seconds (uses default for query_type if None)
             query_type: Type of query for default TTL lookup
+            tags: Labels for bulk invalidation (e.g. source view names)
         """
         if ttl is None:
             ttl = self.default_ttls.get(query_type, self.default_ttls["default"])
         
-        # Check if we need to evict entries (LRU)
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            evicted_key, _ = self.cache.popitem(last=False)
-            self.evictions += 1
-            logger.debug(f"Query cache EVICTION (LRU): {evicted_key[:50]}...")
+        with self._lock:
+            # Check if we need to evict entries (LRU)
+            if len(self.cache) >= self.max_size and key not in self.cache:
+                evicted_key, _ = self.cache.popitem(last=False)
+                self.evictions += 1
+                logger.debug(f"Query cache EVICTION (LRU): {evicted_key[:50]}...")
         
-        expires_at = time.time() + ttl
+            expires_at = time.time() + ttl
         
-        self.cache[key] = {
-            "data": data,
-            "expires_at": expires_at,
-            "cached_at": time.time(),
-            "query_type": query_type
-        }
+            self.cache[key] = {
+                "data": data,
+                "expires_at": expires_at,
+                "cached_at": time.time(),
+                "query_type": query_type,
+                "tags": frozenset(t.lower() for t in tags) if tags else frozenset()
+            }
         
-        # Move to end (most recently used)
-        self.cache.move_to_end(key)
+            # Move to end (most recently used)
+            self.cache.move_to_end(key)
         
         logger.debug(f"Query cache SET: {key[:50]}... (ttl={ttl}s, type={query_type})")
     
     def clear(self):
         """Clear all cache entries."""
-        count = len(self.cache)
-        self.cache.clear()
+        with self._lock:
+            count = len(self.cache)
+            self.cache.clear()
         logger.info(f"Query cache cleared: {count} entries removed")
     
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Remove every entry carrying any of the given tags.
+        
+        Args:
+            tags: Tags to invalidate (case-insensitive)
+            
+        Returns:
+            Number of entries removed
+        """
+        wanted = {t.lower() for t in tags}
+        with self._lock:
+            stale = [k for k, entry in self.cache.items() if entry.get("tags", frozenset()) & wanted]
+            for k in stale:
+                del self.cache[k]
+            self.invalidations += len(stale)
+        logger.info(f"Query cache invalidated {len(stale)} entries for tags={sorted(wanted)}")
+        return len(stale)
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
         total_requests = self.hits + self.misses
@@ -134,6 +174,7 @@ class QueryCache:
             "hits": self.hits,
             "misses": self.misses,
             "evictions": self.evictions,
+            "invalidations": self.invalidations,
             "total_requests": total_requests,
             "hit_rate": hit_rate,
             "cache_size": len(self.cache),
@@ -209,3 +250,273 @@ def clear_query_cache():
     global _query_cache
     if _query_cache:
         _query_cache.clear()
+
+
+# ======================== SQL RESULT CACHE ========================
+#
+# Planner-generated SELECTs are cached by normalized SQL text. Entries are
+# tagged with the views they read so ingestion jobs can drop exactly the
+# results a refresh made stale (see invalidate_views).
+
+SQL_RESULT_CACHE_ENABLED = os.getenv("SQL_RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SQL_RESULT_CACHE_MAX_ROWS = int(os.getenv("SQL_RESULT_CACHE_MAX_ROWS", "5000"))
+VIEW_GENERATIONS_SHARED = os.getenv("VIEW_GENERATIONS_SHARED", "true").lower() in ("1", "true", "yes")
+VIEW_GENERATION_POLL_SECONDS = float(os.getenv("VIEW_GENERATION_POLL_SECONDS", "5"))
+
+# Per-view TTLs in seconds; a query gets the shortest TTL of the views it reads
+VIEW_TTLS = {
+    "vprices": 120,
+    "vquotesenhanced": 120,
+    "vdividendsignals": 3600,
+    "vdividendpredictions": 3600,
+    "vdividends": 21600,
+    "vdividendsenhanced": 21600,
+    "vdividendschedules": 21600,
+    "vtickers": 86400,
+    "vsecurities": 86400,
+}
+
+# One row per refreshed view. Jobs that load data outside this app can run
+# BUMP_VIEW_GENERATION_SQL themselves instead of calling the admin endpoint.
+CREATE_VIEW_GENERATIONS_SQL = """
+IF OBJECT_ID('dbo.view_generations', 'U') IS NULL
+    CREATE TABLE dbo.view_generations (
+        view_name VARCHAR(128) NOT NULL PRIMARY KEY,
+        generation BIGINT NOT NULL,
+        refreshed_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    )
+"""
+BUMP_VIEW_GENERATION_SQL = """
+MERGE dbo.view_generations WITH (HOLDLOCK) AS target
+USING (SELECT ? AS view_name) AS source ON target.view_name = source.view_name
+WHEN MATCHED THEN
+    UPDATE SET generation = target.generation + 1, refreshed_at = SYSUTCDATETIME()
+WHEN NOT MATCHED THEN
+    INSERT (view_name, generation) VALUES (source.view_name, 1)
+OUTPUT inserted.generation;
+"""
+SELECT_VIEW_GENERATIONS_SQL = "SELECT view_name, generation FROM dbo.view_generations"
+
+_VIEW_REF = re.compile(r"(?i)\b(?:dbo\.)?\[?(v[A-Za-z]+)\]?")
+_SQL_WS = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace so formatting differences share one cache entry."""
+    return _SQL_WS.sub(" ", sql).strip()
+
+
+def views_in_sql(sql: str) -> List[str]:
+    """Known views referenced by a query (lowercased)."""
+    return sorted({m.group(1).lower() for m in _VIEW_REF.finditer(sql)} & VIEW_TTLS.keys())
+
+
+def sql_result_ttl(views: Iterable[str]) -> int:
+    """Shortest TTL across the views a query reads."""
+    ttls = [VIEW_TTLS[v] for v in views if v in VIEW_TTLS]
+    return min(ttls) if ttls else get_query_cache().default_ttls["sql_result"]
+
+
+def get_cached_sql_result(sql: str) -> Optional[Tuple[List[str], Tuple[tuple, ...]]]:
+    """
+    Look up a cached result set.
+    
+    Returns:
+        (columns, rows) or None on a miss
+    """
+    if not SQL_RESULT_CACHE_ENABLED:
+        return None
+    return get_query_cache().get(f"sql:{normalize_sql(sql)}")
+
+
+def cache_sql_result(sql: str, columns: List[str], rows: List[tuple]) -> bool:
+    """
+    Cache a fully-read result set, tagged by the views it came from.
+    
+    Results larger than SQL_RESULT_CACHE_MAX_ROWS are not cached.
+    """
+    if not SQL_RESULT_CACHE_ENABLED or len(rows) > SQL_RESULT_CACHE_MAX_ROWS:
+        return False
+    views = views_in_sql(sql)
+    get_query_cache().set(
+        f"sql:{normalize_sql(sql)}",
+        (list(columns), tuple(rows)),
+        ttl=sql_result_ttl(views),
+        query_type="sql_result",
+        tags=[f"view:{v}" for v in views]
+    )
+    return True
+
+
+class DatabaseGenerationStore:
+    """dbo.view_generations through a SQLAlchemy engine (the shared one by default)."""
+    
+    def __init__(self, engine=None):
+        self._engine = engine
+    
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.core.database import engine
+            self._engine = engine
+        return self._engine
+    
+    def load(self) -> Dict[str, int]:
+        with self.engine.connect() as conn:
+            rows = conn.exec_driver_sql(SELECT_VIEW_GENERATIONS_SQL).fetchall()
+        return {name.lower(): int(generation) for name, generation in rows}
+    
+    def bump(self, names: List[str]) -> Dict[str, int]:
+        with self.engine.begin() as conn:
+            return {name: int(conn.exec_driver_sql(BUMP_VIEW_GENERATION_SQL, (name,)).scalar()) for name in names}
+
+
+class ViewGenerations:
+    """
+    Refresh generation of each view, shared by every worker.
+    
+    Caches built on SQL results (this module's result cache, the semantic
+    answer cache) compare generations to detect refreshed data.
+    
+    Features:
+    - bump() writes the new generations to dbo.view_generations and applies
+      them in this process at once
+    - A daemon thread reads the table every poll_seconds and reports views
+      bumped elsewhere (another worker, the migration runner, an ingestion
+      job) to on_change, which drops this worker's cached results
+    - When the table cannot be written the bump stays local to this process,
+      as before
+    """
+    
+    def __init__(self, store: Optional[Any] = None, poll_seconds: float = VIEW_GENERATION_POLL_SECONDS,
+                 on_change: Optional[Callable[[List[str]], Any]] = None):
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.on_change = on_change
+        self._shared: Dict[str, int] = {}
+        self._local: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {"bumps": 0, "local_bumps": 0, "remote_bumps": 0, "polls": 0, "poll_errors": 0}
+    
+    def current(self, views: Iterable[str]) -> Dict[str, int]:
+        self._start()
+        with self._lock:
+            return {v: self._shared.get(v, 0) + self._local.get(v, 0) for v in views}
+    
+    def bump(self, names: List[str]):
+        self._start()
+        shared = None
+        if self.store is not None:
+            try:
+                shared = self.store.bump(names)
+            except Exception as e:
+                logger.warning(f"Shared view generation bump failed, invalidating this worker only: {e}")
+        with self._lock:
+            self.stats["bumps"] += len(names)
+            for name in names:
+                if shared is not None:
+                    self._shared[name] = max(self._shared.get(name, 0), shared[name])
+                else:
+                    self._local[name] = self._local.get(name, 0) + 1
+                    self.stats["local_bumps"] += 1
+    
+    def poll(self) -> List[str]:
+        """Read the shared generations; returns (and reports) the views bumped elsewhere."""
+        if self.store is None:
+            return []
+        try:
+            shared = self.store.load()
+        except Exception as e:
+            with self._lock:
+                self.stats["poll_errors"] += 1
+                first = self.stats["poll_errors"] == 1
+            if first:
+                logger.warning(f"Reading shared view generations failed: {e}")
+            return []
+        with self._lock:
+            self.stats["polls"] += 1
+            changed = sorted(v for v, generation in shared.items() if generation > self._shared.get(v, 0))
+            for v in changed:
+                self._shared[v] = shared[v]
+            self.stats["remote_bumps"] += len(changed)
+        if changed and self.on_change is not None:
+            self.on_change(changed)
+        return changed
+    
+    def _start(self):
+        if self._thread is None and self.store is not None and self.poll_seconds > 0:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="view-generations", daemon=True)
+                    self._thread.start()
+    
+    def _run(self):
+        self.poll()
+        while not self._stop.wait(self.poll_seconds):
+            self.poll()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get bump/poll counters and the known generations."""
+        with self._lock:
+            views = sorted(set(self._shared) | set(self._local))
+            return {
+                "shared": self.store is not None,
+                "poll_seconds": self.poll_seconds,
+                **self.stats,
+                "generations": {v: self._shared.get(v, 0) + self._local.get(v, 0) for v in views},
+            }
+
+
+def _drop_view_results(views: List[str]) -> int:
+    removed = get_query_cache().invalidate_tags([f"view:{name}" for name in views])
+    logger.info(f"Views refreshed elsewhere: {views}; dropped {removed} cached results")
+    return removed
+
+
+_view_generations: Optional[ViewGenerations] = None
+_view_generations_lock = threading.Lock()
+
+
+def get_view_generations() -> ViewGenerations:
+    """Get the process-wide view generations (shared through the database unless disabled)."""
+    global _view_generations
+    if _view_generations is None:
+        with _view_generations_lock:
+            if _view_generations is None:
+                store = DatabaseGenerationStore() if VIEW_GENERATIONS_SHARED else None
+                _view_generations = ViewGenerations(store, on_change=_drop_view_results)
+    return _view_generations
+
+
+def invalidate_views(views: Iterable[str]) -> int:
+    """
+    Drop cached SQL results that read any of the given views and bump the
+    views' generation, in this worker now and in the others on their next poll.
+    
+    Call this from ingestion jobs after they refresh a view. It writes to the
+    database, so async callers should await it through run_db.
+    
+    Args:
+        views: View names, with or without the dbo. prefix
+        
+    Returns:
+        Number of cache entries removed in this worker
+    """
+    names = [v.split('.')[-1].strip('[]').lower() for v in views]
+    get_view_generations().bump(names)
+    return get_query_cache().invalidate_tags([f"view:{name}" for name in names])
+
+
+def view_generations(views: Iterable[str]) -> Dict[str, int]:
+    """
+    Current refresh generation of each view (0 until first invalidated).
+    
+    Args:
+        views: Lowercased view names, as returned by views_in_sql
+    """
+    return get_view_generations().current(views)
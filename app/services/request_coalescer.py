@@ -0,0 +1,177 @@
+"""
+Request Coalescer
+
+Single-flight de-duplication for identical chat questions that arrive while an
+answer for them is still being generated:
+- First request for a key becomes the leader and starts one pump task
+- Concurrent followers subscribe to the leader's SSE frames (fan-out)
+- Followers arriving mid-stream get the already-produced prefix replayed
+- The pump runs independently of any single client connection
+- Entry is dropped as soon as the answer completes (no result caching here)
+
+Key = (normalized question, provider, system prompt hash). Callers decide
+whether a request is eligible; personalized turns should bypass coalescing.
+
+Expected Results:
+- One planner call, SQL query and LLM stream per burst of identical questions
+- Lower LLM spend on trending-ticker spikes (earnings days, dividend cuts)
+"""
+
+import os
+import re
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("request_coalescer")
+
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_WS = re.compile(r"\s+")
+
+
+def coalesce_key(question: str, provider: str, system_prompt: str) -> str:
+    """
+    Build the coalescing key for a question.
+
+    Args:
+        question: User question as typed (case and whitespace are folded)
+        provider: Everything that selects the answering model
+        system_prompt: Every prompt fragment that shapes the answer
+    """
+    normalized = _WS.sub(" ", question).strip().lower()
+    question_hash = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    system_hash = hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:16]
+    return f"coalesce:{provider}:{system_hash}:{question_hash}"
+
+
+class BroadcastStream:
+    """
+    One upstream SSE stream fanned out to any number of subscribers.
+
+    Every frame is kept until the stream ends so late subscribers can replay
+    the prefix; the buffer is bounded by a single answer.
+    """
+
+    def __init__(self, key: str, factory: Callable[[], Awaitable[AsyncIterator[Any]]], on_done: Callable[["BroadcastStream"], None]):
+        self.key = key
+        self.frames: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Condition()
+        self._on_done = on_done
+        self.task = asyncio.get_running_loop().create_task(self._pump(factory))
+
+    async def _pump(self, factory: Callable[[], Awaitable[AsyncIterator[Any]]]):
+        try:
+            source = await factory()
+            async for frame in source:
+                self.frames.append(frame)
+                async with self._changed:
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            logger.warning(f"Broadcast stream failed: {self.key[:60]}... ({e})")
+        finally:
+            self.done = True
+            self._on_done(self)
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def subscribe(self, start: int = 0) -> AsyncIterator[Any]:
+        """Replay produced frames from `start`, then tail the live stream until it ends."""
+        self.subscribers += 1
+        i = start
+        while True:
+            if i < len(self.frames):
+                yield self.frames[i]
+                i += 1
+                continue
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: i < len(self.frames) or self.done)
+
+
+class RequestCoalescer:
+    """
+    Registry of in-flight answer streams keyed by coalesce_key().
+
+    Features:
+    - Leader/follower single-flight per key
+    - Prefix replay for late followers
+    - Leader/follower/in-flight statistics
+    """
+
+    def __init__(self):
+        """Initialize request coalescer."""
+        self._inflight: Dict[str, BroadcastStream] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.failures = 0
+
+        logger.info(f"Request coalescer initialized (enabled={REQUEST_COALESCING_ENABLED})")
+
+    def stream(self, key: str, factory: Callable[[], Awaitable[AsyncIterator[Any]]]) -> AsyncIterator[Any]:
+        """
+        Subscribe to the in-flight stream for `key`, starting it if needed.
+
+        Must be called from the event loop.
+
+        Args:
+            key: Key from coalesce_key()
+            factory: Coroutine function producing the answer stream; only the
+                leader's factory is ever called
+
+        Returns:
+            Async iterator over the stream's frames
+        """
+        broadcast = self._inflight.get(key)
+        if broadcast is None or broadcast.done:
+            broadcast = BroadcastStream(key, factory, self._finished)
+            self._inflight[key] = broadcast
+            self.leaders += 1
+            logger.info(f"Coalescing LEADER: {key[:60]}...")
+        else:
+            self.followers += 1
+            logger.info(
+                f"Coalescing FOLLOWER: {key[:60]}... "
+                f"(replaying {len(broadcast.frames)} frame(s), {broadcast.subscribers} subscriber(s))"
+            )
+        return broadcast.subscribe()
+
+    def _finished(self, broadcast: BroadcastStream):
+        if broadcast.error is not None:
+            self.failures += 1
+        if self._inflight.get(broadcast.key) is broadcast:
+            del self._inflight[broadcast.key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics for monitoring."""
+        total = self.leaders + self.followers
+        return {
+            "enabled": REQUEST_COALESCING_ENABLED,
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "failures": self.failures,
+            "in_flight": len(self._inflight),
+            "coalesced_rate": self.followers / total if total > 0 else 0.0,
+        }
+
+
+# Global request coalescer instance
+_request_coalescer: Optional[RequestCoalescer] = None
+
+
+def get_request_coalescer() -> RequestCoalescer:
+    """Get or create global request coalescer instance."""
+    global _request_coalescer
+    if _request_coalescer is None:
+        _request_coalescer = RequestCoalescer()
+    return _request_coalescer
@@ -0,0 +1,520 @@
+"""
+Semantic Answer Cache
+
+Serves a stored answer to paraphrases of a question we have already answered
+("what does O pay monthly" / "Realty Income monthly dividend"), in front of
+the planner/SQL/answer pipeline:
+- Questions are ticker-normalized: tickers (and #TICKER annotations) and the
+  company names the ticker index matched them by ("Realty Income" for O) are
+  removed from the text, and the ticker set becomes a hard partition, so an
+  answer about O is never served for KO
+- Local hashing-vectorizer embedding (folded words + character trigrams),
+  no model download and no external calls
+- Per-partition inverted index, cosine-threshold lookup
+- Numbers in the question must match exactly ("last 5 years" != "last 10 years")
+- Freshness bound to the data: entries remember the views their SQL read and
+  those views' refresh generation (see query_cache.invalidate_views); a
+  refresh, or the shortest view TTL, retires them
+- Hits replay the stored TokenEvents, encoded to SSE at the edge like any answer
+- Audit sampling: a fraction of hits is answered live instead and compared
+  with the cached answer; divergent pairs count as false hits and are evicted
+- Enabled per query type (SEMANTIC_CACHE_QUERY_TYPES)
+
+Only answers whose pipeline reported a cacheable source (SQL, planner chat,
+Gemini) are stored; web search, ML API and error answers never are.
+
+Expected Results:
+- Repeat and paraphrased questions answered in milliseconds, with no planner,
+  SQL or LLM calls
+- Measured false-hit rate (audit) to tune SEMANTIC_CACHE_THRESHOLD against
+"""
+
+import os
+import re
+import time
+import zlib
+import hashlib
+import math
+import random
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from app.core.token_events import TokenEvent
+from app.services.query_cache import VIEW_TTLS, views_in_sql, view_generations
+
+logger = logging.getLogger("semantic_cache")
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.88"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+SEMANTIC_CACHE_DEFAULT_TTL = int(os.getenv("SEMANTIC_CACHE_DEFAULT_TTL", "3600"))
+SEMANTIC_CACHE_MAX_ANSWER_CHARS = int(os.getenv("SEMANTIC_CACHE_MAX_ANSWER_CHARS", "20000"))
+SEMANTIC_CACHE_AUDIT_RATE = float(os.getenv("SEMANTIC_CACHE_AUDIT_RATE", "0.05"))
+# Audited pairs whose answers share less than this (word Jaccard) are false hits
+SEMANTIC_CACHE_AUDIT_MIN_OVERLAP = float(os.getenv("SEMANTIC_CACHE_AUDIT_MIN_OVERLAP", "0.5"))
+SEMANTIC_CACHE_QUERY_TYPES = frozenset(
+    t.strip() for t in os.getenv(
+        "SEMANTIC_CACHE_QUERY_TYPES",
+        "fast_query,general_chat,dividend_scoring,dividend_strategy,dividend_sustainability,global_markets"
+    ).split(",") if t.strip()
+)
+
+# Pipeline sources whose answers may be stored
+CACHEABLE_SOURCES = frozenset({"sql", "chat", "gemini"})
+
+_DIMENSIONS = 1 << 20
+_TRIGRAM_WEIGHT = 0.35
+_REPLAY_CHUNK_CHARS = 256
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.\-'][a-z0-9]+)*")
+_NUMBER = re.compile(r"^\d+(?:\.\d+)?$")
+_ANSWER_WORD = re.compile(r"[a-z0-9$%.]+")
+
+_STOPWORDS = frozenset({
+    "a", "an", "the", "of", "for", "to", "in", "on", "at", "by", "and", "or", "is", "are", "was",
+    "were", "be", "do", "does", "did", "what", "whats", "what's", "which", "me", "my", "i", "you",
+    "your", "it", "its", "it's", "can", "could", "would", "please", "tell", "show", "give", "get",
+    "about", "with", "from", "this", "that", "how", "much", "many", "when", "stock", "stocks",
+    "share", "shares", "company", "ticker",
+})
+
+# Finance paraphrases folded onto one feature
+_SYNONYMS = {
+    "pay": "dividend", "pays": "dividend", "paid": "dividend", "paying": "dividend", "payer": "dividend",
+    "payers": "dividend", "payout": "dividend", "payouts": "dividend", "dividends": "dividend",
+    "div": "dividend", "divs": "dividend", "distribution": "dividend", "distributions": "dividend",
+    "yields": "yield", "yielding": "yield",
+    "prices": "price", "quote": "price", "quotes": "price", "trading": "price", "worth": "price",
+    "month": "monthly", "quarter": "quarterly", "year": "annual", "yearly": "annual", "annually": "annual",
+    "historical": "history", "past": "history",
+    "recent": "latest", "current": "latest", "currently": "latest", "now": "latest", "today": "latest",
+    "next": "upcoming", "upcoming": "upcoming",
+    "ex-dividend": "exdate", "ex-div": "exdate", "ex-date": "exdate",
+    "safe": "safety", "sustainable": "safety", "sustainability": "safety",
+}
+
+# Request-scoped record of how the answer was produced (set by the controller,
+# filled in by the answer pipeline): {"route": ..., "sql": ...}
+_ANSWER_SOURCES: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "SEMANTIC_CACHE_ANSWER_SOURCES", default=None
+)
+
+
+def answer_sources() -> Dict[str, Any]:
+    """
+    Provenance record for the answer being generated in this request.
+
+    Pipelines set "route" (and "sql" on the SQL path) on the returned dict.
+    Outside a cache-eligible request a throwaway dict is returned.
+    """
+    sources = _ANSWER_SOURCES.get()
+    return sources if sources is not None else {}
+
+
+def set_answer_sources() -> Tuple[Dict[str, Any], contextvars.Token]:
+    """Start a provenance record for the current request (controller side)."""
+    sources: Dict[str, Any] = {}
+    return sources, _ANSWER_SOURCES.set(sources)
+
+
+def reset_answer_sources(token: contextvars.Token):
+    """End the provenance scope started by set_answer_sources."""
+    _ANSWER_SOURCES.reset(token)
+
+
+def _ticker_aliases(tickers: List[str]) -> Dict[str, List[str]]:
+    """Company names of the tickers, from the loaded ticker universe."""
+    if not tickers:
+        return {}
+    from app.utils.extract_tickers import ticker_aliases
+    return ticker_aliases(tickers)
+
+
+def _drop_phrases(tokens: List[str], phrases: List[Tuple[str, ...]]) -> List[str]:
+    """Remove every occurrence of the token phrases, longest first."""
+    for phrase in sorted(set(phrases), key=len, reverse=True):
+        n = len(phrase)
+        out: List[str] = []
+        i = 0
+        while i < len(tokens):
+            if tuple(tokens[i:i + n]) == phrase:
+                i += n
+                continue
+            out.append(tokens[i])
+            i += 1
+        tokens = out
+    return tokens
+
+
+def normalize_question(question: str, tickers: List[str],
+                       aliases: Optional[Dict[str, List[str]]] = None) -> Tuple[List[str], FrozenSet[str]]:
+    """
+    Ticker-normalized, folded question words and the numbers it contains.
+
+    Args:
+        question: Question text (may carry #TICKER annotations)
+        tickers: Tickers detected in the question
+        aliases: Company names per ticker; whole names are removed like the ticker
+    """
+    drop = {t.lower() for t in tickers}
+    tokens = _TOKEN.findall(question.lower().replace("#", " "))
+    if aliases:
+        phrases = [tuple(_TOKEN.findall(name.lower())) for names in aliases.values() for name in names]
+        tokens = _drop_phrases(tokens, [p for p in phrases if p])
+    words: List[str] = []
+    numbers = set()
+    for token in tokens:
+        if token in drop or token in _STOPWORDS:
+            continue
+        if _NUMBER.match(token):
+            numbers.add(token)
+        words.append(_SYNONYMS.get(token, token))
+    return words, frozenset(numbers)
+
+
+def _feature(text: str) -> Tuple[int, float]:
+    h = zlib.crc32(text.encode("utf-8"))
+    return h % _DIMENSIONS, (1.0 if h & 0x80000000 else -1.0)
+
+
+def embed(words: List[str]) -> Dict[int, float]:
+    """L2-normalized signed hashing-vectorizer embedding of folded words."""
+    vec: Dict[int, float] = {}
+    for word in words:
+        idx, sign = _feature("w:" + word)
+        vec[idx] = vec.get(idx, 0.0) + sign
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            idx, sign = _feature("c:" + padded[i:i + 3])
+            vec[idx] = vec.get(idx, 0.0) + sign * _TRIGRAM_WEIGHT
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    if norm == 0.0:
+        return {}
+    return {k: v / norm for k, v in vec.items() if v}
+
+
+def answer_overlap(a: str, b: str) -> float:
+    """Word Jaccard similarity of two answers (audit comparison)."""
+    wa, wb = set(_ANSWER_WORD.findall(a.lower())), set(_ANSWER_WORD.findall(b.lower()))
+    if not wa and not wb:
+        return 1.0
+    return len(wa & wb) / len(wa | wb)
+
+
+@dataclass
+class SemanticEntry:
+    """One cached answer."""
+    id: int
+    partition: str
+    question: str
+    numbers: FrozenSet[str]
+    vector: Dict[int, float]
+    events: List[TokenEvent]
+    text: str
+    created_at: float
+    expires_at: float
+    generations: Dict[str, int] = field(default_factory=dict)
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """
+    In-process vector index of answered questions.
+
+    Features:
+    - Ticker-set partitions with an inverted index over hashed features
+    - Cosine threshold + exact number match
+    - View-generation and TTL freshness
+    - LRU bound on total entries
+    - Hit/miss/audit statistics
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 audit_rate: float = SEMANTIC_CACHE_AUDIT_RATE, query_types: FrozenSet[str] = SEMANTIC_CACHE_QUERY_TYPES,
+                 aliases: Optional[Callable[[List[str]], Dict[str, List[str]]]] = None):
+        """
+        Initialize semantic answer cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Maximum number of cached answers
+            audit_rate: Fraction of hits answered live and compared
+            query_types: QueryType values the cache is enabled for
+            aliases: Resolves tickers to their company names (default: ticker universe)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.audit_rate = audit_rate
+        self.query_types = query_types
+        self.aliases = aliases or _ticker_aliases
+        self._entries: "OrderedDict[int, SemanticEntry]" = OrderedDict()
+        self._postings: Dict[str, Dict[int, Dict[int, float]]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self.audit_samples: deque = deque(maxlen=50)
+        self.stats = {
+            "lookups": 0, "hits": 0, "misses": 0, "stale": 0, "stores": 0, "evictions": 0,
+            "skipped_query_type": 0, "uncacheable": 0, "audits": 0, "false_hits": 0,
+        }
+
+        logger.info(f"Semantic cache initialized: threshold={threshold}, max_entries={max_entries}, "
+                    f"audit_rate={audit_rate}")
+
+    # ------------------------------------------------------------------ index
+
+    def enabled_for(self, query_type: str) -> bool:
+        """Whether answers of this query type may be served from / stored in the cache."""
+        if query_type in self.query_types:
+            return True
+        with self._lock:
+            self.stats["skipped_query_type"] += 1
+        return False
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        postings = self._postings.get(entry.partition, {})
+        for idx in entry.vector:
+            ids = postings.get(idx)
+            if ids is not None:
+                ids.pop(entry_id, None)
+                if not ids:
+                    del postings[idx]
+        if not postings:
+            self._postings.pop(entry.partition, None)
+
+    def _fresh(self, entry: SemanticEntry, now: float) -> bool:
+        return now < entry.expires_at and view_generations(entry.generations) == entry.generations
+
+    def _search(self, partition: str, vector: Dict[int, float], numbers: FrozenSet[str]) -> Tuple[Optional[SemanticEntry], float]:
+        postings = self._postings.get(partition)
+        if not postings or not vector:
+            return None, 0.0
+        scores: Dict[int, float] = {}
+        for idx, weight in vector.items():
+            ids = postings.get(idx)
+            if ids:
+                for entry_id, w in ids.items():
+                    scores[entry_id] = scores.get(entry_id, 0.0) + weight * w
+        best, best_score = None, 0.0
+        for entry_id, score in scores.items():
+            if score >= self.threshold and score > best_score:
+                entry = self._entries[entry_id]
+                if entry.numbers == numbers:
+                    best, best_score = entry, score
+        return best, best_score
+
+    def lookup(self, question: str, tickers: List[str], scope: str) -> Optional[Tuple[SemanticEntry, float]]:
+        """
+        Find a fresh cached answer for a paraphrase of `question`.
+
+        Args:
+            question: Ticker-annotated question
+            tickers: Tickers detected in the question
+            scope: Provider and system prompts the answer was generated under
+
+        Returns:
+            (entry, similarity) or None on a miss
+        """
+        words, numbers = normalize_question(question, tickers, self.aliases(tickers))
+        vector = embed(words)
+        key = self.partition_key(scope, tickers)
+        now = time.time()
+        with self._lock:
+            self.stats["lookups"] += 1
+            while True:
+                entry, score = self._search(key, vector, numbers)
+                if entry is None or self._fresh(entry, now):
+                    break
+                self._remove(entry.id)
+                self.stats["stale"] += 1
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            entry.hits += 1
+            self._entries.move_to_end(entry.id)
+            self.stats["hits"] += 1
+        logger.info(f"Semantic cache HIT ({score:.3f}): {question[:60]!r} ~ {entry.question[:60]!r}")
+        return entry, score
+
+    def store(self, question: str, tickers: List[str], scope: str, events: List[TokenEvent],
+              sources: Dict[str, Any]) -> bool:
+        """
+        Store a completed answer, replacing a near-duplicate entry.
+
+        Args:
+            question: Ticker-annotated question
+            tickers: Tickers detected in the question
+            scope: Provider and system prompts the answer was generated under
+            events: The answer's TokenEvents, start to done
+            sources: Provenance recorded by the pipeline (route, sql)
+        """
+        text = "".join(ev.content for ev in events if ev.kind == "delta")
+        if (sources.get("route") not in CACHEABLE_SOURCES or not text.strip()
+                or len(text) > SEMANTIC_CACHE_MAX_ANSWER_CHARS):
+            with self._lock:
+                self.stats["uncacheable"] += 1
+            return False
+
+        views = views_in_sql(sources["sql"]) if sources.get("sql") else []
+        ttl = min([VIEW_TTLS[v] for v in views] + [SEMANTIC_CACHE_DEFAULT_TTL])
+        words, numbers = normalize_question(question, tickers, self.aliases(tickers))
+        vector = embed(words)
+        if not vector:
+            return False
+        key = self.partition_key(scope, tickers)
+        now = time.time()
+
+        with self._lock:
+            duplicate, _ = self._search(key, vector, numbers)
+            if duplicate is not None:
+                self._remove(duplicate.id)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            self._next_id += 1
+            entry = SemanticEntry(
+                id=self._next_id, partition=key, question=question, numbers=numbers, vector=vector,
+                events=_compact(events), text=text, created_at=now, expires_at=now + ttl,
+                generations=view_generations(views),
+            )
+            self._entries[entry.id] = entry
+            postings = self._postings.setdefault(key, {})
+            for idx, weight in vector.items():
+                postings.setdefault(idx, {})[entry.id] = weight
+            self.stats["stores"] += 1
+        logger.debug(f"Semantic cache STORE: {question[:60]!r} (ttl={ttl}s, views={views})")
+        return True
+
+    @staticmethod
+    def partition_key(scope: str, tickers: List[str]) -> str:
+        """Partition for a provider/prompt scope and ticker set."""
+        scope_hash = hashlib.sha1(scope.encode("utf-8")).hexdigest()[:16]
+        return scope_hash + "|" + ",".join(sorted({t.upper() for t in tickers}))
+
+    # ---------------------------------------------------------------- serving
+
+    def should_audit(self) -> bool:
+        """Sample this hit for a live re-answer."""
+        return self.audit_rate > 0 and self._rng.random() < self.audit_rate
+
+    @staticmethod
+    async def replay(entry: SemanticEntry) -> AsyncIterator[TokenEvent]:
+        """Replay a cached answer's events."""
+        for event in entry.events:
+            yield event
+
+    async def record(self, events: AsyncIterator[TokenEvent], question: str, tickers: List[str], scope: str,
+                     sources: Dict[str, Any], audited: Optional[Tuple[SemanticEntry, float]] = None) -> AsyncIterator[TokenEvent]:
+        """
+        Pass a live answer through, storing it once it completes.
+
+        Args:
+            events: Live answer stream
+            question, tickers, scope: As for store()
+            sources: Provenance dict the pipeline fills in while answering
+            audited: The cache hit this live answer is auditing, if any
+        """
+        seen: List[TokenEvent] = []
+        completed = False
+        async for event in events:
+            seen.append(event)
+            if event.kind == "done":
+                completed = True
+            yield event
+        if not completed:
+            return
+        if audited is not None:
+            self._audit(audited, question, seen)
+        self.store(question, tickers, scope, seen, sources)
+
+    def _audit(self, audited: Tuple[SemanticEntry, float], question: str, events: List[TokenEvent]):
+        entry, similarity = audited
+        live = "".join(ev.content for ev in events if ev.kind == "delta")
+        overlap = answer_overlap(entry.text, live)
+        false_hit = overlap < SEMANTIC_CACHE_AUDIT_MIN_OVERLAP
+        with self._lock:
+            self.stats["audits"] += 1
+            if false_hit:
+                self.stats["false_hits"] += 1
+                self._remove(entry.id)
+            self.audit_samples.append({
+                "time": time.time(),
+                "question": question[:200],
+                "cached_question": entry.question[:200],
+                "similarity": round(similarity, 4),
+                "answer_overlap": round(overlap, 4),
+                "false_hit": false_hit,
+            })
+        if false_hit:
+            logger.warning(f"Semantic cache FALSE HIT (similarity={similarity:.3f}, overlap={overlap:.2f}): "
+                           f"{question[:60]!r} ~ {entry.question[:60]!r}")
+
+    # ------------------------------------------------------------- monitoring
+
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get semantic cache statistics for monitoring."""
+        with self._lock:
+            stats = dict(self.stats)
+            entries = len(self._entries)
+            partitions = len(self._postings)
+            samples = list(self.audit_samples)[-10:]
+        return {
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            "threshold": self.threshold,
+            "audit_rate": self.audit_rate,
+            "query_types": sorted(self.query_types),
+            **stats,
+            "hit_rate": stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0,
+            "false_hit_rate": stats["false_hits"] / stats["audits"] if stats["audits"] else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "partitions": partitions,
+            "recent_audits": samples,
+        }
+
+
+def _compact(events: List[TokenEvent]) -> List[TokenEvent]:
+    """Merge consecutive deltas into replay-sized chunks."""
+    out: List[TokenEvent] = []
+    buf: List[str] = []
+    size = 0
+    for event in events:
+        if event.kind == "delta":
+            buf.append(event.content)
+            size += len(event.content)
+            if size >= _REPLAY_CHUNK_CHARS:
+                out.append(TokenEvent("delta", "".join(buf)))
+                buf, size = [], 0
+            continue
+        if buf:
+            out.append(TokenEvent("delta", "".join(buf)))
+            buf, size = [], 0
+        out.append(event)
+    if buf:
+        out.append(TokenEvent("delta", "".join(buf)))
+    return out
+
+
+# Global semantic cache instance
+_semantic_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_semantic_cache() -> SemanticAnswerCache:
+    """Get or create global semantic cache instance."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticAnswerCache()
+    return _semantic_cache
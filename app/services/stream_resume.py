@@ -0,0 +1,174 @@
+"""
+SSE Stream Resume Registry
+
+Lets clients that drop mid-answer reconnect without regenerating it:
+- Every SSE event carries `id: {stream_id}:{seq}`
+- The response pipeline runs in a pump task, independent of the connection
+- Produced events are retained per stream for a short window after completion
+- A POST carrying `Last-Event-ID` resumes after that event, tailing the
+  generation if it is still running
+
+Bounded: at most STREAM_RESUME_MAX_STREAMS finished streams are kept, each for
+STREAM_RESUME_TTL seconds, and streams larger than STREAM_RESUME_MAX_BYTES are
+not retained after they finish.
+
+Expected Results:
+- Reconnects cost zero planner/SQL/LLM work
+- Mobile users see the rest of the answer instead of a restart
+"""
+
+import os
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.services.request_coalescer import BroadcastStream
+
+logger = logging.getLogger("stream_resume")
+
+STREAM_RESUME_ENABLED = os.getenv("STREAM_RESUME_ENABLED", "true").lower() in ("1", "true", "yes")
+STREAM_RESUME_TTL = int(os.getenv("STREAM_RESUME_TTL", "120"))
+STREAM_RESUME_MAX_STREAMS = int(os.getenv("STREAM_RESUME_MAX_STREAMS", "500"))
+STREAM_RESUME_MAX_BYTES = int(os.getenv("STREAM_RESUME_MAX_BYTES", str(1024 * 1024)))
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Split a `stream_id:seq` event id; None if it is not one of ours."""
+    if not value or ":" not in value:
+        return None
+    stream_id, _, seq = value.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+def _as_bytes(frame: Any) -> bytes:
+    return frame if isinstance(frame, bytes) else str(frame).encode("utf-8")
+
+
+class StreamResumeRegistry:
+    """
+    Registry of resumable SSE streams.
+
+    Features:
+    - Sequential event ids per stream
+    - Tail-while-running and replay-after-finish
+    - TTL + count bounded retention of finished streams
+    - Start/resume/miss statistics
+    """
+
+    def __init__(self, ttl: int = STREAM_RESUME_TTL, max_streams: int = STREAM_RESUME_MAX_STREAMS):
+        """
+        Initialize resume registry.
+
+        Args:
+            ttl: Seconds a finished stream stays resumable
+            max_streams: Maximum number of finished streams retained
+        """
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[str, BroadcastStream]" = OrderedDict()
+        self._finished_at: Dict[str, float] = {}
+        self.started = 0
+        self.resumed = 0
+        self.misses = 0
+
+        logger.info(f"Stream resume registry initialized: ttl={ttl}s, max_streams={max_streams}")
+
+    def start(self, factory: Callable[[], Awaitable[AsyncIterator[Any]]]) -> str:
+        """
+        Start pumping a response stream and register it for resume.
+
+        Must be called from the event loop.
+
+        Args:
+            factory: Coroutine function producing SSE frames
+
+        Returns:
+            stream_id to pass to events()
+        """
+        self._expire()
+        stream_id = uuid.uuid4().hex[:16]
+        self._streams[stream_id] = BroadcastStream(stream_id, factory, self._finished)
+        self.started += 1
+        return stream_id
+
+    def resume(self, last_event_id: Optional[str]) -> Optional[AsyncIterator[bytes]]:
+        """
+        Continue a stream after the client's last seen event.
+
+        Returns:
+            Event iterator, or None if the stream is unknown or expired
+        """
+        parsed = parse_last_event_id(last_event_id)
+        if parsed is None:
+            return None
+        self._expire()
+        stream_id, seq = parsed
+        if stream_id not in self._streams:
+            self.misses += 1
+            logger.info(f"Stream resume MISS: {stream_id} (expired or unknown)")
+            return None
+
+        self.resumed += 1
+        logger.info(f"Stream resume HIT: {stream_id} after event {seq}")
+        return self.events(stream_id, start=seq + 1)
+
+    def events(self, stream_id: str, start: int = 0) -> AsyncIterator[bytes]:
+        """SSE events of a registered stream with `id:` lines, starting at sequence `start`."""
+        return self._with_ids(self._streams[stream_id], start)
+
+    @staticmethod
+    async def _with_ids(stream: BroadcastStream, start: int) -> AsyncIterator[bytes]:
+        seq = start
+        async for frame in stream.subscribe(start):
+            yield f"id: {stream.key}:{seq}\n".encode("utf-8") + _as_bytes(frame)
+            seq += 1
+
+    def _finished(self, stream: BroadcastStream):
+        size = sum(len(_as_bytes(f)) for f in stream.frames)
+        if size > STREAM_RESUME_MAX_BYTES:
+            self._streams.pop(stream.key, None)
+            logger.info(f"Stream {stream.key} not retained for resume ({size} bytes)")
+            return
+        self._finished_at[stream.key] = time.time()
+
+    def _expire(self):
+        now = time.time()
+        for stream_id, finished_at in list(self._finished_at.items()):
+            if now - finished_at > self.ttl:
+                self._drop(stream_id)
+
+        finished = [sid for sid in self._streams if sid in self._finished_at]
+        for stream_id in finished[:max(0, len(finished) - self.max_streams)]:
+            self._drop(stream_id)
+
+    def _drop(self, stream_id: str):
+        self._streams.pop(stream_id, None)
+        self._finished_at.pop(stream_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get resume statistics for monitoring."""
+        return {
+            "enabled": STREAM_RESUME_ENABLED,
+            "ttl_seconds": self.ttl,
+            "streams": len(self._streams),
+            "running": len(self._streams) - len(self._finished_at),
+            "started": self.started,
+            "resumed": self.resumed,
+            "misses": self.misses,
+        }
+
+
+# Global resume registry instance
+_stream_resume_registry: Optional[StreamResumeRegistry] = None
+
+
+def get_stream_resume_registry() -> StreamResumeRegistry:
+    """Get or create global stream resume registry instance."""
+    global _stream_resume_registry
+    if _stream_resume_registry is None:
+        _stream_resume_registry = StreamResumeRegistry()
+    return _stream_resume_registry
@@ -17,7 +17,7 @@ from typing import Dict, List, Optional, Any
 from sqlalchemy import text
 
 from app.core.database import engine
-from app.core.llm_providers import oai_client, CHAT_MODEL
+from app.core.llm_providers import oai_chat_completion
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("tax_optimization_service")
@@ -651,8 +651,7 @@ Format your response as clear, actionable markdown with dollar amounts for estim
 
 Provide 3-5 specific, actionable recommendations with estimated dollar savings."""
         
-        response = oai_client.chat.completions.create(
-            model=CHAT_MODEL,
+        response = oai_chat_completion(
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
@@ -0,0 +1,144 @@
+"""
+Tests for LLM Admission Control
+"""
+
+import time
+import asyncio
+import threading
+import pytest
+from app.core.admission_control import (
+    AdmissionController, AdmissionRejected, LLMAdmission, current_priority, llm_priority,
+    PRIORITY_INTERACTIVE, PRIORITY_DIGEST, PRIORITY_TRAINING,
+)
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+    class response:
+        headers = {"retry-after": "2"}
+
+
+class TestAdmissionControl:
+    """Test suite for per-deployment admission and priority queues."""
+
+    @pytest.fixture
+    def controller(self):
+        """Create a single-slot controller with generous deadlines."""
+        return AdmissionController("azure:test", concurrency=1, tpm=0,
+                                   deadlines={PRIORITY_INTERACTIVE: 5, PRIORITY_DIGEST: 5, PRIORITY_TRAINING: 5})
+
+    def test_waiters_admitted_by_priority(self, controller):
+        """Test that a freed slot goes to interactive, then digest, then training callers."""
+        controller.avg_hold_seconds = 0.01
+        order = []
+
+        async def call(priority):
+            ticket = await controller.acquire_async(priority)
+            order.append(priority)
+            await asyncio.sleep(0.01)
+            controller.release(ticket)
+
+        async def run():
+            holder = await controller.acquire_async(PRIORITY_INTERACTIVE)
+            tasks = []
+            for priority in (PRIORITY_TRAINING, PRIORITY_DIGEST, PRIORITY_INTERACTIVE):
+                tasks.append(asyncio.create_task(call(priority)))
+                await asyncio.sleep(0.01)
+            controller.release(holder)
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        assert order == [PRIORITY_INTERACTIVE, PRIORITY_DIGEST, PRIORITY_TRAINING]
+        stats = controller.get_stats()
+        assert stats["admitted"] == 4 and stats["queued"] == 3 and stats["in_flight"] == 0
+
+    def test_token_bucket_paces_calls(self):
+        """Test that calls wait for the token budget to refill, and unused tokens are refunded."""
+        ctl = AdmissionController("azure:tpm", concurrency=10, tpm=600)  # 10 tokens/s
+        first = ctl.acquire(tokens=600)
+        started = time.monotonic()
+        second = ctl.acquire(tokens=3)
+        assert time.monotonic() - started >= 0.2
+        first.used_tokens = 0
+        ctl.release(first)
+        assert ctl.get_stats()["tokens_available"] >= 590
+        ctl.release(second)
+
+    def test_hopeless_wait_fails_fast(self, controller):
+        """Test that a call whose expected wait exceeds its deadline is rejected immediately."""
+        controller.avg_hold_seconds = 30
+        ticket = controller.acquire(PRIORITY_INTERACTIVE)
+        started = time.monotonic()
+        with pytest.raises(AdmissionRejected, match="try again"):
+            controller.acquire(PRIORITY_INTERACTIVE)
+        assert time.monotonic() - started < 0.1
+        controller.release(ticket)
+        assert controller.get_stats()["rejected_fast"] == 1
+
+    def test_sync_acquire_on_event_loop_never_waits(self, controller):
+        """Test that a sync acquire on an event loop thread takes a free slot but refuses to queue."""
+        async def run():
+            ticket = controller.acquire(PRIORITY_DIGEST)
+            started = time.monotonic()
+            with pytest.raises(AdmissionRejected):
+                controller.acquire(PRIORITY_DIGEST)
+            elapsed = time.monotonic() - started
+            controller.release(ticket)
+            return elapsed
+
+        assert asyncio.run(run()) < 0.1
+        stats = controller.get_stats()
+        assert stats["rejected_on_loop"] == 1 and stats["queued"] == 0 and stats["in_flight"] == 0
+
+    def test_sync_and_async_waiters_share_queue(self, controller):
+        """Test hand-off between a thread holder, an async waiter and a thread waiter."""
+        controller.avg_hold_seconds = 0.01
+        holder = controller.acquire()
+        got = []
+
+        def sync_waiter():
+            ticket = controller.acquire(PRIORITY_TRAINING)
+            got.append("sync")
+            controller.release(ticket)
+
+        async def run():
+            thread = threading.Thread(target=sync_waiter)
+            thread.start()
+            await asyncio.sleep(0.02)
+            waiter = asyncio.create_task(controller.acquire_async(PRIORITY_INTERACTIVE))
+            await asyncio.sleep(0.02)
+            controller.release(holder)
+            ticket = await waiter
+            got.append("async")
+            controller.release(ticket)
+            await asyncio.to_thread(thread.join)
+
+        asyncio.run(run())
+        assert got == ["async", "sync"]
+        assert controller.get_stats()["in_flight"] == 0
+
+    def test_rate_limit_pauses_admissions(self):
+        """Test that a provider 429 drains the bucket and pauses the deployment."""
+        admission = LLMAdmission(enabled=True, limits={"azure:rl": {"concurrency": 2, "tpm": 1000}})
+        with pytest.raises(FakeRateLimitError):
+            with admission.admit("azure:rl", tokens=10):
+                raise FakeRateLimitError()
+        stats = admission.get_stats()["deployments"]["azure:rl"]
+        assert stats["rate_limited"] == 1 and stats["paused_seconds"] > 1.5
+        assert stats["in_flight"] == 0
+
+    def test_priority_context(self):
+        """Test the priority context manager and its decorator form."""
+        @llm_priority(PRIORITY_TRAINING)
+        def job():
+            return current_priority()
+
+        assert current_priority() == PRIORITY_INTERACTIVE
+        assert job() == PRIORITY_TRAINING
+        with llm_priority(PRIORITY_DIGEST):
+            assert current_priority() == PRIORITY_DIGEST
+        assert current_priority() == PRIORITY_INTERACTIVE
+        with pytest.raises(ValueError):
+            with llm_priority("urgent"):
+                pass
@@ -0,0 +1,285 @@
+"""
+Tests for Conversation History Tail Cache
+"""
+
+import sys
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, event, text
+
+# conversation_service imports the database engine, which needs the ODBC driver
+conversation_service = pytest.importorskip("app.services.conversation_service", exc_type=ImportError)
+ConversationTailCache = conversation_service.ConversationTailCache
+ConversationCompactor = conversation_service.ConversationCompactor
+
+
+def _reference(messages, budget):
+    """The original newest-first loop over the full conversation."""
+    out, total = [], 0
+    for role, content, tokens in reversed(messages):
+        if total + tokens > budget:
+            break
+        out.append({"role": role, "content": content})
+        total += tokens
+    return out[::-1]
+
+
+class TestConversationTailCache:
+    """Test suite for cached history selection."""
+
+    @pytest.fixture
+    def cache(self):
+        """Create a small tail cache."""
+        return ConversationTailCache(max_conversations=2, ttl=60, max_tokens=1000)
+
+    def test_new_conversation_served_from_cache(self, cache):
+        """Test that a conversation created here never needs a history query."""
+        cache.start("c1")
+        assert cache.select("c1", 3500) == []
+        messages = [("user", "q1", 50), ("assistant", "a1", 300), ("user", "q2", 40)]
+        for m in messages:
+            cache.append("c1", *m)
+        assert cache.select("c1", 3500) == _reference(messages, 3500)
+        assert cache.select("c1", 100) == _reference(messages, 100)
+
+    def test_trimmed_tail_only_answers_bounded_budgets(self, cache):
+        """Test that after trimming, budgets the tail cannot decide fall through to the database."""
+        cache.start("c1")
+        messages = [("user", f"m{i}", 200) for i in range(8)]
+        for m in messages:
+            cache.append("c1", *m)
+        assert cache.select("c1", 700) == _reference(messages, 700)
+        assert cache.select("c1", 5000) is None
+        assert cache.get_stats()["misses"] == 1
+
+    def test_fill_and_lru_eviction(self, cache):
+        """Test tails filled from the database and LRU eviction across conversations."""
+        cache.fill("c1", [("user", "a", 10)], complete=False, count=4)
+        assert cache.select("c1", 3500) is None
+        cache.fill("c2", [("user", "b", 10)], complete=True, count=1)
+        cache.start("c3")
+        assert not cache.has("c1") and cache.has("c2") and cache.has("c3")
+        cache.append("c1", "user", "ignored", 5)
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_window_covers_unflushed_replies(self, cache):
+        """Test that the message_count window widens for write-behind replies until they are confirmed."""
+        assert cache.window("c1") == conversation_service.NO_TAIL
+        cache.fill("c1", [("user", "q1", 10)], complete=True, count=1)
+        cache.append("c1", "assistant", "a1", 20, written=False)
+        assert cache.window("c1") == (1, 2)
+        cache.confirm("c1")
+        cache.append("c1", "user", "q2", 10)
+        assert cache.window("c1") == (3, 3)
+        cache.select("c1", 3500)
+        cache.stale("c1")
+        assert not cache.has("c1")
+        stats = cache.get_stats()
+        assert stats["stale"] == 1 and stats["hits"] == 0 and stats["misses"] == 1
+
+
+class TestConversationCompactor:
+    """Test suite for background compaction scheduling."""
+
+    @pytest.fixture
+    def compactor(self):
+        compactor = ConversationCompactor(workers=1, cooldown=60)
+        yield compactor
+        compactor.stop()
+
+    def test_small_conversation_not_scheduled(self, compactor):
+        """Test that a complete cached tail under the threshold skips the database entirely."""
+        tail = conversation_service.get_conversation_tail_cache()
+        tail.start("small")
+        tail.append("small", "user", "hi", 10)
+        assert not compactor.maybe_schedule("small")
+        assert compactor.get_stats()["scheduled"] == 0
+        tail.evict("small")
+
+    def test_one_job_per_conversation_and_cooldown(self, compactor, monkeypatch):
+        """Test per-conversation dedupe while running and the cooldown after a check."""
+        release = threading.Event()
+        done = threading.Event()
+
+        def summarize(conversation_id):
+            release.wait(2)
+            done.set()
+            return {"compacted_messages": 6, "compacted_tokens": 5000, "summary_tokens": 300}
+
+        monkeypatch.setattr(conversation_service, "summarize_old_conversations", summarize)
+        assert compactor.maybe_schedule("long")
+        assert not compactor.maybe_schedule("long")
+        release.set()
+        assert done.wait(2)
+        while compactor.get_stats()["pending"]:
+            time.sleep(0.01)
+        assert not compactor.maybe_schedule("long")
+        stats = compactor.get_stats()
+        assert stats["scheduled"] == 1 and stats["compactions"] == 1
+        assert stats["tokens_saved"] == 4700 and stats["pending"] == 0
+
+
+class HeldWrites:
+    """Write-behind stand-in that writes only when flushed."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.records = []
+
+    def submit(self, name, sql, params, on_written=None):
+        self.records.append((sql, params, on_written))
+        return True
+
+    def flush(self):
+        records, self.records = self.records, []
+        with self.engine.begin() as conn:
+            for sql, params, _ in records:
+                conn.execute(text(sql), params)
+        for _, _, on_written in records:
+            if on_written is not None:
+                on_written()
+
+
+class TestBootstrapTurn:
+    """Test suite for the single round-trip turn bootstrap (SQLite fallback path)."""
+
+    @pytest.fixture
+    def engine(self, tmp_path, monkeypatch):
+        """SQLite engine with the conversation tables in an attached `dbo` schema."""
+        engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+        @event.listens_for(engine, "connect")
+        def attach(dbapi_conn, record):
+            dbapi_conn.execute(f"ATTACH '{tmp_path / 'dbo.db'}' AS dbo")
+
+        @event.listens_for(engine, "before_cursor_execute", retval=True)
+        def isnull(conn, cursor, statement, parameters, context, executemany):
+            # T-SQL ISNULL, used by the compaction queries
+            return statement.replace("ISNULL(", "IFNULL("), parameters
+
+        with engine.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE dbo.user_sessions (session_id TEXT PRIMARY KEY, "
+                                 "created_at TEXT, last_active TEXT, user_data TEXT)")
+            conn.exec_driver_sql("CREATE TABLE dbo.conversations (conversation_id TEXT PRIMARY KEY, "
+                                 "session_id TEXT, title TEXT, created_at TEXT, updated_at TEXT, "
+                                 "total_tokens INT, message_count INT)")
+            conn.exec_driver_sql("CREATE TABLE dbo.conversation_messages (message_id TEXT, "
+                                 "conversation_id TEXT, role TEXT, content TEXT, tokens INT, "
+                                 "created_at TEXT, metadata TEXT, compacted INT DEFAULT 0)")
+        monkeypatch.setattr(conversation_service, "engine", engine)
+        monkeypatch.setattr(conversation_service, "count_tokens", lambda text, model=None: 100)
+        conversation_service.get_conversation_tail_cache().clear()
+        yield engine
+        engine.dispose()
+
+    def test_new_then_existing_conversation(self, engine):
+        """Test creation for unknown ids, then history excluding the current message."""
+        first = conversation_service.bootstrap_turn("unknown-session", None, "q1")
+        assert first["created_session"] and first["created_conversation"]
+        assert first["session_id"] != "unknown-session"
+        assert first["conversation_history"] == []
+
+        conversation_service.get_conversation_tail_cache().clear()
+        second = conversation_service.bootstrap_turn(first["session_id"], first["conversation_id"], "q2")
+        assert not second["created_session"] and not second["created_conversation"]
+        assert second["conversation_history"] == [{"role": "user", "content": "q1"}]
+
+        # Served from the tail cache, which now includes q2
+        third = conversation_service.bootstrap_turn(first["session_id"], first["conversation_id"], "q3")
+        assert [m["content"] for m in third["conversation_history"]] == ["q1", "q2"]
+        with engine.connect() as conn:
+            counts = conn.exec_driver_sql("SELECT message_count, total_tokens FROM dbo.conversations").fetchall()
+        assert counts == [(3, 300)]
+
+    def test_tail_behind_another_worker_is_reloaded(self, engine, monkeypatch):
+        """Test that a tail cached before another worker wrote is replaced by the stored history."""
+        first = conversation_service.bootstrap_turn(None, None, "q1")
+        ids = (first["session_id"], first["conversation_id"])
+        worker_a = conversation_service.get_conversation_tail_cache()
+
+        monkeypatch.setattr(conversation_service, "_tail_cache", ConversationTailCache())
+        conversation_service.bootstrap_turn(*ids, "q2")
+        monkeypatch.setattr(conversation_service, "_tail_cache", worker_a)
+
+        third = conversation_service.bootstrap_turn(*ids, "q3")
+        assert [m["content"] for m in third["conversation_history"]] == ["q1", "q2"]
+        assert worker_a.get_stats()["stale"] == 1
+
+        # Current again: served from the tail without reading the messages
+        history = conversation_service.get_conversation_history(ids[1])
+        assert [m["content"] for m in history] == ["q1", "q2", "q3"]
+        assert worker_a.get_stats()["stale"] == 1
+
+        with engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE dbo.conversations SET message_count = message_count + 1")
+            conn.exec_driver_sql("INSERT INTO dbo.conversation_messages (message_id, conversation_id, role, "
+                                 f"content, tokens, created_at) VALUES ('m4', '{ids[1]}', 'assistant', 'a3', "
+                                 "100, '9999-01-01')")
+        history = conversation_service.get_conversation_history(ids[1])
+        assert [m["content"] for m in history] == ["q1", "q2", "q3", "a3"]
+        assert worker_a.get_stats()["stale"] == 2
+
+    def test_deferred_reply_ordered_and_compacted_after_flush(self, engine, monkeypatch):
+        """Test that a write-behind reply sorts between its turns and compaction waits for the flush."""
+        held = HeldWrites(engine)
+        scheduled = []
+        monkeypatch.setattr(conversation_service, "get_write_behind", lambda: held)
+        monkeypatch.setattr(conversation_service, "CONVERSATION_COMPACTION_ENABLED", True)
+        monkeypatch.setattr(conversation_service._compactor, "maybe_schedule", scheduled.append)
+
+        first = conversation_service.bootstrap_turn(None, None, "q1")
+        ids = (first["session_id"], first["conversation_id"])
+        conversation_service.add_message(ids[1], "assistant", "a1", write_behind=True)
+        assert scheduled == []
+        held.flush()
+        assert scheduled == [ids[1]]
+
+        conversation_service.get_conversation_tail_cache().clear()
+        conversation_service.bootstrap_turn(*ids, "q2")
+        conversation_service.get_conversation_tail_cache().clear()
+        history = conversation_service.get_conversation_history(ids[1])
+        assert [m["content"] for m in history] == ["q1", "a1", "q2"]
+
+    def test_concurrent_compaction_writes_one_summary(self, engine, monkeypatch):
+        """Test that a compaction racing another worker's over the same turns writes nothing."""
+        monkeypatch.setattr(conversation_service, "CONVERSATION_COMPACTION_THRESHOLD", 250)
+        monkeypatch.setattr(conversation_service, "CONVERSATION_COMPACTION_KEEP_TOKENS", 200)
+        turn = conversation_service.bootstrap_turn(None, None, "q0")
+        conversation_id = turn["conversation_id"]
+        for i in range(1, 6):
+            conversation_service.bootstrap_turn(turn["session_id"], conversation_id, f"q{i}")
+
+        other_worker = {}
+
+        def fake_completion(messages, **kwargs):
+            if "result" not in other_worker:
+                # Another worker compacts the same turns while this one waits on the LLM
+                other_worker["result"] = None
+                other_worker["result"] = conversation_service.summarize_old_conversations(conversation_id)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="summary"))])
+
+        monkeypatch.setitem(sys.modules, "app.core.llm_providers",
+                            SimpleNamespace(oai_chat_completion=fake_completion))
+        assert conversation_service.summarize_old_conversations(conversation_id) is None
+        assert other_worker["result"]["compacted_messages"] == 4
+
+        with engine.connect() as conn:
+            summaries = conn.exec_driver_sql("SELECT COUNT(*) FROM dbo.conversation_messages "
+                                             "WHERE role = 'system'").scalar()
+            compacted = conn.exec_driver_sql("SELECT COUNT(*) FROM dbo.conversation_messages "
+                                             "WHERE compacted = 1").scalar()
+            count = conn.exec_driver_sql("SELECT message_count FROM dbo.conversations").scalar()
+        assert (summaries, compacted, count) == (1, 4, 7)
+
+    def test_history_respects_budget(self, engine):
+        """Test that only the newest messages within the budget come back."""
+        turn = conversation_service.bootstrap_turn(None, None, "q0")
+        for i in range(1, 6):
+            conversation_service.get_conversation_tail_cache().clear()
+            turn = conversation_service.bootstrap_turn(
+                turn["session_id"], turn["conversation_id"], f"q{i}",
+                max_tokens=conversation_service.TOKEN_BUFFER + 250
+            )
+        assert [m["content"] for m in turn["conversation_history"]] == ["q3", "q4"]
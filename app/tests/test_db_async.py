@@ -0,0 +1,301 @@
+"""
+Tests for Async Database Access
+"""
+
+import ast
+import sys
+import time
+import asyncio
+import pathlib
+import threading
+import contextvars
+import pytest
+from app.core.db_async import (
+    DatabaseExecutor, BlockingDatabaseCallError, check_not_on_event_loop, get_loop_guard_stats,
+    with_connection, fetch_all,
+)
+
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+
+# Async endpoint modules that must not block the event loop on the database
+ENDPOINT_FILES = sorted(
+    [ROOT / "main.py"]
+    + list((ROOT / "app" / "routes").glob("*.py"))
+    + list((ROOT / "app" / "routers").glob("*.py"))
+    + list((ROOT / "financial_models" / "api").glob("*.py"))
+)
+# Modules that wrap the database; their functions and methods block unless awaited through run_db
+DATA_ACCESS_FILES = (
+    [ROOT / "financial_models" / "utils" / "database.py"]
+    + sorted((ROOT / "financial_models" / "engines").glob("*.py"))
+    + sorted((ROOT / "app" / "services").glob("*.py"))
+)
+
+SYNC_DB_ATTRS = {"connect", "begin", "execute", "exec_driver_sql", "cursor", "fetchall", "fetchone"}
+SYNC_DB_FUNCTIONS = {"exec_sql_stream", "exec_sql_stream_cached", "get_db_connection", "initialize_database"}
+DB_HANDLES = {"engine", "data_extractor"}
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def _called_names(fn):
+    names = set()
+    for node in ast.walk(fn):
+        if isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute):
+                names.add(node.func.attr)
+            elif isinstance(node.func, ast.Name):
+                names.add(node.func.id)
+    return names
+
+
+def _blocking_methods():
+    """
+    Names of data-access functions and methods that use the engine, directly
+    or by calling another such function in the same module or class.
+    """
+    blocking = set()
+    for path in DATA_ACCESS_FILES:
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        for scope in [tree] + [node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)]:
+            calls = {}
+            for fn in scope.body:
+                if isinstance(fn, ast.FunctionDef):
+                    calls[fn.name] = _called_names(fn)
+                    used = {n.attr for n in ast.walk(fn) if isinstance(n, ast.Attribute)}
+                    used |= {n.id for n in ast.walk(fn) if isinstance(n, ast.Name)}
+                    if used & DB_HANDLES:
+                        blocking.add(fn.name)
+            changed = True
+            while changed:
+                changed = False
+                for name, called in calls.items():
+                    if name not in blocking and called & blocking:
+                        blocking.add(name)
+                        changed = True
+    return blocking - {"__init__"}
+
+
+def _blocking_calls(source, blocking_methods):
+    """(function, line, call) for each un-awaited sync DB call directly in an async def body."""
+    found = []
+    for fn in ast.walk(ast.parse(source)):
+        if not isinstance(fn, ast.AsyncFunctionDef):
+            continue
+        awaited = set()
+        stack = list(fn.body)
+        while stack:
+            node = stack.pop()
+            # Nested defs and lambdas are what gets handed to run_db/with_connection
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                continue
+            if isinstance(node, ast.Await):
+                awaited.add(id(node.value))
+            if isinstance(node, ast.Call) and id(node) not in awaited:
+                func = node.func
+                if isinstance(func, ast.Attribute) and (func.attr in SYNC_DB_ATTRS or func.attr in blocking_methods):
+                    found.append((fn.name, node.lineno, ast.unparse(func)))
+                elif isinstance(func, ast.Name) and func.id in SYNC_DB_FUNCTIONS:
+                    found.append((fn.name, node.lineno, func.id))
+            stack.extend(ast.iter_child_nodes(node))
+    return sorted(found, key=lambda f: f[1])
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __enter__(self):
+        self.engine.threads.append(threading.current_thread().name)
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params):
+        self.engine.statements.append((statement, params))
+        return FakeResult([("AAPL", 0.25)])
+
+
+class FakeEngine:
+    def __init__(self):
+        self.threads = []
+        self.statements = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class TestDatabaseExecutor:
+    """Test suite for awaiting blocking database calls on the executor."""
+
+    @pytest.fixture
+    def executor(self):
+        executor = DatabaseExecutor(max_workers=4)
+        yield executor
+        executor.shutdown()
+
+    def test_runs_off_loop_with_context(self, executor):
+        """Test that calls run on a db worker thread and see the caller's context variables."""
+        def work(x):
+            return threading.current_thread().name, request_id.get(), x * 2
+
+        async def run():
+            request_id.set("req-1")
+            return await executor.run(work, 21)
+
+        thread, rid, value = asyncio.run(run())
+        assert thread.startswith("db") and rid == "req-1" and value == 42
+        stats = executor.get_stats()
+        assert stats["completed"] == 1 and stats["running"] == 0 and stats["queued"] == 0
+
+    def test_slow_query_does_not_stall_other_requests(self, executor):
+        """Test that fast calls complete while a slow call is in flight."""
+        finished = []
+
+        async def run():
+            slow = asyncio.create_task(executor.run(time.sleep, 0.5))
+            await asyncio.sleep(0.01)
+            started = time.perf_counter()
+            for _ in range(20):
+                await executor.run(time.sleep, 0.001)
+            finished.append(time.perf_counter() - started)
+            assert not slow.done()
+            await slow
+
+        asyncio.run(run())
+        assert finished[0] < 0.4
+
+    def test_queue_bounded_by_workers(self, executor):
+        """Test that no more calls run at once than there are workers, and errors are counted."""
+        def fail():
+            raise ValueError("bad")
+
+        async def run():
+            await asyncio.gather(*(executor.run(time.sleep, 0.02) for _ in range(12)))
+            with pytest.raises(ValueError):
+                await executor.run(fail)
+
+        asyncio.run(run())
+        stats = executor.get_stats()
+        assert stats["max_running"] == 4 and stats["max_queued"] >= 8
+        assert stats["errors"] == 1 and stats["completed"] == 13
+
+    def test_connection_helpers_use_worker(self):
+        """Test that with_connection and fetch_all open the connection on a db worker."""
+        engine = FakeEngine()
+        statement = object()
+
+        async def run():
+            rows = await fetch_all(statement, {"ticker": "AAPL"}, engine=engine)
+            count = await with_connection(lambda conn, n: n + len(engine.statements), 1, engine=engine)
+            return rows, count
+
+        rows, count = asyncio.run(run())
+        assert rows == [("AAPL", 0.25)] and count == 2
+        assert engine.statements == [(statement, {"ticker": "AAPL"})]
+        assert all(name.startswith("db") for name in engine.threads)
+
+
+class TestEventLoopGuard:
+    """Test suite for catching sync database calls on the event loop thread."""
+
+    def test_checkout_on_loop_fails_in_raise_mode(self):
+        """Test that a checkout on the event loop thread raises, and off the loop it does not."""
+        executor = DatabaseExecutor(max_workers=1)
+        before = get_loop_guard_stats()["violations"]
+
+        async def run():
+            with pytest.raises(BlockingDatabaseCallError):
+                check_not_on_event_loop("raise")
+            await executor.run(check_not_on_event_loop, "raise")
+
+        asyncio.run(run())
+        check_not_on_event_loop("raise")
+        executor.shutdown()
+        assert get_loop_guard_stats()["violations"] == before + 1
+
+    def test_lint_catches_blocking_calls(self):
+        """Test that the endpoint lint flags inline DB calls and accepts awaited helpers."""
+        source = '''
+async def bad(request):
+    with engine.connect() as conn:
+        conn.execute(query)
+    return portfolio_engine.analyze_portfolio(request.user_id)
+
+async def good(request):
+    def collect(conn):
+        return conn.execute(query).fetchall()
+    rows = await with_connection(collect)
+    return await run_db(portfolio_engine.analyze_portfolio, request.user_id)
+'''
+        found = _blocking_calls(source, {"analyze_portfolio"})
+        assert [(fn, call) for fn, _, call in found] == [
+            ("bad", "engine.connect"), ("bad", "conn.execute"), ("bad", "portfolio_engine.analyze_portfolio"),
+        ]
+
+    def test_async_endpoints_do_not_block_on_database(self):
+        """Test that no async endpoint makes a sync database call on the event loop thread."""
+        blocking_methods = _blocking_methods()
+        assert {"get_portfolio_holdings", "analyze_portfolio", "get_user_alerts", "get_unread_insights"} <= blocking_methods
+        # Starting a thread whose target uses the database does not block
+        assert "start" not in blocking_methods
+        violations = []
+        for path in ENDPOINT_FILES:
+            for fn, line, call in _blocking_calls(path.read_text(encoding="utf-8"), blocking_methods):
+                violations.append(f"{path.relative_to(ROOT)}:{line} {fn}() calls {call}")
+        assert violations == [], "Await app.core.db_async helpers instead:\n" + "\n".join(violations)
+
+    # (route module, handler, arguments); every service they reach uses the module-level engine
+    GUARDED_ROUTES = [
+        ("app.routes.alerts", "list_alerts", {"session_id": "s1", "active_only": True, "api_key": "k"}),
+        ("app.routes.alerts", "list_alert_events", {"session_id": "s1", "unread_only": True, "limit": 5, "api_key": "k"}),
+        ("app.routes.alerts", "delete_alert", {"alert_id": "a1", "api_key": "k"}),
+        ("app.routes.alerts", "mark_alert_event_read", {"event_id": "e1", "api_key": "k"}),
+        ("app.routes.alerts", "check_alerts", {"alert_id": "a1", "api_key": "k"}),
+        ("app.routes.insights", "get_insights", {"session_id": "s1", "unread_only": True, "limit": 5, "api_key": "k"}),
+        ("app.routes.insights", "mark_insight_read", {"insight_id": "i1", "api_key": "k"}),
+        ("app.routes.income_ladder", "get_income_ladder", {"ladder_id": "l1", "api_key": "k"}),
+        ("app.routes.income_ladder", "list_user_ladders", {"session_id": "s1", "limit": 5, "api_key": "k"}),
+        ("app.routes.tax_optimization", "list_tax_scenarios", {"session_id": "s1", "limit": 5, "api_key": "k"}),
+        ("app.routes.feedback", "get_feedback_summary", {"days": 7}),
+        ("app.routes.feedback", "get_analytics_dashboard", {"days": 7}),
+        ("app.routes.feedback", "get_feedback_trends", {"days": 7}),
+        ("app.routes.feedback", "get_response_patterns", {"min_responses": 1}),
+    ]
+
+    def test_routes_never_check_out_on_loop(self, monkeypatch):
+        """Test that async routes reach the database only off the loop, with the guard in raise mode."""
+        sqlalchemy = pytest.importorskip("sqlalchemy")
+        # The route modules import the shared engine, which needs the ODBC driver
+        modules = {name: pytest.importorskip(name, exc_type=ImportError) for name, _, _ in self.GUARDED_ROUTES}
+        from app.core import db_async
+
+        monkeypatch.setitem(db_async._guard_stats, "mode", "raise")
+        engine = sqlalchemy.create_engine("sqlite://")
+        db_async.install_loop_guard(engine)
+        for name, module in list(sys.modules.items()):
+            if name.startswith("app.services.") and getattr(module, "engine", None) is not None:
+                monkeypatch.setattr(module, "engine", engine)
+        before = get_loop_guard_stats()["violations"]
+
+        async def run():
+            for name, handler, kwargs in self.GUARDED_ROUTES:
+                try:
+                    await getattr(modules[name], handler)(**kwargs)
+                except Exception:
+                    # SQLite has none of the tables; only where the checkout happens matters
+                    pass
+
+        asyncio.run(run())
+        engine.dispose()
+        assert get_loop_guard_stats()["violations"] == before
@@ -0,0 +1,183 @@
+"""
+Tests for Database Telemetry
+"""
+
+import time
+import threading
+import pytest
+from app.core.db_telemetry import DatabaseTelemetry, DB_ENDPOINT, normalize_sql
+
+
+class FakeCursor:
+    def __init__(self, description=None, rowcount=-1):
+        self.description = description
+        self.rowcount = rowcount
+
+
+class FakeContext:
+    cursor_fetch_strategy = "default"
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+PoolTimeout.__name__ = "TimeoutError"
+
+
+class FakePool:
+    """Pool whose getter opens a connection the first time and can time out."""
+
+    def __init__(self, telemetry):
+        self.telemetry = telemetry
+        self.opened = 0
+        self.checked_out = 0
+        self.timeout = False
+
+    def _do_get(self):
+        if self.timeout:
+            raise PoolTimeout("QueuePool limit reached")
+        if self.opened == 0:
+            self.opened += 1
+            self.telemetry.on_connect()
+        self.checked_out += 1
+        return object()
+
+    def overflow(self):
+        return self.checked_out - 1
+
+    def checkedout(self):
+        return self.checked_out
+
+    def size(self):
+        return 1
+
+
+class FakeDialect:
+    def __init__(self):
+        self.alive = True
+
+    def do_ping(self, dbapi_connection):
+        time.sleep(0.002)
+        return self.alive
+
+
+def execute(telemetry, statement, elapsed=0.0, cursor=None, context=None):
+    cursor = cursor or FakeCursor(description=[("col",)])
+    context = context or FakeContext()
+    telemetry.before_cursor_execute(None, cursor, statement, None, context, False)
+    if elapsed:
+        time.sleep(elapsed)
+    telemetry.after_cursor_execute(None, cursor, statement, None, context, False)
+    return context
+
+
+class TestDatabaseTelemetry:
+    """Test suite for statement, pool and pre-ping telemetry."""
+
+    @pytest.fixture
+    def telemetry(self):
+        return DatabaseTelemetry(slow_query_ms=20, slow_log_size=2)
+
+    def test_normalize_sql(self):
+        """Test that literals, IN lists, comments and whitespace are normalized."""
+        sql = """
+            SELECT TOP 10 Ticker, v2.Price -- latest
+            FROM dbo.vQuotes v2 WHERE Ticker IN ('AAPL', N'MSFT', 'O''Reilly') AND Price > -1.5e2;
+        """
+        assert normalize_sql(sql) == (
+            "SELECT TOP ? Ticker, v2.Price FROM dbo.vQuotes v2 WHERE Ticker IN (?) AND Price > ?"
+        )
+        assert normalize_sql("SELECT * FROM t WHERE id = 42") == normalize_sql("SELECT  *\nFROM t WHERE id = 7;")
+
+    def test_statements_grouped_by_fingerprint(self, telemetry):
+        """Test that statements differing only in literals share one record with endpoint counts."""
+        token = DB_ENDPOINT.set("POST /v1/chat/completions")
+        try:
+            execute(telemetry, "SELECT * FROM dbo.vTickers WHERE Ticker = 'AAPL'")
+            execute(telemetry, "SELECT * FROM dbo.vTickers WHERE Ticker = 'MSFT'")
+        finally:
+            DB_ENDPOINT.reset(token)
+        execute(telemetry, "UPDATE dbo.alerts SET seen = 1 WHERE id = 7",
+                cursor=FakeCursor(description=None, rowcount=3))
+
+        stats = telemetry.get_stats()
+        assert stats["executed"] == 3 and stats["fingerprints"] == 2
+        select = next(s for s in stats["statements"] if s["sql"].startswith("SELECT"))
+        assert select["count"] == 2
+        assert select["endpoints"] == {"POST /v1/chat/completions": 2}
+        assert select["latency_ms"]["count"] == 2
+        update = next(s for s in stats["statements"] if s["sql"].startswith("UPDATE"))
+        assert update["rows_affected"] == 3
+        assert update["endpoints"] == {threading.current_thread().name: 1}
+
+    def test_rows_counted_on_fetch(self, telemetry):
+        """Test that result sets get a counting fetch strategy that adds fetched rows to the record."""
+        telemetry.enable_row_counting("default", lambda record: ("counting", record))
+        context = execute(telemetry, "SELECT Ticker FROM dbo.vTickers")
+        kind, record = context.cursor_fetch_strategy
+        assert kind == "counting"
+        telemetry.add_rows(record, 25)
+        telemetry.add_rows(record, 5)
+        assert telemetry.get_stats()["statements"][0]["rows"] == 30
+
+        # Statements without a result set keep the dialect's strategy
+        context = execute(telemetry, "DELETE FROM dbo.t", cursor=FakeCursor(description=None, rowcount=0))
+        assert context.cursor_fetch_strategy == "default"
+
+    def test_slow_query_log(self, telemetry):
+        """Test that slow statements are logged newest first, bounded, with the endpoint."""
+        token = DB_ENDPOINT.set("GET /v1/insights")
+        try:
+            for ticker in ("A", "B", "C"):
+                execute(telemetry, f"SELECT * FROM dbo.vDividendsEnhanced WHERE Ticker = '{ticker}'", elapsed=0.025)
+            execute(telemetry, "SELECT 1")
+        finally:
+            DB_ENDPOINT.reset(token)
+        slow = telemetry.get_stats()["slow_queries"]
+        assert len(slow) == 2 and telemetry.get_stats()["slow"] == 3
+        assert slow[0]["endpoint"] == "GET /v1/insights"
+        assert slow[0]["sql"] == "SELECT * FROM dbo.vDividendsEnhanced WHERE Ticker = ?"
+        assert slow[0]["duration_ms"] >= 20
+
+    def test_errors_counted(self, telemetry):
+        """Test that failed statements count against their fingerprint."""
+        class ExceptionContext:
+            statement = "SELECT * FROM dbo.missing WHERE id = 1"
+
+        telemetry.handle_error(ExceptionContext())
+        stats = telemetry.get_stats()
+        assert stats["errors"] == 1 and stats["statements"][0]["errors"] == 1
+
+    def test_fingerprint_limit(self):
+        """Test that statements past the fingerprint limit are pooled under 'other'."""
+        telemetry = DatabaseTelemetry(max_fingerprints=2)
+        for table in ("a", "b", "c", "d"):
+            execute(telemetry, f"SELECT * FROM {table}")
+        stats = telemetry.get_stats()
+        assert stats["fingerprints"] == 3
+        assert next(s for s in stats["statements"] if s["fingerprint"] == "other")["count"] == 2
+
+    def test_pool_checkout_and_pre_ping(self, telemetry):
+        """Test that checkouts split into connects vs. waits, with overflow, timeouts and ping cost."""
+        pool = FakePool(telemetry)
+        dialect = FakeDialect()
+        telemetry.instrument_pool(pool)
+        telemetry.instrument_dialect(dialect)
+
+        for _ in range(3):
+            pool._do_get()
+        assert dialect.do_ping(None)
+        dialect.alive = False
+        assert not dialect.do_ping(None)
+        pool.timeout = True
+        with pytest.raises(PoolTimeout):
+            pool._do_get()
+
+        stats = telemetry.get_stats()["pool"]
+        assert stats["checkouts"] == 3 and stats["connects"] == 1
+        assert stats["connect_ms"]["count"] == 1 and stats["checkout_wait_ms"]["count"] == 2
+        assert stats["overflow_checkouts"] == 2 and stats["peak_overflow"] == 2
+        assert stats["timeouts"] == 1 and stats["checked_out"] == 3 and stats["overflow"] == 2
+        assert stats["pre_pings"] == 2 and stats["pre_ping_failures"] == 1
+        assert stats["pre_ping_ms"]["p50"] >= 1
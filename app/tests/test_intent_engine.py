@@ -0,0 +1,86 @@
+"""
+Tests for Intent Engine
+"""
+
+import re
+import pytest
+from app.core.intent_engine import IntentEngine
+from app.core.model_router import QueryRouter, QueryType, QUERY_PATTERNS, CLASSIFY_ORDER
+from app.utils import helpers
+from app.helpers.status_message_detector import detect_status_message
+
+
+QUERIES = [
+    "What is the dividend yield of KO?",
+    "Is the $T dividend safe? cut risk?",
+    "Give me a dividend sustainability analysis of PEP",
+    "Compare SCHD vs VYM payout ratio",
+    "Show all YieldMax ETFs distributions this month",
+    "Explain covered call ETFs in detail and compare strategy options for a comprehensive income plan",
+    "hi",
+    "Read my brokerage statement pdf",
+    "what's up",
+    "Who is the CEO of MSFT?",
+    "Find dividend aristocrats with high yield",
+    "",
+]
+
+
+class TestIntentEngine:
+    """Test suite for single-pass keyword/pattern classification."""
+
+    @pytest.fixture
+    def engine(self):
+        """Create a fresh engine instance."""
+        return IntentEngine(cache_size=16)
+
+    def test_overlapping_keywords_all_found(self, engine):
+        """Test that keywords sharing a start position or overlapping are all reported."""
+        engine.register_keywords("a", ["dividend", "dividend cut", "cut", "end"])
+        engine.register_keywords("b", ["ex-div", " vs "])
+        signals = engine.scan("Dividend cut vs EX-DIV")
+        assert signals.hits("a") == {"dividend", "dividend cut", "cut", "end"}
+        assert signals.hits("b") == {"ex-div", " vs "}
+
+    def test_substring_semantics_match_in_operator(self, engine):
+        """Test that keyword hits equal `kw in text.lower()` for every keyword."""
+        keywords = ["div", "dividend", "ividen", "yield", "What all you can do", "a"]
+        engine.register_keywords("k", keywords)
+        for text in QUERIES:
+            expected = {k for k in keywords if k in text.lower()}
+            assert engine.scan(text).hits("k") == expected
+
+    def test_patterns_and_reregistration(self, engine):
+        """Test pattern groups and that re-registering invalidates memoized scans."""
+        engine.register_patterns("fx", [r"\bfx\b", r"eur/usd"])
+        engine.register_keywords("k", ["foo"])
+        assert engine.scan("EUR/USD today").matches("fx")
+        assert engine.scan("foo").has("k")
+        engine.register_keywords("k", ["bar"])
+        assert not engine.scan("foo").has("k")
+        assert engine.get_stats()["keyword_groups"] == 1
+
+    def test_classify_query_matches_per_pattern_scan(self):
+        """Test that routing classification equals the original per-pattern loop."""
+        def reference(query):
+            query_lower = query.lower()
+            for query_type in CLASSIFY_ORDER:
+                if any(re.search(p, query_lower, re.IGNORECASE) for p in QUERY_PATTERNS[query_type]):
+                    return query_type
+            words = ['analyze', 'compare', 'evaluate', 'portfolio', 'strategy',
+                     'comprehensive', 'detailed', 'explain', 'breakdown']
+            indicators = [len(query) > 200, query.count('?') > 2, any(w in query_lower for w in words)]
+            return QueryType.COMPLEX_ANALYSIS if sum(indicators) >= 2 else QueryType.GENERAL_CHAT
+
+        router = QueryRouter()
+        for query in QUERIES:
+            assert router.classify_query(query) == reference(query), query
+
+    def test_legacy_helpers_delegate(self):
+        """Test a few known classifications through the legacy entry points."""
+        assert helpers.is_ml_query("what is the cut risk for T")
+        assert helpers.detect_ml_query_type("dividend forecast for KO") == "yield_forecast"
+        assert helpers.should_route_to_web("Who is the CEO of MSFT?", ["MSFT"])
+        assert not helpers.should_route_to_web("KO dividend history", ["KO"])
+        assert detect_status_message("Find dividend aristocrats") == "Finding dividend aristocrats..."
+        assert detect_status_message("Is $T safe from a cut?") == "Evaluating dividend safety..."
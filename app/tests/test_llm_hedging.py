@@ -0,0 +1,117 @@
+"""
+Tests for LLM Request Hedging
+"""
+
+import asyncio
+import pytest
+from app.core.llm_hedging import LLMHedger, LatencyHistogram
+
+
+def _model(chunks, first_delay=0.0, fail=False, closed=None):
+    async def gen():
+        try:
+            await asyncio.sleep(first_delay)
+            if fail:
+                raise RuntimeError("deployment unavailable")
+            for chunk in chunks:
+                yield chunk
+        finally:
+            if closed is not None:
+                closed.append(True)
+    return gen
+
+
+async def _drain(stream):
+    return [piece async for piece in stream]
+
+
+class TestLLMHedging:
+    """Test suite for TTFT tracking and hedged streams."""
+
+    @pytest.fixture
+    def hedger(self):
+        """Create a hedger with a short default threshold."""
+        return LLMHedger(default_ms=50, min_ms=10, max_ms=1000, min_samples=5)
+
+    def test_histogram_percentiles(self):
+        """Test bucket-based percentile estimates."""
+        hist = LatencyHistogram([100, 200, 500])
+        for value in [50] * 90 + [150] * 5 + [400] * 5:
+            hist.observe(value)
+        assert hist.percentile(0.5) == 100
+        assert hist.percentile(0.95) == 200
+        assert hist.percentile(0.99) == 500
+
+    def test_threshold_adapts_to_observed_ttft(self, hedger):
+        """Test default threshold until enough samples, then clamped p95."""
+        assert hedger.threshold_ms("m") == 50
+        for _ in range(10):
+            hedger.record("m", 280, chunks=10, stream_seconds=0.5)
+        assert hedger.threshold_ms("m") == 300
+        assert hedger.get_stats()["models"]["m"]["tokens_per_sec"]["count"] == 10
+
+    def test_fast_primary_is_not_hedged(self, hedger):
+        """Test that a primary answering within threshold streams alone."""
+        fallback_closed = []
+        out = asyncio.run(_drain(hedger.stream(
+            "primary", _model(["a", "b"]),
+            "fallback", _model(["x"], closed=fallback_closed)
+        )))
+        assert out == ["a", "b"]
+        assert hedger.hedged == 0
+        assert fallback_closed == []
+
+    def test_slow_primary_loses_to_fallback_and_is_cancelled(self, hedger):
+        """Test that a late first token fires the fallback and cancels the loser."""
+        primary_closed = []
+        out = asyncio.run(_drain(hedger.stream(
+            "primary", _model(["slow"], first_delay=1.0, closed=primary_closed),
+            "fallback", _model(["fast", "er"])
+        )))
+        assert out == ["fast", "er"]
+        assert hedger.hedged == 1
+        assert hedger.fallback_wins == 1
+        assert primary_closed == [True]
+        stats = hedger.get_stats()["models"]
+        assert stats["primary"]["cancelled"] == 1
+        assert stats["primary"]["in_flight"] == 0
+        assert stats["fallback"]["ttft_ms"]["count"] == 1
+
+    def test_primary_error_fails_over(self, hedger):
+        """Test that a primary failing before its first token hands over immediately."""
+        out = asyncio.run(_drain(hedger.stream(
+            "primary", _model([], fail=True),
+            "fallback", _model(["ok"])
+        )))
+        assert out == ["ok"]
+        assert hedger.failovers == 1
+        assert hedger.get_stats()["models"]["primary"]["errors"] == 1
+
+    def test_error_without_fallback_propagates(self, hedger):
+        """Test that an unhedged stream is only timed and errors surface."""
+        with pytest.raises(RuntimeError):
+            asyncio.run(_drain(hedger.stream("primary", _model([], fail=True))))
+
+    def test_sync_stream_reports_events(self, hedger):
+        """Test that a timed sync stream emits start/ttft/tps/end and closes the upstream when abandoned."""
+        events = []
+        hedger.add_listener(lambda model, event, value: events.append((model, event)))
+        assert list(hedger.timed("m", iter(["a", "", "b", "c"]))) == ["a", "b", "c"]
+        assert events == [("m", "start"), ("m", "ttft"), ("m", "tps"), ("m", "end")]
+
+        closed = []
+
+        def upstream():
+            try:
+                yield "x"
+                yield "y"
+            finally:
+                closed.append(True)
+
+        stream = hedger.timed("m", upstream())
+        assert next(stream) == "x"
+        stream.close()
+        assert closed == [True]
+        stats = hedger.get_stats()["models"]["m"]
+        assert stats["requests"] == 2 and stats["cancelled"] == 1 and stats["in_flight"] == 0
+        assert stats["tokens_per_sec"]["count"] == 1
@@ -0,0 +1,197 @@
+"""
+Tests for Schema Migrations
+"""
+
+import pytest
+from app.core.migrations import (
+    Migration, MigrationRunner, SELECT_APPLIED_SQL, RECORD_MIGRATION_SQL, _feature_tables,
+)
+
+
+class FakeResult:
+    def __init__(self, rows=None, scalar=None):
+        self.rows = rows or []
+        self.value = scalar
+
+    def fetchall(self):
+        return self.rows
+
+    def scalar(self):
+        return self.value
+
+
+class FakeServer:
+    """Shared SQL Server state: the migrations table, the app lock and a statement log."""
+
+    def __init__(self):
+        self.table = None  # version -> checksum once dbo.schema_migrations exists
+        self.lock_holder = None
+        self.statements = []
+        self.on_lock = None
+        self.errors = {}  # statement substring -> error message
+
+    def engine(self):
+        return FakeEngine(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.server.lock_holder is self:
+            self.server.lock_holder = None
+        return False
+
+    def commit(self):
+        pass
+
+    def exec_driver_sql(self, sql, params=None):
+        server = self.server
+        server.statements.append(sql)
+        for marker, message in server.errors.items():
+            if marker in sql:
+                raise RuntimeError(message)
+        if sql == SELECT_APPLIED_SQL:
+            if server.table is None:
+                raise RuntimeError("Invalid object name 'dbo.schema_migrations'")
+            return FakeResult(rows=list(server.table.items()))
+        if "CREATE TABLE dbo.schema_migrations" in sql:
+            if server.table is None:
+                server.table = {}
+            return FakeResult()
+        if sql == RECORD_MIGRATION_SQL:
+            server.table[params[0]] = params[2]
+            return FakeResult()
+        if "sp_getapplock" in sql:
+            if server.on_lock:
+                server.on_lock()
+            if server.lock_holder not in (None, self):
+                return FakeResult(scalar=-1)
+            server.lock_holder = self
+            return FakeResult(scalar=0)
+        if "sp_releaseapplock" in sql:
+            server.lock_holder = None
+        return FakeResult()
+
+
+class FakeEngine:
+    def __init__(self, server):
+        self.server = server
+
+    def connect(self):
+        return FakeConnection(self.server)
+
+
+def _migrations(calls, sql_overrides=None, fail=None):
+    sql_overrides = sql_overrides or {}
+
+    def apply_for(version):
+        def apply(engine):
+            if version == fail:
+                raise RuntimeError("permission denied")
+            calls.append(version)
+        return apply
+
+    return [
+        Migration(v, f"step_{v}", sql_overrides.get(v, f"CREATE OR ALTER VIEW dbo.v{v} AS SELECT {v}"), apply_for(v))
+        for v in (1, 2, 3)
+    ]
+
+
+class TestMigrationRunner:
+    """Test suite for versioned startup migrations."""
+
+    @pytest.fixture
+    def server(self):
+        return FakeServer()
+
+    def test_fresh_database_applies_all_in_order(self, server):
+        """Test that an empty database gets every migration, recorded with its checksum."""
+        calls = []
+        runner = MigrationRunner(server.engine(), list(reversed(_migrations(calls))))
+        assert runner.run()
+        assert calls == [1, 2, 3]
+        assert set(server.table) == {1, 2, 3}
+        assert runner.get_stats()["applied"] == ["0001_step_1", "0002_step_2", "0003_step_3"]
+        assert server.lock_holder is None
+
+    def test_current_schema_skips_all_ddl(self, server):
+        """Test that a worker starting against a current schema runs only the version check."""
+        MigrationRunner(server.engine(), _migrations([])).run()
+        server.statements.clear()
+
+        calls = []
+        runner = MigrationRunner(server.engine(), _migrations(calls))
+        assert runner.run()
+        assert calls == []
+        assert server.statements == [SELECT_APPLIED_SQL]
+        assert runner.get_stats()["check_ms"] is not None
+        # Checked once per process
+        assert runner.run()
+        assert server.statements == [SELECT_APPLIED_SQL]
+
+    def test_changed_migration_reapplied(self, server):
+        """Test that editing a migration's SQL re-applies only that migration."""
+        MigrationRunner(server.engine(), _migrations([])).run()
+        calls = []
+        runner = MigrationRunner(server.engine(), _migrations(calls, {2: "CREATE OR ALTER VIEW dbo.v2 AS SELECT 22"}))
+        assert runner.status()["migrations"][1]["state"] == "changed"
+        assert runner.run()
+        assert calls == [2]
+        assert runner.status()["current"]
+
+    def test_failure_stops_and_retries_next_start(self, server):
+        """Test that a failed migration is not recorded and later ones wait for it."""
+        calls = []
+        runner = MigrationRunner(server.engine(), _migrations(calls, fail=2))
+        assert not runner.run()
+        assert calls == [1]
+        assert set(server.table) == {1}
+        assert runner.get_stats()["failed"] == "0002_step_2"
+
+        calls = []
+        assert MigrationRunner(server.engine(), _migrations(calls)).run()
+        assert calls == [2, 3]
+
+    def test_other_process_holding_lock(self, server):
+        """Test that a worker that cannot get the lock applies nothing."""
+        server.lock_holder = object()
+        calls = []
+        runner = MigrationRunner(server.engine(), _migrations(calls), lock_timeout=0)
+        assert not runner.run()
+        assert calls == []
+
+    def test_waiter_skips_migrations_applied_meanwhile(self, server):
+        """Test that a worker that waited for the lock re-checks and does not re-apply."""
+        calls = []
+        other = MigrationRunner(server.engine(), _migrations([]))
+
+        def applied_by_other_process():
+            server.on_lock = None
+            other.run()
+
+        server.on_lock = applied_by_other_process
+        runner = MigrationRunner(server.engine(), _migrations(calls))
+        assert runner.run()
+        assert calls == []
+
+    def test_duplicate_versions_rejected(self, server):
+        """Test that two migrations with one version number are refused."""
+        migrations = _migrations([])
+        with pytest.raises(ValueError):
+            MigrationRunner(server.engine(), migrations + [migrations[0]])
+
+    def test_feature_tables_fail_on_any_real_error(self, server):
+        """Test that existing objects are skipped but one failing statement fails the migration."""
+        apply = _feature_tables("CREATE TABLE dbo.a (id INT); CREATE TABLE dbo.b (id INT); CREATE TABLE dbo.c (id INT)")
+        server.errors["dbo.a"] = "There is already an object named 'a' in the database."
+        apply(server.engine())
+
+        server.errors["dbo.b"] = "CREATE TABLE permission denied in database 'harvey'."
+        with pytest.raises(RuntimeError, match="1 feature table statement"):
+            apply(server.engine())
+        assert server.statements[-1] == "CREATE TABLE dbo.c (id INT)"
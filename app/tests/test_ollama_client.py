@@ -0,0 +1,136 @@
+"""
+Tests for Ollama Client
+"""
+
+import json
+import asyncio
+import threading
+import httpx
+import pytest
+from app.core.ollama_client import ModelGate, OllamaClient, OllamaBusyError
+
+
+class FakeSession:
+    """requests.Session stand-in recording calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        self.calls.append(("GET", url, None))
+        return FakeResponse({"models": [{"name": "llama3.1:8b"}, {"name": "mistral"}]})
+
+    def post(self, url, json=None, timeout=None, stream=False):
+        self.calls.append(("POST", url, json))
+        return FakeResponse({})
+
+    def close(self):
+        pass
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class TestOllamaClient:
+    """Test suite for the pooled, warm Ollama transport."""
+
+    @pytest.fixture
+    def session(self):
+        return FakeSession()
+
+    @pytest.fixture
+    def client(self, session):
+        """Create a client against fake transports."""
+        def handler(request):
+            body = json.loads(request.content or b"{}")
+            return httpx.Response(200, json={"message": {"content": body.get("keep_alive", "")}})
+        return OllamaClient(base_url="http://ollama:11434", keep_alive="15m", model_concurrency=1,
+                            queue_timeout=1.0, transport=httpx.MockTransport(handler), session=session)
+
+    def test_chat_payload_carries_keep_alive(self, client):
+        """Test that every chat asks Ollama to keep the model resident."""
+        async def run():
+            payload = client.chat_payload("llama3.1:8b", [{"role": "user", "content": "hi"}], stream=False)
+            async with client.slot_async("llama3.1:8b"):
+                r = await client.async_client.post("/api/chat", json=payload)
+            return r.json()["message"]["content"]
+        assert asyncio.run(run()) == "15m"
+
+    def test_tags_are_cached(self, client, session):
+        """Test that the tag list is fetched once per TTL."""
+        assert client.list_tags() == ["llama3.1:8b", "mistral"]
+        assert client.list_tags() == ["llama3.1:8b", "mistral"]
+        assert sum(1 for c in session.calls if c[0] == "GET") == 1
+        assert client.get_stats()["tags_cache_hits"] == 1
+
+    def test_keepwarm_pings_generate(self, client, session):
+        """Test the keep-warm ping: empty /api/generate with keep_alive."""
+        assert client.warm("llama3.1:8b")
+        assert session.calls[-1] == ("POST", "http://ollama:11434/api/generate",
+                                     {"model": "llama3.1:8b", "keep_alive": "15m"})
+        assert client.get_stats()["keepwarm_pings"] == 1
+
+    def test_burst_queues_per_model(self, client):
+        """Test that requests beyond the model limit wait, while other models run."""
+        async def run():
+            order = []
+
+            async def call(model, tag, hold):
+                async with client.slot_async(model):
+                    order.append(f"{tag}+")
+                    await asyncio.sleep(hold)
+                    order.append(f"{tag}-")
+
+            await asyncio.gather(call("a", "a1", 0.05), call("a", "a2", 0), call("b", "b1", 0))
+            return order
+
+        order = asyncio.run(run())
+        assert order.index("a1-") < order.index("a2+")
+        assert order.index("b1+") < order.index("a1-")
+        stats = client.get_stats()
+        assert stats["queued"] == 1 and stats["models"]["a"]["in_flight"] == 0
+
+    def test_queue_timeout_raises_busy(self, client):
+        """Test that a request waiting past the queue timeout fails fast."""
+        client.queue_timeout = 0.05
+
+        async def run():
+            async with client.slot_async("a"):
+                with pytest.raises(OllamaBusyError):
+                    async with client.slot_async("a"):
+                        pass
+        asyncio.run(run())
+        assert client.get_stats()["queue_timeouts"] == 1
+
+    def test_gate_hands_slots_between_threads_and_loop(self):
+        """Test FIFO hand-off from a thread holder to an async waiter and back."""
+        gate = ModelGate(1)
+        assert gate.acquire()
+        got = []
+
+        def sync_waiter():
+            got.append(gate.acquire(timeout=2))
+
+        async def run():
+            waiter = asyncio.create_task(gate.acquire_async(timeout=2))
+            await asyncio.sleep(0.01)
+            thread = threading.Thread(target=sync_waiter)
+            thread.start()
+            await asyncio.sleep(0.01)
+            gate.release()
+            assert await waiter
+            gate.release()
+            await asyncio.to_thread(thread.join)
+
+        asyncio.run(run())
+        assert got == [True] and gate.in_use == 1
+        gate.release()
+        assert gate.in_use == 0
@@ -0,0 +1,97 @@
+"""
+Tests for Planner Plan Cache
+"""
+
+import pytest
+from app.services.plan_cache import (
+    PlanCache, canonicalize_question, to_sql_template, bind_sql_template
+)
+
+
+PLANNER = "You are the planner."
+
+
+class TestPlanCache:
+    """Test suite for plan cache canonicalization and re-binding."""
+
+    @pytest.fixture
+    def cache(self):
+        """Create a small plan cache instance."""
+        return PlanCache(ttl=60, max_size=2)
+
+    def test_canonical_shape_ignores_tickers_case_and_whitespace(self):
+        """Test that questions differing only by ticker share a shape."""
+        a = canonicalize_question("TICKERS_HINT: KO\nLatest  dividend for KO", ["KO"])
+        b = canonicalize_question("TICKERS_HINT: PEP\nlatest dividend for   PEP", ["PEP"])
+        assert a == b
+        assert "__t0__" in a
+
+    def test_canonical_shape_drops_extraction_timing(self):
+        """Test that ticker-extraction timing does not fragment keys."""
+        a = canonicalize_question("[TICKER_EXTRACTION] Detected tickers: KO (processed in 3ms)\nyield of KO", ["KO"])
+        b = canonicalize_question("[TICKER_EXTRACTION] Detected tickers: KO (processed in 12ms)\nyield of KO", ["KO"])
+        assert a == b
+
+    def test_template_round_trip(self):
+        """Test SQL template creation and re-binding for multiple tickers."""
+        sql = "SELECT Ticker, Price FROM dbo.vPrices WHERE Ticker IN ('AAPL', 'MSFT')"
+        template = to_sql_template(sql, ["AAPL", "MSFT"])
+        assert template == "SELECT Ticker, Price FROM dbo.vPrices WHERE Ticker IN ('__T0__', '__T1__')"
+        assert bind_sql_template(template, ["KO", "PEP"]) == (
+            "SELECT Ticker, Price FROM dbo.vPrices WHERE Ticker IN ('KO', 'PEP')"
+        )
+
+    def test_template_rejects_foreign_ticker_literal(self):
+        """Test that SQL naming a ticker the user never mentioned is not cached."""
+        sql = "SELECT Ticker FROM dbo.vPrices WHERE Ticker IN ('KO', 'PEP')"
+        assert to_sql_template(sql, ["KO"]) is None
+
+    def test_template_allows_exchange_literals(self):
+        """Test that exchange filters do not block caching."""
+        sql = "SELECT Ticker FROM dbo.vTickers WHERE Exchange = 'NYSE' AND Ticker = 'KO'"
+        assert to_sql_template(sql, ["KO"]) is not None
+
+    def test_hit_rebinds_tickers(self, cache):
+        """Test that a cached plan is re-bound for a new ticker."""
+        key_ko = cache.make_key("latest dividend for KO", ["KO"], PLANNER)
+        assert cache.lookup(key_ko, ["KO"]) is None
+        assert cache.store_plan(key_ko, "SELECT TOP 1 * FROM dbo.vDividends WHERE Ticker = 'KO'", ["KO"])
+
+        key_pep = cache.make_key("latest dividend for PEP", ["PEP"], PLANNER)
+        assert key_pep == key_ko
+        plan = cache.lookup(key_pep, ["PEP"])
+        assert plan["action"] == "sql"
+        assert plan["sql"] == "SELECT TOP 1 * FROM dbo.vDividends WHERE Ticker = 'PEP'"
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["stores"] == 1
+
+    def test_planner_prompt_change_changes_key(self, cache):
+        """Test that editing the planner prompt invalidates cached plans."""
+        assert cache.make_key("yield of KO", ["KO"], PLANNER) != cache.make_key("yield of KO", ["KO"], PLANNER + "!")
+
+    def test_lru_eviction(self, cache):
+        """Test that the oldest template is evicted past max_size."""
+        keys = [cache.make_key(f"question {i} for KO", ["KO"], PLANNER) for i in range(3)]
+        for key in keys:
+            cache.store_plan(key, "SELECT * FROM dbo.vDividends WHERE Ticker = 'KO'", ["KO"])
+        assert cache.lookup(keys[0], ["KO"]) is None
+        assert cache.lookup(keys[2], ["KO"]) is not None
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_ticker_in_like_or_company_literal_not_cached(self, cache):
+        """Test that SQL naming the question's ticker in a LIKE or company-name literal is never reused."""
+        aliases = {"KO": ["coca-cola company", "coca-cola"]}
+        key_ko = cache.make_key("dividends for KO", ["KO"], PLANNER)
+        assert not cache.store_plan(key_ko, "SELECT * FROM dbo.vDividends WHERE Ticker LIKE 'KO%'", ["KO"], aliases)
+        assert not cache.store_plan(
+            key_ko, "SELECT * FROM dbo.vDividends WHERE Company_Name LIKE '%Coca-Cola%'", ["KO"], aliases
+        )
+        assert cache.lookup(cache.make_key("dividends for PEP", ["PEP"], PLANNER), ["PEP"]) is None
+        assert cache.get_stats()["uncacheable"] == 2
+
+        # A question with tickers whose plan never binds one is not reusable either
+        assert to_sql_template("SELECT TOP 5 * FROM dbo.vDividends ORDER BY Amount DESC", ["KO"]) is None
+        assert to_sql_template("SELECT TOP 5 * FROM dbo.vDividends ORDER BY Amount DESC", []) is not None
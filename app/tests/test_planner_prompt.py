@@ -0,0 +1,93 @@
+"""
+Tests for Planner Prompt Pruning
+"""
+
+import os
+
+import pytest
+from app.config.settings import PLANNER_SECTIONS, PLANNER_SYSTEM_DEFAULT
+from app.core.planner_prompt import PlannerPromptBuilder, SECTION_INTENTS
+
+
+class TestPlannerPrompt:
+    """Test suite for intent-scoped planner prompt assembly."""
+
+    @pytest.fixture
+    def builder(self):
+        """Create a fresh builder instance."""
+        return PlannerPromptBuilder(enabled=True)
+
+    def test_sections_form_full_prompt(self):
+        """Test that the sections joined in order are the full prompt, and all have a rule."""
+        assert "".join(PLANNER_SECTIONS.values()) == PLANNER_SYSTEM_DEFAULT
+        assert set(SECTION_INTENTS) == set(PLANNER_SECTIONS)
+
+    def test_price_question_gets_price_schema_only(self, builder):
+        """Test that a price lookup drops dividend/ticker schemas and unrelated rules."""
+        prompt, report = builder.build("price of MSFT", ["MSFT"])
+        assert report["pruned"] and report["intents"] == ["prices"]
+        assert "dbo.vPrices(" in prompt
+        assert "dbo.vDividends(" not in prompt and "dbo.vTickers(" not in prompt
+        assert "*** PASSIVE INCOME PLANNING DETECTION ***" not in prompt
+        assert PLANNER_SECTIONS["absolute_rules"] in prompt
+        assert 0 < report["tokens"] < report["full_tokens"]
+
+    def test_dividend_question_keeps_enhanced_view_examples(self, builder):
+        """Test that dividend questions get the dividend schema and examples."""
+        prompt, report = builder.build("TICKERS_HINT: KO\nShow KO dividend history", ["KO"])
+        assert "dbo.vDividends(" in prompt and "vDividendsEnhanced" in prompt
+        assert "dbo.vPrices(" not in prompt
+        assert "us_market" in report["sections"]
+
+    def test_ambiguous_or_disabled_gets_full_prompt(self, builder):
+        """Test that unrecognised questions and a disabled builder use the full prompt."""
+        prompt, report = builder.build("what is the weather like", [])
+        assert prompt == PLANNER_SYSTEM_DEFAULT and not report["pruned"]
+        prompt, _ = PlannerPromptBuilder(enabled=False).build("price of MSFT", ["MSFT"], user_system="Be brief.")
+        assert prompt == PLANNER_SYSTEM_DEFAULT + "\n\nBe brief."
+        assert builder.get_stats()["full"] == 1
+
+    def test_sanitize_failure_replans_with_full_prompt(self, monkeypatch, tmp_path):
+        """Test that SQL rejected by sanitize_sql triggers one re-plan with the full prompt."""
+        # The LLM clients are built at import; the database engine needs the ODBC driver
+        monkeypatch.setenv("OPENAI_API_KEY", os.environ.get("OPENAI_API_KEY") or "test-key")
+        request_handler = pytest.importorskip("app.handlers.request_handler", exc_type=ImportError)
+        prompts = []
+
+        def fake_plan(question, planner_system):
+            prompts.append(planner_system)
+            return {"action": "sql", "final_answer": None, "sql": "DELETE FROM dbo.vPrices"}
+
+        monkeypatch.setattr(request_handler, "oai_plan", fake_plan)
+        monkeypatch.setattr(request_handler, "write_runlog", lambda run, logfile: None)
+        monkeypatch.setattr(request_handler, "AUTO_WEB_FALLBACK", False)
+        request_handler.handle_request(
+            "price of MSFT", "", {"bypass_plan_cache": True}, logfile=str(tmp_path / "runlogger.jsonl")
+        )
+
+        assert len(prompts) == 2
+        assert len(prompts[0]) < len(PLANNER_SYSTEM_DEFAULT)
+        assert prompts[1] == PLANNER_SYSTEM_DEFAULT
+
+    def test_rejected_replan_reports_busy(self, monkeypatch, tmp_path):
+        """Test that admission control rejecting the full-prompt re-plan sends the busy message."""
+        monkeypatch.setenv("OPENAI_API_KEY", os.environ.get("OPENAI_API_KEY") or "test-key")
+        request_handler = pytest.importorskip("app.handlers.request_handler", exc_type=ImportError)
+        from app.core.admission_control import AdmissionRejected
+        prompts = []
+
+        def fake_plan(question, planner_system):
+            prompts.append(planner_system)
+            if len(prompts) == 2:
+                raise AdmissionRejected("planner", "interactive", 2.0)
+            return {"action": "sql", "final_answer": None, "sql": "DELETE FROM dbo.vPrices"}
+
+        monkeypatch.setattr(request_handler, "oai_plan", fake_plan)
+        monkeypatch.setattr(request_handler, "AUTO_WEB_FALLBACK", False)
+        body = "".join(request_handler.handle_request(
+            "price of MSFT", "", {"bypass_plan_cache": True}, logfile=str(tmp_path / "runlogger.jsonl")
+        ))
+
+        assert len(prompts) == 2
+        assert "unusually high number of requests" in body
+        assert "safe SQL query" not in body
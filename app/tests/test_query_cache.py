@@ -0,0 +1,107 @@
+"""
+Tests for SQL Result Cache
+"""
+
+import pytest
+from app.services import query_cache as qc
+
+
+class TestSqlResultCache:
+    """Test suite for view-tagged SQL result caching."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self, monkeypatch):
+        """Give each test its own global cache instance and process-local generations."""
+        monkeypatch.setattr(qc, "_query_cache", qc.QueryCache(max_size=10))
+        monkeypatch.setattr(qc, "_view_generations", qc.ViewGenerations(store=None))
+        monkeypatch.setattr(qc, "SQL_RESULT_CACHE_ENABLED", True)
+
+    def test_views_in_sql(self):
+        """Test view detection with and without dbo./brackets."""
+        sql = "SELECT d.Ticker FROM dbo.vDividends d JOIN [vPrices] p ON p.Ticker = d.Ticker"
+        assert qc.views_in_sql(sql) == ["vdividends", "vprices"]
+
+    def test_ttl_is_shortest_view_ttl(self):
+        """Test that a join gets the TTL of its most volatile view."""
+        assert qc.sql_result_ttl(["vdividends", "vprices"]) == qc.VIEW_TTLS["vprices"]
+        assert qc.sql_result_ttl(["vtickers"]) == qc.VIEW_TTLS["vtickers"]
+
+    def test_round_trip_ignores_whitespace(self):
+        """Test that formatting differences share one entry."""
+        assert qc.cache_sql_result("SELECT Ticker FROM dbo.vTickers", ["Ticker"], [("KO",)])
+        columns, rows = qc.get_cached_sql_result("SELECT  Ticker\nFROM dbo.vTickers")
+        assert columns == ["Ticker"]
+        assert list(rows) == [("KO",)]
+
+    def test_invalidate_views_only_drops_dependents(self):
+        """Test that refreshing one view leaves unrelated results cached."""
+        qc.cache_sql_result("SELECT * FROM dbo.vPrices", ["Price"], [(1.0,)])
+        qc.cache_sql_result("SELECT * FROM dbo.vTickers", ["Ticker"], [("KO",)])
+
+        assert qc.invalidate_views(["dbo.vPrices"]) == 1
+        assert qc.get_cached_sql_result("SELECT * FROM dbo.vPrices") is None
+        assert qc.get_cached_sql_result("SELECT * FROM dbo.vTickers") is not None
+        assert qc.get_query_cache().get_stats()["invalidations"] == 1
+
+    def test_oversized_results_not_cached(self, monkeypatch):
+        """Test that large result sets bypass the cache."""
+        monkeypatch.setattr(qc, "SQL_RESULT_CACHE_MAX_ROWS", 2)
+        assert not qc.cache_sql_result("SELECT * FROM dbo.vPrices", ["Price"], [(1,), (2,), (3,)])
+        assert qc.get_cached_sql_result("SELECT * FROM dbo.vPrices") is None
+
+
+class FakeGenerationStore:
+    """dbo.view_generations as a dict, shared by the 'workers' of a test."""
+
+    def __init__(self):
+        self.rows = {}
+        self.down = False
+
+    def load(self):
+        if self.down:
+            raise ConnectionError("database unavailable")
+        return dict(self.rows)
+
+    def bump(self, names):
+        if self.down:
+            raise ConnectionError("database unavailable")
+        for name in names:
+            self.rows[name] = self.rows.get(name, 0) + 1
+        return {name: self.rows[name] for name in names}
+
+
+class TestViewGenerations:
+    """Test suite for view refresh generations shared across workers."""
+
+    def test_bump_reaches_other_workers_on_poll(self):
+        """Test that a bump in one worker drops the other worker's results on its next poll."""
+        store = FakeGenerationStore()
+        dropped = []
+        worker_a = qc.ViewGenerations(store, poll_seconds=0)
+        worker_b = qc.ViewGenerations(store, poll_seconds=0, on_change=dropped.extend)
+
+        worker_a.bump(["vprices"])
+        assert worker_a.current(["vprices"]) == {"vprices": 1}
+        assert worker_b.current(["vprices"]) == {"vprices": 0}
+
+        assert worker_b.poll() == ["vprices"]
+        assert dropped == ["vprices"]
+        assert worker_b.current(["vprices", "vtickers"]) == {"vprices": 1, "vtickers": 0}
+        assert worker_b.poll() == []
+        assert worker_b.get_stats()["remote_bumps"] == 1
+
+    def test_database_down_falls_back_to_local_bump(self):
+        """Test that without the shared table a bump still invalidates this worker."""
+        store = FakeGenerationStore()
+        store.down = True
+        generations = qc.ViewGenerations(store, poll_seconds=0)
+        generations.bump(["vdividends"])
+        assert generations.current(["vdividends"]) == {"vdividends": 1}
+        assert generations.poll() == []
+
+        store.down = False
+        store.rows["vdividends"] = 1
+        assert generations.poll() == ["vdividends"]
+        assert generations.current(["vdividends"]) == {"vdividends": 2}
+        stats = generations.get_stats()
+        assert stats["local_bumps"] == 1 and stats["poll_errors"] == 1
@@ -0,0 +1,100 @@
+"""
+Tests for Request Coalescer
+"""
+
+import asyncio
+import pytest
+from app.services.request_coalescer import RequestCoalescer, coalesce_key
+
+
+class TestRequestCoalescer:
+    """Test suite for single-flight answer stream sharing."""
+
+    @pytest.fixture
+    def coalescer(self):
+        """Create a fresh coalescer instance."""
+        return RequestCoalescer()
+
+    def test_key_folds_case_and_whitespace(self):
+        """Test that trivially different spellings share a key."""
+        a = coalesce_key("Latest dividend for  KO?", "gpt", "sys")
+        b = coalesce_key("latest dividend for KO?", "gpt", "sys")
+        assert a == b
+        assert a != coalesce_key("latest dividend for KO?", "gpt", "sys2")
+        assert a != coalesce_key("latest dividend for KO?", "gemini", "sys")
+
+    def test_followers_share_one_generation(self, coalescer):
+        """Test that concurrent identical requests run the factory once."""
+        calls = []
+        release = asyncio.Event()
+
+        async def factory():
+            calls.append(1)
+
+            async def gen():
+                yield "a"
+                await release.wait()
+                yield "b"
+            return gen()
+
+        async def consume(it):
+            return [frame async for frame in it]
+
+        async def main():
+            leader = asyncio.create_task(consume(coalescer.stream("k", factory)))
+            await asyncio.sleep(0.01)
+            # Follower joins mid-stream and must still see the prefix
+            follower = asyncio.create_task(consume(coalescer.stream("k", factory)))
+            await asyncio.sleep(0.01)
+            release.set()
+            return await leader, await follower
+
+        leader_frames, follower_frames = asyncio.run(main())
+        assert leader_frames == ["a", "b"]
+        assert follower_frames == ["a", "b"]
+        assert len(calls) == 1
+        stats = coalescer.get_stats()
+        assert stats["leaders"] == 1
+        assert stats["followers"] == 1
+        assert stats["in_flight"] == 0
+
+    def test_completed_stream_is_not_reused(self, coalescer):
+        """Test that a finished answer starts a new generation."""
+        calls = []
+
+        async def factory():
+            calls.append(1)
+
+            async def gen():
+                yield "x"
+            return gen()
+
+        async def main():
+            first = [f async for f in coalescer.stream("k", factory)]
+            second = [f async for f in coalescer.stream("k", factory)]
+            return first, second
+
+        assert asyncio.run(main()) == (["x"], ["x"])
+        assert len(calls) == 2
+
+    def test_error_reaches_every_subscriber(self, coalescer):
+        """Test that a failing leader fails all followers."""
+        async def factory():
+            async def gen():
+                yield "a"
+                raise RuntimeError("boom")
+            return gen()
+
+        async def consume(it):
+            return [frame async for frame in it]
+
+        async def main():
+            return await asyncio.gather(
+                consume(coalescer.stream("k", factory)),
+                consume(coalescer.stream("k", factory)),
+                return_exceptions=True
+            )
+
+        results = asyncio.run(main())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert coalescer.get_stats()["failures"] == 1
@@ -0,0 +1,159 @@
+"""
+Tests for Semantic Answer Cache
+"""
+
+import asyncio
+import pytest
+from app.core.token_events import ROLE_EVENT, DONE_EVENT, TokenEvent, collect_text, fallback_text_events
+from app.services import query_cache as qc
+from app.services.semantic_cache import SemanticAnswerCache, answer_sources, set_answer_sources, reset_answer_sources
+
+SCOPE = "grok-4:chatgpt:\x1f"
+SQL = "SELECT Ticker, Dividend_Amount FROM dbo.vDividends WHERE Ticker = 'O'"
+
+
+def _events(text):
+    return [ROLE_EVENT] + [TokenEvent("delta", text[i:i + 5]) for i in range(0, len(text), 5)] + [DONE_EVENT]
+
+
+class TestSemanticCache:
+    """Test suite for paraphrase lookup, freshness and audit sampling."""
+
+    @pytest.fixture
+    def cache(self):
+        """Create a fresh cache with auditing off."""
+        return SemanticAnswerCache(threshold=0.88, audit_rate=0.0, query_types=frozenset({"fast_query"}))
+
+    def test_paraphrase_hits_within_ticker_partition(self, cache):
+        """Test that a paraphrase hits, but never across tickers or differing numbers."""
+        assert cache.store("what does #O pay monthly", ["O"], SCOPE, _events("O pays $0.26 monthly."),
+                           {"route": "sql", "sql": SQL})
+        entry, score = cache.lookup("#O monthly dividend", ["O"], SCOPE)
+        assert score >= 0.88 and entry.text == "O pays $0.26 monthly."
+        assert cache.lookup("#KO monthly dividend", ["KO"], SCOPE) is None
+        assert cache.lookup("#O monthly dividend", ["O"], "other-model") is None
+
+        cache.store("#O dividend history last 5 years", ["O"], SCOPE, _events("5y"), {"route": "sql", "sql": SQL})
+        assert cache.lookup("#O dividend history last 10 years", ["O"], SCOPE) is None
+
+    def test_company_name_paraphrase_hits(self):
+        """Test that naming the company instead of the ticker still hits, and the name alone is not a word."""
+        names = {"O": ["realty income corporation", "realty income"]}
+        cache = SemanticAnswerCache(threshold=0.88, audit_rate=0.0, query_types=frozenset({"fast_query"}),
+                                    aliases=lambda tickers: {t: names[t] for t in tickers if t in names})
+        assert cache.store("what does O pay monthly", ["O"], SCOPE, _events("O pays $0.26 monthly."),
+                           {"route": "sql", "sql": SQL})
+        entry, score = cache.lookup("Realty Income monthly dividend", ["O"], SCOPE)
+        assert score >= 0.88 and entry.text == "O pays $0.26 monthly."
+        assert cache.lookup("Realty Income Corporation monthly dividend", ["O"], SCOPE) is not None
+        assert cache.lookup("monthly income", ["O"], SCOPE) is None
+
+    def test_uncacheable_sources_not_stored(self, cache):
+        """Test that web/ML/error answers are never stored."""
+        assert not cache.store("latest news on #O", ["O"], SCOPE, _events("news"), {"route": "web_fast"})
+        assert not cache.store("#O dividend", ["O"], SCOPE, _events("x"), {"route": "plan"})
+        assert cache.get_stats()["uncacheable"] == 2
+
+    def test_view_refresh_retires_entries(self, cache):
+        """Test that invalidating a view the answer read makes the entry stale."""
+        cache.store("#O monthly dividend", ["O"], SCOPE, _events("old"), {"route": "sql", "sql": SQL})
+        cache.store("what is a dividend", [], SCOPE, _events("chat"), {"route": "chat"})
+        qc.invalidate_views(["dbo.vDividends"])
+        assert cache.lookup("#O monthly dividend", ["O"], SCOPE) is None
+        assert cache.lookup("what is a dividend", [], SCOPE) is not None
+        assert cache.get_stats()["stale"] == 1
+
+    def test_record_stores_completed_stream_and_replays(self, cache):
+        """Test that a live answer is stored on completion and replayed as events."""
+        async def live():
+            sources = answer_sources()
+            sources.update(route="sql", sql=SQL)
+            for ev in _events("Realty Income pays monthly."):
+                yield ev
+
+        async def run():
+            sources, token = set_answer_sources()
+            try:
+                gen = live()
+                text = await collect_text(cache.record(gen, "#O monthly dividend", ["O"], SCOPE, sources))
+            finally:
+                reset_answer_sources(token)
+            entry, _ = cache.lookup("what does #O pay monthly", ["O"], SCOPE)
+            replayed = [ev async for ev in cache.replay(entry)]
+            return text, replayed
+
+        text, replayed = asyncio.run(run())
+        assert text == "Realty Income pays monthly."
+        assert replayed[0] == ROLE_EVENT and replayed[-1] == DONE_EVENT
+        assert "".join(ev.content for ev in replayed if ev.kind == "delta") == text
+
+    def _gemini_stream(self, cache, chunks, fail_after, fallback_events):
+        """Run a Gemini-style stream that fails after fail_after chunks through record()."""
+        async def provider():
+            for i, chunk in enumerate(chunks):
+                if i == fail_after:
+                    raise ConnectionError("stream reset")
+                yield chunk
+
+        async def run():
+            sources, token = set_answer_sources()
+            sources["route"] = "gemini"
+
+            async def fallback():
+                sources["route"] = "gemini_fallback"
+
+                async def events():
+                    for ev in fallback_events:
+                        yield ev
+                return events()
+
+            def partial_failure(error):
+                sources["route"] = "gemini_partial"
+
+            try:
+                events = fallback_text_events(provider(), fallback, partial_failure)
+                return [ev async for ev in cache.record(events, "#O monthly dividend", ["O"], SCOPE, sources)]
+            finally:
+                reset_answer_sources(token)
+
+        return asyncio.run(run())
+
+    def test_partial_stream_never_cached(self, cache):
+        """Test that a stream failing mid-answer reaches the client with an error but is not stored."""
+        events = self._gemini_stream(cache, ["Realty Income ", "pays monthly ", "dividends."], 2, [])
+        text = "".join(ev.content for ev in events if ev.kind == "delta")
+        assert text.startswith("Realty Income pays monthly ") and "**Error**" in text
+        assert events[-1] == DONE_EVENT
+        assert cache.lookup("#O monthly dividend", ["O"], SCOPE) is None
+        assert cache.get_stats()["uncacheable"] == 1
+
+    def test_failure_before_first_chunk_falls_back(self, cache):
+        """Test that a stream failing before any text is replaced by the fallback answer, uncached."""
+        fallback = _events("O pays $0.26 monthly.")
+        events = self._gemini_stream(cache, ["never sent"], 0, fallback)
+        assert [ev.kind for ev in events].count("role") == 1
+        assert "".join(ev.content for ev in events if ev.kind == "delta") == "O pays $0.26 monthly."
+        assert cache.lookup("#O monthly dividend", ["O"], SCOPE) is None
+
+    def test_audit_flags_and_evicts_false_hits(self, cache):
+        """Test that an audited hit with a divergent live answer counts as a false hit."""
+        cache.store("#O monthly dividend", ["O"], SCOPE, _events("O pays 0.26 monthly"), {"route": "sql", "sql": SQL})
+        hit = cache.lookup("#O monthly dividend", ["O"], SCOPE)
+
+        async def live():
+            for ev in _events("Completely different content about something else"):
+                yield ev
+
+        async def run():
+            return await collect_text(cache.record(live(), "#O monthly dividend", ["O"], SCOPE, {}, audited=hit))
+
+        asyncio.run(run())
+        stats = cache.get_stats()
+        assert stats["audits"] == 1 and stats["false_hits"] == 1
+        assert stats["recent_audits"][-1]["false_hit"]
+        assert cache.lookup("#O monthly dividend", ["O"], SCOPE) is None
+
+    def test_query_type_flags(self, cache):
+        """Test per-query-type enablement."""
+        assert cache.enabled_for("fast_query")
+        assert not cache.enabled_for("fx_trading")
@@ -0,0 +1,85 @@
+"""
+Tests for SSE Stream Resume Registry
+"""
+
+import asyncio
+import pytest
+from app.services.stream_resume import StreamResumeRegistry, parse_last_event_id
+
+
+def _factory(frames, gate=None):
+    async def factory():
+        async def gen():
+            for i, frame in enumerate(frames):
+                if gate is not None and i == 2:
+                    await gate.wait()
+                yield frame
+        return gen()
+    return factory
+
+
+class TestStreamResume:
+    """Test suite for event ids and Last-Event-ID resume."""
+
+    @pytest.fixture
+    def registry(self):
+        """Create a fresh registry instance."""
+        return StreamResumeRegistry(ttl=60, max_streams=2)
+
+    def test_parse_last_event_id(self):
+        """Test event id parsing and rejection of foreign ids."""
+        assert parse_last_event_id("abc123:7") == ("abc123", 7)
+        assert parse_last_event_id("abc123") is None
+        assert parse_last_event_id("abc:x") is None
+        assert parse_last_event_id(None) is None
+
+    def test_events_carry_sequential_ids(self, registry):
+        """Test that every SSE event is prefixed with stream id and sequence."""
+        async def main():
+            sid = registry.start(_factory(["data: a\n\n", b"data: b\n\n"]))
+            return sid, [e async for e in registry.events(sid)]
+
+        sid, events = asyncio.run(main())
+        assert events == [
+            f"id: {sid}:0\ndata: a\n\n".encode(),
+            f"id: {sid}:1\ndata: b\n\n".encode(),
+        ]
+
+    def test_resume_tails_running_stream(self, registry):
+        """Test that a reconnect mid-answer gets only the remaining events."""
+        gate = asyncio.Event()
+
+        async def main():
+            sid = registry.start(_factory(["data: 0\n\n", "data: 1\n\n", "data: 2\n\n"], gate))
+            first = registry.events(sid)
+            seen = [await first.__anext__(), await first.__anext__()]
+            await first.aclose()  # client drops after event 1
+
+            resumed = registry.resume(f"{sid}:1")
+            gate.set()
+            return seen, [e async for e in resumed]
+
+        seen, rest = asyncio.run(main())
+        assert len(seen) == 2
+        assert len(rest) == 1
+        assert rest[0].endswith(b"data: 2\n\n")
+        assert registry.get_stats()["resumed"] == 1
+
+    def test_unknown_stream_misses(self, registry):
+        """Test that an expired or foreign id falls back to regeneration."""
+        assert registry.resume("deadbeef:3") is None
+        assert registry.get_stats()["misses"] == 1
+
+    def test_finished_streams_are_bounded(self, registry):
+        """Test that only max_streams finished streams are retained."""
+        async def main():
+            ids = []
+            for _ in range(4):
+                sid = registry.start(_factory(["data: x\n\n"]))
+                [e async for e in registry.events(sid)]
+                ids.append(sid)
+            return ids
+
+        ids = asyncio.run(main())
+        assert registry.resume(f"{ids[0]}:0") is None
+        assert registry.resume(f"{ids[-1]}:0") is not None
@@ -0,0 +1,91 @@
+"""
+Tests for the Ticker Index
+"""
+
+import pytest
+from app.utils.ticker_index import TickerIndex, get_ticker_index, normalize_company_name
+
+
+COMPANIES = {
+    "AAPL": "Apple Inc.",
+    "KO": "Coca-Cola Company",
+    "JNJ": "Johnson & Johnson",
+    "BAC": "Bank of America Corp",
+    "O": "Realty Income Corporation",
+    "MSFT": "Microsoft Corporation",
+    "XOM": "Exxon Mobil Corp",
+}
+
+
+def _universe(companies=COMPANIES):
+    """Build tickers/name_to_ticker/companies/keyword_index the way load_tickers does."""
+    tickers, name_to_ticker, keyword_index = {}, {}, {}
+    for t, name in companies.items():
+        tickers[t] = name
+        normalized, keywords = normalize_company_name(name)
+        name_to_ticker[name.lower()] = t
+        name_to_ticker[normalized] = t
+        for kw in keywords:
+            keyword_index.setdefault(kw, []).append(t)
+    return tickers, name_to_ticker, list(companies.values()), keyword_index
+
+
+class TestTickerIndex:
+    """Test suite for indexed ticker extraction."""
+
+    @pytest.fixture
+    def index(self):
+        return TickerIndex(*_universe(), cache_size=16)
+
+    def _tickers(self, index, query, use_fuzzy=True):
+        return [t for t, _ in index.extract(query, use_fuzzy)]
+
+    def test_company_names_matched_on_word_boundaries(self, index):
+        """Test that full and normalized company names are found at word boundaries only."""
+        assert self._tickers(index, "johnson & johnson payout", use_fuzzy=False) == ["JNJ"]
+        assert self._tickers(index, "compare bank of america and exxon mobil", use_fuzzy=False) == ["BAC", "XOM"]
+        assert self._tickers(index, "pineapple juice", use_fuzzy=False) == []
+
+    def test_match_spans_point_into_query(self, index):
+        """Test that match text and positions refer to the original query."""
+        query = "Is Realty Income a buy?"
+        (t, (confidence, text, start, end)), = index.extract(query, False)
+        assert t == "O"
+        assert text == "Realty Income" == query[start:end]
+        assert 0.8 <= confidence <= 0.97
+
+    def test_suffix_words_never_match_alone(self, index):
+        """Test that bare suffix words like 'corporation' match no company."""
+        assert self._tickers(index, "which corporation pays more", use_fuzzy=False) == []
+
+    def test_fuzzy_fallback_finds_misspelling(self, index):
+        """Test that the trigram candidates still surface misspelled company names."""
+        assert "MSFT" in self._tickers(index, "microsft dividend")
+        assert self._tickers(index, "microsft dividend", use_fuzzy=False) == []
+
+    def test_common_keyword_pairs_capped(self, monkeypatch):
+        """Test that keyword candidates come from the rarest pairs first, up to the cap."""
+        import app.utils.ticker_index as ticker_index
+        monkeypatch.setattr(ticker_index, "KEYWORD_CANDIDATES", 5)
+        companies = {f"R{i}": f"Stem{i} Realty Income" for i in range(50)}
+        companies["APX"] = "Apex Realty Trust"
+        index = TickerIndex(*_universe(companies), cache_size=16)
+        found = self._tickers(index, "realty apex trust income", use_fuzzy=False)
+        assert "APX" in found and len(found) <= 5
+
+    def test_results_memoized(self, index):
+        """Test that repeated queries are served from the memo."""
+        index.extract("coca-cola vs apple", True)
+        index.extract("coca-cola vs apple", True)
+        info = index.extract.cache_info()
+        assert info.hits == 1 and info.misses == 1
+
+    def test_index_rebuilt_when_data_changes(self):
+        """Test that get_ticker_index reuses the index until a new universe is loaded."""
+        data = _universe()
+        first = get_ticker_index(*data)
+        assert get_ticker_index(*data) is first
+        reloaded = _universe(dict(COMPANIES, PEP="PepsiCo Inc"))
+        second = get_ticker_index(*reloaded)
+        assert second is not first
+        assert self._tickers(second, "pepsico yield", use_fuzzy=False) == ["PEP"]
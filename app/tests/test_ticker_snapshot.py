@@ -0,0 +1,163 @@
+"""
+Tests for the Ticker Universe Snapshot
+"""
+
+import os
+import pytest
+from app.utils.ticker_snapshot import (
+    TickerSnapshot, TickerUniverse, write_snapshot, csv_rows, universe_from_rows, _rebuild_lock,
+)
+from app.utils.ticker_index import TickerIndex, get_ticker_index
+
+
+ROWS = [
+    ("msft", "Microsoft Corporation"),
+    ("AAPL", "Apple Inc."),
+    ("KO", "Coca-Cola Company"),
+    ("", "No Ticker Inc"),
+    ("NESN", "Nestlé S.A."),
+]
+
+
+class DatabaseDown(Exception):
+    pass
+
+
+class TestTickerSnapshot:
+    """Test suite for the snapshot file and the hot-reloading universe."""
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "data" / "tickers.snapshot")
+
+    @pytest.fixture
+    def make_universe(self, path):
+        universes = []
+
+        def make(rows, **kwargs):
+            source = kwargs.pop("source", None) or (lambda: list(rows))
+            universe = TickerUniverse(path=path, source=source, check_interval=0, **kwargs)
+            universes.append(universe)
+            return universe
+
+        yield make
+        for universe in universes:
+            universe.stop(timeout=1)
+
+    def test_round_trip_sorted_with_lookups(self, path):
+        """Test that a written snapshot reads back sorted, with binary-search lookups."""
+        assert write_snapshot(ROWS, path) == 4
+        snapshot = TickerSnapshot(path)
+        assert [t for t, _ in snapshot.items()] == ["AAPL", "KO", "MSFT", "NESN"]
+        assert snapshot.get("msft") == "Microsoft Corporation"
+        assert snapshot.get("NESN") == "Nestlé S.A."
+        assert snapshot.get("ZZZZ") is None
+        assert "KO" in snapshot and "A" not in snapshot
+        snapshot.close()
+
+    def test_truncated_file_rejected(self, path):
+        """Test that a partially written file is not loaded."""
+        write_snapshot(ROWS, path)
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 3)
+        with pytest.raises(ValueError):
+            TickerSnapshot(path)
+
+    def test_csv_stand_in(self, tmp_path, path):
+        """Test that a tickers CSV with a header builds the snapshot."""
+        csv_path = tmp_path / "tickers.csv"
+        csv_path.write_text("ticker,name\nAAPL,Apple Inc\nO,Realty Income Corporation\n", encoding="utf-8")
+        write_snapshot(csv_rows(str(csv_path)), path)
+        assert dict(TickerSnapshot(path).items()) == {"AAPL": "Apple Inc", "O": "Realty Income Corporation"}
+
+    def test_universe_built_and_indexed_on_first_use(self, make_universe):
+        """Test that the first get() builds the snapshot and an index usable for extraction."""
+        universe = make_universe(ROWS)
+        tickers, name_to_ticker, companies, keyword_index = universe.get()
+        assert tickers["AAPL"] == "Apple Inc."
+        assert name_to_ticker["coca-cola"] == "KO"
+        index = get_ticker_index(tickers, name_to_ticker, companies, keyword_index)
+        assert [t for t, _ in index.extract("compare apple and microsoft", False)] == ["AAPL", "MSFT"]
+        assert universe.get_stats()["symbols"] == 4
+
+    def test_index_served_from_mapped_tables(self, make_universe):
+        """Test that workers use the index tables stored in the snapshot, matching an index built in memory."""
+        rows = ROWS + [("PEP", "PepsiCo Inc"), ("KDP", "Keurig Dr Pepper Inc")]
+        universe = make_universe(rows)
+        data = universe.get()
+        index = get_ticker_index(*data)
+        assert index.tables is universe._state[0].tables
+        assert data[2][0] == "Apple Inc." and data[3]["pepper"] == ["KDP"]
+
+        built = TickerIndex(*universe_from_rows(sorted((t.upper(), n) for t, n in rows if t)))
+        for query in ("$ko vs keurig pepper", "compare apple and microsoft", "nestle dividend", "pepsico"):
+            assert index.extract(query) == built.extract(query)
+
+    def test_older_snapshot_format_rebuilt(self, make_universe, path):
+        """Test that a snapshot in an older file format is rebuilt on first use."""
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(b"TKSNAP01" + bytes(32))
+        universe = make_universe(ROWS)
+        assert universe.get()[0]["AAPL"] == "Apple Inc."
+        assert universe.get_stats()["rebuilds"] == 1
+
+    def test_rebuild_swaps_universe_without_restart(self, make_universe):
+        """Test that a rebuilt snapshot replaces the universe while readers keep the old one."""
+        rows = list(ROWS)
+        universe = make_universe(rows, source=lambda: rows)
+        before = universe.get()
+        rows.append(("PEP", "PepsiCo Inc"))
+
+        assert not universe.refresh()  # still fresh
+        assert universe.refresh(force=True)
+        assert universe.reload_if_changed()
+        after = universe.get()
+        assert "PEP" in after[0] and "PEP" not in before[0]
+        assert not universe.reload_if_changed()
+        assert universe.get_stats()["reloads"] == 2
+
+    def test_other_workers_pick_up_rebuild(self, make_universe, path):
+        """Test that a snapshot rebuilt by another process is reloaded."""
+        worker = make_universe(ROWS)
+        worker.get()
+        write_snapshot(ROWS + [("T", "AT&T Inc")], path)
+        assert worker.reload_if_changed()
+        assert worker.get()[0]["T"] == "AT&T Inc"
+
+    def test_failed_rebuild_keeps_current_snapshot(self, make_universe):
+        """Test that a source failure during a rebuild leaves the loaded universe in place."""
+        calls = []
+
+        def source():
+            calls.append(1)
+            if len(calls) > 1:
+                raise DatabaseDown("login timeout")
+            return ROWS
+
+        universe = make_universe(ROWS, source=source)
+        universe.get()
+        assert not universe.refresh(force=True)
+        assert not universe.reload_if_changed()
+        assert "MSFT" in universe.get()[0]
+        assert universe.get_stats()["rebuild_errors"] == 1
+
+    def test_first_build_falls_back_to_csv(self, make_universe, tmp_path):
+        """Test that an unreachable source on first build uses the CSV stand-in."""
+        csv_path = tmp_path / "tickers.csv"
+        csv_path.write_text("AAPL,Apple Inc\n", encoding="utf-8")
+
+        def source():
+            raise DatabaseDown("login timeout")
+
+        universe = make_universe([], source=source, fallback_csv=str(csv_path))
+        assert universe.get()[0] == {"AAPL": "Apple Inc"}
+
+    def test_only_one_process_rebuilds(self, make_universe, path):
+        """Test that a rebuild is skipped while another process holds the rebuild lock."""
+        universe = make_universe(ROWS)
+        universe.get()
+        with _rebuild_lock(path) as acquired:
+            assert acquired
+            assert not universe.refresh(force=True)
+        assert universe.refresh(force=True)
@@ -0,0 +1,84 @@
+"""
+Tests for Token Events
+"""
+
+import asyncio
+import orjson
+from app.core.token_events import (
+    TokenEvent, SSEEncoder, text_events, collect_text, coalesce_deltas, meta_event,
+    ROLE_EVENT, DONE_EVENT
+)
+
+
+async def _from_list(items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+async def _drain(events):
+    return [ev async for ev in events]
+
+
+class TestTokenEvents:
+    """Test suite for event encoding and delta coalescing."""
+
+    def test_encoder_matches_openai_chunk_shape(self):
+        """Test that deltas encode to the same JSON the old SSE wrapper produced."""
+        encoder = SSEEncoder("chatcmpl-1")
+        frame = encoder.encode(TokenEvent("delta", 'say "hi"\n'))
+        assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+        assert orjson.loads(frame[6:]) == {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "choices": [{"delta": {"content": 'say "hi"\n'}}],
+        }
+        assert encoder.encode(DONE_EVENT) == b"data: [DONE]\n\n"
+        assert orjson.loads(encoder.encode(ROLE_EVENT)[6:])["choices"][0]["delta"] == {"role": "assistant"}
+        assert orjson.loads(encoder.encode(meta_event(video_metadata=[1]))[6:])["video_metadata"] == [1]
+
+    def test_text_events_and_collect(self):
+        """Test wrapping text chunks and collecting them back."""
+        events = asyncio.run(_drain(text_events(_from_list(["a", "", "b"]))))
+        assert events[0] == ROLE_EVENT and events[-1] == DONE_EVENT
+        assert asyncio.run(collect_text(_from_list(events))) == "ab"
+
+    def test_burst_is_merged_and_order_kept(self):
+        """Test that a fast burst collapses into few frames without losing text."""
+        deltas = [TokenEvent("delta", str(i % 10)) for i in range(200)]
+        source = [ROLE_EVENT] + deltas + [DONE_EVENT]
+        out = asyncio.run(_drain(coalesce_deltas(_from_list(source), min_ms=20, max_ms=40, max_chars=10_000)))
+        assert out[0] == ROLE_EVENT and out[-1] == DONE_EVENT
+        merged = [ev for ev in out if ev.kind == "delta"]
+        assert "".join(ev.content for ev in merged) == "".join(d.content for d in deltas)
+        assert len(merged) <= 3
+        # First token is never held back
+        assert merged[0].content == "0"
+
+    def test_size_limit_flushes(self):
+        """Test that max_chars bounds frame size."""
+        deltas = [TokenEvent("delta", "x" * 10) for _ in range(10)]
+        out = asyncio.run(_drain(coalesce_deltas(_from_list(deltas), min_ms=1000, max_ms=1000, max_chars=30)))
+        assert all(len(ev.content) <= 30 for ev in out)
+        assert sum(len(ev.content) for ev in out) == 100
+
+    def test_slow_stream_is_not_delayed(self):
+        """Test that a batch is flushed on time while upstream is silent."""
+        async def main():
+            async def slow():
+                yield TokenEvent("delta", "a")
+                yield TokenEvent("delta", "b")
+                await asyncio.sleep(0.3)
+                yield TokenEvent("delta", "c")
+
+            loop = asyncio.get_running_loop()
+            t0 = loop.time()
+            stamps = []
+            async for ev in coalesce_deltas(slow(), min_ms=20, max_ms=40):
+                stamps.append((ev.content, loop.time() - t0))
+            return stamps
+
+        stamps = asyncio.run(main())
+        assert [c for c, _ in stamps] == ["a", "b", "c"]
+        assert stamps[1][1] < 0.2
@@ -0,0 +1,214 @@
+"""
+Tests for the Write-Behind Queue
+"""
+
+import time
+import threading
+from datetime import datetime
+import pytest
+from app.core.write_behind import WriteBehindQueue
+
+
+class DatabaseDown(Exception):
+    pass
+
+
+class RowRejected(Exception):
+    pass
+
+
+class FakeDatabase:
+    """Batch writer that records batches and can be switched off."""
+
+    def __init__(self):
+        self.batches = []
+        self.down = False
+        self.reject = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        if self.down:
+            raise DatabaseDown("connection refused")
+        if any(params.get("id") in self.reject for _, _, params in batch):
+            raise RowRejected("constraint violation")
+        with self.lock:
+            self.batches.append(list(batch))
+
+    @property
+    def rows(self):
+        return [params for batch in self.batches for _, _, params in batch]
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestWriteBehindQueue:
+    """Test suite for batched deferred writes."""
+
+    @pytest.fixture
+    def db(self):
+        return FakeDatabase()
+
+    @pytest.fixture
+    def make_queue(self, db, tmp_path):
+        queues = []
+
+        def make(**kwargs):
+            options = dict(writer=db, batch_size=10, flush_interval=0.02, max_retries=2,
+                           backoff_base=0.01, backoff_max=0.05, spill_path=str(tmp_path / "spill.jsonl"),
+                           enabled=True, is_transient=lambda e: isinstance(e, DatabaseDown))
+            options.update(kwargs)
+            queue = WriteBehindQueue(**options)
+            queues.append(queue)
+            return queue
+
+        yield make
+        for queue in queues:
+            queue.stop(timeout=1)
+
+    def test_writes_flushed_in_batches(self, make_queue, db):
+        """Test that submitted records are written in batches, in order."""
+        queue = make_queue()
+        for i in range(25):
+            assert queue.submit("event", "INSERT", {"id": i})
+        assert _wait_for(lambda: len(db.rows) == 25)
+        assert [row["id"] for row in db.rows] == list(range(25))
+        assert max(len(batch) for batch in db.batches) == 10
+        stats = queue.get_stats()
+        assert stats["written"] == 25 and stats["queue_depth"] == 0
+        assert stats["flush_ms"]["count"] == stats["batches"]
+
+    def test_on_written_after_commit_only(self, make_queue, db):
+        """Test that on_written fires once the record is written, never for a rejected record."""
+        db.reject = {1}
+        queue = make_queue(flush_interval=10)
+        written = []
+        for i in range(3):
+            queue.submit("event", "INSERT", {"id": i}, on_written=lambda i=i: written.append(i))
+        queue.stop(timeout=2)
+        assert sorted(written) == [0, 2]
+        assert queue.get_stats()["rejected_rows"] == 1
+
+    def test_full_queue_drops_newest(self, make_queue, db):
+        """Test that a full queue drops and counts new records instead of blocking."""
+        db.down = True
+        queue = make_queue(max_queue=3, flush_interval=10, spill_path=None)
+        results = [queue.submit("event", "INSERT", {"id": i}) for i in range(5)]
+        assert results == [True, True, True, False, False]
+        stats = queue.get_stats()
+        assert stats["dropped"] == 2
+        assert stats["statements"]["event"] == {"submitted": 3, "dropped": 2}
+
+    def test_spills_while_down_and_replays_on_recovery(self, make_queue, db, tmp_path):
+        """Test that an unreachable database spills batches to disk and replays them later."""
+        db.down = True
+        queue = make_queue()
+        created = datetime(2026, 1, 2, 3, 4, 5)
+        for i in range(3):
+            queue.submit("event", "INSERT", {"id": i, "created_at": created})
+        assert _wait_for(lambda: queue.get_stats()["spilled"] == 3)
+        assert queue.get_stats()["degraded"]
+        assert queue.get_stats()["retries"] >= 1
+
+        db.down = False
+        queue.submit("event", "INSERT", {"id": 3, "created_at": created})
+        assert _wait_for(lambda: len(db.rows) == 4)
+        assert sorted(row["id"] for row in db.rows) == [0, 1, 2, 3]
+        assert all(row["created_at"] == created for row in db.rows)
+        assert not (tmp_path / "spill.jsonl").exists()
+        # Writes submitted while degraded go to the spill file too
+        stats = queue.get_stats()
+        assert stats["replayed"] == stats["spilled"] >= 3
+
+    def test_rejected_record_dropped_alone(self, make_queue, db):
+        """Test that a record the database rejects does not take its batch down with it."""
+        db.reject = {2}
+        queue = make_queue(flush_interval=10)
+        for i in range(10):
+            queue.submit("event", "INSERT", {"id": i})
+        assert _wait_for(lambda: len(db.rows) == 9)
+        assert 2 not in [row["id"] for row in db.rows]
+        assert queue.get_stats()["rejected_rows"] == 1
+
+    def test_stop_drains_queue(self, make_queue, db):
+        """Test that shutdown writes what is still queued."""
+        queue = make_queue(flush_interval=10)
+        for i in range(5):
+            queue.submit("event", "INSERT", {"id": i})
+        queue.stop(timeout=2)
+        assert [row["id"] for row in db.rows] == list(range(5))
+
+    def test_startup_replays_previous_spill(self, make_queue, db):
+        """Test that records spilled by a previous process are written on startup."""
+        db.down = True
+        first = make_queue(flush_interval=10)
+        first.submit("event", "INSERT", {"id": 1})
+        first.stop(timeout=2)
+        assert first.get_stats()["spilled"] == 1
+
+        db.down = False
+        second = make_queue()
+        second.submit("event", "INSERT", {"id": 2})
+        assert _wait_for(lambda: len(db.rows) == 2)
+        assert [row["id"] for row in db.rows] == [1, 2]
+
+    def test_concurrent_replays_write_each_record_once(self, make_queue, db):
+        """Test that workers replaying one shared spill file at the same time never duplicate records."""
+        workers = [make_queue(batch_size=5, flush_interval=10) for _ in range(4)]
+        errors = []
+
+        def replay(queue, start):
+            start.wait()
+            try:
+                queue._replay_spill()
+            except Exception as e:
+                errors.append(e)
+
+        expected = []
+        for round_ in range(20):
+            db.down = True
+            ids = [round_ * 10 + i for i in range(10)]
+            workers[0]._spill([("event", "INSERT", {"id": i}) for i in ids])
+            expected += ids
+            db.down = False
+            start = threading.Barrier(len(workers))
+            threads = [threading.Thread(target=replay, args=(queue, start)) for queue in workers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+        assert errors == []
+        assert sorted(row["id"] for row in db.rows) == expected
+
+    def test_flusher_survives_unexpected_errors(self, make_queue, db):
+        """Test that an error escaping a flush is logged and later writes still go through."""
+        queue = make_queue()
+        flush, failures = queue._flush, []
+
+        def failing_once(batch):
+            if not failures:
+                failures.append(batch)
+                raise FileNotFoundError("spill.jsonl.replay")
+            return flush(batch)
+
+        queue._flush = failing_once
+        queue.submit("event", "INSERT", {"id": 1})
+        assert _wait_for(lambda: failures)
+        queue.submit("event", "INSERT", {"id": 2})
+        assert _wait_for(lambda: [row["id"] for row in db.rows] == [2])
+        assert queue.get_stats()["errors"] == 1
+
+    def test_disabled_writes_synchronously(self, make_queue, db):
+        """Test that with write-behind off, submit writes inline and surfaces errors."""
+        queue = make_queue(enabled=False)
+        queue.submit("event", "INSERT", {"id": 1})
+        assert db.rows == [{"id": 1}]
+        db.down = True
+        with pytest.raises(DatabaseDown):
+            queue.submit("event", "INSERT", {"id": 2})
@@ -108,6 +108,15 @@ SELECT
 FROM dbo.Ingest_Dividends_ETF_Data;
 """
 
+BUMP_VIEW_GENERATION_SQL = """
+MERGE dbo.view_generations WITH (HOLDLOCK) AS target
+USING (SELECT ? AS view_name) AS source ON target.view_name = source.view_name
+WHEN MATCHED THEN
+    UPDATE SET generation = target.generation + 1, refreshed_at = SYSUTCDATETIME()
+WHEN NOT MATCHED THEN
+    INSERT (view_name, generation) VALUES (source.view_name, 1);
+"""
+
 # -----------------------------
 # Connection helpers
 # -----------------------------
@@ -151,6 +160,15 @@ def try_create_views(cursor) -> None:
     # Split on GO-like separators not required; pyodbc can run the whole batch if no GO is present.
     cursor.execute(CREATE_VIEWS_SQL)
 
+def bump_view_generations(cursor, views: List[str]) -> None:
+    # Tells every running app worker to drop cached results read from these views
+    # (same statement as app.services.query_cache.BUMP_VIEW_GENERATION_SQL)
+    for view in views:
+        try:
+            cursor.execute(BUMP_VIEW_GENERATION_SQL, (view,))
+        except pyodbc.Error as e:
+            print(f"Warning: could not bump view generation for {view}: {e}", file=sys.stderr)
+
 def fetch_from_vtickers(cursor) -> pd.DataFrame:
     # Only pull the columns we need
     cursor.execute("SELECT Ticker, Company_Name FROM dbo.vTickers;")
@@ -292,6 +310,7 @@ def main(path_csv: str = "tickers.csv", create_views: bool = False) -> int:
         if create_views:
             try:
                 try_create_views(cursor)
+                bump_view_generations(cursor, ["vtickers", "vdividends"])
                 conn.commit()
             except Exception as e:
                 print(f"Warning: could not create views (continuing): {e}", file=sys.stderr)
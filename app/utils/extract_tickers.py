@@ -25,16 +25,9 @@ from pydantic import BaseModel, Field
 from typing import Optional, List
 import csv
 import os
-import re
-import time
-from difflib import get_close_matches
 
-# Attempt to use rapidfuzz for better fuzzy matching; fallback to difflib
-try:
-    from rapidfuzz import process, fuzz  # type: ignore
-    _HAS_RAPIDFUZZ = True
-except Exception:
-    _HAS_RAPIDFUZZ = False
+from app.utils.ticker_index import _HAS_RAPIDFUZZ, normalize_company_name, get_ticker_index
+from app.utils.ticker_snapshot import TICKER_SNAPSHOT_ENABLED, get_ticker_universe
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -52,25 +45,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Stopwords (remove common words that are not helpful)
-STOPWORDS = {
-    "the", "a", "an", "of", "and", "or", "latest", "dividend", "stock",
-    "stocks", "price", "value", "values", "show", "tell", "about", "what",
-    "is", "are", "i", "me", "please", "can", "you", "give", "get", "find",
-    "more", "how", "who", "has", "paid"
-}
-
-# Common company suffixes to handle intelligently
-COMPANY_SUFFIXES = {
-    "inc", "corp", "corporation", "company", "co", "ltd", "limited",
-    "plc", "llc", "holdings", "group", "technologies", "systems", "services"
-}
-
-# Words that should NEVER trigger matches on their own
-FORBIDDEN_SOLO_WORDS = COMPANY_SUFFIXES | {"compare", "corporation", "inc", "company"}
-
-RE_WORD = re.compile(r"\b[\w\.\-&']+\b", re.UNICODE)  # tokenization
-
 # Global cache for tickers data
 _TICKERS_CACHE = None
 _CACHE_PATH = None
@@ -104,29 +78,6 @@ def locate_default_tickers_csv():
     return candidate
 
 
-def normalize_company_name(name):
-    """
-    Normalize company name by removing suffixes and extra words.
-    Returns both the full normalized name and key words.
-    """
-    if not name:
-        return "", []
-    
-    # Convert to lowercase and split
-    words = name.lower().replace(",", "").split()
-    
-    # Remove common suffixes from the end
-    filtered_words = []
-    for w in words:
-        w_clean = w.strip(".")
-        if w_clean not in COMPANY_SUFFIXES:
-            filtered_words.append(w_clean)
-    
-    # Return normalized full name and key words
-    normalized = " ".join(filtered_words)
-    return normalized, filtered_words
-
-
 def load_tickers(csv_path):
     """
     Load tickers from CSV file.
@@ -200,9 +151,23 @@ def load_tickers(csv_path):
 
 
 def get_tickers_data(csv_path=None, force_reload=False):
-    """Get tickers data from cache or load from CSV."""
+    """
+    Get tickers data from cache or load it.
+    Without an explicit csv_path the snapshot-backed universe is used (see
+    app/utils/ticker_snapshot.py); the CSV is the fallback when it is disabled or fails.
+    """
     global _TICKERS_CACHE, _CACHE_PATH
     
+    if csv_path is None and TICKER_SNAPSHOT_ENABLED:
+        universe = get_ticker_universe()
+        try:
+            if force_reload:
+                universe.refresh(force=True)
+                universe.reload_if_changed()
+            return universe.get()
+        except Exception as e:
+            print(f"[WARN] Ticker snapshot unavailable, using tickers.csv: {e}")
+    
     if csv_path is None:
         csv_path = locate_default_tickers_csv()
     
@@ -210,205 +175,45 @@ def get_tickers_data(csv_path=None, force_reload=False):
     if not force_reload and _TICKERS_CACHE is not None and _CACHE_PATH == csv_path:
         return _TICKERS_CACHE
     
-    # Load and cache
+    # Load, index and cache
     tickers_data = load_tickers(csv_path)
+    get_ticker_index(*tickers_data)
     _TICKERS_CACHE = tickers_data
     _CACHE_PATH = csv_path
     
     return tickers_data
 
 
-def clean_query(query):
-    """Clean query by removing stopwords."""
-    if not query:
-        return ""
-    parts = RE_WORD.findall(query.lower())
-    filtered = [p for p in parts if p not in STOPWORDS]
-    return " ".join(filtered)
+def ticker_aliases(ticker_list):
+    """
+    Lowercased company name and normalized name of each ticker in the loaded
+    universe - the names the ticker index matches them by.
+    Returns {ticker: [aliases]}; tickers the universe does not know are left out.
+    """
+    try:
+        tickers = get_tickers_data()[0]
+    except Exception as e:
+        print(f"[WARN] Ticker universe unavailable for aliases: {e}")
+        return {}
+    aliases = {}
+    for t in ticker_list:
+        name = tickers.get(t.upper())
+        if name:
+            normalized, _ = normalize_company_name(name)
+            aliases[t.upper()] = [a for a in dict.fromkeys((name.lower(), normalized)) if a]
+    return aliases
 
 
 def extract_tickers_from_query(query, tickers, name_to_ticker, companies, keyword_index, use_fuzzy=True, debug=False):
     """
     Extract tickers from natural language query.
     Returns list of (ticker, confidence, match_text, start, end) tuples and elapsed time in ms.
-    """
-    start = time.perf_counter()
-    results = {}  # ticker -> (confidence, match_text, start, end)
-    original = query or ""
-    query_stripped = clean_query(original)
-    
-    debug_info = {}
-    
-    # Detect if query likely contains multiple tickers
-    multi_ticker_indicators = ["vs", "versus", "and", "or", "compare", ","]
-    is_multi_query = any(indicator in original.lower() for indicator in multi_ticker_indicators)
     
-    if debug:
-        debug_info["original"] = original
-        debug_info["cleaned"] = query_stripped
-        debug_info["is_multi_query"] = is_multi_query
-    
-    # 1) $TICKER style (e.g., $AAPL)
-    for m in re.finditer(r"\$([A-Za-z0-9\.\-]{1,8})", original):
-        t = m.group(1).upper()
-        if t in tickers:
-            match_info = (0.99, m.group(0), m.start(), m.end())
-            if t not in results or results[t][0] < 0.99:
-                results[t] = match_info
-    
-    # 2) Direct token matches (case-insensitive) - but avoid single suffix words
-    for m in RE_WORD.finditer(original):
-        tk = m.group(0)
-        tk_up = tk.upper()
-        tk_low = tk.lower()
-        
-        # Skip if it's a forbidden solo word
-        if tk_low in FORBIDDEN_SOLO_WORDS:
-            continue
-            
-        if tk_up in tickers:
-            match_info = (0.98, tk, m.start(), m.end())
-            if tk_up not in results or results[tk_up][0] < 0.98:
-                results[tk_up] = match_info
-    
-    # 3) Exact company-name substring matches (multi-word only for suffixes)
-    qlow = original.lower()
-    for name_lower, t in name_to_ticker.items():
-        # Skip single-word suffix matches
-        name_words = name_lower.split()
-        if len(name_words) == 1 and name_words[0] in FORBIDDEN_SOLO_WORDS:
-            continue
-        
-        # Find all occurrences of this company name
-        pattern = re.escape(name_lower)
-        for m in re.finditer(r'\b' + pattern + r'\b', qlow):
-            match_ratio = len(name_lower) / max(len(query_stripped), 1)
-            confidence = min(0.97, 0.80 + match_ratio * 0.17)
-            match_info = (confidence, original[m.start():m.end()], m.start(), m.end())
-            if t not in results or results[t][0] < confidence:
-                results[t] = match_info
-    
-    # 4) Keyword-based matching
-    query_normalized, query_keywords = normalize_company_name(query_stripped)
-    meaningful_keywords = [kw for kw in query_keywords if len(kw) >= 3 and kw not in FORBIDDEN_SOLO_WORDS]
-    
-    for kw in meaningful_keywords:
-        if kw in keyword_index:
-            candidate_tickers = keyword_index[kw]
-            for t in candidate_tickers:
-                company_name = tickers[t]
-                _, company_keywords = normalize_company_name(company_name)
-                
-                matching_kw = set(meaningful_keywords) & set(company_keywords)
-                
-                # Require at least 2 matching keywords OR 1 highly distinctive keyword
-                if len(matching_kw) >= 2 or (len(matching_kw) == 1 and len(company_keywords) == 1):
-                    match_score = len(matching_kw) / len(company_keywords)
-                    if len(query_stripped) < 5:
-                        confidence = 0.65 + match_score * 0.25
-                    else:
-                        confidence = 0.70 + match_score * 0.20
-                    
-                    # Find the keyword position in original query
-                    kw_pattern = re.compile(r'\b' + re.escape(kw) + r'\b', re.IGNORECASE)
-                    m = kw_pattern.search(original)
-                    if m:
-                        match_info = (confidence, m.group(0), m.start(), m.end())
-                        if t not in results or results[t][0] < confidence:
-                            results[t] = match_info
-    
-    # 5) Fuzzy matching
-    if use_fuzzy and qlow and len(query_stripped) >= 3:
-        if is_multi_query:
-            separator_pattern = r'\s+(?:vs|versus|and|or|compare)\s+|,\s*'
-            raw_parts = re.split(f'({separator_pattern})', original)
-            
-            query_parts = []
-            current_pos = 0
-            for part in raw_parts:
-                if not part or re.match(separator_pattern, part):
-                    current_pos += len(part) if part else 0
-                    continue
-                    
-                cleaned = clean_query(part)
-                if cleaned and len(cleaned) >= 3:
-                    words = cleaned.lower().split()
-                    if not (len(words) == 1 and words[0] in FORBIDDEN_SOLO_WORDS):
-                        part_stripped = part.strip()
-                        pos = original.find(part_stripped, current_pos)
-                        if pos >= 0:
-                            query_parts.append((cleaned, part_stripped, pos, pos + len(part_stripped)))
-                
-                current_pos += len(part)
-        else:
-            words = query_stripped.lower().split()
-            if not (len(words) == 1 and words[0] in FORBIDDEN_SOLO_WORDS):
-                query_parts = [(query_stripped, original, 0, len(original))]
-            else:
-                query_parts = []
-        
-        for query_part, original_part, part_start, part_end in query_parts:
-            if len(query_part) < 3:
-                continue
-                
-            search_targets = []
-            ticker_map = {}
-            
-            for t, company_name in tickers.items():
-                normalized, _ = normalize_company_name(company_name)
-                search_targets.append(company_name)
-                search_targets.append(normalized)
-                search_targets.append(t)
-                ticker_map[company_name.lower()] = t
-                ticker_map[normalized] = t
-                ticker_map[t.upper()] = t
-            
-            if _HAS_RAPIDFUZZ:
-                matches = process.extract(query_part, search_targets, scorer=fuzz.WRatio, limit=10)
-                if debug:
-                    debug_info[f"rapidfuzz_matches_{query_part}"] = matches
-                for match_text, score, _ in matches:
-                    min_score = 75 if len(query_part) < 5 else 65
-                    if score >= min_score:
-                        t = ticker_map.get(match_text.upper()) or ticker_map.get(match_text.lower()) or ticker_map.get(match_text)
-                        if t:
-                            confidence = min(0.95, score / 100.0)
-                            match_info = (confidence, original_part, part_start, part_end)
-                            
-                            if t not in results or results[t][0] < confidence:
-                                results[t] = match_info
-            else:
-                normalized_companies = [normalize_company_name(c)[0] for c in companies]
-                close = get_close_matches(query_part, normalized_companies, n=5, cutoff=0.65)
-                if debug:
-                    debug_info[f"difflib_matches_{query_part}"] = close
-                for normalized_match in close:
-                    t = name_to_ticker.get(normalized_match)
-                    if t:
-                        match_info = (0.85, original_part, part_start, part_end)
-                        
-                        if t not in results or results[t][0] < 0.85:
-                            results[t] = match_info
-    
-    # 6) Final filtering
-    if len(query_stripped) < 4:
-        min_confidence = 0.85
-    elif is_multi_query:
-        min_confidence = 0.70
-    else:
-        min_confidence = 0.75
-    
-    final = {t: info for t, info in results.items() if t in tickers and info[0] >= min_confidence}
-    elapsed_ms = (time.perf_counter() - start) * 1000.0
-    
-    if debug:
-        debug_info["elapsed_ms"] = elapsed_ms
-        debug_info["raw_results"] = {k: (v[0], v[1]) for k, v in results.items()}
-        debug_info["final_results"] = {k: (v[0], v[1]) for k, v in final.items()}
-    
-    # Sort by position in query (then by confidence)
-    sorted_list = sorted(final.items(), key=lambda x: (x[1][2], -x[1][0]))
-    return sorted_list, elapsed_ms, debug_info if debug else None
+    Matching runs against the prebuilt TickerIndex for the loaded universe
+    (see app/utils/ticker_index.py); results are memoized per query text.
+    """
+    index = get_ticker_index(tickers, name_to_ticker, companies, keyword_index)
+    return index.extract_timed(query, use_fuzzy=use_fuzzy, debug=debug)
 
 
 def replace_tickers_in_query(query, ticker_matches, tickers):
@@ -445,8 +250,7 @@ async def extract_tickers(request: TickerRequest):
     """
     try:
         # Get tickers data (from cache or load)
-        csv_path = request.csv_path or locate_default_tickers_csv()
-        tickers, name_to_ticker, companies, keyword_index = get_tickers_data(csv_path)
+        tickers, name_to_ticker, companies, keyword_index = get_tickers_data(request.csv_path)
         
         # Extract tickers
         ticker_matches, elapsed_ms, debug_info = extract_tickers_from_query(
@@ -490,19 +294,20 @@ async def health_check():
     return {
         "status": "healthy",
         "has_rapidfuzz": _HAS_RAPIDFUZZ,
-        "cache_loaded": _TICKERS_CACHE is not None
+        "cache_loaded": _TICKERS_CACHE is not None,
+        "snapshot": get_ticker_universe().get_stats() if TICKER_SNAPSHOT_ENABLED else None
     }
 
 
 @app.post("/reload-tickers")
 async def reload_tickers(csv_path: Optional[str] = None):
-    """Reload tickers CSV (useful for updates without restart)."""
+    """Reload tickers (rebuilds the snapshot, or re-reads the CSV) without a restart."""
     try:
-        path = csv_path or locate_default_tickers_csv()
-        tickers, name_to_ticker, companies, keyword_index = get_tickers_data(path, force_reload=True)
+        tickers, name_to_ticker, companies, keyword_index = get_tickers_data(csv_path, force_reload=True)
+        source = csv_path or (get_ticker_universe().path if TICKER_SNAPSHOT_ENABLED else locate_default_tickers_csv())
         return {
             "success": True,
-            "message": f"Loaded {len(tickers)} tickers from {path}"
+            "message": f"Loaded {len(tickers)} tickers from {source}"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -514,7 +319,7 @@ def extract_tickers_function(query: str, csv_path: str = None, debug: bool = Fal
     
     Args:
         query: Natural language query string
-        csv_path: Optional path to tickers CSV (uses default if None)
+        csv_path: Optional path to tickers CSV (uses the ticker snapshot if None)
         debug: Enable debug output
     
     Returns:
@@ -547,9 +352,6 @@ def extract_tickers_function(query: str, csv_path: str = None, debug: bool = Fal
     
     try:
         # Get tickers data (from cache or load)
-        if csv_path is None:
-            csv_path = locate_default_tickers_csv()
-        
         tickers, name_to_ticker, companies, keyword_index = get_tickers_data(csv_path)
         
         # Extract tickers
@@ -5,6 +5,7 @@ from app.config.settings import (
     GREETING_WORDS, SMALLTALK_KEYWORDS, FINANCE_KEYWORDS, 
     NEWS_KEYWORDS, SCHEMA_CAPABLE_KEYWORDS, TICKER_CANDIDATE, _STOPWORDS
 )
+from app.core.intent_engine import get_intent_engine, scan
 
 logger = logging.getLogger("ai_controller")
 
@@ -23,24 +24,21 @@ def is_greeting_only(text: str) -> bool:
     return 1 <= len(words) <= 3 and all(w in GREETING_WORDS for w in words)
 
 def is_smalltalk(text: str) -> bool:
-    t = text.strip().lower()
-    if is_greeting_only(t):
+    if is_greeting_only(text.strip().lower()):
         return True
-    return any(kw in t for kw in SMALLTALK_KEYWORDS)
+    return scan(text).has("smalltalk")
 
 def has_finance_intent(text: str) -> bool:
-    lt = text.lower()
-    return any(k in lt for k in FINANCE_KEYWORDS)
+    return scan(text).has("finance")
 
 def is_news_like(text: str) -> bool:
-    t = text.lower()
-    return any(k in t for k in NEWS_KEYWORDS)
+    return scan(text).has("news")
 
 def is_schema_capable(text: str, tickers_present: bool) -> bool:
-    t = text.lower()
-    if not any(k in t for k in SCHEMA_CAPABLE_KEYWORDS):
+    signals = scan(text)
+    if not signals.has("schema_capable"):
         return False
-    return tickers_present or any(k in t for k in ("dividend","ex-div","ex date","payment date","record date","history","payout"))
+    return tickers_present or signals.has("schema_dividend")
 
 def should_route_to_web(question: str, parsed_tickers: List[str]) -> bool:
     if is_smalltalk(question):
@@ -140,13 +138,20 @@ ML_QUERY_KEYWORDS = {
 }
 
 
+_intent_engine = get_intent_engine()
+_intent_engine.register_keywords("smalltalk", SMALLTALK_KEYWORDS)
+_intent_engine.register_keywords("finance", FINANCE_KEYWORDS)
+_intent_engine.register_keywords("news", NEWS_KEYWORDS)
+_intent_engine.register_keywords("schema_capable", SCHEMA_CAPABLE_KEYWORDS)
+_intent_engine.register_keywords("schema_dividend", ("dividend","ex-div","ex date","payment date","record date","history","payout"))
+for _ml_type, _ml_keywords in ML_QUERY_KEYWORDS.items():
+    _intent_engine.register_keywords(f"ml:{_ml_type}", _ml_keywords)
+_intent_engine.register_keywords("ml", [kw for kws in ML_QUERY_KEYWORDS.values() for kw in kws])
+
+
 def is_ml_query(text: str) -> bool:
     """Detect if query is requesting ML predictions."""
-    t = text.lower()
-    for keywords_list in ML_QUERY_KEYWORDS.values():
-        if any(kw in t for kw in keywords_list):
-            return True
-    return False
+    return scan(text).has("ml")
 
 
 def detect_ml_query_type(text: str) -> str:
@@ -156,10 +161,10 @@ def detect_ml_query_type(text: str) -> str:
     Returns:
         One of: "payout_rating", "cut_risk", "yield_forecast", "anomaly", "comprehensive", or "payout_rating" (default)
     """
-    t = text.lower()
+    signals = scan(text)
     
-    for query_type, keywords in ML_QUERY_KEYWORDS.items():
-        if any(kw in t for kw in keywords):
+    for query_type in ML_QUERY_KEYWORDS:
+        if signals.has(f"ml:{query_type}"):
             return query_type
     
     return "payout_rating"
@@ -61,71 +61,9 @@ class ProfessionalMarkdownFormatter:
         next_prediction_info = None
         
         for item in data:
-            # Handle various column name variations (case-insensitive matching)
-            item_lower = {k.lower(): v for k, v in item.items()}
-            
-            # Ticker
-            ticker = (item.get("ticker") or item.get("Ticker") or 
-                     item.get("symbol") or item.get("Symbol") or
-                     item_lower.get("ticker") or item_lower.get("symbol") or "N/A")
-            
-            # Price
-            price = (item.get("price") or item.get("Price") or 
-                    item.get("current_price") or item.get("Current Price") or
-                    item_lower.get("price") or item_lower.get("current_price"))
-            
-            # Distribution Amount
-            distribution = (item.get("Dividend_Amount") or  # Match exact SQL column name
-                          item.get("distribution_amount") or 
-                          item.get("Distribution Amount") or 
-                          item.get("dividend_amount") or 
-                          item.get("Dividend Amount") or
-                          item.get("amount") or item.get("Amount") or
-                          item_lower.get("distribution_amount") or
-                          item_lower.get("dividend_amount") or
-                          item_lower.get("amount"))
-            
-            # Yield
-            yield_val = (item.get("yield") or item.get("Yield") or 
-                        item.get("dividend_yield") or item.get("Dividend Yield") or
-                        item.get("current_yield") or item.get("Current Yield") or
-                        item_lower.get("yield") or item_lower.get("dividend_yield") or
-                        item_lower.get("current_yield"))
-            
-            # Payout Ratio
-            payout = (item.get("payout_ratio") or item.get("Payout Ratio") or
-                     item.get("payoutratio") or item.get("PayoutRatio") or
-                     item_lower.get("payout_ratio") or item_lower.get("payoutratio"))
-            
-            # Declaration Date
-            decl_date = (item.get("Declaration_Date") or  # Match exact SQL column name
-                        item.get("declaration_date") or 
-                        item.get("Declaration Date") or 
-                        item.get("declarationDate") or
-                        item.get("declarationdate") or
-                        item.get("DeclarationDate") or
-                        item_lower.get("declaration_date") or
-                        item_lower.get("declarationdate"))
-            
-            # Ex-Date
-            ex_date = (item.get("Ex_Dividend_Date") or  # Match exact SQL column name
-                      item.get("ex_date") or item.get("Ex-Date") or 
-                      item.get("exDate") or item.get("exdate") or
-                      item.get("ex_dividend_date") or 
-                      item.get("Ex Dividend Date") or
-                      item.get("ExDate") or
-                      item_lower.get("ex_date") or item_lower.get("exdate") or
-                      item_lower.get("ex_dividend_date"))
-            
-            # Pay Date
-            pay_date = (item.get("Payment_Date") or  # Match exact SQL column name
-                       item.get("pay_date") or item.get("Pay Date") or 
-                       item.get("payDate") or item.get("paydate") or
-                       item.get("payment_date") or 
-                       item.get("Payment Date") or
-                       item.get("PayDate") or
-                       item_lower.get("pay_date") or item_lower.get("paydate") or
-                       item_lower.get("payment_date"))
+            ticker, price, distribution, yield_val, payout, decl_date, ex_date, pay_date = (
+                ProfessionalMarkdownFormatter._extract_dividend_fields(item)
+            )
             
             context = item.get('context', {}) if has_context else {}
             declared_today = context.get('declared_today', False)
@@ -182,6 +120,118 @@ class ProfessionalMarkdownFormatter:
         
         return table
     
+    @staticmethod
+    def _extract_dividend_fields(item: Dict[str, Any]) -> tuple:
+        """Pick ticker/price/amount/yield/payout/dates out of a row, tolerating column name variants."""
+        # Handle various column name variations (case-insensitive matching)
+        item_lower = {k.lower(): v for k, v in item.items()}
+        
+        # Ticker
+        ticker = (item.get("ticker") or item.get("Ticker") or 
+                 item.get("symbol") or item.get("Symbol") or
+                 item_lower.get("ticker") or item_lower.get("symbol") or "N/A")
+        
+        # Price
+        price = (item.get("price") or item.get("Price") or 
+                item.get("current_price") or item.get("Current Price") or
+                item_lower.get("price") or item_lower.get("current_price"))
+        
+        # Distribution Amount
+        distribution = (item.get("Dividend_Amount") or  # Match exact SQL column name
+                      item.get("distribution_amount") or 
+                      item.get("Distribution Amount") or 
+                      item.get("dividend_amount") or 
+                      item.get("Dividend Amount") or
+                      item.get("amount") or item.get("Amount") or
+                      item_lower.get("distribution_amount") or
+                      item_lower.get("dividend_amount") or
+                      item_lower.get("amount"))
+        
+        # Yield
+        yield_val = (item.get("yield") or item.get("Yield") or 
+                    item.get("dividend_yield") or item.get("Dividend Yield") or
+                    item.get("current_yield") or item.get("Current Yield") or
+                    item_lower.get("yield") or item_lower.get("dividend_yield") or
+                    item_lower.get("current_yield"))
+        
+        # Payout Ratio
+        payout = (item.get("payout_ratio") or item.get("Payout Ratio") or
+                 item.get("payoutratio") or item.get("PayoutRatio") or
+                 item_lower.get("payout_ratio") or item_lower.get("payoutratio"))
+        
+        # Declaration Date
+        decl_date = (item.get("Declaration_Date") or  # Match exact SQL column name
+                    item.get("declaration_date") or 
+                    item.get("Declaration Date") or 
+                    item.get("declarationDate") or
+                    item.get("declarationdate") or
+                    item.get("DeclarationDate") or
+                    item_lower.get("declaration_date") or
+                    item_lower.get("declarationdate"))
+        
+        # Ex-Date
+        ex_date = (item.get("Ex_Dividend_Date") or  # Match exact SQL column name
+                  item.get("ex_date") or item.get("Ex-Date") or 
+                  item.get("exDate") or item.get("exdate") or
+                  item.get("ex_dividend_date") or 
+                  item.get("Ex Dividend Date") or
+                  item.get("ExDate") or
+                  item_lower.get("ex_date") or item_lower.get("exdate") or
+                  item_lower.get("ex_dividend_date"))
+        
+        # Pay Date
+        pay_date = (item.get("Payment_Date") or  # Match exact SQL column name
+                   item.get("pay_date") or item.get("Pay Date") or 
+                   item.get("payDate") or item.get("paydate") or
+                   item.get("payment_date") or 
+                   item.get("Payment Date") or
+                   item.get("PayDate") or
+                   item_lower.get("pay_date") or item_lower.get("paydate") or
+                   item_lower.get("payment_date"))
+        
+        return ticker, price, distribution, yield_val, payout, decl_date, ex_date, pay_date
+    
+    DIVIDEND_TABLE_COLUMNS = [
+        "Ticker", "Price", "Distribution", "Yield",
+        "Payout Ratio", "Declaration", "Ex-Date", "Pay Date"
+    ]
+    
+    @staticmethod
+    def dividend_table_header() -> str:
+        """
+        Header and separator lines for a streamed dividend table.
+        
+        Streamed tables are not padded to a common column width, so the header
+        can be sent before the last row has been fetched. Pair with
+        format_dividend_row().
+        """
+        columns = ProfessionalMarkdownFormatter.DIVIDEND_TABLE_COLUMNS
+        return "| " + " | ".join(columns) + " |\n" + "|" + "---|" * len(columns) + "\n"
+    
+    @staticmethod
+    def format_dividend_row(item: Dict[str, Any]) -> str:
+        """
+        Format one dividend row as a markdown table line.
+        
+        Same columns and cell formatting as format_dividend_table() without
+        context-aware rendering.
+        """
+        ticker, price, distribution, yield_val, payout, decl_date, ex_date, pay_date = (
+            ProfessionalMarkdownFormatter._extract_dividend_fields(item)
+        )
+        cells = [
+            str(ticker) if ticker and ticker != "N/A" else "N/A",
+            ProfessionalMarkdownFormatter._format_price(price),
+            ProfessionalMarkdownFormatter._format_currency(distribution),
+            ProfessionalMarkdownFormatter._format_percentage(yield_val),
+            ProfessionalMarkdownFormatter._format_percentage(payout),
+            ProfessionalMarkdownFormatter._format_date(decl_date),
+            ProfessionalMarkdownFormatter._format_date(ex_date),
+            ProfessionalMarkdownFormatter._format_date(pay_date),
+        ]
+        line = "| " + " | ".join(c.replace("|", "\\|") for c in cells) + " |\n"
+        return ProfessionalMarkdownFormatter._remove_emojis(line)
+    
     @staticmethod
     def format_stock_table(data: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> str:
         """
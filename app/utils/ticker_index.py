@@ -0,0 +1,801 @@
+"""
+Ticker Index
+Prebuilt lookup structures behind extract_tickers_from_query.
+
+Packed once per ticker universe into flat uint32 tables (pack_index_tables),
+which the ticker snapshot stores so every worker maps them instead of
+building them:
+- A hash of every company name and normalized name, looked up on run-aligned
+  slices of the query. Names and queries are split into alternating word /
+  non-word runs, so these lookups find exactly the `\\bname\\b` matches the old
+  per-name regex loop found, in O(query runs x longest name) instead of
+  O(names x query), without keeping a trie of per-run nodes in memory.
+- Per-ticker company keywords and sorted keyword -> ticker id postings, so
+  keyword matching intersects small id lists instead of re-normalizing every
+  candidate company. Pairs of common words ("Foods Realty") are shared by
+  thousands of companies; candidates are taken from the rarest pairs first,
+  up to KEYWORD_CANDIDATES.
+- A character trigram index over the fuzzy search targets (company name,
+  normalized name, ticker). The fuzzy fallback scores only the best-overlapping
+  FUZZY_CANDIDATES targets instead of rebuilding and scanning every target.
+
+Extraction results are memoized per query text (LRU).
+
+Expected Results:
+- Cold extraction on a 100k-name universe under 1 ms at the median, 3 ms at
+  p95 and 6 ms at p99 (the budgets scripts/benchmark_ticker_extraction.py
+  gates on); the tail is multi-company questions, where difflib scores the
+  fuzzy candidates of every part
+- No per-worker index build or copy when served from the ticker snapshot
+"""
+
+import os
+import re
+import sys
+import time
+import zlib
+import threading
+from collections import Counter
+from collections.abc import Mapping, Sequence
+from difflib import get_close_matches
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Attempt to use rapidfuzz for better fuzzy matching; fallback to difflib
+try:
+    from rapidfuzz import process, fuzz  # type: ignore
+    _HAS_RAPIDFUZZ = True
+except Exception:
+    _HAS_RAPIDFUZZ = False
+
+TICKER_EXTRACT_CACHE_SIZE = int(os.getenv("TICKER_EXTRACT_CACHE_SIZE", "4096"))
+# Fuzzy targets scored per query part
+FUZZY_CANDIDATES = int(os.getenv("TICKER_FUZZY_CANDIDATES", "16"))
+# Postings counted per query part, rarest trigrams first; common trigrams past the budget are skipped
+FUZZY_POSTINGS_BUDGET = int(os.getenv("TICKER_FUZZY_POSTINGS_BUDGET", "150"))
+# Companies checked by keyword matching per query, taken from the rarest keyword pairs first
+KEYWORD_CANDIDATES = int(os.getenv("TICKER_KEYWORD_CANDIDATES", "64"))
+
+# Stopwords (remove common words that are not helpful)
+STOPWORDS = {
+    "the", "a", "an", "of", "and", "or", "latest", "dividend", "stock",
+    "stocks", "price", "value", "values", "show", "tell", "about", "what",
+    "is", "are", "i", "me", "please", "can", "you", "give", "get", "find",
+    "more", "how", "who", "has", "paid"
+}
+
+# Common company suffixes to handle intelligently
+COMPANY_SUFFIXES = {
+    "inc", "corp", "corporation", "company", "co", "ltd", "limited",
+    "plc", "llc", "holdings", "group", "technologies", "systems", "services"
+}
+
+# Words that should NEVER trigger matches on their own
+FORBIDDEN_SOLO_WORDS = COMPANY_SUFFIXES | {"compare", "corporation", "inc", "company"}
+
+RE_WORD = re.compile(r"\b[\w\.\-&']+\b", re.UNICODE)  # tokenization
+RE_RUN = re.compile(r"\w+|\W+", re.UNICODE)  # alternating word / non-word runs
+RE_WORD_CHAR = re.compile(r"\w", re.UNICODE)
+RE_DOLLAR_TICKER = re.compile(r"\$([A-Za-z0-9\.\-]{1,8})")
+
+MULTI_TICKER_INDICATORS = ["vs", "versus", "and", "or", "compare", ","]
+SEPARATOR_PATTERN = r'\s+(?:vs|versus|and|or|compare)\s+|,\s*'
+RE_SEPARATOR_SPLIT = re.compile(f'({SEPARATOR_PATTERN})')
+RE_SEPARATOR = re.compile(SEPARATOR_PATTERN)
+
+# Result entry: (ticker, (confidence, match_text, start, end))
+TickerMatch = Tuple[str, Tuple[float, str, int, int]]
+
+
+def normalize_company_name(name):
+    """
+    Normalize company name by removing suffixes and extra words.
+    Returns both the full normalized name and key words.
+    """
+    if not name:
+        return "", []
+
+    # Convert to lowercase and split
+    words = name.lower().replace(",", "").split()
+
+    # Remove common suffixes from the end
+    filtered_words = []
+    for w in words:
+        w_clean = w.strip(".")
+        if w_clean not in COMPANY_SUFFIXES:
+            filtered_words.append(w_clean)
+
+    # Return normalized full name and key words
+    normalized = " ".join(filtered_words)
+    return normalized, filtered_words
+
+
+def clean_query(query):
+    """Clean query by removing stopwords."""
+    if not query:
+        return ""
+    parts = RE_WORD.findall(query.lower())
+    filtered = [p for p in parts if p not in STOPWORDS]
+    return " ".join(filtered)
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f" {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@lru_cache(maxsize=4096)
+def _keyword_pattern(kw: str):
+    return re.compile(r'\b' + re.escape(kw) + r'\b', re.IGNORECASE)
+
+
+NO_KEYWORD = 0xFFFFFFFF
+
+# Flags stored per name in the packed names table
+NAME_MATCHABLE = 1
+NAME_STARTS_WORD = 2
+NAME_ENDS_WORD = 4
+
+# Packed index sections: "strings" is a UTF-8 blob, every other section a uint32 array.
+#   symbols           (start, end) of ticker i, its company name and normalized name: 6 entries per ticker
+#   <table>.keys      (start, end) in strings of each entry's key, in entry order
+#   <table>.slots     open-addressing hash over the keys (crc32, linear probing); entry + 1, 0 = empty
+#   <csr>.offsets     entry i owns <csr>.postings[off[i]:off[i+1]]
+#   companies         keyword entries of ticker i's company keywords (NO_KEYWORD when unindexed)
+# Search target i is ticker i // 3's company name, normalized name or ticker (i % 3).
+INDEX_SECTIONS = (
+    "strings", "symbols", "symbols.slots",
+    "names.keys", "names.slots", "names.ticker", "names.flags",
+    "runs.keys", "runs.slots", "runs.span",
+    "keywords.keys", "keywords.slots", "keywords.offsets", "keywords.postings",
+    "singles.offsets", "singles.postings", "companies.offsets", "companies.postings",
+    "grams.keys", "grams.slots", "grams.offsets", "grams.postings",
+    "targets.first", "targets.grams", "aliases.offsets", "aliases.postings",
+)
+
+
+def _hash_slots(keys: List[bytes]) -> array:
+    size = 8
+    while size < 2 * len(keys):
+        size *= 2
+    mask = size - 1
+    slots = array("I", bytes(4 * size))
+    for entry, key in enumerate(keys):
+        h = zlib.crc32(key) & mask
+        while slots[h]:
+            h = (h + 1) & mask
+        slots[h] = entry + 1
+    return slots
+
+
+def _csr(lists: Iterable[Iterable[int]]) -> Tuple[array, array]:
+    offsets, postings = array("I", [0]), array("I")
+    for ids in lists:
+        postings.extend(ids)
+        offsets.append(len(postings))
+    return offsets, postings
+
+
+def pack_index_tables(tickers: Dict[str, str], name_to_ticker: Dict[str, str],
+                      keyword_index: Dict[str, List[str]]) -> Dict[str, bytes]:
+    """
+    Build the TickerIndex lookup tables for a universe as flat little-endian sections.
+
+    Ticker ids follow the order of `tickers`. The result can be kept in memory
+    or written into the ticker snapshot and mapped by every worker.
+    """
+    strings = bytearray()
+    sections: Dict[str, array] = {}
+
+    def keyed(name: str, keys: List[str]):
+        encoded = [k.encode("utf-8") for k in keys]
+        spans = array("I")
+        for key in encoded:
+            spans.append(len(strings))
+            strings.extend(key)
+            spans.append(len(strings))
+        sections[f"{name}.keys"] = spans
+        sections[f"{name}.slots"] = _hash_slots(encoded)
+
+    ids = {t: i for i, t in enumerate(tickers)}
+    symbols = array("I")
+    for t, company_name in tickers.items():
+        for text in (t, company_name, normalize_company_name(company_name)[0]):
+            symbols.append(len(strings))
+            strings.extend(text.encode("utf-8"))
+            symbols.append(len(strings))
+    sections["symbols"] = symbols
+    sections["symbols.slots"] = _hash_slots(list(map(str.encode, tickers)))
+
+    # Names -> ticker and match flags; for each first run the most runs a name starting with it spans
+    name_ticker, name_flags = array("I"), array("I")
+    run_span: Dict[str, int] = {}
+    for name, t in name_to_ticker.items():
+        name_ticker.append(ids[t])
+        name_words = name.split()
+        if not name_words or (len(name_words) == 1 and name_words[0] in FORBIDDEN_SOLO_WORDS):
+            name_flags.append(0)
+            continue
+        runs = RE_RUN.findall(name)
+        name_flags.append(NAME_MATCHABLE
+                          | (NAME_STARTS_WORD if RE_WORD_CHAR.match(runs[0]) else 0)
+                          | (NAME_ENDS_WORD if RE_WORD_CHAR.match(runs[-1]) else 0))
+        if len(runs) > run_span.get(runs[0], 0):
+            run_span[runs[0]] = len(runs)
+    keyed("names", list(name_to_ticker))
+    sections["names.ticker"], sections["names.flags"] = name_ticker, name_flags
+    keyed("runs", list(run_span))
+    sections["runs.span"] = array("I", run_span.values())
+
+    # Keyword -> sorted ticker ids, the tickers whose company has that single keyword,
+    # and ticker -> its company keywords
+    keyword_ids = {kw: k for k, kw in enumerate(keyword_index)}
+    singles: Dict[str, List[int]] = {}
+    company_keywords = []
+    for t, company_name in tickers.items():
+        _, kws = normalize_company_name(company_name)
+        if len(kws) == 1:
+            singles.setdefault(kws[0], []).append(ids[t])
+        company_keywords.append([keyword_ids.get(kw, NO_KEYWORD) for kw in kws])
+    sections["companies.offsets"], sections["companies.postings"] = _csr(company_keywords)
+    del company_keywords
+    keyed("keywords", list(keyword_index))
+    sections["keywords.offsets"], sections["keywords.postings"] = _csr(
+        sorted({ids[t] for t in ts}) for ts in keyword_index.values())
+    sections["singles.offsets"], sections["singles.postings"] = _csr(
+        singles.get(kw, ()) for kw in keyword_index)
+
+    # Trigram postings over distinct lowercased search targets; distinct target -> its first
+    # search target id (further case variants in aliases) and trigram count
+    target_first, target_grams = array("I"), array("I")
+    aliases: Dict[int, List[int]] = {}
+    postings: Dict[str, List[int]] = {}
+    distinct: Dict[str, int] = {}
+    i = 0
+    for t, company_name in tickers.items():
+        normalized, _ = normalize_company_name(company_name)
+        for target in (company_name, normalized, t):
+            key = target.lower()
+            g = distinct.get(key)
+            if g is None:
+                g = distinct[key] = len(target_first)
+                target_first.append(i)
+                grams = _trigrams(key)
+                target_grams.append(len(grams))
+                for gram in grams:
+                    postings.setdefault(gram, []).append(g)
+            else:
+                aliases.setdefault(g, []).append(i)
+            i += 1
+    del distinct
+    keyed("grams", list(postings))
+    sections["grams.offsets"], sections["grams.postings"] = _csr(postings.values())
+    sections["targets.first"], sections["targets.grams"] = target_first, target_grams
+    sections["aliases.offsets"], sections["aliases.postings"] = _csr(
+        aliases.get(g, ()) for g in range(len(target_first)))
+
+    packed = {"strings": bytes(strings)}
+    for name in INDEX_SECTIONS[1:]:
+        table = sections[name]
+        if sys.byteorder != "little":
+            table.byteswap()
+        packed[name] = table.tobytes()
+    return packed
+
+
+def _uint32(section) -> Any:
+    if sys.byteorder == "little":
+        return memoryview(section).cast("B").cast("I")
+    table = array("I", bytes(section))
+    table.byteswap()
+    return table
+
+
+class IndexTables:
+    """Lookups over packed index sections, held in memory or mapped from the ticker snapshot."""
+
+    def __init__(self, sections: Dict[str, Any]):
+        self.strings = memoryview(sections["strings"]).cast("B")
+        t = {name: _uint32(sections[name]) for name in INDEX_SECTIONS[1:]}
+        self._views = [self.strings] + list(t.values())
+        self.count = len(t["symbols"]) // 6
+        self.symbols, self.symbol_slots = t["symbols"], t["symbols.slots"]
+        self.name_keys, self.name_slots = t["names.keys"], t["names.slots"]
+        self.name_ticker, self.name_flags = t["names.ticker"], t["names.flags"]
+        self.run_keys, self.run_slots, self.run_span = t["runs.keys"], t["runs.slots"], t["runs.span"]
+        self.keyword_keys, self.keyword_slots = t["keywords.keys"], t["keywords.slots"]
+        self.keyword_offsets, self.keyword_postings = t["keywords.offsets"], t["keywords.postings"]
+        self.single_offsets, self.single_postings = t["singles.offsets"], t["singles.postings"]
+        self.company_offsets, self.company_postings = t["companies.offsets"], t["companies.postings"]
+        self.gram_keys, self.gram_slots = t["grams.keys"], t["grams.slots"]
+        self.gram_offsets, self.gram_postings = t["grams.offsets"], t["grams.postings"]
+        self.target_first, self.target_grams = t["targets.first"], t["targets.grams"]
+        self.alias_offsets, self.alias_postings = t["aliases.offsets"], t["aliases.postings"]
+
+    def text(self, spans, k: int) -> str:
+        return str(self.strings[spans[k]:spans[k + 1]], "utf-8")
+
+    def find(self, keys, slots, key: str, stride: int = 2) -> int:
+        """Entry of `key` in a keyed table, or -1 (`stride` spans per entry in `keys`)."""
+        encoded = key.encode("utf-8")
+        strings = self.strings
+        mask = len(slots) - 1
+        h = zlib.crc32(encoded) & mask
+        while True:
+            entry = slots[h]
+            if not entry:
+                return -1
+            entry -= 1
+            if strings[keys[stride * entry]:keys[stride * entry + 1]] == encoded:
+                return entry
+            h = (h + 1) & mask
+
+    def ticker(self, i: int) -> str:
+        return self.text(self.symbols, 6 * i)
+
+    def name(self, i: int) -> str:
+        return self.text(self.symbols, 6 * i + 2)
+
+    def normalized_name(self, i: int) -> str:
+        return self.text(self.symbols, 6 * i + 4)
+
+    def ticker_id(self, ticker: str) -> int:
+        return self.find(self.symbols, self.symbol_slots, ticker, stride=6)
+
+    def release(self):
+        for view in self._views:
+            if isinstance(view, memoryview):
+                view.release()
+
+
+class _NameView(Mapping):
+    """name_to_ticker over the packed names table."""
+
+    def __init__(self, tables: IndexTables):
+        self._t = tables
+
+    def __getitem__(self, name: str) -> str:
+        e = self._t.find(self._t.name_keys, self._t.name_slots, name)
+        if e < 0:
+            raise KeyError(name)
+        return self._t.ticker(self._t.name_ticker[e])
+
+    def __iter__(self) -> Iterator[str]:
+        for e in range(len(self._t.name_ticker)):
+            yield self._t.text(self._t.name_keys, 2 * e)
+
+    def __len__(self) -> int:
+        return len(self._t.name_ticker)
+
+
+class _KeywordView(Mapping):
+    """keyword_index over the packed keyword postings."""
+
+    def __init__(self, tables: IndexTables):
+        self._t = tables
+
+    def __getitem__(self, kw: str) -> List[str]:
+        t = self._t
+        k = t.find(t.keyword_keys, t.keyword_slots, kw)
+        if k < 0:
+            raise KeyError(kw)
+        return [t.ticker(i) for i in t.keyword_postings[t.keyword_offsets[k]:t.keyword_offsets[k + 1]]]
+
+    def __iter__(self) -> Iterator[str]:
+        for k in range(len(self._t.keyword_offsets) - 1):
+            yield self._t.text(self._t.keyword_keys, 2 * k)
+
+    def __len__(self) -> int:
+        return len(self._t.keyword_offsets) - 1
+
+
+class _CompanyView(Sequence):
+    """companies (one name per ticker) over the packed symbols."""
+
+    def __init__(self, tables: IndexTables):
+        self._t = tables
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return self._t.name(i % len(self))
+
+    def __len__(self) -> int:
+        return self._t.count
+
+
+def _common_ids(smaller, larger, block: int = 1024) -> Iterator[int]:
+    """Ids in both sorted postings, ascending, a block of `smaller` at a time."""
+    a = np.frombuffer(smaller, dtype=np.uint32)
+    b = np.frombuffer(larger, dtype=np.uint32)
+    if not len(a) or not len(b):
+        return
+    for start in range(0, len(a), block):
+        ids = a[start:start + block]
+        pos = np.minimum(np.searchsorted(b, ids), len(b) - 1)
+        yield from ids[b[pos] == ids].tolist()
+
+
+class TickerIndex:
+    """
+    Company-name, keyword and fuzzy indexes over one loaded ticker universe.
+
+    Takes the structures returned by load_tickers; they must not be mutated
+    afterwards (build a new index on reload). from_tables() serves the same
+    lookups from tables packed once by pack_index_tables, e.g. mapped from
+    the ticker snapshot, without building anything per process.
+    """
+
+    def __init__(self, tickers: Dict[str, str], name_to_ticker: Dict[str, str],
+                 companies: List[str], keyword_index: Dict[str, List[str]],
+                 cache_size: int = TICKER_EXTRACT_CACHE_SIZE):
+        self.tickers = tickers
+        self.name_to_ticker = name_to_ticker
+        self.companies = companies
+        self.keyword_index = keyword_index
+        self.tables = IndexTables(pack_index_tables(tickers, name_to_ticker, keyword_index))
+        self.extract = lru_cache(maxsize=cache_size)(self._extract)
+
+    @classmethod
+    def from_tables(cls, tables: IndexTables, tickers: Optional[Mapping] = None,
+                    cache_size: int = TICKER_EXTRACT_CACHE_SIZE) -> "TickerIndex":
+        """Index over packed tables; its universe attributes are views over the same tables."""
+        index = cls.__new__(cls)
+        index.tables = tables
+        index.tickers = tickers
+        index.name_to_ticker = _NameView(tables)
+        index.companies = _CompanyView(tables)
+        index.keyword_index = _KeywordView(tables)
+        index.extract = lru_cache(maxsize=cache_size)(index._extract)
+        return index
+
+    @property
+    def universe(self) -> Tuple[Mapping, Mapping, Sequence, Mapping]:
+        """(tickers, name_to_ticker, companies, keyword_index), as get_ticker_index matches them."""
+        return self.tickers, self.name_to_ticker, self.companies, self.keyword_index
+
+    def _search_target(self, i: int) -> str:
+        ticker_id, kind = divmod(i, 3)
+        if kind == 0:
+            return self.tables.name(ticker_id)
+        return self.tables.normalized_name(ticker_id) if kind == 1 else self.tables.ticker(ticker_id)
+
+    def _name_matches(self, original: str, query_stripped: str, results: Dict[str, Tuple]):
+        """Exact company-name substring matches (multi-word only for suffixes)."""
+        tb = self.tables
+        qlow = original.lower()
+        runs = [(m.start(), m.group(0)) for m in RE_RUN.finditer(qlow)]
+        best: Dict[str, Tuple] = {}
+        first_seen: Dict[str, int] = {}
+        for i, (start, run) in enumerate(runs):
+            r = tb.find(tb.run_keys, tb.run_slots, run)
+            if r < 0:
+                continue
+            for j in range(i, min(i + tb.run_span[r], len(runs))):
+                end = runs[j][0] + len(runs[j][1])
+                order = tb.find(tb.name_keys, tb.name_slots, qlow[start:end])
+                if order < 0:
+                    continue
+                flags = tb.name_flags[order]
+                if not flags & NAME_MATCHABLE:
+                    continue
+                # \b before/after a non-word edge needs a word character on the other side
+                if ((not flags & NAME_STARTS_WORD and start == 0)
+                        or (not flags & NAME_ENDS_WORD and end == len(qlow))):
+                    continue
+                t = tb.ticker(tb.name_ticker[order])
+                match_ratio = (end - start) / max(len(query_stripped), 1)
+                confidence = min(0.97, 0.80 + match_ratio * 0.17)
+                key = (-confidence, order, start)
+                if t not in best or key < best[t][0]:
+                    best[t] = (key, (confidence, original[start:end], start, end))
+                if order < first_seen.get(t, order + 1):
+                    first_seen[t] = order
+        # Apply in name order, as the per-name loop did (insertion order breaks position ties)
+        for t in sorted(best, key=first_seen.__getitem__):
+            match_info = best[t][1]
+            if t not in results or results[t][0] < match_info[0]:
+                results[t] = match_info
+
+    def _keyword_matches(self, original: str, query_stripped: str, results: Dict[str, Tuple]):
+        """Keyword-based matching: 2+ shared keywords, or a company's only keyword."""
+        _, query_keywords = normalize_company_name(query_stripped)
+        meaningful_keywords = [kw for kw in query_keywords if len(kw) >= 3 and kw not in FORBIDDEN_SOLO_WORDS]
+        tb = self.tables
+        # (keyword, sorted ids of the tickers it indexes, ids of companies with only that keyword)
+        present = []
+        present_ids: Set[int] = set()
+        for kw in dict.fromkeys(meaningful_keywords):
+            k = tb.find(tb.keyword_keys, tb.keyword_slots, kw)
+            if k >= 0:
+                present.append((kw, tb.keyword_postings[tb.keyword_offsets[k]:tb.keyword_offsets[k + 1]],
+                                tb.single_postings[tb.single_offsets[k]:tb.single_offsets[k + 1]]))
+                present_ids.add(k)
+        if not present:
+            return
+
+        candidates: Set[int] = set()
+        pairs = []
+        for i, (_, a, single) in enumerate(present):
+            candidates.update(single)
+            for _, b, _ in present[i + 1:]:
+                pairs.append(sorted((a, b), key=len))
+        # Rarest pairs first, lowest ticker ids first, until the cap: a pair of common
+        # words shared by more companies than that says little about which one is meant
+        pairs.sort(key=lambda pair: len(pair[0]))
+        for smaller, larger in pairs:
+            if len(candidates) >= KEYWORD_CANDIDATES:
+                break
+            for t in _common_ids(smaller, larger):
+                candidates.add(t)
+                if len(candidates) >= KEYWORD_CANDIDATES:
+                    break
+
+        if not candidates:
+            return
+        # Which query keywords index each candidate (one search per keyword over all candidates),
+        # and the first of them with the candidate's place in its list
+        ids = np.fromiter(candidates, dtype=np.uint32, count=len(candidates))
+        ids.sort()
+        indexed = []
+        first = np.full(len(ids), len(present))
+        place = np.zeros(len(ids), dtype=np.intp)
+        for i, (_, postings, _) in enumerate(present):
+            postings = np.frombuffer(postings, dtype=np.uint32)
+            pos = np.searchsorted(postings, ids)
+            hit = postings[np.minimum(pos, len(postings) - 1)] == ids
+            indexed.append(hit.tolist())
+            new = hit & (first == len(present))
+            first[new] = i
+            place[new] = pos[new]
+
+        # Visit candidates in the order the keyword -> ticker lists would reach them
+        order = np.lexsort((place, first))
+        positions: Dict[str, Any] = {}
+        for j, t in zip(order.tolist(), ids[order].tolist()):
+            company_keywords = tb.company_postings[tb.company_offsets[t]:tb.company_offsets[t + 1]]
+            matching_kw = present_ids.intersection(company_keywords)
+            if not (len(matching_kw) >= 2 or (len(matching_kw) == 1 and len(company_keywords) == 1)):
+                continue
+            match_score = len(matching_kw) / len(company_keywords)
+            if len(query_stripped) < 5:
+                confidence = 0.65 + match_score * 0.25
+            else:
+                confidence = 0.70 + match_score * 0.20
+            # Position of the first query keyword that indexes this ticker
+            for (kw, _, _), hits in zip(present, indexed):
+                if not hits[j]:
+                    continue
+                if kw not in positions:
+                    positions[kw] = _keyword_pattern(kw).search(original)
+                m = positions[kw]
+                if m:
+                    ticker = tb.ticker(t)
+                    if ticker not in results or results[ticker][0] < confidence:
+                        results[ticker] = (confidence, m.group(0), m.start(), m.end())
+                    break
+
+    def fuzzy_candidates(self, query_part: str, limit: int = FUZZY_CANDIDATES) -> List[int]:
+        """
+        Ids of the search targets sharing the most trigrams with the query part.
+
+        Trigrams are counted rarest first until FUZZY_POSTINGS_BUDGET postings
+        have been read. Distinct targets are ranked by the share of the smaller
+        trigram set that overlaps (a name contained in the query ranks like an
+        exact match), then by overlap over the larger set (closer lengths first).
+        """
+        tb = self.tables
+        grams = _trigrams(query_part)
+        postings_lists = []
+        for gram in grams:
+            k = tb.find(tb.gram_keys, tb.gram_slots, gram)
+            if k >= 0:
+                postings_lists.append(tb.gram_postings[tb.gram_offsets[k]:tb.gram_offsets[k + 1]])
+        if not postings_lists:
+            return []
+        postings_lists.sort(key=len)
+        if len(postings_lists[0]) > FUZZY_POSTINGS_BUDGET:
+            # Only the rarest trigram is read: every target shares that one, the first ids rank first
+            top = [(g, 1) for g in postings_lists[0][:limit * 2]]
+        else:
+            counts: Counter = Counter()
+            budget = FUZZY_POSTINGS_BUDGET
+            for postings in postings_lists:
+                if len(postings) > budget:
+                    break
+                counts.update(postings)
+                budget -= len(postings)
+            # Rank only the targets with the most shared trigrams
+            top = counts.most_common(limit * 2) if len(counts) > limit * 2 else counts.items()
+        n = len(grams)
+        target_grams = tb.target_grams
+        ranked = sorted(
+            (-shared / min(n, target_grams[g]), -shared / max(n, target_grams[g]), g)
+            for g, shared in top
+        )[:limit]
+        ids = []
+        for _, _, g in ranked:
+            ids.append(tb.target_first[g])
+            ids.extend(tb.alias_postings[tb.alias_offsets[g]:tb.alias_offsets[g + 1]])
+        return ids
+
+    def _fuzzy_matches(self, original: str, query_stripped: str, is_multi_query: bool,
+                       results: Dict[str, Tuple], debug_info: Optional[Dict[str, Any]]):
+        if is_multi_query:
+            raw_parts = RE_SEPARATOR_SPLIT.split(original)
+
+            query_parts = []
+            current_pos = 0
+            for part in raw_parts:
+                if not part or RE_SEPARATOR.match(part):
+                    current_pos += len(part) if part else 0
+                    continue
+
+                cleaned = clean_query(part)
+                if cleaned and len(cleaned) >= 3:
+                    words = cleaned.lower().split()
+                    if not (len(words) == 1 and words[0] in FORBIDDEN_SOLO_WORDS):
+                        part_stripped = part.strip()
+                        pos = original.find(part_stripped, current_pos)
+                        if pos >= 0:
+                            query_parts.append((cleaned, part_stripped, pos, pos + len(part_stripped)))
+
+                current_pos += len(part)
+        else:
+            words = query_stripped.lower().split()
+            if not (len(words) == 1 and words[0] in FORBIDDEN_SOLO_WORDS):
+                query_parts = [(query_stripped, original, 0, len(original))]
+            else:
+                query_parts = []
+
+        for query_part, original_part, part_start, part_end in query_parts:
+            if len(query_part) < 3:
+                continue
+            candidates = self.fuzzy_candidates(query_part)
+
+            if _HAS_RAPIDFUZZ:
+                targets = [self._search_target(i) for i in candidates]
+                matches = process.extract(query_part, targets, scorer=fuzz.WRatio, limit=10)
+                if debug_info is not None:
+                    debug_info[f"rapidfuzz_matches_{query_part}"] = matches
+                for match_text, score, k in matches:
+                    min_score = 75 if len(query_part) < 5 else 65
+                    if score >= min_score:
+                        # The ticker whose name, normalized name or symbol this target is
+                        t = self.tables.ticker(candidates[k] // 3)
+                        if t:
+                            confidence = min(0.95, score / 100.0)
+                            match_info = (confidence, original_part, part_start, part_end)
+
+                            if t not in results or results[t][0] < confidence:
+                                results[t] = match_info
+            else:
+                # Search targets come in (name, normalized, ticker) triples
+                normalized_companies = list(dict.fromkeys(
+                    self._search_target(i - i % 3 + 1) for i in candidates
+                ))
+                close = get_close_matches(query_part, normalized_companies, n=5, cutoff=0.65)
+                if debug_info is not None:
+                    debug_info[f"difflib_matches_{query_part}"] = close
+                for normalized_match in close:
+                    e = self.tables.find(self.tables.name_keys, self.tables.name_slots, normalized_match)
+                    t = self.tables.ticker(self.tables.name_ticker[e]) if e >= 0 else None
+                    if t:
+                        match_info = (0.85, original_part, part_start, part_end)
+
+                        if t not in results or results[t][0] < 0.85:
+                            results[t] = match_info
+
+    def _extract(self, query: str, use_fuzzy: bool = True,
+                 debug_info: Optional[Dict[str, Any]] = None) -> Tuple[TickerMatch, ...]:
+        """
+        Extract tickers from a natural language query.
+        Returns (ticker, (confidence, match_text, start, end)) entries sorted by position.
+        """
+        tb = self.tables
+        results: Dict[str, Tuple] = {}  # ticker -> (confidence, match_text, start, end)
+        original = query or ""
+        query_stripped = clean_query(original)
+
+        # Detect if query likely contains multiple tickers
+        is_multi_query = any(indicator in original.lower() for indicator in MULTI_TICKER_INDICATORS)
+
+        if debug_info is not None:
+            debug_info["original"] = original
+            debug_info["cleaned"] = query_stripped
+            debug_info["is_multi_query"] = is_multi_query
+
+        # 1) $TICKER style (e.g., $AAPL)
+        for m in RE_DOLLAR_TICKER.finditer(original):
+            t = m.group(1).upper()
+            if tb.ticker_id(t) >= 0:
+                match_info = (0.99, m.group(0), m.start(), m.end())
+                if t not in results or results[t][0] < 0.99:
+                    results[t] = match_info
+
+        # 2) Direct token matches (case-insensitive) - but avoid single suffix words
+        for m in RE_WORD.finditer(original):
+            tk = m.group(0)
+            tk_up = tk.upper()
+
+            # Skip if it's a forbidden solo word
+            if tk.lower() in FORBIDDEN_SOLO_WORDS:
+                continue
+
+            if tb.ticker_id(tk_up) >= 0:
+                match_info = (0.98, tk, m.start(), m.end())
+                if tk_up not in results or results[tk_up][0] < 0.98:
+                    results[tk_up] = match_info
+
+        # 3) Exact company-name substring matches
+        self._name_matches(original, query_stripped, results)
+
+        # 4) Keyword-based matching
+        self._keyword_matches(original, query_stripped, results)
+
+        # 5) Fuzzy matching
+        if use_fuzzy and original and len(query_stripped) >= 3:
+            self._fuzzy_matches(original, query_stripped, is_multi_query, results, debug_info)
+
+        # 6) Final filtering
+        if len(query_stripped) < 4:
+            min_confidence = 0.85
+        elif is_multi_query:
+            min_confidence = 0.70
+        else:
+            min_confidence = 0.75
+
+        final = {t: info for t, info in results.items() if info[0] >= min_confidence}
+
+        if debug_info is not None:
+            debug_info["raw_results"] = {k: (v[0], v[1]) for k, v in results.items()}
+            debug_info["final_results"] = {k: (v[0], v[1]) for k, v in final.items()}
+
+        # Sort by position in query (then by confidence)
+        return tuple(sorted(final.items(), key=lambda x: (x[1][2], -x[1][0])))
+
+    def extract_timed(self, query: str, use_fuzzy: bool = True, debug: bool = False):
+        """extract() with the (matches, elapsed_ms, debug_info) return shape of extract_tickers_from_query."""
+        start = time.perf_counter()
+        if debug:
+            debug_info: Dict[str, Any] = {}
+            matches = self._extract(query, use_fuzzy, debug_info)
+        else:
+            debug_info = None
+            matches = self.extract(query, use_fuzzy)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        if debug_info is not None:
+            debug_info["elapsed_ms"] = elapsed_ms
+        return list(matches), elapsed_ms, debug_info
+
+
+# Most recent first; the previous index stays alive while in-flight requests still hold the old universe
+_INDEXES: List[TickerIndex] = []
+_INDEXES_KEPT = 2
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_ticker_index(tickers, name_to_ticker, companies, keyword_index) -> TickerIndex:
+    """Index for the given loaded universe, built on first use and kept until the data changes."""
+    for index in _INDEXES:
+        if index.tickers is tickers and index.name_to_ticker is name_to_ticker:
+            return index
+    with _INDEXES_LOCK:
+        for index in _INDEXES:
+            if index.tickers is tickers and index.name_to_ticker is name_to_ticker:
+                return index
+        index = TickerIndex(tickers, name_to_ticker, companies, keyword_index)
+        _INDEXES[:] = [index] + _INDEXES[:_INDEXES_KEPT - 1]
+    return index
+
+
+def add_ticker_index(index: TickerIndex) -> TickerIndex:
+    """Register a prebuilt index so get_ticker_index(*index.universe) returns it."""
+    with _INDEXES_LOCK:
+        _INDEXES[:] = [index] + [i for i in _INDEXES if i is not index][:_INDEXES_KEPT - 1]
+    return index
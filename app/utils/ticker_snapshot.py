@@ -0,0 +1,445 @@
+"""
+Ticker Snapshot
+Universe-scale ticker dictionary shared by every worker through one file.
+
+The ticker/company list comes from dbo.vSecurities (falling back to
+dbo.vTickers) instead of the 124-row tickers.csv:
+- A snapshot file holds the symbols sorted by ticker together with the
+  TickerIndex lookup tables (name and keyword hashes, trigram postings),
+  packed once by the process that writes it. Workers mmap it read-only and
+  serve lookups from the mapped arrays, so the dictionary and its index are
+  paged in once per machine rather than queried, copied and rebuilt per worker
+- One process at a time (file lock) rebuilds the snapshot in the background
+  every TICKER_SNAPSHOT_REFRESH_SECONDS, writing a temp file and renaming it
+  over the old one, so readers only ever see a complete snapshot
+- Every worker polls the file's identity every TICKER_SNAPSHOT_CHECK_SECONDS;
+  on change it maps the new file off the request path, then swaps the
+  universe and its index in with a single reference assignment
+- TICKER_SNAPSHOT_SOURCE=csv (or an unreachable database on first build)
+  builds the snapshot from tickers.csv instead, which keeps it testable locally
+
+File layout (little-endian):
+    header     magic, symbol count, section count, build time, file size (HEADER)
+    directory  section name, offset, length for each section (SECTION)
+    sections   ticker_index.INDEX_SECTIONS, each 8-byte aligned; symbol i is
+               entry i of the "symbols" section
+
+Expected Results:
+- Worker startup maps an existing snapshot instead of loading from SQL and
+  building the index: milliseconds and a few MB of private memory per worker
+- Symbol updates reach every worker without a restart
+  (see scripts/benchmark_ticker_snapshot.py for load time and RSS)
+"""
+
+import os
+import csv
+import mmap
+import time
+import struct
+import logging
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.utils.ticker_index import (
+    INDEX_SECTIONS, IndexTables, TickerIndex, normalize_company_name, pack_index_tables, add_ticker_index,
+)
+
+try:
+    import fcntl
+    _HAS_FCNTL = True
+except ImportError:  # Windows: rebuilds are not coordinated between processes
+    _HAS_FCNTL = False
+
+logger = logging.getLogger("ticker_snapshot")
+
+TICKER_SNAPSHOT_ENABLED = os.getenv("TICKER_SNAPSHOT_ENABLED", "true").lower() in ("1", "true", "yes")
+TICKER_SNAPSHOT_PATH = os.getenv("TICKER_SNAPSHOT_PATH", "data/tickers.snapshot")
+TICKER_SNAPSHOT_SOURCE = os.getenv("TICKER_SNAPSHOT_SOURCE", "database").lower()
+TICKER_SNAPSHOT_CSV = os.getenv("TICKER_SNAPSHOT_CSV", "tickers.csv")
+TICKER_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("TICKER_SNAPSHOT_REFRESH_SECONDS", "3600"))
+TICKER_SNAPSHOT_CHECK_SECONDS = float(os.getenv("TICKER_SNAPSHOT_CHECK_SECONDS", "30"))
+
+MAGIC = b"TKSNAP02"
+HEADER = struct.Struct("<8sIIdQ")  # magic, count, sections, built_at, file size
+SECTION = struct.Struct("<24sQQ")  # name, offset, length
+ALIGN = 8
+
+SECURITIES_SNAPSHOT_SQL = """
+SELECT Ticker, MAX(Company_Name) AS Company_Name
+FROM dbo.{view}
+WHERE Ticker IS NOT NULL AND Company_Name IS NOT NULL
+GROUP BY Ticker
+"""
+
+Rows = Iterable[Tuple[str, str]]
+# load_tickers shape: tickers, name_to_ticker, companies, keyword_index (read-only views when mapped)
+Universe = Tuple[Mapping, Mapping, List[str], Mapping]
+
+
+def write_snapshot(rows: Rows, path: str) -> int:
+    """
+    Write (ticker, company name) rows and their packed TickerIndex tables as a
+    snapshot file, atomically. Tickers are upper-cased; the last name seen for
+    a ticker wins. Returns the symbol count.
+    """
+    entries: Dict[str, str] = {}
+    for ticker, name in rows:
+        t = (ticker or "").strip().upper()
+        n = (name or "").strip()
+        if t and n:
+            entries[t] = n
+
+    tickers, name_to_ticker, _, keyword_index = universe_from_rows(sorted(entries.items()))
+    sections = pack_index_tables(tickers, name_to_ticker, keyword_index)
+    layout = []
+    end = HEADER.size + SECTION.size * len(INDEX_SECTIONS)
+    for name in INDEX_SECTIONS:
+        start = -(-end // ALIGN) * ALIGN
+        layout.append((name, start, len(sections[name])))
+        end = start + len(sections[name])
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(tickers), len(layout), time.time(), end))
+            for name, start, length in layout:
+                f.write(SECTION.pack(name.encode("ascii"), start, length))
+            for name, start, _ in layout:
+                f.write(bytes(start - f.tell()))
+                f.write(sections[name])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return len(entries)
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """(inode, mtime_ns, size) of the file, or None when it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class TickerSnapshot(Mapping):
+    """
+    Read-only, memory-mapped view of a snapshot file: a ticker -> company name
+    mapping plus the packed TickerIndex tables (`tables`).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, count, section_count, built_at, size = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or len(self._mm) != size:
+                raise ValueError(f"{path} is not a complete ticker snapshot")
+            self._view = memoryview(self._mm)
+            sections = {}
+            for k in range(section_count):
+                name, start, length = SECTION.unpack_from(self._mm, HEADER.size + k * SECTION.size)
+                sections[name.rstrip(b"\0").decode("ascii")] = self._view[start:start + length]
+            missing = set(INDEX_SECTIONS) - set(sections)
+            if missing:
+                raise ValueError(f"{path} is missing snapshot sections: {sorted(missing)}")
+            self.tables = IndexTables(sections)
+        except (ValueError, struct.error) as e:
+            if hasattr(self, "_view"):
+                self._view.release()
+            self._mm.close()
+            raise ValueError(f"{path} is not a readable ticker snapshot: {e}") from e
+        self.count = count
+        self.built_at = built_at
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self.count):
+            yield self.tables.ticker(i)
+
+    def __getitem__(self, ticker: str) -> str:
+        name = self.get(ticker)
+        if name is None:
+            raise KeyError(ticker)
+        return name
+
+    def ticker(self, i: int) -> str:
+        return self.tables.ticker(i)
+
+    def name(self, i: int) -> str:
+        return self.tables.name(i)
+
+    def get(self, ticker: str, default: Optional[str] = None) -> Optional[str]:
+        """Company name for a ticker (hash lookup over the mapped symbols)."""
+        i = self.tables.ticker_id(ticker.strip().upper())
+        return self.tables.name(i) if i >= 0 else default
+
+    def __contains__(self, ticker) -> bool:
+        return isinstance(ticker, str) and self.get(ticker) is not None
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        for i in range(self.count):
+            yield self.tables.ticker(i), self.tables.name(i)
+
+    def close(self):
+        self.tables.release()
+        self._view.release()
+        self._mm.close()
+
+
+def csv_rows(csv_path: str) -> List[Tuple[str, str]]:
+    """(ticker, company name) rows from a tickers CSV, with or without a ticker/name header."""
+    rows = []
+    with open(csv_path, newline="", encoding="utf-8") as fh:
+        reader = csv.reader(fh)
+        first = next(reader, None)
+        if first is None:
+            return rows
+        header_row = [c.strip().lower() for c in first]
+        if "ticker" in header_row and ("name" in header_row or "company" in header_row):
+            fh.seek(0)
+            for row in csv.DictReader(fh):
+                t = row.get("ticker") or row.get("symbol") or row.get("Ticker") or ""
+                n = row.get("name") or row.get("company") or row.get("Name") or ""
+                rows.append((t, n))
+        else:
+            fh.seek(0)
+            for row in reader:
+                if row:
+                    rows.append((row[0], row[1] if len(row) > 1 else row[0]))
+    return rows
+
+
+def database_rows(engine=None) -> List[Tuple[str, str]]:
+    """(ticker, company name) rows from dbo.vSecurities, or dbo.vTickers when that view is unavailable."""
+    from sqlalchemy import text
+
+    if engine is None:
+        from app.core.database import engine
+    last_error: Optional[Exception] = None
+    for view in ("vSecurities", "vTickers"):
+        try:
+            with engine.connect() as conn:
+                return [(r[0], r[1]) for r in conn.execute(text(SECURITIES_SNAPSHOT_SQL.format(view=view)))]
+        except Exception as e:
+            logger.warning(f"Ticker snapshot query on dbo.{view} failed: {e}")
+            last_error = e
+    raise last_error
+
+
+def universe_from_rows(rows: Iterable[Tuple[str, str]]) -> Universe:
+    """Build the (tickers, name_to_ticker, companies, keyword_index) structures load_tickers returns."""
+    tickers: Dict[str, str] = {}
+    name_to_ticker: Dict[str, str] = {}
+    companies: List[str] = []
+    keyword_index: Dict[str, List[str]] = {}
+    for t, n in rows:
+        tickers[t] = n
+        normalized, keywords = normalize_company_name(n)
+        name_to_ticker[n.lower()] = t
+        name_to_ticker[normalized] = t
+        companies.append(n)
+        for kw in keywords:
+            keyword_index.setdefault(kw, []).append(t)
+    return tickers, name_to_ticker, companies, keyword_index
+
+
+@contextmanager
+def _rebuild_lock(path: str) -> Iterator[bool]:
+    """Non-blocking exclusive lock next to the snapshot; yields whether it was acquired."""
+    if not _HAS_FCNTL:
+        yield True
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.lock", "a") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        yield True  # closing the file releases the lock
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+class TickerUniverse:
+    """
+    Hot-reloading ticker universe backed by a snapshot file.
+
+    get() returns load_tickers-shaped, read-only views over the mapped
+    snapshot whose TickerIndex is already registered.
+    The first call opens (or builds) the snapshot synchronously and starts the
+    background thread that rebuilds and reloads it.
+    """
+
+    def __init__(self, path: str = TICKER_SNAPSHOT_PATH,
+                 source: Optional[Callable[[], Rows]] = None,
+                 fallback_csv: Optional[str] = TICKER_SNAPSHOT_CSV,
+                 refresh_interval: float = TICKER_SNAPSHOT_REFRESH_SECONDS,
+                 check_interval: float = TICKER_SNAPSHOT_CHECK_SECONDS):
+        self.path = path
+        if source is None:
+            source = (lambda: csv_rows(fallback_csv)) if TICKER_SNAPSHOT_SOURCE == "csv" else database_rows
+        self.source = source
+        self.fallback_csv = fallback_csv
+        self.refresh_interval = refresh_interval
+        self.check_interval = check_interval
+
+        # (snapshot, universe) swapped as one reference
+        self._state: Optional[Tuple[TickerSnapshot, Universe]] = None
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {
+            "reloads": 0,
+            "rebuilds": 0,
+            "rebuild_errors": 0,
+            "last_error": None,
+            "load_ms": 0.0,
+            "index_ms": 0.0,
+            "rss_mb": 0.0,
+        }
+
+    def get(self) -> Universe:
+        """Current universe, loading it on first use."""
+        state = self._state
+        if state is None:
+            with self._load_lock:
+                if self._state is None:
+                    if file_signature(self.path) is None:
+                        self._build(initial=True)
+                    try:
+                        self._reload()
+                    except ValueError as e:
+                        # Unreadable or older-format file: replace it rather than serve nothing
+                        logger.warning(f"Rebuilding ticker snapshot: {e}")
+                        self._build(initial=True)
+                        self._reload()
+                    self._start()
+                state = self._state
+        return state[1]
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rebuild the snapshot from the source if it is older than refresh_interval
+        (or force) and no other process is rebuilding it. Returns True when rebuilt.
+        """
+        with _rebuild_lock(self.path) as acquired:
+            if not acquired:
+                return False
+            signature = file_signature(self.path)
+            if not force and signature is not None and time.time() - signature[1] / 1e9 < self.refresh_interval:
+                return False
+            try:
+                self._build(initial=False)
+                return True
+            except Exception as e:
+                self.stats["rebuild_errors"] += 1
+                self.stats["last_error"] = str(e)
+                logger.error(f"Ticker snapshot rebuild failed, keeping the current snapshot: {e}")
+                return False
+
+    def reload_if_changed(self) -> bool:
+        """Swap in the snapshot file if another process replaced it. Returns True when swapped."""
+        state = self._state
+        signature = file_signature(self.path)
+        if signature is None or (state is not None and state[0].signature == signature):
+            return False
+        with self._load_lock:
+            self._reload()
+        return True
+
+    def _build(self, initial: bool):
+        try:
+            rows = list(self.source())
+        except Exception as e:
+            # Without any snapshot yet, the CSV stand-in beats an empty universe
+            if not (initial and self.fallback_csv and os.path.exists(self.fallback_csv)):
+                raise
+            logger.warning(f"Ticker snapshot source unavailable, building from {self.fallback_csv}: {e}")
+            rows = csv_rows(self.fallback_csv)
+        count = write_snapshot(rows, self.path)
+        self.stats["rebuilds"] += 1
+        logger.info(f"Ticker snapshot rebuilt: {count} symbols -> {self.path}")
+
+    def _reload(self):
+        start = time.perf_counter()
+        snapshot = TickerSnapshot(self.path)
+        loaded = time.perf_counter()
+        # The index reads the mapped tables; register it before the swap so
+        # get_ticker_index(*universe) finds it instead of building one
+        index = add_ticker_index(TickerIndex.from_tables(snapshot.tables, tickers=snapshot))
+        self._state = (snapshot, index.universe)
+        self.stats["reloads"] += 1
+        self.stats["load_ms"] = round((loaded - start) * 1000, 1)
+        self.stats["index_ms"] = round((time.perf_counter() - loaded) * 1000, 1)
+        self.stats["rss_mb"] = round(_current_rss_mb(), 1)
+        logger.info(f"Ticker universe loaded: {len(snapshot)} symbols in "
+                    f"{self.stats['load_ms'] + self.stats['index_ms']:.0f} ms")
+
+    def _start(self):
+        if self._thread is None and self.check_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="ticker-snapshot", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.refresh()
+                self.reload_if_changed()
+            except Exception as e:
+                logger.error(f"Ticker snapshot refresh failed: {e}")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get snapshot age, symbol count, load timings and reload counters."""
+        state = self._state
+        snapshot = state[0] if state else None
+        return {
+            "path": self.path,
+            "loaded": snapshot is not None,
+            "symbols": len(snapshot) if snapshot else 0,
+            "built_at": snapshot.built_at if snapshot else None,
+            "age_seconds": round(time.time() - snapshot.built_at, 1) if snapshot else None,
+            **self.stats,
+        }
+
+
+_ticker_universe: Optional[TickerUniverse] = None
+_ticker_universe_lock = threading.Lock()
+
+
+def get_ticker_universe() -> TickerUniverse:
+    """Get the process-wide ticker universe."""
+    global _ticker_universe
+    if _ticker_universe is None:
+        with _ticker_universe_lock:
+            if _ticker_universe is None:
+                _ticker_universe = TickerUniverse()
+    return _ticker_universe
@@ -13,6 +13,7 @@ from financial_models.engines.watchlist_projection import WatchlistProjectionEng
 from financial_models.engines.sustainability_analyzer import DividendSustainabilityAnalyzer
 from financial_models.engines.cashflow_sensitivity import CashFlowSensitivityModel
 from financial_models.utils.database import FinancialDataExtractor
+from app.core.db_async import run_db
 
 logger = logging.getLogger(__name__)
 
@@ -74,7 +75,7 @@ async def analyze_portfolio_projection(request: PortfolioProjectionRequest):
     Returns comprehensive projections with growth modeling based on historical data
     """
     try:
-        result = portfolio_engine.analyze_portfolio(request.user_id)
+        result = await run_db(portfolio_engine.analyze_portfolio, request.user_id)
         return result
     except Exception as e:
         logger.error(f"Error in portfolio projection: {e}")
@@ -89,7 +90,8 @@ async def analyze_watchlist(request: WatchlistAnalysisRequest):
     Shows what-if scenarios with given investment amount
     """
     try:
-        result = watchlist_engine.analyze_watchlist(
+        result = await run_db(
+            watchlist_engine.analyze_watchlist,
             request.user_id,
             request.investment_amount
         )
@@ -107,7 +109,7 @@ async def calculate_optimal_allocation(request: OptimalAllocationRequest):
     Returns recommended positions with diversification constraints
     """
     try:
-        watchlist = data_extractor.get_watchlist_stocks(request.user_id)
+        watchlist = await run_db(data_extractor.get_watchlist_stocks, request.user_id)
         result = watchlist_engine.calculate_optimal_allocation(
             watchlist,
             request.target_monthly_income,
@@ -130,7 +132,7 @@ async def analyze_stock_sustainability(request: SustainabilityAnalysisRequest):
         if not request.ticker:
             raise HTTPException(status_code=400, detail="ticker is required")
         
-        result = sustainability_analyzer.analyze_stock_sustainability(request.ticker)
+        result = await run_db(sustainability_analyzer.analyze_stock_sustainability, request.ticker)
         return result
     except Exception as e:
         logger.error(f"Error in sustainability analysis: {e}")
@@ -145,7 +147,7 @@ async def analyze_portfolio_sustainability(request: SustainabilityAnalysisReques
     Returns weighted scores, grades, and risk alerts
     """
     try:
-        result = sustainability_analyzer.analyze_portfolio_sustainability(request.user_id)
+        result = await run_db(sustainability_analyzer.analyze_portfolio_sustainability, request.user_id)
         return result
     except Exception as e:
         logger.error(f"Error in portfolio sustainability: {e}")
@@ -160,7 +162,7 @@ async def analyze_cashflow_sensitivity(request: CashFlowSensitivityRequest):
     Analyzes impact of dividend cuts, sector downturns, and other scenarios
     """
     try:
-        holdings = data_extractor.get_portfolio_holdings(request.user_id)
+        holdings = await run_db(data_extractor.get_portfolio_holdings, request.user_id)
         result = cashflow_model.analyze_cash_flow_sensitivity(
             holdings,
             request.custom_scenarios
@@ -3,6 +3,7 @@ import time
 import uuid
 import logging
 import json
+import threading
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -30,7 +31,8 @@ from app.routes import currency  # Multi-currency support endpoints
 # from app.routes import ml_schedulers  # ML scheduler endpoints - temporarily disabled due to aiohttp dependency
 from app.routers import data_quality
 from app.middleware.api_logging import APILoggingMiddleware
-from app.core.database import engine
+from app.core.db_async import run_db, with_transaction
+from app.core.db_telemetry import DB_ENDPOINT
 from app.core.auth import verify_api_key
 from app.services.scheduler_service import scheduler
 from financial_models.api.endpoints import router as financial_router
@@ -64,8 +66,12 @@ class TimingMiddleware(BaseHTTPMiddleware):
         rid = str(uuid.uuid4())[:8]
         request.state.rid = rid
         start = time.time()
+        endpoint_token = DB_ENDPOINT.set(f"{request.method} {request.url.path}")
 
-        response = await call_next(request)
+        try:
+            response = await call_next(request)
+        finally:
+            DB_ENDPOINT.reset(endpoint_token)
 
         elapsed_ms = int((time.time() - start) * 1000)
         logger.info(f"[{rid}] {request.method} {request.url.path} done in {elapsed_ms} ms")
@@ -288,11 +294,9 @@ async def save_portfolio(request: SavePortfolioRequest, api_key: str = Depends(v
                 SELECT user_id FROM dbo.user_profiles WHERE email = :email;
             """)
             
-            with engine.begin() as conn:
-                result = conn.execute(user_query, {"email": request.email})
-                row = result.fetchone()
-                if row:
-                    user_id = row[0]
+            row = await with_transaction(lambda conn: conn.execute(user_query, {"email": request.email}).fetchone())
+            if row:
+                user_id = row[0]
         
         metadata_json = json.dumps(request.metadata) if request.metadata else None
         
@@ -302,7 +306,7 @@ async def save_portfolio(request: SavePortfolioRequest, api_key: str = Depends(v
             VALUES (:user_id, :name, :type, :metadata);
         """)
         
-        with engine.begin() as conn:
+        def save_group(conn):
             result = conn.execute(insert_group_query, {
                 "user_id": user_id,
                 "name": request.name,
@@ -336,6 +340,9 @@ async def save_portfolio(request: SavePortfolioRequest, api_key: str = Depends(v
                     "target_allocation_pct": target_allocation_pct,
                     "notes": notes
                 })
+            return group_id
+        
+        group_id = await with_transaction(save_group)
         
         logger.info(f"Successfully saved {request.type} '{request.name}' with group_id={group_id}")
         
@@ -370,13 +377,21 @@ async def startup_event():
     """
     logger.info("[startup] Initializing Harvey with performance optimizations...")
     
-    # Initialize database indexes
+    # Apply pending schema migrations (views, tables, indexes); a no-op check when current
     try:
         from app.database.init_db import initialize_database
-        logger.info("[startup] Applying database performance indexes...")
-        initialize_database()
+        from app.core.migrations import get_migration_runner
+        logger.info("[startup] Checking database schema version...")
+        schema_start = time.perf_counter()
+        await run_db(initialize_database)
+        migration_stats = get_migration_runner().get_stats()
+        applied = f"applied {len(migration_stats['applied'])} migrations"
+        if migration_stats["apply_ms"] is not None:
+            applied += f" in {migration_stats['apply_ms']} ms"
+        logger.info(f"[startup] Schema step took {(time.perf_counter() - schema_start) * 1000:.0f} ms "
+                    f"(check {migration_stats['check_ms']} ms, {applied})")
     except Exception as e:
-        logger.warning(f"[startup] Database index initialization failed (non-critical): {e}")
+        logger.warning(f"[startup] Database schema initialization failed (non-critical): {e}")
     
     # Start background scheduler
     logger.info("[startup] Starting background scheduler...")
@@ -401,6 +416,24 @@ async def startup_event():
     except Exception as e:
         logger.warning(f"[startup] ML health monitor initialization failed (non-critical): {e}")
     
+    # Keep the local Ollama model resident (avoids cold loads on llama requests)
+    try:
+        from app.core.ollama_client import get_ollama_client, OLLAMA_KEEPWARM_ENABLED
+        if OLLAMA_KEEPWARM_ENABLED:
+            get_ollama_client().start()
+            logger.info("[startup] ✓ Ollama keep-warm started")
+    except Exception as e:
+        logger.warning(f"[startup] Ollama keep-warm initialization failed (non-critical): {e}")
+    
+    # Load the ticker universe snapshot off the request path (first chat turn would otherwise pay for it)
+    try:
+        from app.utils.ticker_snapshot import get_ticker_universe, TICKER_SNAPSHOT_ENABLED
+        if TICKER_SNAPSHOT_ENABLED:
+            threading.Thread(target=get_ticker_universe().get, name="ticker-snapshot-load", daemon=True).start()
+            logger.info("[startup] ✓ Ticker universe loading in background")
+    except Exception as e:
+        logger.warning(f"[startup] Ticker universe initialization failed (non-critical): {e}")
+    
     logger.info("[startup] ✅ Harvey initialized with performance optimizations enabled")
 
 
@@ -427,4 +460,39 @@ async def shutdown_event():
     except Exception as e:
         logger.warning(f"[shutdown] ML health monitor stop failed: {e}")
     
+    # Stop Ollama keep-warm and close its connection pools
+    try:
+        from app.core.ollama_client import get_ollama_client
+        await get_ollama_client().aclose()
+    except Exception as e:
+        logger.warning(f"[shutdown] Ollama client stop failed: {e}")
+    
+    # Stop ticker snapshot refresh
+    try:
+        from app.utils.ticker_snapshot import get_ticker_universe
+        get_ticker_universe().stop()
+    except Exception as e:
+        logger.warning(f"[shutdown] Ticker snapshot refresh stop failed: {e}")
+    
+    # Stop conversation compaction workers
+    try:
+        from app.services.conversation_service import get_conversation_compactor
+        get_conversation_compactor().stop()
+    except Exception as e:
+        logger.warning(f"[shutdown] Conversation compactor stop failed: {e}")
+    
+    # Stop the async database executor (calls already running finish on their own)
+    try:
+        from app.core.db_async import get_db_executor
+        get_db_executor().shutdown()
+    except Exception as e:
+        logger.warning(f"[shutdown] Database executor stop failed: {e}")
+    
+    # Drain deferred database writes (last: the services above may still queue writes)
+    try:
+        from app.core.write_behind import get_write_behind
+        get_write_behind().stop()
+    except Exception as e:
+        logger.warning(f"[shutdown] Write-behind drain failed: {e}")
+    
     logger.info("[shutdown] ✅ All background services stopped")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Load Test for Async Database Access
+
+Runs concurrent "requests" on one event loop while a single slow query is in
+flight, once with the database call made inline on the loop (how async
+endpoints used to call the engine) and once awaited through
+app.core.db_async. Reports fast-request throughput and latency for both and
+fails when the executor path does not keep at least --min-ratio of its
+no-slow-query throughput.
+
+By default queries are simulated with time.sleep (pyodbc releases the GIL
+while waiting on the server, so a sleep behaves the same way); --engine runs
+them against the configured SQL Server instead.
+
+Usage Examples:
+    # Simulated: 2 s slow query, 50 concurrent clients issuing 5 ms queries
+    python scripts/benchmark_db_async.py
+
+    # Against the database (WAITFOR DELAY for the slow query, SELECT 1 otherwise)
+    python scripts/benchmark_db_async.py --engine --slow-s 3
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.db_async import DatabaseExecutor
+
+
+def simulated_queries(fast_ms, slow_s):
+    return (lambda: time.sleep(fast_ms / 1000)), (lambda: time.sleep(slow_s))
+
+
+def engine_queries(slow_s):
+    from app.core.database import engine
+
+    def run(sql):
+        with engine.connect() as conn:
+            return conn.exec_driver_sql(sql).fetchall()
+
+    seconds = int(slow_s)
+    return (lambda: run("SELECT 1")), (lambda: run(f"WAITFOR DELAY '00:00:{seconds:02d}'; SELECT 1"))
+
+
+async def load(call, fast, slow, clients, duration, with_slow):
+    """Issue fast queries from `clients` loops for `duration` seconds; returns per-request latencies."""
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await call(fast)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async def slow_request():
+        await call(slow)
+
+    tasks = [asyncio.create_task(slow_request())] if with_slow else []
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(client()) for _ in range(clients)]
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def summarize(latencies, duration):
+    ordered = sorted(latencies) or [0.0]
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50": ordered[len(ordered) // 2],
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test async endpoints with one slow query in flight")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent request loops")
+    parser.add_argument("--fast-ms", type=float, default=5.0, help="Simulated fast query time")
+    parser.add_argument("--slow-s", type=float, default=2.0, help="Slow query time (and test duration)")
+    parser.add_argument("--workers", type=int, default=40, help="Executor workers (pool_size + max_overflow)")
+    parser.add_argument("--engine", action="store_true", help="Query the configured database")
+    parser.add_argument("--min-ratio", type=float, default=0.8,
+                        help="Required executor throughput with the slow query vs without")
+    args = parser.parse_args()
+
+    fast, slow = engine_queries(args.slow_s) if args.engine else simulated_queries(args.fast_ms, args.slow_s)
+    executor = DatabaseExecutor(args.workers)
+
+    async def inline(fn):
+        return fn()
+
+    async def awaited(fn):
+        return await executor.run(fn)
+
+    duration = args.slow_s
+    results = {}
+    for name, call, with_slow in (
+        ("inline, no slow query", inline, False),
+        ("inline, slow in flight", inline, True),
+        ("executor, no slow query", awaited, False),
+        ("executor, slow in flight", awaited, True),
+    ):
+        results[name] = summarize(asyncio.run(load(call, fast, slow, args.clients, duration, with_slow)), duration)
+    executor.shutdown()
+
+    print(f"{args.clients} clients, {duration:.1f} s per run, {args.workers} executor workers\n")
+    print(f"{'mode':28s}{'requests':>10s}{'req/s':>10s}{'p50 ms':>10s}{'p99 ms':>10s}")
+    for name, r in results.items():
+        print(f"{name:28s}{r['requests']:10d}{r['rps']:10.0f}{r['p50']:10.1f}{r['p99']:10.1f}")
+
+    baseline = results["executor, no slow query"]["rps"]
+    ratio = results["executor, slow in flight"]["rps"] / baseline if baseline else 0.0
+    if ratio < args.min_ratio:
+        print(f"\nFAIL: executor kept {ratio:.0%} of its throughput with a slow query in flight "
+              f"(need {args.min_ratio:.0%})")
+        sys.exit(1)
+    print(f"\nOK: executor kept {ratio:.0%} of its throughput with a slow query in flight")
+
+
+if __name__ == '__main__':
+    main()
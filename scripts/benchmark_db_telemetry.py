@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Overhead Benchmark for Database Telemetry
+
+Calls the before/after_cursor_execute hooks the way SQLAlchemy does for a
+warm set of statements (fingerprints already cached, endpoint set, row
+counting on) and reports the added cost per statement. Fails when it exceeds
+--max-us.
+
+With --sqlite (needs SQLAlchemy) it also runs the same query loop against a
+SQLite engine with and without the hooks installed, so the figure includes
+the event dispatch and the counting fetch strategy.
+
+Usage Examples:
+    # Hook cost only
+    python scripts/benchmark_db_telemetry.py
+
+    # Also measure end to end through a SQLAlchemy engine
+    python scripts/benchmark_db_telemetry.py --sqlite
+"""
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.db_telemetry import DatabaseTelemetry, DB_ENDPOINT
+
+
+class Cursor:
+    description = (("col",),)
+    rowcount = -1
+
+
+class Context:
+    cursor_fetch_strategy = None
+
+
+def hook_cost_us(statements: int, iterations: int) -> float:
+    telemetry = DatabaseTelemetry(slow_query_ms=1e9)
+    telemetry.enable_row_counting(None, lambda record: None)
+    texts = [f"SELECT Ticker, Price FROM dbo.vQuotesEnhanced WHERE Ticker = ? AND Source = {i}"
+             for i in range(statements)]
+    cursor, context = Cursor(), Context()
+    before, after = telemetry.before_cursor_execute, telemetry.after_cursor_execute
+    token = DB_ENDPOINT.set("POST /v1/chat/completions")
+    try:
+        for text in texts:
+            after(None, cursor, text, None, context, False)
+        start = time.perf_counter()
+        for i in range(iterations):
+            text = texts[i % statements]
+            context.cursor_fetch_strategy = None
+            before(None, cursor, text, None, context, False)
+            after(None, cursor, text, None, context, False)
+        elapsed = time.perf_counter() - start
+    finally:
+        DB_ENDPOINT.reset(token)
+
+    # Same loop without the hooks, to subtract the loop itself
+    start = time.perf_counter()
+    for i in range(iterations):
+        text = texts[i % statements]
+        context.cursor_fetch_strategy = None
+    baseline = time.perf_counter() - start
+    return (elapsed - baseline) / iterations * 1e6
+
+
+def sqlite_cost_us(iterations: int) -> float:
+    from sqlalchemy import create_engine, text
+    from app.core.db_telemetry import install_telemetry
+
+    def run(engine):
+        query = text("SELECT :x")
+        with engine.connect() as conn:
+            for i in range(200):
+                conn.execute(query, {"x": i}).fetchall()
+            start = time.perf_counter()
+            for i in range(iterations):
+                conn.execute(query, {"x": i}).fetchall()
+            return time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = create_engine(f"sqlite:///{tmp}/plain.db")
+        hooked = create_engine(f"sqlite:///{tmp}/hooked.db")
+        install_telemetry(hooked, DatabaseTelemetry(slow_query_ms=1e9))
+        plain_s, hooked_s = run(plain), run(hooked)
+    return (hooked_s - plain_s) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure database telemetry overhead per statement")
+    parser.add_argument("--iterations", type=int, default=200000, help="Statements to simulate")
+    parser.add_argument("--statements", type=int, default=50, help="Distinct statement texts")
+    parser.add_argument("--sqlite", action="store_true", help="Also measure through a SQLite engine")
+    parser.add_argument("--max-us", type=float, default=5.0, help="Per-statement overhead budget")
+    args = parser.parse_args()
+
+    cost = hook_cost_us(args.statements, args.iterations)
+    print(f"Hooks: {cost:.2f} us per statement ({args.iterations} statements, {args.statements} fingerprints)")
+    if args.sqlite:
+        engine_cost = sqlite_cost_us(args.iterations // 10)
+        print(f"SQLite engine: {engine_cost:.2f} us per statement added")
+        cost = max(cost, engine_cost)
+
+    if cost > args.max_us:
+        print(f"\nFAIL: {cost:.2f} us per statement exceeds {args.max_us} us")
+        sys.exit(1)
+    print(f"\nOK: {cost:.2f} us per statement within {args.max_us} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the Intent Engine
+
+Runs the per-turn intent checks (model routing, web/ML routing, finance
+intent, status message, ETF provider and audit dividend checks) over a corpus
+of generated chat questions, once with the legacy per-function scans and once
+through the single-pass intent engine, and verifies both classify every
+question identically.
+
+Usage Examples:
+    # Default corpus (5,000 questions)
+    python scripts/benchmark_intent_engine.py
+
+    # Bigger corpus, more repetitions
+    python scripts/benchmark_intent_engine.py --queries 20000 --repeat 5
+"""
+
+import sys
+import os
+import re
+import time
+import random
+import logging
+import argparse
+from typing import Any, Callable, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+logging.disable(logging.INFO)
+
+from app.core.intent_engine import get_intent_engine
+from app.core.model_router import QueryRouter, QueryType, QUERY_PATTERNS
+from app.config.settings import FINANCE_KEYWORDS, SMALLTALK_KEYWORDS, NEWS_KEYWORDS, SCHEMA_CAPABLE_KEYWORDS
+from app.utils import helpers
+from app.utils.helpers import ML_QUERY_KEYWORDS, is_greeting_only
+from app.helpers.status_message_detector import STATUS_MAPPINGS, detect_status_message
+from app.services.etf_provider_service import ETFProviderService, PLURAL_INDICATORS
+from app.services.model_audit_service import DividendModelAuditor, DIVIDEND_QUERY_KEYWORDS
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+TICKERS = ["AAPL", "MSFT", "KO", "PEP", "O", "JEPI", "QYLD", "SCHD", "VYM", "T", "VZ", "XOM", "MO", "ABBV", "TSLY", "MSTY"]
+TEMPLATES = [
+    "What is the dividend yield of {t}?",
+    "Show me the last 5 years of dividend history for {t}",
+    "When is the next ex-dividend date for {t} and {u}?",
+    "Is the {t} dividend safe? What's the cut risk?",
+    "Compare {t} vs {u} payout ratio and dividend growth",
+    "Give me a dividend sustainability analysis of {t}",
+    "Build an income ladder for $2,000 monthly income using monthly payers",
+    "What are the best dividend aristocrats to buy now?",
+    "Optimize my portfolio of {t}, {u} and {v} for income",
+    "How do I minimize taxes on qualified dividends in a Roth IRA?",
+    "Show all YieldMax ETFs distributions this month",
+    "What are the Global X funds distribution amounts?",
+    "Analyze this chart of {t} with RSI and MACD",
+    "What is the EUR/USD exchange rate doing today?",
+    "Calculate the Sharpe ratio and volatility of {t}",
+    "Latest news on {t} earnings and guidance",
+    "hi",
+    "thanks, that helps!",
+    "Who is the CEO of {t}?",
+    "Rate this dividend: {t}",
+    "International dividend stocks with low withholding tax",
+    "Assess the concentration risk of my portfolio with {t} and {u}",
+    "Should I buy {t} before the ex date to capture the dividend?",
+    "Explain covered call ETFs and how they generate option income in detail, and compare to traditional dividend growth strategies",
+    "Forecast the dividend growth rate for {t} over the next 3 years",
+    "Read my brokerage statement pdf and extract holdings",
+    "what's up Harvey",
+    "Is {t} overvalued vs its fair value? price target?",
+    "REIT vs MLP vs BDC: which has the best yield?",
+    "price of {t}",
+]
+SUFFIXES = ["", " please", " thanks", "?", " in detail", " for retirement income", " — quick answer"]
+
+
+def build_corpus(n: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        t, u, v = rng.sample(TICKERS, 3)
+        text = rng.choice(TEMPLATES).format(t=t, u=u, v=v) + rng.choice(SUFFIXES)
+        if rng.random() < 0.3:
+            text = text.lower()
+        corpus.append(text)
+    return corpus
+
+
+# ---------------------------------------------------------------------------
+# Legacy implementations (reference behaviour before the intent engine)
+# ---------------------------------------------------------------------------
+
+_LEGACY_ORDER = [
+    QueryType.MULTIMODAL_DOCUMENT, QueryType.DIVIDEND_SUSTAINABILITY, QueryType.RISK_ASSESSMENT,
+    QueryType.PORTFOLIO_OPTIMIZATION, QueryType.TAX_STRATEGY, QueryType.GLOBAL_MARKETS,
+    QueryType.QUANTITATIVE_ANALYSIS, QueryType.DIVIDEND_SCORING, QueryType.CHART_ANALYSIS,
+    QueryType.FX_TRADING, QueryType.FAST_QUERY,
+]
+
+
+def legacy_classify_query(query: str) -> QueryType:
+    query_lower = query.lower()
+    for query_type in _LEGACY_ORDER:
+        for pattern in QUERY_PATTERNS[query_type]:
+            if re.search(pattern, query_lower, re.IGNORECASE):
+                return query_type
+    complex_indicators = [
+        len(query) > 200,
+        query.count('?') > 2,
+        any(word in query_lower for word in [
+            'analyze', 'compare', 'evaluate', 'portfolio', 'strategy',
+            'comprehensive', 'detailed', 'explain', 'breakdown'
+        ])
+    ]
+    if sum(complex_indicators) >= 2:
+        return QueryType.COMPLEX_ANALYSIS
+    return QueryType.GENERAL_CHAT
+
+
+def legacy_is_smalltalk(text: str) -> bool:
+    t = text.strip().lower()
+    if is_greeting_only(t):
+        return True
+    return any(kw in t for kw in SMALLTALK_KEYWORDS)
+
+
+def legacy_has_finance_intent(text: str) -> bool:
+    lt = text.lower()
+    return any(k in lt for k in FINANCE_KEYWORDS)
+
+
+def legacy_should_route_to_web(question: str, parsed_tickers: List[str]) -> bool:
+    if legacy_is_smalltalk(question):
+        return False
+    tickers_present = bool(parsed_tickers)
+    t = question.lower()
+    if any(k in t for k in SCHEMA_CAPABLE_KEYWORDS) and (
+        tickers_present or any(k in t for k in ("dividend", "ex-div", "ex date", "payment date", "record date", "history", "payout"))
+    ):
+        return False
+    if any(k in t for k in NEWS_KEYWORDS):
+        return True
+    if not legacy_has_finance_intent(question) and not tickers_present:
+        return True
+    return False
+
+
+def legacy_is_ml_query(text: str) -> bool:
+    t = text.lower()
+    for keywords_list in ML_QUERY_KEYWORDS.values():
+        if any(kw in t for kw in keywords_list):
+            return True
+    return False
+
+
+def legacy_detect_ml_query_type(text: str) -> str:
+    t = text.lower()
+    for query_type, keywords in ML_QUERY_KEYWORDS.items():
+        if any(kw in t for kw in keywords):
+            return query_type
+    return "payout_rating"
+
+
+def legacy_detect_status_message(query: str) -> str:
+    if not query:
+        return STATUS_MAPPINGS["default"]
+    query_lower = query.lower()
+    ticker_match = re.search(r'[\$#]([A-Z]{1,5})', query, re.IGNORECASE)
+    if ticker_match:
+        ticker = ticker_match.group(1).upper()
+        if "distribution" in query_lower or "distributions" in query_lower:
+            return f"Checking {ticker} distributions..."
+        elif "fundamental" in query_lower or "fundamentals" in query_lower:
+            return f"Pulling {ticker} fundamentals..."
+        elif "ex-dividend" in query_lower or "ex dividend" in query_lower:
+            return "Finding ex-dividend dates..."
+        elif "safety" in query_lower or "cut" in query_lower or "suspend" in query_lower:
+            return "Evaluating dividend safety..."
+        else:
+            return f"Pulling {ticker} fundamentals..."
+    sorted_keywords = sorted(
+        [(k, v) for k, v in STATUS_MAPPINGS.items() if k != "default"],
+        key=lambda x: len(x[0]),
+        reverse=True
+    )
+    for keyword, status_msg in sorted_keywords:
+        if keyword in query_lower:
+            return status_msg
+    return STATUS_MAPPINGS["default"]
+
+
+def legacy_is_provider_query(service: ETFProviderService, query: str) -> bool:
+    query_lower = query.lower()
+    provider = None
+    for provider_key, aliases in service.PROVIDER_ALIASES.items():
+        if any(alias in query_lower for alias in aliases):
+            provider = provider_key
+            break
+    if provider is None:
+        for word in query.upper().split():
+            ticker = ''.join(c for c in word if c.isalnum())
+            if ticker in service.ticker_to_provider:
+                provider = service.ticker_to_provider[ticker]
+                break
+    if provider and any(ind in query_lower for ind in PLURAL_INDICATORS):
+        return True
+    for aliases in service.PROVIDER_ALIASES.values():
+        for alias in aliases:
+            if alias in query_lower and any(ind in query_lower for ind in PLURAL_INDICATORS):
+                return True
+    return False
+
+
+def legacy_is_dividend_query(query: str) -> bool:
+    query_lower = query.lower()
+    return any(keyword in query_lower for keyword in DIVIDEND_QUERY_KEYWORDS)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def turn_checks() -> Tuple[Callable[[str], Tuple[Any, ...]], Callable[[str], Tuple[Any, ...]]]:
+    """The intent checks one chat turn runs, legacy and engine-backed."""
+    router = QueryRouter()
+    etf = ETFProviderService()
+    auditor = DividendModelAuditor.__new__(DividendModelAuditor)  # no DB needed for is_dividend_query
+
+    def legacy(q: str):
+        tickers = helpers.extract_ticker_list(q)
+        return (
+            legacy_classify_query(q), legacy_should_route_to_web(q, tickers), legacy_is_ml_query(q),
+            legacy_detect_ml_query_type(q), legacy_has_finance_intent(q), legacy_detect_status_message(q),
+            legacy_is_provider_query(etf, q), legacy_is_dividend_query(q),
+        )
+
+    def engine(q: str):
+        tickers = helpers.extract_ticker_list(q)
+        return (
+            router.classify_query(q), helpers.should_route_to_web(q, tickers), helpers.is_ml_query(q),
+            helpers.detect_ml_query_type(q), helpers.has_finance_intent(q), detect_status_message(q),
+            etf.is_provider_query(q), auditor.is_dividend_query(q),
+        )
+
+    return legacy, engine
+
+
+def timed(fn: Callable[[str], Any], corpus: List[str], repeat: int, before_each: Callable[[], None] = lambda: None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        before_each()
+        start = time.perf_counter()
+        for q in corpus:
+            fn(q)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the single-pass intent engine")
+    parser.add_argument("--queries", type=int, default=5000, help="Corpus size")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions (best time is reported)")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.queries)
+    legacy, engine = turn_checks()
+    memo = get_intent_engine().scan
+
+    mismatches = [q for q in corpus if legacy(q) != engine(q)]
+    print(f"Corpus: {len(corpus)} questions ({len(set(corpus))} distinct)")
+    print(f"Identical classifications: {len(corpus) - len(mismatches)}/{len(corpus)}")
+    for q in mismatches[:10]:
+        print(f"  MISMATCH: {q!r}\n    legacy={legacy(q)}\n    engine={engine(q)}")
+
+    distinct = list(dict.fromkeys(corpus))
+    t_legacy = timed(legacy, distinct, args.repeat)
+    t_cold = timed(engine, distinct, args.repeat, before_each=memo.cache_clear)
+    t_warm = timed(engine, corpus, args.repeat)
+
+    per = lambda t, n: t / n * 1e6
+    print()
+    print(f"{'':22s}{'total (s)':>12s}{'per turn (µs)':>16s}{'speedup':>10s}")
+    print(f"{'legacy':22s}{t_legacy:12.3f}{per(t_legacy, len(distinct)):16.1f}{'1.0x':>10s}")
+    print(f"{'engine (cold scan)':22s}{t_cold:12.3f}{per(t_cold, len(distinct)):16.1f}{t_legacy / t_cold:9.1f}x")
+    print(f"{'engine (memoized)':22s}{t_warm:12.3f}{per(t_warm, len(corpus)):16.1f}"
+          f"{per(t_legacy, len(distinct)) / per(t_warm, len(corpus)):9.1f}x")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for Ticker Extraction
+
+Builds a synthetic ticker universe (company names made of realistic name
+words and suffixes), indexes it once, and times extract_tickers_from_query
+over a corpus of chat questions mentioning tickers, exact company names,
+partial names and misspellings. Reports index build time and per-query
+latency cold (memo cleared) and memoized, and fails when the cold p50,
+p95 or p99 exceeds its budget. The targets are a sub-millisecond median
+with p95 under 3 ms and p99 under 6 ms; the tail is questions naming
+several companies, each of which gets a difflib fuzzy pass.
+
+Usage Examples:
+    # Default: 100,000 names, 2,000 questions, 1 / 3 / 6 ms p50 / p95 / p99 budgets
+    python scripts/benchmark_ticker_extraction.py
+
+    # Smaller universe, include the legacy per-name scan for comparison
+    python scripts/benchmark_ticker_extraction.py --names 5000 --legacy
+"""
+
+import sys
+import os
+import re
+import time
+import random
+import argparse
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.ticker_index import (
+    TickerIndex, FORBIDDEN_SOLO_WORDS, normalize_company_name, _HAS_RAPIDFUZZ,
+)
+
+
+# ---------------------------------------------------------------------------
+# Universe and corpus
+# ---------------------------------------------------------------------------
+
+SYLLABLES = ["al", "ben", "cor", "dex", "el", "fin", "gar", "hal", "ion", "jet", "kor", "lum",
+             "mar", "nov", "or", "pra", "quin", "ros", "sol", "tor", "ul", "ver", "wex", "xan",
+             "yor", "zen", "tri", "gen", "vita", "nex", "pax", "sig"]
+SECTOR_WORDS = ["Energy", "Capital", "Realty", "Bancorp", "Pharmaceuticals", "Financial", "Industries",
+                "Resources", "Therapeutics", "Semiconductor", "Insurance", "Utilities", "Income",
+                "Logistics", "Foods", "Brands", "Materials", "Networks", "Partners", "Trust"]
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SUFFIXES = ["Inc", "Corp", "Corporation", "Company", "Ltd", "Holdings", "Group", "PLC", "LLC", "ETF", "Fund"]
+QUESTIONS = [
+    "What is the dividend yield of {x}?",
+    "Compare {x} and {y} payout ratio",
+    "{x} vs {y}, which is safer?",
+    "Show me the last 5 years of dividends for {x}",
+    "Is {x} a good monthly income pick",
+    "When is the next ex-dividend date for {x}",
+]
+
+
+def build_universe(n: int, seed: int = 7):
+    """Synthetic tickers/name_to_ticker/companies/keyword_index, shaped like load_tickers output."""
+    rng = random.Random(seed)
+    tickers: Dict[str, str] = {}
+    name_to_ticker: Dict[str, str] = {}
+    companies: List[str] = []
+    keyword_index: Dict[str, List[str]] = {}
+    while len(tickers) < n:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        words = [stem] + rng.sample(SECTOR_WORDS, rng.randint(0, 2)) + [rng.choice(SUFFIXES)]
+        name = " ".join(words)
+        t = "".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 5)))
+        if t in tickers or name.lower() in name_to_ticker:
+            continue
+        tickers[t] = name
+        normalized, keywords = normalize_company_name(name)
+        name_to_ticker[name.lower()] = t
+        name_to_ticker[normalized] = t
+        companies.append(name)
+        for kw in keywords:
+            keyword_index.setdefault(kw, []).append(t)
+    return tickers, name_to_ticker, companies, keyword_index
+
+
+def build_corpus(tickers: Dict[str, str], n: int, seed: int = 11) -> List[str]:
+    rng = random.Random(seed)
+    items = list(tickers.items())
+
+    def mention():
+        t, name = rng.choice(items)
+        kind = rng.random()
+        if kind < 0.3:
+            return t
+        if kind < 0.6:
+            return name
+        if kind < 0.8:
+            return normalize_company_name(name)[0].title()
+        # Misspelling: drop one character of the name stem
+        stem = name.split()[0]
+        i = rng.randrange(1, len(stem))
+        return stem[:i] + stem[i + 1:]
+
+    return [rng.choice(QUESTIONS).format(x=mention(), y=mention()) for _ in range(n)]
+
+
+# ---------------------------------------------------------------------------
+# Legacy step 3 (per-name regex scan) for comparison
+# ---------------------------------------------------------------------------
+
+def legacy_name_scan(query: str, name_to_ticker: Dict[str, str]) -> List[Tuple[str, int]]:
+    qlow = query.lower()
+    hits = []
+    for name_lower, t in name_to_ticker.items():
+        name_words = name_lower.split()
+        if len(name_words) == 1 and name_words[0] in FORBIDDEN_SOLO_WORDS:
+            continue
+        for m in re.finditer(r'\b' + re.escape(name_lower) + r'\b', qlow):
+            hits.append((t, m.start()))
+    return hits
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indexed ticker extraction")
+    parser.add_argument("--names", type=int, default=100000, help="Universe size (companies)")
+    parser.add_argument("--queries", type=int, default=2000, help="Corpus size")
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="Cold p50 budget per query")
+    parser.add_argument("--p95-ms", type=float, default=3.0, help="Cold p95 budget per query")
+    parser.add_argument("--p99-ms", type=float, default=6.0, help="Cold p99 budget per query")
+    parser.add_argument("--legacy", action="store_true", help="Also time the legacy per-name scan (slow)")
+    args = parser.parse_args()
+
+    universe = build_universe(args.names)
+    corpus = build_corpus(universe[0], args.queries)
+
+    start = time.perf_counter()
+    index = TickerIndex(*universe)
+    build_s = time.perf_counter() - start
+    print(f"Universe: {len(universe[0])} companies, {len(universe[1])} names, {len(universe[3])} keywords")
+    print(f"Fuzzy scorer: {'rapidfuzz' if _HAS_RAPIDFUZZ else 'difflib'}")
+    print(f"Index build: {build_s:.2f} s")
+
+    cold = []
+    for q in corpus:
+        index.extract.cache_clear()
+        start = time.perf_counter()
+        index.extract(q)
+        cold.append((time.perf_counter() - start) * 1000)
+
+    for q in corpus:
+        index.extract(q)
+    start = time.perf_counter()
+    for q in corpus:
+        index.extract(q)
+    warm_ms = (time.perf_counter() - start) * 1000 / len(corpus)
+
+    found = sum(1 for q in corpus if index.extract(q))
+    print(f"Questions with a detected ticker: {found}/{len(corpus)}")
+    print()
+    print(f"{'':22s}{'p50 (ms)':>10s}{'p95 (ms)':>10s}{'p99 (ms)':>10s}")
+    print(f"{'indexed (cold)':22s}{percentile(cold, 0.5):10.3f}{percentile(cold, 0.95):10.3f}{percentile(cold, 0.99):10.3f}")
+    print(f"{'indexed (memoized)':22s}{warm_ms:10.4f}")
+
+    if args.legacy:
+        sample = corpus[:min(50, len(corpus))]
+        start = time.perf_counter()
+        for q in sample:
+            legacy_name_scan(q, universe[1])
+        legacy_ms = (time.perf_counter() - start) * 1000 / len(sample)
+        print(f"{'legacy name scan only':22s}{legacy_ms:10.3f}")
+
+    gates = [("p50", percentile(cold, 0.5), args.budget_ms),
+             ("p95", percentile(cold, 0.95), args.p95_ms),
+             ("p99", percentile(cold, 0.99), args.p99_ms)]
+    over = [(name, value, budget) for name, value, budget in gates if value > budget]
+    if over:
+        for name, value, budget in over:
+            print(f"\nFAIL: cold {name} {value:.3f} ms exceeds the {budget} ms budget")
+        sys.exit(1)
+    print("\nOK: cold " + ", ".join(f"{name} {value:.3f} ms" for name, value, _ in gates)
+          + " within budget")
+
+
+if __name__ == '__main__':
+    main()
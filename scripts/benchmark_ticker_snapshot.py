@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the Ticker Universe Snapshot
+
+Writes a synthetic 100k-symbol snapshot (symbols plus packed index tables),
+then starts fresh worker processes that each open it the way app workers do
+(mmap, register the TickerIndex over the mapped tables), run a query corpus
+through extraction, and report load time and resident memory split into
+private (anonymous) pages and mapped snapshot pages, which every worker on
+the machine shares. Fails when the slowest worker load or the largest
+private RSS growth after the queries exceeds the budget.
+
+Usage Examples:
+    # Default: 100,000 symbols, 2 workers
+    python scripts/benchmark_ticker_snapshot.py
+
+    # Snapshot from tickers.csv (the local stand-in for vSecurities)
+    python scripts/benchmark_ticker_snapshot.py --csv tickers.csv
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.ticker_snapshot import write_snapshot, csv_rows
+
+WORKER = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from app.utils.ticker_snapshot import TickerUniverse, _current_rss_mb
+from app.utils.ticker_index import get_ticker_index
+
+def rss_mb():
+    # (private, file-backed) resident MB; total RSS as private where /proc/self/status is missing
+    sizes = {{}}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("RssAnon", "RssFile"):
+                    sizes[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return sizes.get("RssAnon", _current_rss_mb()), sizes.get("RssFile", 0.0)
+
+with open({queries!r}) as f:
+    queries = json.load(f)
+universe = TickerUniverse(path={path!r}, check_interval=0)
+private_before, shared_before = rss_mb()
+start = time.perf_counter()
+data = universe.get()
+elapsed = time.perf_counter() - start
+stats = universe.get_stats()
+loaded_mb = rss_mb()[0] - private_before
+index = get_ticker_index(*data)
+found = sum(1 for q in queries if index.extract(q))
+private, shared = rss_mb()
+print(json.dumps({{"symbols": len(data[0]), "load_s": elapsed, "snapshot_ms": stats["load_ms"],
+                  "index_ms": stats["index_ms"], "loaded_mb": loaded_mb, "found": found,
+                  "rss_growth_mb": private - private_before, "shared_mb": shared - shared_before}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ticker snapshot load time and worker RSS")
+    parser.add_argument("--symbols", type=int, default=100000, help="Synthetic universe size")
+    parser.add_argument("--csv", help="Build the snapshot from this tickers CSV instead")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes to start")
+    parser.add_argument("--queries", type=int, default=2000, help="Queries each worker extracts after loading")
+    parser.add_argument("--max-load-s", type=float, default=0.5, help="Per-worker load budget")
+    parser.add_argument("--max-rss-mb", type=float, default=40.0, help="Per-worker private RSS growth budget")
+    args = parser.parse_args()
+
+    from benchmark_ticker_extraction import build_universe, build_corpus
+    if args.csv:
+        rows = csv_rows(args.csv)
+    else:
+        rows = list(build_universe(args.symbols)[0].items())
+    corpus = build_corpus(dict(rows), args.queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tickers.snapshot")
+        queries = os.path.join(tmp, "queries.json")
+        with open(queries, "w") as f:
+            json.dump(corpus, f)
+        start = time.perf_counter()
+        count = write_snapshot(rows, path)
+        build_s = time.perf_counter() - start
+        print(f"Snapshot: {count} symbols, {os.path.getsize(path) / (1024 * 1024):.1f} MB, written in {build_s:.2f} s")
+
+        results = []
+        for _ in range(args.workers):
+            out = subprocess.run([sys.executable, "-c", WORKER.format(root=ROOT, path=path, queries=queries)],
+                                 capture_output=True, text=True, check=True)
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print()
+    print(f"{'worker':8s}{'load (s)':>10s}{'snapshot (ms)':>15s}{'index (ms)':>12s}"
+          f"{'private +MB':>13s}{'after queries':>15s}{'shared +MB':>12s}{'found':>8s}")
+    for i, r in enumerate(results):
+        print(f"{i:<8d}{r['load_s']:10.3f}{r['snapshot_ms']:15.1f}{r['index_ms']:12.1f}"
+              f"{r['loaded_mb']:13.1f}{r['rss_growth_mb']:15.1f}{r['shared_mb']:12.1f}{r['found']:8d}")
+
+    load_s = max(r["load_s"] for r in results)
+    rss_mb = max(r["rss_growth_mb"] for r in results)
+    if load_s > args.max_load_s or rss_mb > args.max_rss_mb:
+        print(f"\nFAIL: worst load {load_s:.2f} s / private RSS +{rss_mb:.0f} MB exceeds "
+              f"{args.max_load_s} s / {args.max_rss_mb} MB")
+        sys.exit(1)
+    print(f"\nOK: worst load {load_s:.2f} s / private RSS +{rss_mb:.0f} MB within "
+          f"{args.max_load_s} s / {args.max_rss_mb} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+CLI Tool for Replaying Model Routing Decisions
+
+Re-runs recorded routing decisions (each with the per-model statistics seen at
+decision time) through the current QueryRouter, deterministically, to compare
+routing changes against captured traffic.
+
+Recorded decisions come from GET /admin/models/routing ("recent_decisions"),
+saved as a JSON list or as JSON lines.
+
+Usage Examples:
+    # Capture, then replay
+    curl -s "$HOST/admin/models/routing?limit=1000" | jq '.recent_decisions' > decisions.json
+    python scripts/replay_routing.py decisions.json
+
+    # Try a different switch margin / budget
+    ROUTER_SWITCH_MARGIN=0.1 ROUTER_COST_BUDGET_MULTIPLIER=3 python scripts/replay_routing.py decisions.json
+
+    # Full per-decision output
+    python scripts/replay_routing.py decisions.json --json
+"""
+
+import sys
+import os
+import argparse
+import json
+from collections import Counter
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.model_router import QueryRouter
+
+
+def load_decisions(path: str) -> List[Dict[str, Any]]:
+    """Load decisions from a JSON list or JSON lines file."""
+    with open(path, "r") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded model routing decisions")
+    parser.add_argument("path", help="Recorded decisions (JSON list or JSON lines)")
+    parser.add_argument("--json", action="store_true", help="Print the full replay result as JSON")
+    args = parser.parse_args()
+
+    summary = QueryRouter().replay(load_decisions(args.path))
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    routes = Counter(f"{r['query_type']}: {r['static']} → {r['chosen']}" for r in summary["results"])
+    print(f"Decisions replayed:      {summary['decisions']}")
+    print(f"Routed off static:       {summary['adaptive']}")
+    print(f"Changed vs recorded:     {summary['changed_vs_recorded']}")
+    print(f"Expected latency (ms):   static={summary['expected_latency_ms']['static']}  "
+          f"adaptive={summary['expected_latency_ms']['adaptive']}")
+    print()
+    for route, count in routes.most_common():
+        print(f"  {count:6d}  {route}")
+
+
+if __name__ == '__main__':
+    main()